@@ -0,0 +1,107 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares the SDPA implementations on long-context CPU attention.
+
+Usage:
+
+    python benchmarks/sdpa.py --seq-len 4096 --num-threads 8
+"""
+
+from argparse import ArgumentParser, Namespace
+from typing import Dict, Optional
+
+import torch
+from torch.utils.benchmark import Timer
+
+from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.transformer import (
+    SDPA,
+    AttentionMask,
+    CausalAttentionMask,
+    NaiveSDPA,
+    TiledSDPA,
+)
+
+
+def _parse_args() -> Namespace:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--num-heads", type=int, default=16)
+    parser.add_argument("--num-key-value-heads", type=int, default=16)
+    parser.add_argument("--head-dim", type=int, default=64)
+    parser.add_argument("--seq-len", type=int, default=4096)
+    parser.add_argument("--dtype", choices=["float32", "bfloat16"], default="float32")
+    parser.add_argument("--num-threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--min-run-time", type=float, default=5.0)
+    parser.add_argument(
+        "--padded", action="store_true", help="pad the last quarter of the keys"
+    )
+    parser.add_argument(
+        "--no-causal", action="store_true", help="attend without a causal mask"
+    )
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+
+    dtype = getattr(torch, args.dtype)
+
+    seq_len = args.seq_len
+
+    q = torch.randn(
+        (args.batch_size, args.num_heads, seq_len, args.head_dim), dtype=dtype
+    )
+
+    kv_shape = (args.batch_size, args.num_key_value_heads, seq_len, args.head_dim)
+
+    k = torch.randn(kv_shape, dtype=dtype)
+    v = torch.randn(kv_shape, dtype=dtype)
+
+    key_padding_mask: Optional[PaddingMask] = None
+
+    if args.padded:
+        seq_lens = torch.full((args.batch_size,), seq_len - seq_len // 4)
+
+        key_padding_mask = PaddingMask(seq_lens, batch_seq_len=seq_len)
+
+    sdpas: Dict[str, SDPA] = {"naive": NaiveSDPA(), "tiled": TiledSDPA()}
+
+    baseline: Optional[float] = None
+
+    print(f"{'SDPA':<8} {'Median (ms)':>12} {'Speedup':>8}")
+
+    for name, sdpa in sdpas.items():
+        sdpa.eval()
+
+        def run() -> None:
+            attn_mask: Optional[AttentionMask] = None
+
+            # Create the mask in each run, since it is created for each forward
+            # pass in models.
+            if not args.no_causal:
+                attn_mask = CausalAttentionMask(seq_len, seq_len, dtype=dtype)
+
+            with torch.inference_mode():
+                sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        timer = Timer(
+            "run()", globals={"run": run}, num_threads=args.num_threads, label=name
+        )
+
+        median = timer.blocked_autorange(min_run_time=args.min_run_time).median
+
+        if baseline is None:
+            baseline = median
+
+        print(f"{name:<8} {median * 1000:>12.2f} {baseline / median:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
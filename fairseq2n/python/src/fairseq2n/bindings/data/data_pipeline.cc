@@ -13,6 +13,7 @@
 #include <iterator>
 #include <memory>
 #include <optional>
+#include <string_view>
 #include <unordered_set>
 #include <utility>
 #include <variant>
@@ -26,6 +27,7 @@
 #include <fairseq2n/data/data_length_extractor.h>
 #include <fairseq2n/data/data_pipeline.h>
 #include <fairseq2n/data/file_mapper.h>
+#include <fairseq2n/data/indexed_shard_writer.h>
 #include <fairseq2n/data/record_reader.h>
 #include <fairseq2n/data/tape.h>
 #include <fairseq2n/detail/exception.h>
@@ -419,6 +421,46 @@ def_data_pipeline(py::module_ &data_module)
             py::arg("bucket_sizes"),
             py::arg("selector") = std::nullopt,
             py::arg("drop_remainder") = false)
+        .def(
+            "cache",
+            [](
+                data_pipeline_builder &self,
+                std::string key_selector,
+                std::size_t capacity_bytes,
+                std::optional<std::string> maybe_spill_dir) -> data_pipeline_builder &
+            {
+                self = std::move(self).cache(
+                    std::move(key_selector), capacity_bytes, std::move(maybe_spill_dir));
+
+                return self;
+            },
+            py::arg("key_selector"),
+            py::arg("capacity_bytes"),
+            py::arg("spill_dir") = std::nullopt)
+        .def(
+            "dynamic_bucket",
+            [](
+                data_pipeline_builder &self,
+                std::size_t max_num_tokens,
+                std::optional<std::size_t> maybe_max_num_examples,
+                std::size_t sort_pool_size,
+                std::optional<std::string> maybe_selector,
+                bool drop_remainder) -> data_pipeline_builder &
+            {
+                self = std::move(self).dynamic_bucket(
+                    max_num_tokens,
+                    maybe_max_num_examples,
+                    sort_pool_size,
+                    data_length_extractor{std::move(maybe_selector)},
+                    drop_remainder);
+
+                return self;
+            },
+            py::arg("max_num_tokens"),
+            py::arg("max_num_examples") = std::nullopt,
+            py::arg("sort_pool_size") = 1,
+            py::arg("selector") = std::nullopt,
+            py::arg("drop_remainder") = false)
         .def(
             "collate",
             [](
@@ -458,13 +500,54 @@ def_data_pipeline(py::module_ &data_module)
             "map",
             [](
                 data_pipeline_builder &self,
-                std::variant<map_fn, std::vector<map_fn>> fn,
+                const py::object &fn,
                 std::optional<std::string> maybe_selector,
-                std::size_t num_parallel_calls) -> data_pipeline_builder &
+                std::size_t num_parallel_calls,
+                bool streaming,
+                bool preserve_order,
+                std::string_view executor,
+                std::optional<std::size_t> maybe_num_workers) -> data_pipeline_builder &
             {
+                std::variant<map_fn, std::vector<map_fn>> fns{};
+
+                if (executor == "process") {
+                    std::size_t num_workers = maybe_num_workers.value_or(num_parallel_calls);
+                    if (num_workers == 0)
+                        throw_<std::invalid_argument>(
+                            "`num_workers` must be greater than zero, but is {} instead.", num_workers);
+
+                    static py::module_ process_map_module = py::module_::import(
+                        "fairseq2n.process_map");
+
+                    // The process map function blocks the calling thread until
+                    // a worker process returns; we always stream so that all
+                    // workers can be kept busy.
+                    py::object process_fn = process_map_module.attr("ProcessMapFunction")(
+                        fn, num_workers);
+
+                    fns = process_fn.cast<map_fn>();
+
+                    num_parallel_calls = std::max(num_parallel_calls, num_workers);
+
+                    streaming = true;
+                } else if (executor == "thread") {
+                    if (maybe_num_workers)
+                        throw_<std::invalid_argument>(
+                            "`num_workers` can only be specified when `executor` is 'process'.");
+
+                    try {
+                        fns = fn.cast<std::variant<map_fn, std::vector<map_fn>>>();
+                    } catch (const py::cast_error &) {
+                        throw_<std::invalid_argument>(
+                            "`fn` must be a callable or a sequence of callables.");
+                    }
+                } else
+                    throw_<std::invalid_argument>(
+                        "`executor` must be 'thread' or 'process', but is '{}' instead.", executor);
+
                 map_fn f{};
 
-                if (auto *map_functions = std::get_if<std::vector<map_fn>>(&fn))
+                if (auto *map_functions = std::get_if<std::vector<map_fn>>(&fns))
                     // Combine all map functions in a single lambda and pass it
                     // to the C++ API.
                     f = [map_functions = std::move(*map_functions)](data &&example)
@@ -475,17 +558,22 @@ def_data_pipeline(py::module_ &data_module)
                         return std::move(example);
                     };
                 else
-                    f = std::get<map_fn>(std::move(fn));
+                    f = std::get<map_fn>(std::move(fns));
 
                 element_mapper mapper{std::move(f), std::move(maybe_selector)};
 
-                self = std::move(self).map(std::move(mapper), num_parallel_calls);
+                self = std::move(self).map(
+                    std::move(mapper), num_parallel_calls, streaming, preserve_order);
 
                 return self;
             },
             py::arg("fn"),
             py::arg("selector") = std::nullopt,
-            py::arg("num_parallel_calls") = 1)
+            py::arg("num_parallel_calls") = 1,
+            py::arg("streaming") = false,
+            py::arg("preserve_order") = true,
+            py::arg("executor") = "thread",
+            py::arg("num_workers") = std::nullopt)
         .def(
             "prefetch",
             [](data_pipeline_builder &self, std::size_t num_examples) -> data_pipeline_builder &
@@ -541,6 +629,19 @@ def_data_pipeline(py::module_ &data_module)
                 return self;
             },
             py::arg("num_examples"))
+        .def(
+            "to_device",
+            [](
+                data_pipeline_builder &self,
+                at::Device device,
+                std::size_t num_buffers) -> data_pipeline_builder &
+            {
+                self = std::move(self).to_device(device, num_buffers);
+
+                return self;
+            },
+            py::arg("device"),
+            py::arg("num_buffers") = 2)
         .def(
             "yield_from",
             [](data_pipeline_builder &self, yield_fn fn) -> data_pipeline_builder &
@@ -583,7 +684,17 @@ def_data_pipeline(py::module_ &data_module)
 
     m.def("read_sequence", &read_list, py::arg("seq"));
 
-    m.def("read_zipped_records", &read_zipped_records, py::arg("pathname"));
+    m.def(
+        "read_indexed_shard",
+        &read_indexed_shard,
+        py::arg("pathname"),
+        py::arg("shuffle") = false);
+
+    m.def(
+        "read_zipped_records",
+        &read_zipped_records,
+        py::arg("pathname"),
+        py::arg("num_parallel_calls") = 1);
 
     // Collater
     py::class_<collate_options_override>(m, "CollateOptionsOverride")
@@ -653,6 +764,16 @@ def_data_pipeline(py::module_ &data_module)
 
     map_functors().register_<file_mapper>();
 
+    // IndexedShardWriter
+    py::class_<indexed_shard_writer>(m, "IndexedShardWriter")
+        .def(py::init<std::string>(), py::arg("pathname"))
+        .def(
+            "write",
+            &indexed_shard_writer::write,
+            py::arg("example"),
+            py::call_guard<py::gil_scoped_release>{})
+        .def("close", &indexed_shard_writer::close, py::call_guard<py::gil_scoped_release>{});
+
     // RecordError
     static py::exception<record_error> py_record_error{m, "RecordError", PyExc_RuntimeError};
 
@@ -105,6 +105,13 @@ def_sentencepiece(py::module_ &text_module)
             py::arg("device")          = std::nullopt,
             py::arg("pin_memory")      = false)
         .def("__call__", &sp_encoder::operator(), py::call_guard<py::gil_scoped_release>{})
+        .def(
+            "encode_batch",
+            &sp_encoder::encode_batch,
+            py::arg("sentences"),
+            py::arg("pad_idx"),
+            py::arg("pad_to_multiple") = 1,
+            py::call_guard<py::gil_scoped_release>{})
 
         .def_property_readonly("prefix_indices", &sp_encoder::prefix_indices)
         .def_property_readonly("suffix_indices", &sp_encoder::suffix_indices);
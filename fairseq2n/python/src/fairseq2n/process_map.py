@@ -0,0 +1,121 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.reduction import ForkingPickler
+from threading import Lock
+from typing import Any, Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+import torch.multiprocessing  # Registers the shared memory reductions of tensors.
+
+from fairseq2n.bindings.memory import MemoryBlock
+
+MapFunction = Callable[[Any], Any]
+
+
+class ProcessMapFunction:
+    """Calls a map function in a persistent pool of worker processes.
+
+    Used by ``DataPipelineBuilder.map(..., executor="process")``. Since each
+    call blocks only the calling thread while releasing the GIL, the data
+    pipeline can keep as many examples in flight as there are worker processes.
+
+    Tensors and memory blocks are exchanged with the worker processes through
+    shared memory; all other objects are pickled.
+    """
+
+    _fns: Tuple[MapFunction, ...]
+    _num_workers: int
+    _executor: Optional[ProcessPoolExecutor]
+    _executor_lock: Lock
+
+    def __init__(
+        self, fn: Union[MapFunction, Sequence[MapFunction]], num_workers: int
+    ) -> None:
+        """
+        :param fn:
+            The function to call. If a sequence of functions, they will be
+            chained. Must be picklable.
+        :param num_workers:
+            The number of worker processes.
+        """
+        if num_workers <= 0:
+            raise ValueError(
+                f"`num_workers` must be greater than zero, but is {num_workers} instead."
+            )
+
+        if callable(fn):
+            self._fns = (fn,)
+        else:
+            self._fns = tuple(fn)
+
+        self._num_workers = num_workers
+
+        self._executor = None
+
+        self._executor_lock = Lock()
+
+    def __call__(self, example: Any) -> Any:
+        future = self._get_executor().submit(_call_worker_fns, example)
+
+        return future.result()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            # We start the worker processes lazily on the first call. We use the
+            # 'spawn' method since the data pipeline is multi-threaded and it is
+            # not safe to fork it.
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self._num_workers,
+                    mp_context=torch.multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self._fns,),
+                )
+
+            return self._executor
+
+    def __del__(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+# The map functions of the current worker process.
+_worker_fns: Tuple[MapFunction, ...] = ()
+
+
+def _init_worker(fns: Tuple[MapFunction, ...]) -> None:
+    global _worker_fns
+
+    _worker_fns = fns
+
+
+def _call_worker_fns(example: Any) -> Any:
+    for fn in _worker_fns:
+        example = fn(example)
+
+    return example
+
+
+def _reduce_memory_block(block: MemoryBlock) -> Tuple[Any, Tuple[Any, ...]]:
+    # Copy the block into a shared memory tensor; the tensor itself is sent to
+    # the other process by reference through the torch reductions.
+    tensor = torch.empty((len(block),), dtype=torch.uint8).share_memory_()
+
+    tensor.numpy()[:] = np.frombuffer(block, dtype=np.uint8)
+
+    return _rebuild_memory_block, (tensor,)
+
+
+def _rebuild_memory_block(tensor: torch.Tensor) -> MemoryBlock:
+    # The memory block keeps a reference to the array, and therefore to the
+    # shared memory, for its lifetime.
+    return MemoryBlock(tensor.numpy(), copy=False)
+
+
+ForkingPickler.register(MemoryBlock, _reduce_memory_block)
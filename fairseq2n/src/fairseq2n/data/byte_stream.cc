@@ -10,6 +10,12 @@ namespace fairseq2n {
 
 byte_stream::~byte_stream() = default;
 
+bool
+byte_stream::seek(std::size_t)
+{
+    return false;
+}
+
 byte_stream_error::~byte_stream_error() = default;
 
 }
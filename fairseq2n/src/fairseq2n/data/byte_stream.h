@@ -6,6 +6,7 @@
 
 #pragma once
 
+#include <cstddef>
 #include <stdexcept>
 
 #include "fairseq2n/api.h"
@@ -31,6 +32,11 @@ public:
 
     virtual void
     reset() = 0;
+
+    // Moves the stream to `offset` bytes past its beginning. Returns `false` if
+    // the stream does not support random access.
+    virtual bool
+    seek(std::size_t offset);
 };
 
 class FAIRSEQ2_API byte_stream_error : public std::runtime_error {
@@ -37,4 +37,12 @@ count_data_source::reload_position(tape &t)
     counter_ = t.read<std::int64_t>();
 }
 
+std::size_t
+count_data_source::skip(std::size_t num_examples)
+{
+    counter_ += static_cast<std::int64_t>(num_examples);
+
+    return num_examples;
+}
+
 }
@@ -31,6 +31,9 @@ public:
     void
     reload_position(tape &t) override;
 
+    std::size_t
+    skip(std::size_t num_examples) override;
+
 private:
     std::int64_t start_;
     std::int64_t counter_;
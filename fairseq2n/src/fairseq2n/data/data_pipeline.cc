@@ -17,8 +17,12 @@
 #include "fairseq2n/data/concat_data_source.h"
 #include "fairseq2n/data/constant_data_source.h"
 #include "fairseq2n/data/count_data_source.h"
+#include "fairseq2n/data/detail/device_transferer.h"
+#include "fairseq2n/data/detail/example_cache.h"
 #include "fairseq2n/data/detail/file_system.h"
+#include "fairseq2n/data/dynamic_bucket_data_source.h"
 #include "fairseq2n/data/filter_data_source.h"
+#include "fairseq2n/data/indexed_shard_data_source.h"
 #include "fairseq2n/data/list_data_source.h"
 #include "fairseq2n/data/map_data_source.h"
 #include "fairseq2n/data/prefetch_data_source.h"
@@ -37,6 +41,32 @@
 using namespace fairseq2n::detail;
 
 namespace fairseq2n {
+namespace {
+
+// We use a named type instead of a lambda so that `cache()` can recognize and
+// amend the factory of a preceding `map()` call.
+struct map_data_source_factory {
+    std::unique_ptr<data_source>
+    operator()()
+    {
+        auto source = std::make_unique<map_data_source>(
+            inner(), std::move(fn), num_parallel_calls, streaming, preserve_order);
+
+        if (cache_factory)
+            source->set_cache(cache_factory());
+
+        return source;
+    }
+
+    data_source_factory inner;
+    map_fn fn;
+    std::size_t num_parallel_calls;
+    bool streaming;
+    bool preserve_order;
+    std::function<std::unique_ptr<example_cache>()> cache_factory{};
+};
+
+}  // namespace
 
 std::optional<data>
 data_pipeline::next()
@@ -104,6 +134,13 @@ data_pipeline::record_position(tape &t) const
 
         try {
             source_->record_position(t);
+        } catch (const data_pipeline_error &ex) {
+            // A recoverable error (e.g. a failed map call that has not been
+            // read yet) leaves the pipeline intact.
+            if (!ex.recoverable())
+                is_broken_ = true;
+
+            throw;
         } catch (const std::exception &) {
             is_broken_ = true;
 
@@ -356,27 +393,85 @@ data_pipeline_builder::bucket_by_length(
 }
 
 data_pipeline_builder
-data_pipeline_builder::filter(predicate_fn fn) &&
+data_pipeline_builder::cache(
+    std::string key_selector,
+    std::size_t capacity_bytes,
+    std::optional<std::string> maybe_spill_dir) &&
 {
-    factory_ = [fn = std::move(fn), inner = std::move(factory_)]() mutable
+    auto *map_factory = factory_.target<map_data_source_factory>();
+    if (map_factory == nullptr)
+        throw_<std::invalid_argument>("`cache` must directly follow a `map` operation.");
+
+    if (capacity_bytes == 0)
+        throw_<std::invalid_argument>("`capacity_bytes` must be greater than zero.");
+
+    map_factory->cache_factory = [
+        =,
+        key_selector = element_selector{std::move(key_selector)},
+        maybe_spill_dir = std::move(maybe_spill_dir)]
     {
-        return std::make_unique<filter_data_source>(inner(), std::move(fn));
+        return std::make_unique<example_cache>(key_selector, capacity_bytes, maybe_spill_dir);
     };
 
     return std::move(*this);
 }
 
 data_pipeline_builder
-data_pipeline_builder::map(map_fn fn, std::size_t num_parallel_calls) &&
+data_pipeline_builder::dynamic_bucket(
+    std::size_t max_num_tokens,
+    std::optional<std::size_t> maybe_max_num_examples,
+    std::size_t sort_pool_size,
+    data_length_fn fn,
+    bool drop_remainder) &&
 {
+    if (max_num_tokens == 0)
+        throw_<std::invalid_argument>("`max_num_tokens` must be greater than zero.");
+
+    if (maybe_max_num_examples && *maybe_max_num_examples == 0)
+        throw_<std::invalid_argument>("`max_num_examples` must be greater than zero.");
+
+    if (sort_pool_size == 0)
+        throw_<std::invalid_argument>("`sort_pool_size` must be greater than zero.");
+
     factory_ = [=, fn = std::move(fn), inner = std::move(factory_)]() mutable
     {
-        return std::make_unique<map_data_source>(inner(), std::move(fn), num_parallel_calls);
+        return std::make_unique<dynamic_bucket_data_source>(
+            inner(),
+            max_num_tokens,
+            maybe_max_num_examples,
+            sort_pool_size,
+            std::move(fn),
+            drop_remainder);
+    };
+
+    return std::move(*this);
+}
+
+data_pipeline_builder
+data_pipeline_builder::filter(predicate_fn fn) &&
+{
+    factory_ = [fn = std::move(fn), inner = std::move(factory_)]() mutable
+    {
+        return std::make_unique<filter_data_source>(inner(), std::move(fn));
     };
 
     return std::move(*this);
 }
 
+data_pipeline_builder
+data_pipeline_builder::map(
+    map_fn fn, std::size_t num_parallel_calls, bool streaming, bool preserve_order) &&
+{
+    if (!streaming && !preserve_order)
+        throw_<std::invalid_argument>(
+            "`preserve_order` can only be `false` when `streaming` is `true`.");
+
+    factory_ = map_data_source_factory{
+        std::move(factory_), std::move(fn), num_parallel_calls, streaming, preserve_order};
+
+    return std::move(*this);
+}
+
 data_pipeline_builder
 data_pipeline_builder::prefetch(std::size_t num_examples) &&
 {
@@ -440,6 +535,17 @@ data_pipeline_builder::take(std::size_t num_examples) &&
     return std::move(*this);
 }
 
+data_pipeline_builder
+data_pipeline_builder::to_device(at::Device device, std::size_t num_buffers) &&
+{
+    if (num_buffers == 0)
+        throw_<std::invalid_argument>("`num_buffers` must be greater than zero.");
+
+    // The transfer runs on the prefetch thread; therefore, the next batches
+    // are copied to the device while the consumer works on the current one.
+    return std::move(*this).map(device_transferer{device}).prefetch(num_buffers);
+}
+
 data_pipeline_builder
 data_pipeline_builder::yield_from(yield_fn fn) &&
 {
@@ -496,11 +602,25 @@ read_list(data_list list)
 }
 
 data_pipeline_builder
-read_zipped_records(std::string pathname)
+read_indexed_shard(std::string pathname, bool shuffle)
 {
-    auto factory = [pathname = std::move(pathname)]() mutable
+    auto factory = [pathname = std::move(pathname), shuffle]() mutable
+    {
+        return std::make_unique<indexed_shard_data_source>(std::move(pathname), shuffle);
+    };
+
+    return data_pipeline_builder{std::move(factory)};
+}
+
+data_pipeline_builder
+read_zipped_records(std::string pathname, std::size_t num_parallel_calls)
+{
+    if (num_parallel_calls == 0)
+        throw_<std::invalid_argument>("`num_parallel_calls` must be greater than zero.");
+
+    auto factory = [pathname = std::move(pathname), num_parallel_calls]() mutable
     {
-        return std::make_unique<zip_file_data_source>(std::move(pathname));
+        return std::make_unique<zip_file_data_source>(std::move(pathname), num_parallel_calls);
     };
 
     return data_pipeline_builder{std::move(factory)};
@@ -17,6 +17,8 @@
 #include <utility>
 #include <vector>
 
+#include <ATen/Device.h>
+
 #include "fairseq2n/api.h"
 #include "fairseq2n/data/data.h"
 #include "fairseq2n/data/data_source.h"
@@ -140,11 +142,29 @@ public:
         data_length_fn fn,
         bool drop_remainder = false) &&;
 
+    data_pipeline_builder
+    cache(
+        std::string key_selector,
+        std::size_t capacity_bytes,
+        std::optional<std::string> maybe_spill_dir = {}) &&;
+
+    data_pipeline_builder
+    dynamic_bucket(
+        std::size_t max_num_tokens,
+        std::optional<std::size_t> maybe_max_num_examples,
+        std::size_t sort_pool_size,
+        data_length_fn fn,
+        bool drop_remainder = false) &&;
+
     data_pipeline_builder
     filter(predicate_fn fn) &&;
 
     data_pipeline_builder
-    map(map_fn fn, std::size_t num_parallel_calls = 1) &&;
+    map(
+        map_fn fn,
+        std::size_t num_parallel_calls = 1,
+        bool streaming = false,
+        bool preserve_order = true) &&;
 
     data_pipeline_builder
     prefetch(std::size_t num_examples) &&;
@@ -161,6 +181,9 @@ public:
     data_pipeline_builder
     take(std::size_t num_examples) &&;
 
+    data_pipeline_builder
+    to_device(at::Device device, std::size_t num_buffers = 2) &&;
+
     data_pipeline_builder
     yield_from(yield_fn fn) &&;
 
@@ -218,6 +241,9 @@ FAIRSEQ2_API data_pipeline_builder
 read_list(data_list list);
 
 FAIRSEQ2_API data_pipeline_builder
-read_zipped_records(std::string pathname);
+read_indexed_shard(std::string pathname, bool shuffle = false);
+
+FAIRSEQ2_API data_pipeline_builder
+read_zipped_records(std::string pathname, std::size_t num_parallel_calls = 1);
 
 }  // namespace fairseq2n
@@ -10,4 +10,14 @@ namespace fairseq2n {
 
 data_source::~data_source() = default;
 
+std::size_t
+data_source::skip(std::size_t num_examples)
+{
+    for (std::size_t i = 0; i < num_examples; i++)
+        if (!next())
+            return i;
+
+    return num_examples;
+}
+
 }
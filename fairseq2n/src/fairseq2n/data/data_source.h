@@ -39,6 +39,14 @@ public:
 
     virtual void
     reload_position(tape &t) = 0;
+
+    // Skips the next `num_examples` examples and returns the number of skipped
+    // examples, which is less than `num_examples` only if the end of the data
+    // is reached. The default implementation reads and discards the examples;
+    // data sources that can move ahead without materializing them should
+    // override it.
+    virtual std::size_t
+    skip(std::size_t num_examples);
 };
 
 }  // namespace fairseq2n
@@ -0,0 +1,80 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/detail/device_transferer.h"
+
+#include <utility>
+
+#ifdef FAIRSEQ2N_USE_CUDA
+#include <c10/cuda/CUDAGuard.h>
+#include <c10/cuda/CUDAStream.h>
+#endif
+
+namespace fairseq2n::detail {
+
+data
+device_transferer::operator()(data &&d) const
+{
+#ifdef FAIRSEQ2N_USE_CUDA
+    if (device_.is_cuda()) {
+        c10::cuda::CUDAStream stream = c10::cuda::getStreamFromPool(
+            /*isHighPriority=*/false, device_.index());
+
+        {
+            c10::cuda::CUDAStreamGuard stream_guard{stream};
+
+            d = transfer(std::move(d));
+        }
+
+        stream.synchronize();
+
+        return std::move(d);
+    }
+#endif
+
+    return transfer(std::move(d));
+}
+
+data
+device_transferer::transfer(data &&d) const
+{
+    if (d.is_tensor())
+        return transfer_tensor(d.as_tensor());
+
+    if (d.is_list()) {
+        for (data &element : d.as_list())
+            element = transfer(std::move(element));
+    } else if (d.is_dict()) {
+        for (auto &[key, element] : d.as_dict())
+            element = transfer(std::move(element));
+    }
+
+    return std::move(d);
+}
+
+at::Tensor
+device_transferer::transfer_tensor(const at::Tensor &tensor) const
+{
+#ifdef FAIRSEQ2N_USE_CUDA
+    if (device_.is_cuda() && tensor.is_cpu()) {
+        // A copy from pageable memory is always synchronous.
+        at::Tensor pinned_tensor = tensor.is_pinned() ? tensor : tensor.pin_memory();
+
+        at::Tensor output = pinned_tensor.to(device_, /*non_blocking=*/true);
+
+        // The output is allocated on the side stream, but will be consumed on
+        // the default stream of the device; make sure that the caching
+        // allocator does not reuse its memory prematurely.
+        output.record_stream(c10::cuda::getDefaultCUDAStream(output.device().index()));
+
+        return output;
+    }
+#endif
+
+    return tensor.to(device_);
+}
+
+}  // namespace fairseq2n::detail
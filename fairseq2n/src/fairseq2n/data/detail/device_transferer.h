@@ -0,0 +1,41 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <ATen/Device.h>
+#include <ATen/Tensor.h>
+
+#include "fairseq2n/data/data.h"
+
+namespace fairseq2n::detail {
+
+// Moves all tensors of an example to a device. CPU tensors bound to a CUDA
+// device are pinned and copied asynchronously on a side stream; the call
+// returns once the copy is complete so that the caller can hand the example
+// to the consumer thread without any further synchronization.
+class device_transferer {
+public:
+    explicit
+    device_transferer(at::Device device) noexcept
+      : device_{device}
+    {}
+
+    data
+    operator()(data &&d) const;
+
+private:
+    data
+    transfer(data &&d) const;
+
+    at::Tensor
+    transfer_tensor(const at::Tensor &tensor) const;
+
+private:
+    at::Device device_;
+};
+
+}  // namespace fairseq2n::detail
@@ -0,0 +1,126 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/detail/example_cache.h"
+
+#include <stdexcept>
+#include <utility>
+
+#include <ATen/Tensor.h>
+
+#include "fairseq2n/data/detail/exception.h"
+#include "fairseq2n/detail/exception.h"
+
+namespace fairseq2n::detail {
+namespace {
+
+// Returns an estimate of the number of bytes held by `d`. Only the payloads
+// are accounted for precisely; containers are charged a fixed overhead.
+std::size_t
+compute_data_size(const data &d)
+{
+    std::size_t size = sizeof(data);
+
+    if (d.is_string())
+        size += d.as_string().size();
+    else if (d.is_tensor())
+        size += static_cast<std::size_t>(d.as_tensor().nbytes());
+    else if (d.is_memory_block())
+        size += d.as_memory_block().size();
+    else if (d.is_list()) {
+        for (const data &element : d.as_list())
+            size += compute_data_size(element);
+    } else if (d.is_dict()) {
+        for (const auto &[key, value] : d.as_dict())
+            size += key.size() + compute_data_size(value);
+    }
+
+    return size;
+}
+
+}  // namespace
+
+example_cache::example_cache(
+    element_selector key_selector,
+    std::size_t capacity_bytes,
+    const std::optional<std::string> &maybe_spill_dir)
+  : key_selector_{std::move(key_selector)},
+    entries_{capacity_bytes, compute_data_size,
+        [this](const immutable_string &key, data &&output)
+        {
+            // Outputs that cannot be serialized are simply dropped.
+            if (spill_file_)
+                spill_file_->write(key, output);
+        }}
+{
+    if (maybe_spill_dir)
+        spill_file_ = std::make_unique<spill_file>(*maybe_spill_dir);
+}
+
+immutable_string
+example_cache::make_key(const data &example) const
+{
+    std::string key{};
+
+    std::size_t num_elements = 0;
+
+    try {
+        key_selector_.visit(example, [&key, &num_elements](const data &element, element_path_ref path)
+        {
+            // Separate the elements of a composite key with a unit separator.
+            if (num_elements++ > 0)
+                key += '\x1f';
+
+            if (element.is_string())
+                key += element.as_string();
+            else if (element.is_int())
+                key += std::to_string(element.as_int());
+            else
+                throw_<std::invalid_argument>(
+                    "The element at '{}' in the input data must be of type `str` or `int` to be used as a cache key, but is of type `{}` instead.", path, element.type());
+        });
+    } catch (const std::invalid_argument &) {
+        throw_data_pipeline_error_with_nested(example, /*recoverable=*/true,
+            "The cache key of the input data cannot be determined.");
+    }
+
+    return key;
+}
+
+std::optional<data>
+example_cache::maybe_get(const immutable_string &key)
+{
+    {
+        std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+        if (data *maybe_output = entries_.maybe_get(key); maybe_output != nullptr)
+            return *maybe_output;
+    }
+
+    if (!spill_file_)
+        return std::nullopt;
+
+    std::optional<data> maybe_output = spill_file_->maybe_read(key);
+    if (maybe_output) {
+        std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+        // Promote the output back to memory; it won't be written again to disk
+        // once it gets evicted since the spill file already has it.
+        entries_.add(key, *maybe_output);
+    }
+
+    return maybe_output;
+}
+
+void
+example_cache::add(const immutable_string &key, const data &output)
+{
+    std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+    entries_.add(key, output);
+}
+
+}  // namespace fairseq2n::detail
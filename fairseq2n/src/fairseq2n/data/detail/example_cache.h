@@ -0,0 +1,50 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <cstddef>
+#include <memory>
+#include <mutex>
+#include <optional>
+#include <string>
+
+#include "fairseq2n/data/data.h"
+#include "fairseq2n/data/element_selector.h"
+#include "fairseq2n/data/immutable_string.h"
+#include "fairseq2n/data/detail/lru_cache.h"
+#include "fairseq2n/data/detail/spill_file.h"
+
+namespace fairseq2n::detail {
+
+// Memoizes the outputs of a map function by a key selected from its inputs.
+// The outputs are held in memory up to `capacity_bytes`; if a spill directory
+// is specified, evicted outputs are written to disk instead of being dropped.
+class example_cache {
+public:
+    explicit
+    example_cache(
+        element_selector key_selector,
+        std::size_t capacity_bytes,
+        const std::optional<std::string> &maybe_spill_dir = {});
+
+    immutable_string
+    make_key(const data &example) const;
+
+    std::optional<data>
+    maybe_get(const immutable_string &key);
+
+    void
+    add(const immutable_string &key, const data &output);
+
+private:
+    element_selector key_selector_;
+    lru_cache<data> entries_;
+    std::mutex entries_mutex_{};
+    std::unique_ptr<spill_file> spill_file_{};
+};
+
+}  // namespace fairseq2n::detail
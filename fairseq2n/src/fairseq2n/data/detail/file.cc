@@ -29,7 +29,7 @@ mmap_deallocate(const void *addr, std::size_t size, void *) noexcept
 }  // namespace
 
 memory_block
-memory_map_file(const file_desc &fd, std::string_view pathname)
+memory_map_file(const file_desc &fd, std::string_view pathname, bool copy_on_write)
 {
     struct ::stat buf{};
     if (::fstat(fd.get(), &buf) == -1)
@@ -40,7 +40,9 @@ memory_map_file(const file_desc &fd, std::string_view pathname)
     if (size == 0)
         return memory_block{};
 
-    void *addr = ::mmap(nullptr, size, PROT_READ, MAP_PRIVATE, fd.get(), 0);
+    int prot = copy_on_write ? PROT_READ | PROT_WRITE : PROT_READ;
+
+    void *addr = ::mmap(nullptr, size, prot, MAP_PRIVATE, fd.get(), 0);
     if (addr == MAP_FAILED)
         throw_system_error(last_error(),
             "'{}' cannot be memory mapped", pathname);
@@ -83,7 +83,9 @@ operator!=(const file_desc &lhs, const file_desc &rhs) noexcept
     return lhs.get() != rhs.get();
 }
 
+// If `copy_on_write` is true, the pages are mapped writable; writes stay private
+// to the process and never reach the file.
 memory_block
-memory_map_file(const file_desc &fd, std::string_view pathname);
+memory_map_file(const file_desc &fd, std::string_view pathname, bool copy_on_write = false);
 
 }
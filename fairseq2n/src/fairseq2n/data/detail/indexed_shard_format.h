@@ -0,0 +1,74 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <array>
+#include <cstddef>
+#include <cstdint>
+#include <string_view>
+
+#include <c10/core/ScalarType.h>
+
+// An indexed shard stores examples as dictionaries of tensors. All integer
+// fields are little-endian; tensor payloads are stored in native byte order.
+//
+//   header (64 bytes)
+//     char[8] magic
+//     u32     version
+//     u32     number of columns
+//     u64     number of examples
+//     u64     offset of the index
+//   payloads
+//     The tensors of each example, each aligned to 64 bytes.
+//   index
+//     For each column:
+//       u32      size of the name
+//       char[]   name
+//       u8       data type (`at::ScalarType`)
+//       u32      number of feature dimensions
+//       u64[]    feature dimensions
+//     For each column:
+//       (u64, u64)[number of examples]
+//         Offset of the payload and the size of its first dimension.
+namespace fairseq2n::detail {
+
+constexpr std::string_view indexed_shard_magic = "FS2SHARD";
+
+constexpr std::uint32_t indexed_shard_version = 1;
+
+constexpr std::size_t indexed_shard_header_size = 64;
+
+constexpr std::size_t indexed_shard_payload_alignment = 64;
+
+constexpr std::size_t indexed_shard_entry_size = 16;
+
+// The data types that the writer can emit; any other data type code in a shard
+// means that the shard is corrupt.
+constexpr std::array<c10::ScalarType, 10> indexed_shard_dtypes{
+    c10::ScalarType::Bool,
+    c10::ScalarType::Byte,
+    c10::ScalarType::Char,
+    c10::ScalarType::Short,
+    c10::ScalarType::Int,
+    c10::ScalarType::Long,
+    c10::ScalarType::Half,
+    c10::ScalarType::BFloat16,
+    c10::ScalarType::Float,
+    c10::ScalarType::Double,
+};
+
+constexpr bool
+is_indexed_shard_dtype(c10::ScalarType dtype) noexcept
+{
+    for (c10::ScalarType t : indexed_shard_dtypes)
+        if (t == dtype)
+            return true;
+
+    return false;
+}
+
+}  // namespace fairseq2n::detail
@@ -7,6 +7,7 @@
 #pragma once
 
 #include <cstddef>
+#include <functional>
 #include <list>
 #include <unordered_map>
 #include <utility>
@@ -17,16 +18,31 @@ namespace fairseq2n::detail {
 
 template <typename T>
 class lru_cache {
-    using entry_list = std::list<std::pair<immutable_string, T>>;
+    struct entry {
+        immutable_string key;
+        T value;
+        std::size_t size;
+    };
+
+    using entry_list = std::list<entry>;
+
+public:
+    using size_fn = std::function<std::size_t(const T &)>;
+
+    using eviction_fn = std::function<void(const immutable_string &, T &&)>;
 
 public:
+    // If `size_fn` is specified, `capacity` is the maximum total size of the
+    // cached values as measured by `size_fn`; otherwise, it is the maximum
+    // number of entries. If specified, `eviction_fn` is called with each entry
+    // that gets evicted or that is too large to be cached.
     explicit
-    lru_cache(std::size_t capacity) noexcept
-      : capacity_{capacity}
+    lru_cache(std::size_t capacity, size_fn sfn = nullptr, eviction_fn efn = nullptr)
+      : capacity_{capacity}, size_fn_{std::move(sfn)}, eviction_fn_{std::move(efn)}
     {}
 
     // Adds `key`/`value` pair to the cache, and evicts the least-recently-used
-    // entry if the cache is at its capacity.
+    // entries until the cache is within its capacity.
     void
     add(immutable_string key, T value);
 
@@ -41,6 +57,8 @@ public:
         map_.clear();
 
         entries_.clear();
+
+        total_size_ = 0;
     }
 
     std::size_t
@@ -49,8 +67,30 @@ public:
         return map_.size();
     }
 
+    std::size_t
+    total_size() const noexcept
+    {
+        return total_size_;
+    }
+
+private:
+    std::size_t
+    compute_size(const T &value) const
+    {
+        if (size_fn_)
+            return size_fn_(value);
+
+        return 1;
+    }
+
+    void
+    evict_until_fits(std::size_t size);
+
 private:
     std::size_t capacity_;
+    size_fn size_fn_;
+    eviction_fn eviction_fn_;
+    std::size_t total_size_ = 0;
     std::unordered_map<immutable_string, typename entry_list::iterator> map_{};
     entry_list entries_{};
 };
@@ -59,36 +99,35 @@ template <typename T>
 void
 lru_cache<T>::add(immutable_string key, T value)
 {
-    if (capacity_ == 0)
-        return;
+    std::size_t size = compute_size(value);
 
     // If the key is already in the cache, just update its value.
     if (auto pos = map_.find(key); pos != map_.end()) {
-        auto &entry_node = pos->second;
+        auto entry_node = pos->second;
 
-        // Move the entry to the front of the list to mark as the most-
-        // recently-used one.
-        entries_.splice(entries_.begin(), entries_, entry_node);
+        map_.erase(pos);
 
-        entry_node->second = std::move(value);
+        total_size_ -= entry_node->size;
 
-        return;
+        entries_.erase(entry_node);
     }
 
-    // Otherwise, ensure that we do not exceed our capacity.
-    if (map_.size() == capacity_) {
-        // The back of the list holds the least-recently-used entry. Let's
-        // remove it to make space for the new entry.
-        immutable_string &least_recent_key = entries_.back().first;
+    // A value that can never fit is handed directly to the eviction function.
+    if (size > capacity_) {
+        if (eviction_fn_)
+            eviction_fn_(key, std::move(value));
 
-        map_.erase(least_recent_key);
-
-        entries_.pop_back();
+        return;
     }
 
+    // Otherwise, ensure that we do not exceed our capacity.
+    evict_until_fits(size);
+
     // Put the entry to the front of the list so that it becomes the most-
     // recently-used one.
-    entries_.emplace_front(key, std::move(value));
+    entries_.push_front(entry{key, std::move(value), size});
+
+    total_size_ += size;
 
     // And, associate the key and the entry in the map.
     map_[std::move(key)] = entries_.begin();
@@ -105,10 +144,30 @@ lru_cache<T>::maybe_get(const immutable_string &key)
         // recently-used one.
         entries_.splice(entries_.begin(), entries_, entry_node);
 
-        return &entry_node->second;
+        return &entry_node->value;
     }
 
     return nullptr;
 }
 
+template <typename T>
+void
+lru_cache<T>::evict_until_fits(std::size_t size)
+{
+    while (!entries_.empty() && total_size_ + size > capacity_) {
+        // The back of the list holds the least-recently-used entry. Let's
+        // remove it to make space for the new entry.
+        entry &least_recent = entries_.back();
+
+        map_.erase(least_recent.key);
+
+        total_size_ -= least_recent.size;
+
+        if (eviction_fn_)
+            eviction_fn_(least_recent.key, std::move(least_recent.value));
+
+        entries_.pop_back();
+    }
+}
+
 }  // namespace fairseq2n::detail
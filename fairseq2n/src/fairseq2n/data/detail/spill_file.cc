@@ -0,0 +1,404 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/detail/spill_file.h"
+
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <stdexcept>
+#include <system_error>
+#include <utility>
+#include <vector>
+
+#include <fcntl.h>
+#include <unistd.h>
+
+#include <ATen/Functions.h>
+#include <ATen/Tensor.h>
+
+#include "fairseq2n/memory.h"
+#include "fairseq2n/data/detail/tensor_helpers.h"
+#include "fairseq2n/detail/error.h"
+#include "fairseq2n/detail/exception.h"
+
+namespace fairseq2n::detail {
+namespace {
+
+// The layout of a serialized data value is a two byte type tag (the underlying
+// `std::int16_t` of `data_type`) followed by its payload in native byte order;
+// the scalar type of a tensor is written the same way. The spill file never
+// outlives the process.
+class data_writer {
+public:
+    bool
+    write(const data &d);
+
+    std::vector<std::byte> &
+    buffer() noexcept
+    {
+        return buffer_;
+    }
+
+private:
+    bool
+    write_tensor(const at::Tensor &tensor);
+
+    template <typename T>
+    void
+    write_value(T value)
+    {
+        write_bytes(&value, sizeof(T));
+    }
+
+    void
+    write_bytes(const void *ptr, std::size_t size)
+    {
+        const auto *bytes = static_cast<const std::byte *>(ptr);
+
+        buffer_.insert(buffer_.end(), bytes, bytes + size);
+    }
+
+private:
+    std::vector<std::byte> buffer_{};
+};
+
+bool
+data_writer::write(const data &d)
+{
+    write_value(static_cast<std::int16_t>(d.type()));
+
+    switch (d.type()) {
+    case data_type::bool_:
+        write_value(static_cast<std::uint8_t>(d.as_bool()));
+        break;
+
+    case data_type::int_:
+        write_value(d.as_int());
+        break;
+
+    case data_type::float_:
+        write_value(d.as_float());
+        break;
+
+    case data_type::string: {
+        std::string_view s = d.as_string();
+
+        write_value(s.size());
+        write_bytes(s.data(), s.size());
+
+        break;
+    }
+
+    case data_type::tensor:
+        return write_tensor(d.as_tensor());
+
+    case data_type::memory_block: {
+        const memory_block &block = d.as_memory_block();
+
+        write_value(block.size());
+        write_bytes(block.data(), block.size());
+
+        break;
+    }
+
+    case data_type::list: {
+        const data_list &list = d.as_list();
+
+        write_value(list.size());
+
+        for (const data &element : list)
+            if (!write(element))
+                return false;
+
+        break;
+    }
+
+    case data_type::dict: {
+        const data_dict &dict = d.as_dict();
+
+        write_value(dict.size());
+
+        for (const auto &[key, value] : dict) {
+            write_value(key.size());
+            write_bytes(key.data(), key.size());
+
+            if (!write(value))
+                return false;
+        }
+
+        break;
+    }
+
+    case data_type::pyobj:
+        return false;
+    }
+
+    return true;
+}
+
+bool
+data_writer::write_tensor(const at::Tensor &tensor)
+{
+    if (!tensor.device().is_cpu())
+        return false;
+
+    at::Tensor t = tensor.contiguous();
+
+    write_value(static_cast<std::int16_t>(t.scalar_type()));
+
+    write_value(static_cast<std::size_t>(t.dim()));
+
+    for (std::int64_t size : t.sizes())
+        write_value(size);
+
+    auto nbytes = static_cast<std::size_t>(t.nbytes());
+
+    write_value(nbytes);
+    write_bytes(t.data_ptr(), nbytes);
+
+    return true;
+}
+
+class data_reader {
+public:
+    explicit
+    data_reader(memory_block block) noexcept
+      : block_{std::move(block)}
+    {}
+
+    data
+    read();
+
+private:
+    at::Tensor
+    read_tensor();
+
+    template <typename T>
+    T
+    read_value()
+    {
+        T value{};
+
+        std::memcpy(&value, read_bytes(sizeof(T)).data(), sizeof(T));
+
+        return value;
+    }
+
+    memory_block
+    read_bytes(std::size_t size)
+    {
+        if (size > block_.size() - offset_)
+            throw_<std::runtime_error>("The spill file is corrupt.");
+
+        memory_block bytes = block_.share_slice(offset_, size);
+
+        offset_ += size;
+
+        return bytes;
+    }
+
+private:
+    memory_block block_;
+    std::size_t offset_ = 0;
+};
+
+data
+data_reader::read()
+{
+    auto type = static_cast<data_type>(read_value<std::int16_t>());
+
+    switch (type) {
+    case data_type::bool_:
+        return read_value<std::uint8_t>() != 0;
+
+    case data_type::int_:
+        return read_value<std::int64_t>();
+
+    case data_type::float_:
+        return read_value<float64>();
+
+    case data_type::string:
+        // The string shares the memory of the read buffer; no copy is needed.
+        return immutable_string{read_bytes(read_value<std::size_t>())};
+
+    case data_type::tensor:
+        return read_tensor();
+
+    case data_type::memory_block:
+        return read_bytes(read_value<std::size_t>());
+
+    case data_type::list: {
+        auto size = read_value<std::size_t>();
+
+        data_list list{};
+
+        list.reserve(size);
+
+        for (std::size_t i = 0; i < size; ++i)
+            list.push_back(read());
+
+        return list;
+    }
+
+    case data_type::dict: {
+        auto size = read_value<std::size_t>();
+
+        data_dict dict{};
+
+        for (std::size_t i = 0; i < size; ++i) {
+            memory_block key = read_bytes(read_value<std::size_t>());
+
+            dict.emplace(std::string{key.cast<const char>().data(), key.size()}, read());
+        }
+
+        return dict;
+    }
+
+    case data_type::pyobj:
+        break;
+    }
+
+    throw_<std::runtime_error>("The spill file is corrupt.");
+}
+
+at::Tensor
+data_reader::read_tensor()
+{
+    auto scalar_type = static_cast<at::ScalarType>(read_value<std::int16_t>());
+
+    auto dim = read_value<std::size_t>();
+
+    std::vector<std::int64_t> sizes(dim);
+
+    for (std::int64_t &size : sizes)
+        size = read_value<std::int64_t>();
+
+    at::Tensor tensor = at::empty(sizes, at::dtype(scalar_type).device(at::kCPU));
+
+    memory_block bytes = read_bytes(read_value<std::size_t>());
+
+    if (bytes.size() != static_cast<std::size_t>(tensor.nbytes()))
+        throw_<std::runtime_error>("The spill file is corrupt.");
+
+    std::memcpy(tensor.data_ptr(), bytes.data(), bytes.size());
+
+    return tensor;
+}
+
+}  // namespace
+
+spill_file::spill_file(const std::string &dirname)
+  : pathname_{dirname + "/fairseq2-cache-XXXXXX"}
+{
+    fd_ = ::mkostemp(pathname_.data(), O_CLOEXEC);
+    if (fd_ == invalid_fd)
+        throw_system_error(last_error(),
+            "A spill file cannot be created under '{}'", dirname);
+
+    // We never reopen the file by name; unlinking it right away ensures that
+    // it gets cleaned up even if the process crashes.
+    ::unlink(pathname_.c_str());
+}
+
+bool
+spill_file::write(const immutable_string &key, const data &d)
+{
+    if (contains(key))
+        return true;
+
+    data_writer writer{};
+    if (!writer.write(d))
+        return false;
+
+    std::vector<std::byte> &buffer = writer.buffer();
+
+    std::size_t offset{};
+
+    {
+        std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+        // Reserve the region so that concurrent writes do not overlap.
+        offset = std::exchange(file_size_, file_size_ + buffer.size());
+    }
+
+    for (std::size_t num_bytes_written = 0; num_bytes_written < buffer.size();) {
+        ssize_t result = ::pwrite(
+            fd_.get(),
+            buffer.data() + num_bytes_written,
+            buffer.size() - num_bytes_written,
+            static_cast<off_t>(offset + num_bytes_written));
+        if (result == -1) {
+            std::error_code err = last_error();
+            if (err == std::errc::interrupted)
+                continue;
+
+            throw_system_error(err,
+                "The spill file under '{}' cannot be written", pathname_);
+        }
+
+        num_bytes_written += static_cast<std::size_t>(result);
+    }
+
+    std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+    entries_.emplace(key, spill_entry{offset, buffer.size()});
+
+    return true;
+}
+
+std::optional<data>
+spill_file::maybe_read(const immutable_string &key) const
+{
+    spill_entry entry{};
+
+    {
+        std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+        auto pos = entries_.find(key);
+        if (pos == entries_.end())
+            return std::nullopt;
+
+        entry = pos->second;
+    }
+
+    writable_memory_block block = allocate_memory(entry.size);
+
+    for (std::size_t num_bytes_read = 0; num_bytes_read < entry.size;) {
+        ssize_t result = ::pread(
+            fd_.get(),
+            block.data() + num_bytes_read,
+            entry.size - num_bytes_read,
+            static_cast<off_t>(entry.offset + num_bytes_read));
+        if (result == -1) {
+            std::error_code err = last_error();
+            if (err == std::errc::interrupted)
+                continue;
+
+            throw_system_error(err,
+                "The spill file under '{}' cannot be read", pathname_);
+        }
+
+        if (result == 0)
+            throw_<std::runtime_error>("The spill file under '{}' is truncated.", pathname_);
+
+        num_bytes_read += static_cast<std::size_t>(result);
+    }
+
+    data_reader reader{std::move(block)};
+
+    return reader.read();
+}
+
+bool
+spill_file::contains(const immutable_string &key) const
+{
+    std::lock_guard<std::mutex> entries_lock{entries_mutex_};
+
+    return entries_.find(key) != entries_.end();
+}
+
+}  // namespace fairseq2n::detail
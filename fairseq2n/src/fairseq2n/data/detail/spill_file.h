@@ -0,0 +1,54 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <cstddef>
+#include <mutex>
+#include <optional>
+#include <string>
+#include <unordered_map>
+
+#include "fairseq2n/data/data.h"
+#include "fairseq2n/data/immutable_string.h"
+#include "fairseq2n/data/detail/file.h"
+
+namespace fairseq2n::detail {
+
+// Stores data values keyed by string in an anonymous, append-only file. The
+// file is unlinked right after its creation, so it gets removed by the OS once
+// the instance is destructed.
+class spill_file {
+    struct spill_entry {
+        std::size_t offset;
+        std::size_t size;
+    };
+
+public:
+    explicit
+    spill_file(const std::string &dirname);
+
+    // Writes `d` to the file under `key` unless the key already exists. Returns
+    // `false` if `d` cannot be serialized (e.g. it holds a Python object or a
+    // non-CPU tensor).
+    bool
+    write(const immutable_string &key, const data &d);
+
+    std::optional<data>
+    maybe_read(const immutable_string &key) const;
+
+    bool
+    contains(const immutable_string &key) const;
+
+private:
+    file_desc fd_{};
+    std::string pathname_;
+    std::size_t file_size_ = 0;
+    std::unordered_map<immutable_string, spill_entry> entries_{};
+    mutable std::mutex entries_mutex_{};
+};
+
+}  // namespace fairseq2n::detail
@@ -0,0 +1,76 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/detail/thread_pool.h"
+
+#include <utility>
+
+#include "fairseq2n/data/detail/thread.h"
+
+namespace fairseq2n::detail {
+
+thread_pool::thread_pool(std::size_t num_threads)
+{
+    threads_.reserve(num_threads);
+
+    for (std::size_t i = 0; i < num_threads; ++i)
+        threads_.push_back(start_thread(&thread_pool::run, this));
+}
+
+thread_pool::~thread_pool()
+{
+    {
+        std::unique_lock<std::mutex> queue_lock{queue_mutex_};
+
+        should_stop_ = true;
+    }
+
+    queue_condition_.notify_all();
+
+    for (std::thread &t : threads_)
+        t.join();
+}
+
+void
+thread_pool::enqueue(std::function<void()> &&task)
+{
+    {
+        std::unique_lock<std::mutex> queue_lock{queue_mutex_};
+
+        queue_.push_back(std::move(task));
+    }
+
+    queue_condition_.notify_one();
+}
+
+void
+thread_pool::run() noexcept
+{
+    while (true) {
+        std::function<void()> task{};
+
+        {
+            std::unique_lock<std::mutex> queue_lock{queue_mutex_};
+
+            queue_condition_.wait(queue_lock, [this]
+            {
+                return should_stop_ || !queue_.empty();
+            });
+
+            // Drain the queue before stopping.
+            if (queue_.empty())
+                return;
+
+            task = std::move(queue_.front());
+
+            queue_.pop_front();
+        }
+
+        task();
+    }
+}
+
+}  // namespace fairseq2n::detail
@@ -0,0 +1,56 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <condition_variable>
+#include <cstddef>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+namespace fairseq2n::detail {
+
+// Runs enqueued tasks on a fixed set of persistent worker threads. Tasks are
+// expected to handle their own errors; they must not throw.
+class thread_pool {
+public:
+    explicit
+    thread_pool(std::size_t num_threads);
+
+    thread_pool(const thread_pool &) = delete;
+    thread_pool &operator=(const thread_pool &) = delete;
+
+    thread_pool(thread_pool &&) = delete;
+    thread_pool &operator=(thread_pool &&) = delete;
+
+    // Finishes all enqueued tasks and then stops the worker threads.
+   ~thread_pool();
+
+    void
+    enqueue(std::function<void()> &&task);
+
+    std::size_t
+    num_threads() const noexcept
+    {
+        return threads_.size();
+    }
+
+private:
+    void
+    run() noexcept;
+
+private:
+    std::vector<std::thread> threads_{};
+    std::mutex queue_mutex_{};
+    std::condition_variable queue_condition_{};
+    std::deque<std::function<void()>> queue_{};
+    bool should_stop_ = false;
+};
+
+}  // namespace fairseq2n::detail
@@ -0,0 +1,211 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/dynamic_bucket_data_source.h"
+
+#include <algorithm>
+#include <exception>
+#include <numeric>
+#include <stdexcept>
+
+#include "fairseq2n/data/detail/exception.h"
+#include "fairseq2n/detail/exception.h"
+
+namespace fairseq2n::detail {
+
+dynamic_bucket_data_source::dynamic_bucket_data_source(
+    std::unique_ptr<data_source> &&inner,
+    std::size_t max_num_tokens,
+    std::optional<std::size_t> maybe_max_num_examples,
+    std::size_t sort_pool_size,
+    data_length_fn &&fn,
+    bool drop_remainder)
+  : inner_{std::move(inner)},
+    max_num_tokens_{max_num_tokens},
+    maybe_max_num_examples_{maybe_max_num_examples},
+    sort_pool_size_{sort_pool_size},
+    data_length_fn_{std::move(fn)},
+    drop_remainder_{drop_remainder}
+{}
+
+std::optional<data>
+dynamic_bucket_data_source::next()
+{
+    while (true) {
+        std::size_t bucket_size = find_bucket_size();
+
+        // If the next example in the pool does not fit, the bucket is full.
+        if (bucket_size < pool_.size())
+            return pop_bucket(bucket_size);
+
+        if (is_eod_)
+            break;
+
+        // The pool fits entirely in a single bucket; read more examples before
+        // returning a partially filled bucket. The leftover examples are sorted
+        // together with the new ones.
+        fill_pool();
+    }
+
+    if (pool_.empty())
+        return std::nullopt;
+
+    if (is_eod_ && drop_remainder_) {
+        pool_.clear();
+
+        pool_data_lens_.clear();
+
+        return std::nullopt;
+    }
+
+    return pop_bucket(pool_.size());
+}
+
+void
+dynamic_bucket_data_source::reset()
+{
+    pool_.clear();
+
+    pool_data_lens_.clear();
+
+    is_eod_ = false;
+
+    inner_->reset();
+}
+
+void
+dynamic_bucket_data_source::record_position(tape &t) const
+{
+    t.record(pool_);
+
+    t.record(pool_data_lens_);
+
+    t.record(is_eod_);
+
+    inner_->record_position(t);
+}
+
+void
+dynamic_bucket_data_source::reload_position(tape &t)
+{
+    pool_ = t.read<data_list>();
+
+    pool_data_lens_ = t.read<std::vector<std::size_t>>();
+
+    is_eod_ = t.read<bool>();
+
+    if (pool_.size() != pool_data_lens_.size())
+        throw_<corrupt_tape_error>(
+            "The tape is corrupt. The state of the data pipeline cannot be restored.");
+
+    inner_->reload_position(t);
+}
+
+void
+dynamic_bucket_data_source::fill_pool()
+{
+    try {
+        for (std::size_t i = 0; i < sort_pool_size_; i++) {
+            std::optional<data> maybe_example = inner_->next();
+            if (!maybe_example) {
+                is_eod_ = true;
+
+                break;
+            }
+
+            std::size_t data_len{};
+            try {
+                data_len = data_length_fn_(*maybe_example);
+            } catch (const std::invalid_argument &) {
+                throw_data_pipeline_error_with_nested(std::move(maybe_example), /*recoverable=*/true,
+                    "The length of the input data cannot be determined.");
+            }
+
+            if (data_len > max_num_tokens_)
+                throw_data_pipeline_error(std::move(maybe_example), /*recoverable=*/true,
+                    "The length of the input data must be less than or equal to the maximum number of tokens ({}), but is {} instead.", max_num_tokens_, data_len);
+
+            pool_.push_back(*std::move(maybe_example));
+
+            pool_data_lens_.push_back(data_len);
+        }
+    } catch (const std::exception &) {
+        // The pipeline can continue after a recoverable error; make sure that
+        // the pool stays sorted.
+        sort_pool();
+
+        throw;
+    }
+
+    sort_pool();
+}
+
+void
+dynamic_bucket_data_source::sort_pool()
+{
+    std::vector<std::size_t> indices(pool_.size());
+
+    std::iota(indices.begin(), indices.end(), 0);
+
+    // Use a stable sort so that examples of the same length keep their order.
+    std::stable_sort(indices.begin(), indices.end(), [this](std::size_t lhs, std::size_t rhs)
+    {
+        return pool_data_lens_[lhs] < pool_data_lens_[rhs];
+    });
+
+    data_list pool{};
+    pool.reserve(pool_.size());
+
+    std::vector<std::size_t> pool_data_lens{};
+    pool_data_lens.reserve(pool_.size());
+
+    for (std::size_t idx : indices) {
+        pool.push_back(std::move(pool_[idx]));
+
+        pool_data_lens.push_back(pool_data_lens_[idx]);
+    }
+
+    pool_ = std::move(pool);
+
+    pool_data_lens_ = std::move(pool_data_lens);
+}
+
+std::size_t
+dynamic_bucket_data_source::find_bucket_size() const noexcept
+{
+    std::size_t bucket_size = 0;
+
+    for (; bucket_size < pool_.size(); ++bucket_size) {
+        if (maybe_max_num_examples_ && bucket_size == *maybe_max_num_examples_)
+            break;
+
+        // Since the pool is sorted, the length of the current example is the
+        // maximum length in the bucket.
+        std::size_t max_data_len = pool_data_lens_[bucket_size];
+
+        if ((bucket_size + 1) * max_data_len > max_num_tokens_)
+            break;
+    }
+
+    return bucket_size;
+}
+
+data
+dynamic_bucket_data_source::pop_bucket(std::size_t bucket_size)
+{
+    auto pool_end = pool_.begin() + static_cast<std::ptrdiff_t>(bucket_size);
+
+    data_list bucket(std::make_move_iterator(pool_.begin()), std::make_move_iterator(pool_end));
+
+    pool_.erase(pool_.begin(), pool_end);
+
+    pool_data_lens_.erase(
+        pool_data_lens_.begin(), pool_data_lens_.begin() + static_cast<std::ptrdiff_t>(bucket_size));
+
+    return bucket;
+}
+
+}  // namespace fairseq2n::detail
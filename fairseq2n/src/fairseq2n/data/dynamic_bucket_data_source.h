@@ -0,0 +1,68 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <cstddef>
+#include <optional>
+#include <memory>
+#include <utility>
+#include <vector>
+
+#include "fairseq2n/data/data_pipeline.h"
+#include "fairseq2n/data/data_source.h"
+
+namespace fairseq2n::detail {
+
+class dynamic_bucket_data_source final : public data_source {
+public:
+    explicit
+    dynamic_bucket_data_source(
+        std::unique_ptr<data_source> &&inner,
+        std::size_t max_num_tokens,
+        std::optional<std::size_t> maybe_max_num_examples,
+        std::size_t sort_pool_size,
+        data_length_fn &&fn,
+        bool drop_remainder);
+
+    std::optional<data>
+    next() override;
+
+    void
+    reset() override;
+
+    void
+    record_position(tape &t) const override;
+
+    void
+    reload_position(tape &t) override;
+
+private:
+    void
+    fill_pool();
+
+    void
+    sort_pool();
+
+    std::size_t
+    find_bucket_size() const noexcept;
+
+    data
+    pop_bucket(std::size_t bucket_size);
+
+private:
+    std::unique_ptr<data_source> inner_;
+    std::size_t max_num_tokens_;
+    std::optional<std::size_t> maybe_max_num_examples_;
+    std::size_t sort_pool_size_;
+    data_length_fn data_length_fn_;
+    bool drop_remainder_;
+    data_list pool_{};
+    std::vector<std::size_t> pool_data_lens_{};
+    bool is_eod_ = false;
+};
+
+}  // namespace fairseq2n::detail
@@ -91,11 +91,11 @@ open_file(const std::string &pathname, const file_options &opts)
 }
 
 memory_block
-memory_map_file(const std::string &pathname, bool hint_sequential)
+memory_map_file(const std::string &pathname, bool hint_sequential, bool copy_on_write)
 {
     file_desc fd = do_open_file(pathname);
 
-    memory_block block = memory_map_file(fd, pathname);
+    memory_block block = memory_map_file(fd, pathname, copy_on_write);
 
     if (hint_sequential)
         hint_sequential_memory(block, pathname);
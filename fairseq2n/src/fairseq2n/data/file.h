@@ -99,6 +99,7 @@ FAIRSEQ2_API std::unique_ptr<byte_stream>
 open_file(const std::string &pathname, const file_options &opts = {});
 
 FAIRSEQ2_API memory_block
-memory_map_file(const std::string &pathname, bool hint_sequential = false);
+memory_map_file(
+    const std::string &pathname, bool hint_sequential = false, bool copy_on_write = false);
 
 }  // namespace fairseq2n
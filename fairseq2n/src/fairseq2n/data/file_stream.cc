@@ -78,6 +78,25 @@ file_stream::reset()
     is_eod_ = false;
 }
 
+bool
+file_stream::seek(std::size_t offset)
+{
+    ::off_t result = ::lseek(fd_.get(), static_cast<::off_t>(offset), SEEK_SET);
+    if (result == -1) {
+        std::error_code err = last_error();
+
+        if (err == std::errc::invalid_seek)
+            return false;
+
+        throw_system_error(err,
+            "'{}' cannot be repositioned", pathname_);
+    }
+
+    is_eod_ = false;
+
+    return true;
+}
+
 std::size_t
 file_stream::fill_chunk(writable_memory_span chunk)
 {
@@ -31,6 +31,9 @@ public:
     void
     reset() override;
 
+    bool
+    seek(std::size_t offset) override;
+
 private:
     std::size_t
     fill_chunk(writable_memory_span chunk);
@@ -0,0 +1,361 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/indexed_shard_data_source.h"
+
+#include <algorithm>
+#include <exception>
+#include <limits>
+#include <mutex>
+#include <numeric>
+#include <string_view>
+#include <system_error>
+#include <utility>
+
+#include <ATen/CPUGeneratorImpl.h>
+#include <ATen/Context.h>
+#include <ATen/Functions.h>
+
+#include "fairseq2n/data/byte_stream.h"
+#include "fairseq2n/data/data_pipeline.h"
+#include "fairseq2n/data/file.h"
+#include "fairseq2n/data/detail/indexed_shard_format.h"
+#include "fairseq2n/detail/exception.h"
+#include "fairseq2n/utils/cast.h"
+
+namespace fairseq2n::detail {
+namespace {
+
+// Reads the little-endian fields of an indexed shard.
+class shard_field_reader {
+public:
+    explicit
+    shard_field_reader(memory_span bytes) noexcept
+      : bytes_{bytes}
+    {}
+
+    std::uint8_t
+    read_u8(std::size_t offset) const
+    {
+        return static_cast<std::uint8_t>(read(offset, 1));
+    }
+
+    std::uint32_t
+    read_u32(std::size_t offset) const
+    {
+        return static_cast<std::uint32_t>(read(offset, 4));
+    }
+
+    std::uint64_t
+    read_u64(std::size_t offset) const
+    {
+        return read(offset, 8);
+    }
+
+    std::string_view
+    read_string(std::size_t offset, std::size_t size) const
+    {
+        check_bounds(offset, size);
+
+        return std::string_view{reinterpret_cast<const char *>(bytes_.data() + offset), size};
+    }
+
+    void
+    check_bounds(std::size_t offset, std::size_t num_bytes) const
+    {
+        if (offset > bytes_.size() || bytes_.size() - offset < num_bytes)
+            throw_<byte_stream_error>(
+                "The indexed shard is truncated; a field at offset {} is out of bounds.", offset);
+    }
+
+    std::size_t
+    size() const noexcept
+    {
+        return bytes_.size();
+    }
+
+    // Sizes are computed from untrusted fields; they must not wrap around
+    // before `check_bounds()` sees them.
+    static std::size_t
+    checked_mul(std::size_t a, std::size_t b)
+    {
+        std::size_t result = 0;
+
+        if (__builtin_mul_overflow(a, b, &result))
+            throw_<byte_stream_error>(
+                "The indexed shard is corrupt; a size computed from its fields is too large.");
+
+        return result;
+    }
+
+private:
+    std::uint64_t
+    read(std::size_t offset, std::size_t num_bytes) const
+    {
+        check_bounds(offset, num_bytes);
+
+        std::uint64_t value = 0;
+
+        for (std::size_t i = num_bytes; i > 0; --i)
+            value = (value << 8) | static_cast<std::uint64_t>(bytes_[offset + i - 1]);
+
+        return value;
+    }
+
+private:
+    memory_span bytes_;
+};
+
+}  // namespace
+
+indexed_shard_data_source::indexed_shard_data_source(std::string &&pathname, bool shuffle)
+  : pathname_{std::move(pathname)}, shuffle_{shuffle}
+{
+    try {
+        // Examples are returned as tensors that refer directly to the mapping.
+        // Map the shard copy-on-write so that in-place operations on them
+        // modify private pages instead of faulting on read-only memory; the
+        // file itself is never written.
+        shard_ = memory_map_file(pathname_, /*hint_sequential=*/false, /*copy_on_write=*/true);
+
+        load_index();
+    } catch (const std::exception &) {
+        handle_error();
+    }
+
+    generator_ = at::globalContext().defaultGenerator(at::kCPU);
+
+    if (shuffle_)
+        shuffle_order();
+}
+
+std::optional<data>
+indexed_shard_data_source::next()
+{
+    if (num_examples_read_ >= num_examples_)
+        return std::nullopt;
+
+    std::size_t idx = shuffle_ ? order_[num_examples_read_] : num_examples_read_;
+
+    data example{};
+
+    try {
+        example = read_example(idx);
+    } catch (const std::exception &) {
+        handle_error();
+    }
+
+    num_examples_read_++;
+
+    return example;
+}
+
+void
+indexed_shard_data_source::reset()
+{
+    num_examples_read_ = 0;
+
+    // Each epoch visits the examples in a new order.
+    if (shuffle_)
+        shuffle_order();
+}
+
+void
+indexed_shard_data_source::record_position(tape &t) const
+{
+    t.record(num_examples_read_);
+
+    t.record(order_);
+}
+
+void
+indexed_shard_data_source::reload_position(tape &t)
+{
+    auto num_examples_read = t.read<std::size_t>();
+
+    std::vector<std::size_t> order = t.read<std::vector<std::size_t>>();
+
+    if (num_examples_read > num_examples_ || order.size() != order_.size())
+        throw_<corrupt_tape_error>(
+            "The tape is corrupt. The state of the data pipeline cannot be restored.");
+
+    num_examples_read_ = num_examples_read;
+
+    order_ = std::move(order);
+}
+
+std::size_t
+indexed_shard_data_source::skip(std::size_t num_examples)
+{
+    // The index gives us random access to every example; skipping is free.
+    num_examples = std::min(num_examples, num_examples_ - num_examples_read_);
+
+    num_examples_read_ += num_examples;
+
+    return num_examples;
+}
+
+void
+indexed_shard_data_source::load_index()
+{
+    shard_field_reader reader{memory_span{shard_.data(), shard_.size()}};
+
+    if (reader.size() < indexed_shard_header_size ||
+        reader.read_string(0, indexed_shard_magic.size()) != indexed_shard_magic)
+        throw_<byte_stream_error>("The file is not an indexed shard.");
+
+    std::uint32_t version = reader.read_u32(8);
+    if (version != indexed_shard_version)
+        throw_<byte_stream_error>(
+            "The version of the indexed shard must be {}, but is {} instead.", indexed_shard_version, version);
+
+    std::uint32_t num_columns = reader.read_u32(12);
+
+    num_examples_ = conditional_cast<std::size_t>(reader.read_u64(16));
+
+    auto offset = conditional_cast<std::size_t>(reader.read_u64(24));
+
+    columns_.reserve(num_columns);
+
+    for (std::uint32_t i = 0; i < num_columns; ++i) {
+        std::uint32_t name_size = reader.read_u32(offset);
+
+        std::string_view name = reader.read_string(offset + 4, name_size);
+
+        offset += 4 + name_size;
+
+        std::uint8_t dtype_code = reader.read_u8(offset);
+
+        auto dtype = static_cast<at::ScalarType>(dtype_code);
+
+        if (!is_indexed_shard_dtype(dtype))
+            throw_<byte_stream_error>(
+                "The indexed shard is corrupt; the column '{}' has an unknown data type code {}.", name, dtype_code);
+
+        std::uint32_t num_feature_dims = reader.read_u32(offset + 1);
+
+        offset += 5;
+
+        std::vector<std::int64_t> feature_dims(num_feature_dims);
+
+        std::size_t row_size = at::elementSize(dtype);
+
+        for (std::int64_t &dim : feature_dims) {
+            std::uint64_t raw_dim = reader.read_u64(offset);
+
+            if (raw_dim > static_cast<std::uint64_t>(std::numeric_limits<std::int64_t>::max()))
+                throw_<byte_stream_error>(
+                    "The indexed shard is corrupt; the column '{}' has an invalid feature dimension {}.", name, raw_dim);
+
+            dim = static_cast<std::int64_t>(raw_dim);
+
+            row_size = shard_field_reader::checked_mul(row_size, static_cast<std::size_t>(dim));
+
+            offset += 8;
+        }
+
+        columns_.push_back(column{std::string{name}, dtype, std::move(feature_dims), row_size, 0});
+    }
+
+    for (column &col : columns_) {
+        std::size_t entries_size = shard_field_reader::checked_mul(
+            num_examples_, indexed_shard_entry_size);
+
+        reader.check_bounds(offset, entries_size);
+
+        col.entries_offset = offset;
+
+        offset += entries_size;
+    }
+}
+
+data
+indexed_shard_data_source::read_example(std::size_t idx) const
+{
+    data_dict example{};
+
+    for (const column &col : columns_)
+        example.emplace(col.name, read_tensor(col, idx));
+
+    return example;
+}
+
+at::Tensor
+indexed_shard_data_source::read_tensor(const column &col, std::size_t idx) const
+{
+    shard_field_reader reader{memory_span{shard_.data(), shard_.size()}};
+
+    std::size_t entry_offset = col.entries_offset + idx * indexed_shard_entry_size;
+
+    auto offset = conditional_cast<std::size_t>(reader.read_u64(entry_offset));
+    auto length = conditional_cast<std::size_t>(reader.read_u64(entry_offset + 8));
+
+    if (length > static_cast<std::size_t>(std::numeric_limits<std::int64_t>::max()))
+        throw_<byte_stream_error>(
+            "The indexed shard is corrupt; the entry {} of the column '{}' has an invalid length {}.", idx, col.name, length);
+
+    std::size_t size = shard_field_reader::checked_mul(length, col.row_size);
+
+    reader.check_bounds(offset, size);
+
+    std::vector<std::int64_t> shape{static_cast<std::int64_t>(length)};
+
+    shape.insert(shape.end(), col.feature_dims.begin(), col.feature_dims.end());
+
+    auto opts = at::dtype(col.dtype).device(at::kCPU);
+
+    if (size == 0)
+        return at::empty(shape, opts);
+
+    // The tensor refers directly to the memory-mapped shard; it keeps a slice
+    // of the mapping alive until it gets destructed.
+    memory_block payload = shard_.share_slice(offset, size);
+
+    // NOLINTNEXTLINE(cppcoreguidelines-pro-type-const-cast)
+    void *ptr = const_cast<std::byte *>(payload.data());
+
+    return at::from_blob(ptr, shape, [payload = std::move(payload)](void *) {}, opts);
+}
+
+void
+indexed_shard_data_source::shuffle_order()
+{
+    order_.resize(num_examples_);
+
+    std::iota(order_.begin(), order_.end(), 0);
+
+    std::lock_guard<std::mutex> g_lock{generator_.mutex()};
+
+    auto *cpu_generator = at::check_generator<at::CPUGeneratorImpl>(generator_);
+
+    // Fisher-Yates shuffle.
+    for (std::size_t i = order_.size(); i > 1; --i) {
+        std::size_t j = conditional_cast<std::size_t>(cpu_generator->random64()) % i;
+
+        std::swap(order_[i - 1], order_[j]);
+    }
+}
+
+void
+indexed_shard_data_source::handle_error()
+{
+    try {
+        throw;
+    } catch (const byte_stream_error &) {
+        throw_read_failure();
+    } catch (const std::system_error &) {
+        throw_read_failure();
+    }
+}
+
+inline void
+indexed_shard_data_source::throw_read_failure()
+{
+    throw_with_nested<data_pipeline_error>(
+        "The data pipeline cannot read from '{}'. See nested exception for details.", pathname_);
+}
+
+}  // namespace fairseq2n::detail
@@ -0,0 +1,81 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <optional>
+#include <string>
+#include <vector>
+
+#include <ATen/Generator.h>
+#include <ATen/Tensor.h>
+
+#include "fairseq2n/memory.h"
+#include "fairseq2n/data/data_source.h"
+
+namespace fairseq2n::detail {
+
+class indexed_shard_data_source final : public data_source {
+    struct column {
+        std::string name;
+        at::ScalarType dtype;
+        std::vector<std::int64_t> feature_dims;
+        std::size_t row_size;
+        std::size_t entries_offset;
+    };
+
+public:
+    explicit
+    indexed_shard_data_source(std::string &&pathname, bool shuffle = false);
+
+    std::optional<data>
+    next() override;
+
+    void
+    reset() override;
+
+    void
+    record_position(tape &t) const override;
+
+    void
+    reload_position(tape &t) override;
+
+    std::size_t
+    skip(std::size_t num_examples) override;
+
+private:
+    void
+    load_index();
+
+    data
+    read_example(std::size_t idx) const;
+
+    at::Tensor
+    read_tensor(const column &col, std::size_t idx) const;
+
+    void
+    shuffle_order();
+
+    [[noreturn]] void
+    handle_error();
+
+    [[noreturn]] void
+    throw_read_failure();
+
+private:
+    std::string pathname_;
+    bool shuffle_;
+    memory_block shard_{};
+    std::size_t num_examples_ = 0;
+    std::vector<column> columns_{};
+    std::vector<std::size_t> order_{};
+    std::size_t num_examples_read_ = 0;
+    at::Generator generator_;
+};
+
+}  // namespace fairseq2n::detail
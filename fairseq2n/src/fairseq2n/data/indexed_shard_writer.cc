@@ -0,0 +1,319 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#include "fairseq2n/data/indexed_shard_writer.h"
+
+#include <array>
+#include <stdexcept>
+#include <system_error>
+#include <utility>
+
+#include <fcntl.h>
+#include <unistd.h>
+
+#include <fmt/format.h>
+
+#include "fairseq2n/fmt.h"
+#include "fairseq2n/data/detail/indexed_shard_format.h"
+#include "fairseq2n/detail/error.h"
+#include "fairseq2n/detail/exception.h"
+
+using namespace fairseq2n::detail;
+
+namespace fairseq2n {
+namespace {
+
+class field_writer {
+public:
+    void
+    write_u8(std::uint8_t value)
+    {
+        write(value, 1);
+    }
+
+    void
+    write_u32(std::uint32_t value)
+    {
+        write(value, 4);
+    }
+
+    void
+    write_u64(std::uint64_t value)
+    {
+        write(value, 8);
+    }
+
+    void
+    write_string(std::string_view s)
+    {
+        const auto *bytes = reinterpret_cast<const std::byte *>(s.data());
+
+        buffer_.insert(buffer_.end(), bytes, bytes + s.size());
+    }
+
+    memory_span
+    bytes() const noexcept
+    {
+        return memory_span{buffer_.data(), buffer_.size()};
+    }
+
+private:
+    void
+    write(std::uint64_t value, std::size_t num_bytes)
+    {
+        for (std::size_t i = 0; i < num_bytes; ++i)
+            buffer_.push_back(static_cast<std::byte>((value >> (8 * i)) & 0xff));
+    }
+
+private:
+    std::vector<std::byte> buffer_{};
+};
+
+}  // namespace
+
+indexed_shard_writer::indexed_shard_writer(std::string pathname)
+  : pathname_{std::move(pathname)}
+{
+    fd_ = ::open(pathname_.c_str(), O_WRONLY | O_CREAT | O_TRUNC | O_CLOEXEC, 0666);
+    if (fd_ == invalid_fd)
+        throw_system_error(last_error(),
+            "'{}' cannot be opened", pathname_);
+
+    // The header gets written once we know the number of examples.
+    std::array<std::byte, indexed_shard_header_size> header{};
+
+    write_bytes(memory_span{header.data(), header.size()});
+}
+
+indexed_shard_writer::~indexed_shard_writer()
+{
+    try {
+        close();
+    } catch (const std::exception &) {}
+}
+
+void
+indexed_shard_writer::write(const data &example)
+{
+    if (is_closed_)
+        throw_<std::domain_error>("The shard writer has already been closed.");
+
+    if (!example.is_dict())
+        throw_<std::invalid_argument>(
+            "The example must be of type `dict`, but is of type `{}` instead.", example.type());
+
+    const data_dict &dict = example.as_dict();
+
+    // The columns inferred from the first example are only committed once the
+    // example is accepted; otherwise, a bad first example would leave stale
+    // columns behind.
+    std::vector<column> first_columns{};
+
+    std::vector<column> *columns = &columns_;
+
+    if (num_examples_ == 0) {
+        first_columns = infer_columns(dict);
+
+        columns = &first_columns;
+    }
+
+    if (dict.size() != columns->size())
+        throw_<std::invalid_argument>(
+            "The example must have {} column(s), but has {} column(s) instead.", columns->size(), dict.size());
+
+    // Validate all columns before writing anything so that a bad example does
+    // not leave the shard in a partially written state.
+    std::vector<at::Tensor> tensors{};
+
+    tensors.reserve(columns->size());
+
+    for (const column &col : *columns)
+        tensors.push_back(get_column_tensor(dict, col).contiguous());
+
+    for (std::size_t i = 0; i < columns->size(); ++i) {
+        const at::Tensor &tensor = tensors[i];
+
+        write_padding(indexed_shard_payload_alignment);
+
+        (*columns)[i].offsets.push_back(file_size_);
+
+        (*columns)[i].lengths.push_back(static_cast<std::uint64_t>(tensor.size(0)));
+
+        write_bytes(memory_span{
+            static_cast<const std::byte *>(tensor.data_ptr()), static_cast<std::size_t>(tensor.nbytes())});
+    }
+
+    if (num_examples_ == 0)
+        columns_ = std::move(first_columns);
+
+    num_examples_++;
+}
+
+void
+indexed_shard_writer::close()
+{
+    if (is_closed_)
+        return;
+
+    is_closed_ = true;
+
+    std::size_t index_offset = write_index();
+
+    write_header(index_offset);
+
+    fd_ = file_desc{};
+}
+
+std::vector<indexed_shard_writer::column>
+indexed_shard_writer::infer_columns(const data_dict &example)
+{
+    std::vector<column> columns{};
+
+    for (const auto &[name, value] : example) {
+        if (!value.is_tensor())
+            throw_<std::invalid_argument>(
+                "The column '{}' must be of type `torch.Tensor`, but is of type `{}` instead.", name, value.type());
+
+        const at::Tensor &tensor = value.as_tensor();
+
+        if (tensor.dim() == 0)
+            throw_<std::invalid_argument>(
+                "The column '{}' must have at least one dimension.", name);
+
+        if (!is_indexed_shard_dtype(tensor.scalar_type()))
+            throw_<std::invalid_argument>(
+                "The column '{}' must be of a boolean, integral, or floating-point data type, but is of data type `{}` instead.", name, c10::toString(tensor.scalar_type()));
+
+        std::vector<std::int64_t> feature_dims(tensor.sizes().begin() + 1, tensor.sizes().end());
+
+        columns.push_back(column{name, tensor.scalar_type(), std::move(feature_dims)});
+    }
+
+    return columns;
+}
+
+const at::Tensor &
+indexed_shard_writer::get_column_tensor(const data_dict &example, const column &col) const
+{
+    auto pos = example.find(col.name);
+    if (pos == example.end())
+        throw_<std::invalid_argument>(
+            "The example must have a column named '{}'.", col.name);
+
+    const data &value = pos->second;
+
+    if (!value.is_tensor())
+        throw_<std::invalid_argument>(
+            "The column '{}' must be of type `torch.Tensor`, but is of type `{}` instead.", col.name, value.type());
+
+    const at::Tensor &tensor = value.as_tensor();
+
+    if (!tensor.device().is_cpu())
+        throw_<std::invalid_argument>(
+            "The column '{}' must be on the CPU, but is on the '{}' device instead.", col.name, tensor.device().str());
+
+    if (tensor.scalar_type() != col.dtype)
+        throw_<std::invalid_argument>(
+            "The column '{}' must be of data type `{}`, but is of data type `{}` instead.", col.name, c10::toString(col.dtype), c10::toString(tensor.scalar_type()));
+
+    if (tensor.dim() == 0 || tensor.sizes().slice(1) != at::IntArrayRef(col.feature_dims))
+        throw_<std::invalid_argument>(
+            "The column '{}' must have the feature dimensions ({}) of the first example, but has the shape ({}) instead.", col.name, fmt::join(col.feature_dims, ", "), fmt::join(tensor.sizes(), ", "));
+
+    return tensor;
+}
+
+std::size_t
+indexed_shard_writer::write_index()
+{
+    write_padding(8);
+
+    field_writer index{};
+
+    for (const column &col : columns_) {
+        index.write_u32(static_cast<std::uint32_t>(col.name.size()));
+
+        index.write_string(col.name);
+
+        index.write_u8(static_cast<std::uint8_t>(col.dtype));
+
+        index.write_u32(static_cast<std::uint32_t>(col.feature_dims.size()));
+
+        for (std::int64_t dim : col.feature_dims)
+            index.write_u64(static_cast<std::uint64_t>(dim));
+    }
+
+    for (const column &col : columns_) {
+        for (std::size_t i = 0; i < num_examples_; ++i) {
+            index.write_u64(col.offsets[i]);
+            index.write_u64(col.lengths[i]);
+        }
+    }
+
+    std::size_t index_offset = file_size_;
+
+    write_bytes(index.bytes());
+
+    return index_offset;
+}
+
+void
+indexed_shard_writer::write_header(std::size_t index_offset)
+{
+    field_writer header{};
+
+    header.write_string(indexed_shard_magic);
+
+    header.write_u32(indexed_shard_version);
+    header.write_u32(static_cast<std::uint32_t>(columns_.size()));
+
+    header.write_u64(num_examples_);
+    header.write_u64(index_offset);
+
+    write_bytes_at(header.bytes(), 0);
+}
+
+void
+indexed_shard_writer::write_padding(std::size_t alignment)
+{
+    static constexpr std::array<std::byte, indexed_shard_payload_alignment> zeros{};
+
+    std::size_t remainder = file_size_ % alignment;
+    if (remainder != 0)
+        write_bytes(memory_span{zeros.data(), alignment - remainder});
+}
+
+void
+indexed_shard_writer::write_bytes(memory_span bytes)
+{
+    write_bytes_at(bytes, file_size_);
+
+    file_size_ += bytes.size();
+}
+
+void
+indexed_shard_writer::write_bytes_at(memory_span bytes, std::size_t offset)
+{
+    for (std::size_t num_bytes_written = 0; num_bytes_written < bytes.size();) {
+        ssize_t result = ::pwrite(
+            fd_.get(),
+            bytes.data() + num_bytes_written,
+            bytes.size() - num_bytes_written,
+            static_cast<off_t>(offset + num_bytes_written));
+        if (result == -1) {
+            std::error_code err = last_error();
+            if (err == std::errc::interrupted)
+                continue;
+
+            throw_system_error(err,
+                "'{}' cannot be written", pathname_);
+        }
+
+        num_bytes_written += static_cast<std::size_t>(result);
+    }
+}
+
+}  // namespace fairseq2n
@@ -0,0 +1,86 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+// All rights reserved.
+//
+// This source code is licensed under the BSD-style license found in the
+// LICENSE file in the root directory of this source tree.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+#include <ATen/Tensor.h>
+
+#include "fairseq2n/api.h"
+#include "fairseq2n/memory.h"
+#include "fairseq2n/data/data.h"
+#include "fairseq2n/data/detail/file.h"
+
+namespace fairseq2n {
+
+// Writes examples in the format read by `read_indexed_shard()`. The columns of
+// the shard are inferred from the first example.
+class FAIRSEQ2_API indexed_shard_writer {
+    struct column {
+        std::string name;
+        at::ScalarType dtype;
+        std::vector<std::int64_t> feature_dims;
+        std::vector<std::uint64_t> offsets{};
+        std::vector<std::uint64_t> lengths{};
+    };
+
+public:
+    explicit
+    indexed_shard_writer(std::string pathname);
+
+    indexed_shard_writer(const indexed_shard_writer &) = delete;
+    indexed_shard_writer &operator=(const indexed_shard_writer &) = delete;
+
+    indexed_shard_writer(indexed_shard_writer &&) = delete;
+    indexed_shard_writer &operator=(indexed_shard_writer &&) = delete;
+
+   ~indexed_shard_writer();
+
+    // `example` must be a dictionary of CPU tensors. The first dimension of a
+    // tensor can vary between examples; the others must stay the same.
+    void
+    write(const data &example);
+
+    // Writes the index and the header of the shard.
+    void
+    close();
+
+private:
+    static std::vector<column>
+    infer_columns(const data_dict &example);
+
+    const at::Tensor &
+    get_column_tensor(const data_dict &example, const column &col) const;
+
+    std::size_t
+    write_index();
+
+    void
+    write_header(std::size_t index_offset);
+
+    void
+    write_padding(std::size_t alignment);
+
+    void
+    write_bytes(memory_span bytes);
+
+    void
+    write_bytes_at(memory_span bytes, std::size_t offset);
+
+private:
+    std::string pathname_;
+    detail::file_desc fd_{};
+    std::vector<column> columns_{};
+    std::size_t num_examples_ = 0;
+    std::size_t file_size_ = 0;
+    bool is_closed_ = false;
+};
+
+}  // namespace fairseq2n
@@ -6,6 +6,7 @@
 
 #include "fairseq2n/data/list_data_source.h"
 
+#include <algorithm>
 #include <cstddef>
 
 namespace fairseq2n::detail {
@@ -37,4 +38,16 @@ list_data_source::reload_position(tape &t)
     iter_ = list_.begin() + t.read<std::ptrdiff_t>();
 }
 
+std::size_t
+list_data_source::skip(std::size_t num_examples)
+{
+    auto num_remaining = static_cast<std::size_t>(list_.end() - iter_);
+
+    num_examples = std::min(num_examples, num_remaining);
+
+    iter_ += static_cast<std::ptrdiff_t>(num_examples);
+
+    return num_examples;
+}
+
 }
@@ -32,6 +32,9 @@ public:
     void
     reload_position(tape &t) override;
 
+    std::size_t
+    skip(std::size_t num_examples) override;
+
 private:
     data_list list_;
     data_list::iterator iter_;
@@ -6,6 +6,7 @@
 
 #include "fairseq2n/data/map_data_source.h"
 
+#include <algorithm>
 #include <exception>
 
 #include "fairseq2n/data/data_pipeline.h"
@@ -15,17 +16,53 @@
 namespace fairseq2n::detail {
 
 map_data_source::map_data_source(
-    std::unique_ptr<data_source> &&inner, map_fn &&fn, std::size_t num_parallel_calls)
-  : inner_{std::move(inner)}, map_fn_{std::move(fn)}, num_parallel_calls_{num_parallel_calls}
+    std::unique_ptr<data_source> &&inner,
+    map_fn &&fn,
+    std::size_t num_parallel_calls,
+    bool streaming,
+    bool preserve_order)
+  : inner_{std::move(inner)},
+    map_fn_{std::move(fn)},
+    num_parallel_calls_{num_parallel_calls},
+    streaming_{streaming},
+    preserve_order_{preserve_order}
 {
-    buffer_.reserve(num_parallel_calls);
+    if (streaming_)
+        num_parallel_calls_ = std::max(num_parallel_calls_, std::size_t{1});
+    else
+        buffer_.reserve(num_parallel_calls);
 
     buffer_iter_ = buffer_.begin();
 }
 
+map_data_source::~map_data_source()
+{
+    // The worker threads access `map_fn_`; make sure that they are idle before
+    // we get destructed.
+    wait_for_in_flight_calls();
+}
+
 std::optional<data>
 map_data_source::next()
 {
+    if (streaming_) {
+        while (true) {
+            // Keep up to `num_parallel_calls_` examples in flight.
+            fill_in_flight_calls();
+
+            if (in_flight_calls_.empty())
+                return std::nullopt;
+
+            std::shared_ptr<map_call> call = wait_for_next_call();
+
+            if (call->exception_ptr)
+                std::rethrow_exception(call->exception_ptr);
+
+            if (call->maybe_example)
+                return std::move(call->maybe_example);
+        }
+    }
+
     if (num_parallel_calls_ <= 1) {
         while (std::optional<data> maybe_example = inner_->next()) {
             maybe_example = invoke_function(*std::move(maybe_example));
@@ -51,6 +88,10 @@ map_data_source::next()
 void
 map_data_source::reset()
 {
+    wait_for_in_flight_calls();
+
+    in_flight_calls_.clear();
+
     buffer_.clear();
 
     buffer_iter_ = buffer_.begin();
@@ -61,6 +102,36 @@ map_data_source::reset()
 void
 map_data_source::record_position(tape &t) const
 {
+    if (streaming_) {
+        wait_for_in_flight_calls();
+
+        // We record the outputs of the in-flight calls in the same layout as
+        // the lock-step buffer so that both modes can reload each other's
+        // state.
+        std::vector<std::optional<data>> buffer{};
+
+        buffer.reserve(in_flight_calls_.size());
+
+        for (const std::shared_ptr<map_call> &call : in_flight_calls_) {
+            // A failed call cannot be recorded; recording it as a skipped
+            // example would silently drop the example and its error. The call
+            // stays in flight, so the caller can read past it (or handle its
+            // error) and record the position afterwards.
+            if (call->exception_ptr)
+                std::rethrow_exception(call->exception_ptr);
+
+            buffer.push_back(call->maybe_example);
+        }
+
+        t.record(buffer);
+
+        t.record(std::ptrdiff_t{0});
+
+        inner_->record_position(t);
+
+        return;
+    }
+
     t.record(buffer_);
 
     t.record(buffer_iter_ - buffer_.begin());
@@ -71,10 +142,34 @@ map_data_source::record_position(tape &t) const
 void
 map_data_source::reload_position(tape &t)
 {
+    wait_for_in_flight_calls();
+
+    in_flight_calls_.clear();
+
     buffer_ = t.read<std::vector<std::optional<data>>>();
 
     buffer_iter_ = buffer_.begin() + t.read<std::ptrdiff_t>();
 
+    if (streaming_) {
+        // Turn the remaining buffered examples into completed calls.
+        for (; buffer_iter_ < buffer_.end(); ++buffer_iter_) {
+            if (!*buffer_iter_)
+                continue;
+
+            auto call = std::make_shared<map_call>();
+
+            call->maybe_example = std::move(*buffer_iter_);
+
+            call->done = true;
+
+            in_flight_calls_.push_back(std::move(call));
+        }
+
+        buffer_.clear();
+
+        buffer_iter_ = buffer_.begin();
+    }
+
     inner_->reload_position(t);
 }
 
@@ -112,17 +207,126 @@ map_data_source::fill_buffer()
     return true;
 }
 
+void
+map_data_source::fill_in_flight_calls()
+{
+    if (pool_ == nullptr)
+        pool_ = std::make_unique<thread_pool>(num_parallel_calls_);
+
+    while (in_flight_calls_.size() < num_parallel_calls_) {
+        std::optional<data> maybe_example = inner_->next();
+        if (!maybe_example)
+            break;
+
+        auto call = std::make_shared<map_call>();
+
+        {
+            std::unique_lock<std::mutex> call_lock{call_mutex_};
+
+            in_flight_calls_.push_back(call);
+        }
+
+        auto run_call = [this, call, example = *std::move(maybe_example)]() mutable
+        {
+            std::optional<data> maybe_output{};
+
+            std::exception_ptr exception_ptr{};
+
+            try {
+                maybe_output = invoke_function(std::move(example));
+            } catch (...) {
+                exception_ptr = std::current_exception();
+            }
+
+            {
+                std::unique_lock<std::mutex> call_lock{call_mutex_};
+
+                call->maybe_example = std::move(maybe_output);
+
+                call->exception_ptr = exception_ptr;
+
+                call->done = true;
+            }
+
+            call_condition_.notify_all();
+        };
+
+        pool_->enqueue(std::move(run_call));
+    }
+}
+
+std::shared_ptr<map_data_source::map_call>
+map_data_source::wait_for_next_call()
+{
+    std::unique_lock<std::mutex> call_lock{call_mutex_};
+
+    auto pos = in_flight_calls_.begin();
+
+    call_condition_.wait(call_lock, [this, &pos]
+    {
+        // In order-preserving mode, we only ever yield the oldest call;
+        // otherwise, we yield whichever call completes first.
+        if (preserve_order_)
+            pos = in_flight_calls_.begin();
+        else
+            pos = std::find_if(
+                in_flight_calls_.begin(), in_flight_calls_.end(), [](const auto &call)
+                {
+                    return call->done;
+                });
+
+        return pos != in_flight_calls_.end() && (*pos)->done;
+    });
+
+    std::shared_ptr<map_call> call = std::move(*pos);
+
+    in_flight_calls_.erase(pos);
+
+    return call;
+}
+
+void
+map_data_source::wait_for_in_flight_calls() const noexcept
+{
+    std::unique_lock<std::mutex> call_lock{call_mutex_};
+
+    call_condition_.wait(call_lock, [this]
+    {
+        return std::all_of(
+            in_flight_calls_.begin(), in_flight_calls_.end(), [](const auto &call)
+            {
+                return call->done;
+            });
+    });
+}
+
 std::optional<data>
 map_data_source::invoke_function(data &&example)
 {
+    std::optional<immutable_string> maybe_key{};
+
+    if (cache_) {
+        maybe_key = cache_->make_key(example);
+
+        if (std::optional<data> maybe_output = cache_->maybe_get(*maybe_key))
+            return maybe_output;
+    }
+
+    data output{};
+
     try {
-        return map_fn_(std::move(example));
+        output = map_fn_(std::move(example));
     } catch (const data_pipeline_error &) {
         throw;
     } catch (const std::exception &) {
         throw_data_pipeline_error_with_nested(std::nullopt, /*recoverable=*/true,
             "The map operation has failed. See nested exception for details.");
     }
+
+    if (cache_)
+        cache_->add(*maybe_key, output);
+
+    return output;
 }
 
 }  // namespace fairseq2n::detail
@@ -6,22 +6,46 @@
 
 #pragma once
 
+#include <condition_variable>
 #include <cstddef>
+#include <deque>
+#include <exception>
 #include <memory>
+#include <mutex>
 #include <optional>
 #include <utility>
 #include <vector>
 
 #include "fairseq2n/data/data_pipeline.h"
 #include "fairseq2n/data/data_source.h"
+#include "fairseq2n/data/detail/example_cache.h"
+#include "fairseq2n/data/detail/thread_pool.h"
 
 namespace fairseq2n::detail {
 
 class map_data_source final : public data_source {
+    struct map_call {
+        std::optional<data> maybe_example{};
+        std::exception_ptr exception_ptr{};
+        bool done = false;
+    };
+
 public:
     explicit
     map_data_source(
-        std::unique_ptr<data_source> &&inner, map_fn &&fn, std::size_t num_parallel_calls);
+        std::unique_ptr<data_source> &&inner,
+        map_fn &&fn,
+        std::size_t num_parallel_calls,
+        bool streaming = false,
+        bool preserve_order = true);
+
+    map_data_source(const map_data_source &) = delete;
+    map_data_source &operator=(const map_data_source &) = delete;
+
+    map_data_source(map_data_source &&) = delete;
+    map_data_source &operator=(map_data_source &&) = delete;
+
+   ~map_data_source() override;
 
     std::optional<data>
     next() override;
@@ -35,10 +59,27 @@ public:
     void
     reload_position(tape &t) override;
 
+    // Memoizes the outputs of the map function in `cache`. The cache outlives
+    // `reset()` calls so that subsequent epochs can skip the function.
+    void
+    set_cache(std::unique_ptr<example_cache> &&cache) noexcept
+    {
+        cache_ = std::move(cache);
+    }
+
 private:
     bool
     fill_buffer();
 
+    void
+    fill_in_flight_calls();
+
+    std::shared_ptr<map_call>
+    wait_for_next_call();
+
+    void
+    wait_for_in_flight_calls() const noexcept;
+
     std::optional<data>
     invoke_function(data &&example);
 
@@ -46,8 +87,15 @@ private:
     std::unique_ptr<data_source> inner_;
     map_fn map_fn_;
     std::size_t num_parallel_calls_;
+    bool streaming_;
+    bool preserve_order_;
     std::vector<std::optional<data>> buffer_{};
     std::vector<std::optional<data>>::iterator buffer_iter_{};
+    std::deque<std::shared_ptr<map_call>> in_flight_calls_{};
+    mutable std::mutex call_mutex_{};
+    mutable std::condition_variable call_condition_{};
+    std::unique_ptr<thread_pool> pool_{};
+    std::unique_ptr<example_cache> cache_{};
 };
 
 }  // namespace fairseq2n::detail
@@ -6,6 +6,8 @@
 
 #include "fairseq2n/data/memory_stream.h"
 
+#include <algorithm>
+
 namespace fairseq2n::detail {
 
 memory_block
@@ -20,4 +22,12 @@ memory_stream::reset()
     block_ = original_block_;
 }
 
+bool
+memory_stream::seek(std::size_t offset)
+{
+    block_ = original_block_.share_slice(std::min(offset, original_block_.size()));
+
+    return true;
+}
+
 }  // namespace fairseq2n::detail
@@ -6,6 +6,7 @@
 
 #pragma once
 
+#include <cstddef>
 #include <utility>
 
 #include "fairseq2n/memory.h"
@@ -28,6 +29,9 @@ public:
     void
     reset() override;
 
+    bool
+    seek(std::size_t offset) override;
+
 private:
     memory_block block_;
     memory_block original_block_;
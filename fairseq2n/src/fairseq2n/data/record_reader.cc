@@ -28,6 +28,8 @@ record_reader::next()
 
     move_to_next_record();
 
+    position_ += record.size();
+
     return record;
 }
 
@@ -39,6 +41,23 @@ record_reader::reset()
     previous_chunks_.clear();
 
     stream_->reset();
+
+    position_ = 0;
+}
+
+bool
+record_reader::seek(std::size_t offset)
+{
+    if (!stream_->seek(offset))
+        return false;
+
+    current_chunk_ = {};
+
+    previous_chunks_.clear();
+
+    position_ = offset;
+
+    return true;
 }
 
 bool
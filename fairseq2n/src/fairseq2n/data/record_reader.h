@@ -42,6 +42,19 @@ public:
     void
     reset();
 
+    // Moves the reader to the record that starts `offset` bytes past the
+    // beginning of the stream. Returns `false` if the underlying stream does
+    // not support random access.
+    bool
+    seek(std::size_t offset);
+
+    // Returns the byte offset of the next record.
+    std::size_t
+    position() const noexcept
+    {
+        return position_;
+    }
+
 private:
     bool
     load_next_record();
@@ -64,6 +77,7 @@ private:
     std::vector<memory_block> previous_chunks_{};
     std::size_t record_len_ = 0;
     std::size_t record_end_offset_ = 0;
+    std::size_t position_ = 0;
 };
 
 class FAIRSEQ2_API record_error : public std::runtime_error {
@@ -11,17 +11,19 @@ namespace fairseq2n::detail {
 std::optional<data>
 shard_data_source::next()
 {
-    for (std::size_t i = 0; i < shard_idx_; i++)
-        if (!inner_->next())
-            return std::nullopt;
+    // We skip the examples of the other shards instead of reading them; this
+    // is considerably cheaper if the inner data source supports skipping.
+    if (inner_->skip(shard_idx_) < shard_idx_)
+        return std::nullopt;
 
     std::optional<data> maybe_example = inner_->next();
     if (!maybe_example)
         return std::nullopt;
 
-    for (std::size_t i = 0; i < num_shards_ - shard_idx_ - 1; i++)
-        if (!inner_->next())
-            return std::nullopt;
+    std::size_t num_remaining = num_shards_ - shard_idx_ - 1;
+
+    if (inner_->skip(num_remaining) < num_remaining)
+        return std::nullopt;
 
     return maybe_example;
 }
@@ -44,4 +46,12 @@ shard_data_source::reload_position(tape &t)
     inner_->reload_position(t);
 }
 
+std::size_t
+shard_data_source::skip(std::size_t num_examples)
+{
+    // Each example of this shard spans `num_shards_` examples of the inner
+    // data source; an incomplete trailing span is dropped by `next()`.
+    return inner_->skip(num_examples * num_shards_) / num_shards_;
+}
+
 }  // namespace fairseq2n::detail
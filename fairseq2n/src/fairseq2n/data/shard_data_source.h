@@ -36,6 +36,9 @@ public:
     void
     reload_position(tape &t) override;
 
+    std::size_t
+    skip(std::size_t num_examples) override;
+
 private:
     std::unique_ptr<data_source> inner_;
     std::size_t shard_idx_;
@@ -12,9 +12,7 @@ std::optional<data>
 skip_data_source::next()
 {
     if (!skip_) {
-        for (std::size_t i = 0; i < num_examples_; i++)
-            if (!inner_->next())
-                break;
+        inner_->skip(num_examples_);
 
         skip_ = true;
     }
@@ -46,4 +44,16 @@ skip_data_source::reload_position(tape &t)
     inner_->reload_position(t);
 }
 
+std::size_t
+skip_data_source::skip(std::size_t num_examples)
+{
+    if (!skip_) {
+        inner_->skip(num_examples_);
+
+        skip_ = true;
+    }
+
+    return inner_->skip(num_examples);
+}
+
 }  // namespace fairseq2n::detail
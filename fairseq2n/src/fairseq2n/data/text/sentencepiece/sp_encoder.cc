@@ -6,8 +6,10 @@
 
 #include "fairseq2n/data/text/sentencepiece/sp_encoder.h"
 
+#include <algorithm>
 #include <cstddef>
 #include <stdexcept>
+#include <vector>
 
 #include <ATen/Functions.h>
 
@@ -19,6 +21,7 @@
 #include "fairseq2n/data/text/sentencepiece/sp_model.h"
 #include "fairseq2n/data/text/sentencepiece/sp_processor.h"
 #include "fairseq2n/detail/exception.h"
+#include "fairseq2n/detail/parallel.h"
 #include "fairseq2n/utils/cast.h"
 
 using sentencepiece::ImmutableSentencePieceText;
@@ -37,10 +40,20 @@ public:
     at::Tensor &&
     run() &&;
 
-private:
     void
     encode_string();
 
+    // Writes the token indices of the encoded string to `output`, which must
+    // have exactly `seq_len()` elements.
+    void
+    write_indices(span<std::int64_t> output) const;
+
+    std::size_t
+    seq_len() const noexcept
+    {
+        return seq_len_;
+    }
+
 private:
     const sp_encoder *encoder_;
     const sp_processor *processor_;
@@ -76,36 +89,13 @@ sp_encoder_op::run() &&
 {
     encode_string();
 
-    tensor_ = at::zeros({static_cast<std::int64_t>(seq_len_)},
+    // No need to zero-initialize; `write_indices()` overwrites all elements.
+    tensor_ = at::empty({static_cast<std::int64_t>(seq_len_)},
         at::dtype(at::kLong).device(at::kCPU).pinned_memory(encoder_->opts_.pin_memory()));
 
     writable_memory_span tensor_bits = get_raw_mutable_storage(tensor_);
 
-    span tensor_data = cast<std::int64_t>(tensor_bits);
-
-    if (encoder_->opts_.reverse()) {
-        std::size_t i = seq_len_ - 1;
-
-        for (std::int64_t prefix_idx : encoder_->prefix_token_indices_)
-            tensor_data[i--] = prefix_idx;
-
-        for (std::size_t j = 0; j < spt_.pieces_size(); ++j)
-            tensor_data[i--] = get_token_idx(spt_, j);
-
-        for (std::int64_t suffix_idx : encoder_->suffix_token_indices_)
-            tensor_data[i--] = suffix_idx;
-    } else {
-        std::size_t i = 0;
-
-        for (std::int64_t prefix_idx : encoder_->prefix_token_indices_)
-            tensor_data[i++] = prefix_idx;
-
-        for (std::size_t j = 0; j < spt_.pieces_size(); ++j)
-            tensor_data[i++] = get_token_idx(spt_, j);
-
-        for (std::int64_t suffix_idx : encoder_->suffix_token_indices_)
-            tensor_data[i++] = suffix_idx;
-    }
+    write_indices(cast<std::int64_t>(tensor_bits));
 
     at::Device device = encoder_->opts_.maybe_device().value_or(at::kCPU);
     if (device != at::kCPU)
@@ -127,6 +117,34 @@ sp_encoder_op::encode_string()
     seq_len_ = spt_.pieces_size() + extra_tokens_len_;
 }
 
+void
+sp_encoder_op::write_indices(span<std::int64_t> output) const
+{
+    if (encoder_->opts_.reverse()) {
+        std::size_t i = seq_len_ - 1;
+
+        for (std::int64_t prefix_idx : encoder_->prefix_token_indices_)
+            output[i--] = prefix_idx;
+
+        for (std::size_t j = 0; j < spt_.pieces_size(); ++j)
+            output[i--] = get_token_idx(spt_, j);
+
+        for (std::int64_t suffix_idx : encoder_->suffix_token_indices_)
+            output[i--] = suffix_idx;
+    } else {
+        std::size_t i = 0;
+
+        for (std::int64_t prefix_idx : encoder_->prefix_token_indices_)
+            output[i++] = prefix_idx;
+
+        for (std::size_t j = 0; j < spt_.pieces_size(); ++j)
+            output[i++] = get_token_idx(spt_, j);
+
+        for (std::int64_t suffix_idx : encoder_->suffix_token_indices_)
+            output[i++] = suffix_idx;
+    }
+}
+
 }  // namespace detail
 
 sp_encoder::sp_encoder(std::shared_ptr<const sp_model> model, sp_encoder_options opts)
@@ -178,6 +196,95 @@ sp_encoder::operator()(data &&d) const
     return encode(std::move(d).as_string());
 }
 
+data
+sp_encoder::encode_batch(data_list &&sentences, std::int64_t pad_idx, std::int64_t pad_to_multiple) const
+{
+    if (pad_to_multiple < 1)
+        throw_<std::invalid_argument>(
+            "`pad_to_multiple` must be greater than or equal to 1, but is {} instead.", pad_to_multiple);
+
+    std::vector<sp_encoder_op> ops{};
+
+    ops.reserve(sentences.size());
+
+    for (std::size_t i = 0; i < sentences.size(); ++i) {
+        data &d = sentences[i];
+
+        if (!d.is_string())
+            throw_<std::invalid_argument>(
+                "All elements of `sentences` must be of type `string`, but the element at index {} is of type `{}` instead.", i, d.type());
+
+        ops.emplace_back(this, model_->processor_.get(), std::move(d).as_string());
+    }
+
+    auto encode_strings = [&ops](std::size_t begin, std::size_t end)
+    {
+        for (auto i = begin; i < end; ++i)
+            ops[i].encode_string();
+    };
+
+    parallel_for<std::size_t>(encode_strings, ops.size());
+
+    std::size_t max_seq_len = 0;
+    for (const sp_encoder_op &op : ops)
+        max_seq_len = std::max(max_seq_len, op.seq_len());
+
+    auto multiple = static_cast<std::size_t>(pad_to_multiple);
+    if (max_seq_len % multiple > 0)
+        max_seq_len += multiple - (max_seq_len % multiple);
+
+    // Write the token indices directly into the padded batch tensor instead of
+    // allocating a tensor per sentence and collating them afterwards.
+    auto options = at::dtype(at::kLong).device(at::kCPU).pinned_memory(opts_.pin_memory());
+
+    at::Tensor seqs = at::empty(
+        {static_cast<std::int64_t>(ops.size()), static_cast<std::int64_t>(max_seq_len)}, options);
+
+    at::Tensor seq_lens = at::empty({static_cast<std::int64_t>(ops.size())}, options);
+
+    span seqs_data = cast<std::int64_t>(get_raw_mutable_storage(seqs));
+
+    span seq_lens_data = cast<std::int64_t>(get_raw_mutable_storage(seq_lens));
+
+    auto write_indices = [&](std::size_t begin, std::size_t end)
+    {
+        for (auto i = begin; i < end; ++i) {
+            const sp_encoder_op &op = ops[i];
+
+            span row = seqs_data.subspan(i * max_seq_len, max_seq_len);
+
+            op.write_indices(row.first(op.seq_len()));
+
+            std::fill(row.begin() + static_cast<std::ptrdiff_t>(op.seq_len()), row.end(), pad_idx);
+
+            seq_lens_data[i] = static_cast<std::int64_t>(op.seq_len());
+        }
+    };
+
+    parallel_for<std::size_t>(write_indices, ops.size());
+
+    // Follow the convention of `collater`; the batch is ragged if any sequence
+    // is padded.
+    bool is_ragged = std::any_of(ops.begin(), ops.end(), [max_seq_len](const sp_encoder_op &op)
+    {
+        return op.seq_len() != max_seq_len;
+    });
+
+    at::Device device = opts_.maybe_device().value_or(at::kCPU);
+    if (device != at::kCPU) {
+        seqs = seqs.to(device);
+
+        seq_lens = seq_lens.to(device);
+    }
+
+    data_dict output{{"is_ragged", is_ragged}};
+
+    output.emplace("seqs", std::move(seqs));
+    output.emplace("seq_lens", std::move(seq_lens));
+
+    return output;
+}
+
 at::Tensor
 sp_encoder::encode(immutable_string &&sentence) const
 {
@@ -179,6 +179,12 @@ public:
     data
     operator()(data &&d) const;
 
+    // Encodes `sentences` into a single padded tensor. The output has the same
+    // format as the output of `collater`.
+    data
+    encode_batch(
+        data_list &&sentences, std::int64_t pad_idx, std::int64_t pad_to_multiple = 1) const;
+
     const std::optional<at::Tensor> &
     prefix_indices() const
     {
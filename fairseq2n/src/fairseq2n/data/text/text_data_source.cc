@@ -72,20 +72,86 @@ text_data_source::reset()
 void
 text_data_source::record_position(tape &t) const
 {
-    t.record(num_lines_read_);
+    // Along with the number of lines read, we record the byte offset of the
+    // next line so that we can seek directly to it when reloading.
+    tape position{};
+
+    position.record(num_lines_read_);
+
+    position.record(line_reader_->position());
+
+    t.record(position.storage());
 }
 
 void
 text_data_source::reload_position(tape &t)
 {
-    auto num_lines_read = t.read<std::size_t>();
+    auto position = t.read<data>();
+
+    std::size_t num_lines_read = 0;
+
+    std::optional<std::size_t> maybe_offset{};
+
+    if (position.is_list()) {
+        tape position_tape{position.as_list()};
+
+        num_lines_read = position_tape.read<std::size_t>();
+
+        maybe_offset = position_tape.read<std::size_t>();
+    } else {
+        // Tapes recorded by earlier versions only hold the number of lines read.
+        tape position_tape{data_list{std::move(position)}};
+
+        num_lines_read = position_tape.read<std::size_t>();
+    }
 
     reset();
 
+    if (maybe_offset) {
+        bool seeked = false;
+
+        try {
+            seeked = line_reader_->seek(*maybe_offset);
+        } catch (const std::exception &) {
+            handle_error();
+        }
+
+        if (seeked) {
+            num_lines_read_ = num_lines_read;
+
+            return;
+        }
+
+        // The underlying stream does not support random access; fall back to
+        // replaying the lines.
+        reset();
+    }
+
     for (std::size_t i = 0; i < num_lines_read; ++i)
         read_next_line();
 }
 
+std::size_t
+text_data_source::skip(std::size_t num_examples)
+{
+    // Unlike `next()`, we only have to find the line boundaries; no string is
+    // constructed or trimmed.
+    for (std::size_t i = 0; i < num_examples; i++) {
+        memory_block line{};
+
+        try {
+            line = read_next_line();
+        } catch (const std::exception &) {
+            handle_error();
+        }
+
+        if (line.empty())
+            return i;
+    }
+
+    return num_examples;
+}
+
 std::unique_ptr<text_line_reader>
 text_data_source::make_text_line_reader()
 {
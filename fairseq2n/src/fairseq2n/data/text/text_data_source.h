@@ -36,6 +36,9 @@ public:
     void
     reload_position(tape &t) override;
 
+    std::size_t
+    skip(std::size_t num_examples) override;
+
 private:
     std::unique_ptr<text_line_reader>
     make_text_line_reader();
@@ -77,6 +77,33 @@ utf8_stream::reset()
     reset_iconv();
 }
 
+bool
+utf8_stream::seek(std::size_t offset)
+{
+    // If the encoding has to be inferred, read the first chunk to check for a
+    // byte order mark.
+    if (!is_utf8_ && encoding_.empty()) {
+        reset();
+
+        encoded_chunk_ = inner_->read_chunk();
+
+        ensure_iconv_initialized();
+    }
+
+    // Byte offsets match the ones of the inner stream only if the stream is
+    // already in UTF-8.
+    if (!is_utf8_ || !inner_->seek(offset))
+        return false;
+
+    encoded_chunk_ = {};
+
+    leftover_bits_ = {};
+
+    is_eod_ = false;
+
+    return true;
+}
+
 memory_block
 utf8_stream::do_read_chunk()
 {
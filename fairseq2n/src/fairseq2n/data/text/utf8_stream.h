@@ -42,6 +42,9 @@ public:
     void
     reset() override;
 
+    bool
+    seek(std::size_t offset) override;
+
 private:
     bool
     is_utf8_encoding() const noexcept
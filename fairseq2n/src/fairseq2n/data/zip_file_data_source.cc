@@ -8,6 +8,7 @@
 
 #include <algorithm>
 #include <cstddef>
+#include <cstdint>
 #include <exception>
 #include <system_error>
 #include <utility>
@@ -18,44 +19,148 @@
 #include "fairseq2n/data/byte_stream.h"
 #include "fairseq2n/data/data_pipeline.h"
 #include "fairseq2n/data/file.h"
+#include "fairseq2n/data/detail/exception.h"
 #include "fairseq2n/data/immutable_string.h"
 #include "fairseq2n/detail/exception.h"
 #include "fairseq2n/utils/string.h"
 
 namespace fairseq2n::detail {
+namespace {
 
-zip_file_data_source::zip_file_data_source(std::string &&pathname)
-    : pathname_{std::move(pathname)}
+constexpr std::uint32_t end_of_central_dir_signature = 0x06054b50;
+constexpr std::uint32_t zip64_end_of_central_dir_signature = 0x06064b50;
+constexpr std::uint32_t zip64_end_of_central_dir_locator_signature = 0x07064b50;
+constexpr std::uint32_t central_dir_header_signature = 0x02014b50;
+constexpr std::uint32_t local_file_header_signature = 0x04034b50;
+
+constexpr std::size_t end_of_central_dir_size = 22;
+constexpr std::size_t zip64_end_of_central_dir_size = 56;
+constexpr std::size_t zip64_end_of_central_dir_locator_size = 20;
+constexpr std::size_t central_dir_header_size = 46;
+constexpr std::size_t local_file_header_size = 30;
+
+constexpr std::size_t max_comment_size = 0xffff;
+
+constexpr std::uint16_t zip64_extra_field_id = 0x0001;
+
+constexpr std::uint16_t stored_method = 0;
+
+// Reads the fields of a zip archive. All fields are little-endian.
+class zip_field_reader {
+public:
+    explicit
+    zip_field_reader(memory_span bytes) noexcept
+      : bytes_{bytes}
+    {}
+
+    std::uint16_t
+    read_u16(std::size_t offset) const
+    {
+        return static_cast<std::uint16_t>(read(offset, 2));
+    }
+
+    std::uint32_t
+    read_u32(std::size_t offset) const
+    {
+        return static_cast<std::uint32_t>(read(offset, 4));
+    }
+
+    std::uint64_t
+    read_u64(std::size_t offset) const
+    {
+        return read(offset, 8);
+    }
+
+    std::size_t
+    size() const noexcept
+    {
+        return bytes_.size();
+    }
+
+private:
+    std::uint64_t
+    read(std::size_t offset, std::size_t num_bytes) const
+    {
+        if (offset > bytes_.size() || bytes_.size() - offset < num_bytes)
+            throw_<byte_stream_error>(
+                "The zip archive is truncated; a field at offset {} is out of bounds.", offset);
+
+        std::uint64_t value = 0;
+
+        for (std::size_t i = num_bytes; i > 0; --i)
+            value = (value << 8) | static_cast<std::uint64_t>(bytes_[offset + i - 1]);
+
+        return value;
+    }
+
+private:
+    memory_span bytes_;
+};
+
+}  // namespace
+
+zip_file_data_source::zip_file_data_source(std::string &&pathname, std::size_t num_parallel_calls)
+  : pathname_{std::move(pathname)}, num_parallel_calls_{num_parallel_calls}
 {
     try {
-        zip_reader_ = zip_open(pathname_.c_str(), ZIP_DEFAULT_COMPRESSION_LEVEL, 'r');
-        num_entries_ = (std::size_t)zip_entries_total(zip_reader_);
+        archive_ = memory_map_file(pathname_);
+
+        load_central_directory();
     } catch (const std::exception &) {
         handle_error();
     }
+
+    if (num_parallel_calls_ > 1)
+        pool_ = std::make_unique<thread_pool>(num_parallel_calls_);
+}
+
+zip_file_data_source::~zip_file_data_source()
+{
+    clear_read_ahead();
 }
 
 std::optional<data>
 zip_file_data_source::next()
 {
-    if (num_files_read_ >= num_entries_) return std::nullopt;
+    if (num_files_read_ >= entries_.size())
+        return std::nullopt;
 
-    fairseq2n::writable_memory_block zip_entry;
-    zip_entry_openbyindex(zip_reader_, num_files_read_);
-    {
-        auto size = zip_entry_size(zip_reader_);
-        zip_entry = fairseq2n::allocate_memory(size);
-        zip_entry_noallocread(zip_reader_, (void *)zip_entry.data(), size);
+    std::size_t idx = num_files_read_;
+
+    memory_block block{};
+
+    try {
+        if (pool_) {
+            fill_read_ahead();
+
+            std::future<memory_block> future = std::move(read_ahead_.front());
+
+            read_ahead_.pop_front();
+
+            // Count the entry as read before waiting for it; if it fails, the
+            // entries read ahead must still line up with `num_files_read_`.
+            num_files_read_++;
+
+            block = future.get();
+        } else {
+            num_files_read_++;
+
+            block = read_entry(idx);
+        }
+    } catch (const byte_stream_error &) {
+        throw_entry_read_failure(idx);
+    } catch (const std::system_error &) {
+        throw_entry_read_failure(idx);
     }
-    zip_entry_close(zip_reader_);
 
-    num_files_read_ += 1;
-    return immutable_string{zip_entry};
+    return immutable_string{std::move(block)};
 }
 
 void
 zip_file_data_source::reset()
 {
+    clear_read_ahead();
+
     num_files_read_ = 0;
 }
 
@@ -72,9 +177,276 @@ zip_file_data_source::reload_position(tape &t)
 
     reset();
 
-    // TODO: use random access
-    for (std::size_t i = 0; i < num_files_read; i++)
-        next();
+    // Since we have the central directory in memory, we can jump directly to
+    // the next entry to read.
+    num_files_read_ = std::min(num_files_read, entries_.size());
+}
+
+std::size_t
+zip_file_data_source::skip(std::size_t num_examples)
+{
+    num_examples = std::min(num_examples, entries_.size() - num_files_read_);
+
+    // Discard the skipped entries that are already being read ahead.
+    for (std::size_t i = 0; i < num_examples && !read_ahead_.empty(); i++) {
+        read_ahead_.front().wait();
+
+        read_ahead_.pop_front();
+    }
+
+    num_files_read_ += num_examples;
+
+    return num_examples;
+}
+
+void
+zip_file_data_source::load_central_directory()
+{
+    zip_field_reader reader{memory_span{archive_.data(), archive_.size()}};
+
+    if (reader.size() < end_of_central_dir_size)
+        throw_<byte_stream_error>(
+            "The file is not a zip archive; it has no end of central directory record.");
+
+    // The end of central directory record is followed by a variable-length
+    // comment; therefore, we have to search for its signature backwards.
+    std::size_t min_eocd_offset = 0;
+    if (reader.size() > end_of_central_dir_size + max_comment_size)
+        min_eocd_offset = reader.size() - end_of_central_dir_size - max_comment_size;
+
+    std::optional<std::size_t> maybe_eocd_offset{};
+
+    std::size_t offset = reader.size() - end_of_central_dir_size + 1;
+
+    for (; offset > min_eocd_offset; --offset) {
+        if (reader.read_u32(offset - 1) == end_of_central_dir_signature) {
+            maybe_eocd_offset = offset - 1;
+
+            break;
+        }
+    }
+
+    if (!maybe_eocd_offset)
+        throw_<byte_stream_error>(
+            "The file is not a zip archive; no end of central directory record is found.");
+
+    std::size_t eocd_offset = *maybe_eocd_offset;
+
+    std::uint64_t num_entries = reader.read_u16(eocd_offset + 10);
+    std::uint64_t central_dir_offset = reader.read_u32(eocd_offset + 16);
+
+    // A ZIP64 archive has the actual values in a separate record referenced by
+    // a locator that immediately precedes the end of central directory record.
+    if (eocd_offset >= zip64_end_of_central_dir_locator_size) {
+        std::size_t locator_offset = eocd_offset - zip64_end_of_central_dir_locator_size;
+
+        if (reader.read_u32(locator_offset) == zip64_end_of_central_dir_locator_signature) {
+            auto zip64_eocd_offset = static_cast<std::size_t>(reader.read_u64(locator_offset + 8));
+
+            if (reader.read_u32(zip64_eocd_offset) != zip64_end_of_central_dir_signature)
+                throw_<byte_stream_error>(
+                    "The ZIP64 end of central directory record of the zip archive is corrupt.");
+
+            if (reader.size() - zip64_eocd_offset < zip64_end_of_central_dir_size)
+                throw_<byte_stream_error>(
+                    "The ZIP64 end of central directory record of the zip archive is truncated.");
+
+            num_entries        = reader.read_u64(zip64_eocd_offset + 32);
+            central_dir_offset = reader.read_u64(zip64_eocd_offset + 48);
+        }
+    }
+
+    // Each entry takes at least `central_dir_header_size` bytes; this guards
+    // against reserving an absurd amount of memory for a corrupt archive.
+    if (num_entries > reader.size() / central_dir_header_size)
+        throw_<byte_stream_error>(
+            "The central directory of the zip archive is corrupt; it reports {} entries.", num_entries);
+
+    entries_.clear();
+
+    entries_.reserve(static_cast<std::size_t>(num_entries));
+
+    offset = static_cast<std::size_t>(central_dir_offset);
+
+    for (std::uint64_t i = 0; i < num_entries; ++i) {
+        if (reader.read_u32(offset) != central_dir_header_signature)
+            throw_<byte_stream_error>(
+                "The central directory of the zip archive is corrupt; the entry {} has an invalid signature.", i);
+
+        std::uint16_t method = reader.read_u16(offset + 10);
+
+        std::uint64_t compressed_size = reader.read_u32(offset + 20);
+        std::uint64_t size            = reader.read_u32(offset + 24);
+
+        std::uint16_t name_size    = reader.read_u16(offset + 28);
+        std::uint16_t extra_size   = reader.read_u16(offset + 30);
+        std::uint16_t comment_size = reader.read_u16(offset + 32);
+
+        std::uint64_t local_header_offset = reader.read_u32(offset + 42);
+
+        // The 64-bit values of the saturated fields are stored, in order, in
+        // the ZIP64 extended information extra field.
+        std::size_t extra_offset = offset + central_dir_header_size + name_size;
+        std::size_t extra_end = extra_offset + extra_size;
+
+        while (extra_offset + 4 <= extra_end) {
+            std::uint16_t field_id   = reader.read_u16(extra_offset);
+            std::uint16_t field_size = reader.read_u16(extra_offset + 2);
+
+            if (field_id == zip64_extra_field_id) {
+                std::size_t field_offset = extra_offset + 4;
+
+                if (size == 0xffffffff) {
+                    size = reader.read_u64(field_offset);
+
+                    field_offset += 8;
+                }
+
+                if (compressed_size == 0xffffffff) {
+                    compressed_size = reader.read_u64(field_offset);
+
+                    field_offset += 8;
+                }
+
+                if (local_header_offset == 0xffffffff)
+                    local_header_offset = reader.read_u64(field_offset);
+
+                break;
+            }
+
+            extra_offset += 4 + field_size;
+        }
+
+        entries_.push_back(zip_entry{
+            static_cast<std::size_t>(local_header_offset),
+            static_cast<std::size_t>(compressed_size),
+            static_cast<std::size_t>(size),
+            method == stored_method});
+
+        offset += central_dir_header_size + name_size + extra_size + comment_size;
+    }
+}
+
+void
+zip_file_data_source::fill_read_ahead()
+{
+    // Keep the next `num_parallel_calls_` entries in flight.
+    std::size_t idx = num_files_read_ + read_ahead_.size();
+
+    for (; read_ahead_.size() < num_parallel_calls_ && idx < entries_.size(); ++idx) {
+        auto task = std::make_shared<std::packaged_task<memory_block()>>([this, idx]
+        {
+            return read_entry(idx);
+        });
+
+        read_ahead_.push_back(task->get_future());
+
+        pool_->enqueue([task]
+        {
+            (*task)();
+        });
+    }
+}
+
+void
+zip_file_data_source::clear_read_ahead() noexcept
+{
+    // The tasks reference this instance; we have to wait for them before we
+    // discard their results.
+    for (std::future<memory_block> &future : read_ahead_)
+        future.wait();
+
+    read_ahead_.clear();
+}
+
+memory_block
+zip_file_data_source::read_entry(std::size_t idx)
+{
+    const zip_entry &entry = entries_[idx];
+
+    if (entry.stored)
+        return read_stored_entry(entry);
+
+    return read_compressed_entry(idx, entry);
+}
+
+memory_block
+zip_file_data_source::read_stored_entry(const zip_entry &entry)
+{
+    // A stored entry is not compressed; we can return a slice of the memory
+    // mapped archive without copying it.
+    zip_field_reader reader{memory_span{archive_.data(), archive_.size()}};
+
+    std::size_t offset = entry.local_header_offset;
+
+    if (reader.read_u32(offset) != local_file_header_signature)
+        throw_<byte_stream_error>(
+            "The zip archive is corrupt; the local header at offset {} has an invalid signature.", offset);
+
+    std::uint16_t name_size  = reader.read_u16(offset + 26);
+    std::uint16_t extra_size = reader.read_u16(offset + 28);
+
+    offset += local_file_header_size + name_size + extra_size;
+
+    if (offset > archive_.size() || archive_.size() - offset < entry.size)
+        throw_<byte_stream_error>(
+            "The zip archive is truncated; the entry at offset {} is out of bounds.", entry.local_header_offset);
+
+    return archive_.share_slice(offset, entry.size);
+}
+
+memory_block
+zip_file_data_source::read_compressed_entry(std::size_t idx, const zip_entry &entry)
+{
+    zip_reader reader = acquire_reader();
+
+    if (zip_entry_openbyindex(reader.get(), idx) != 0)
+        throw_<byte_stream_error>("The entry {} of the zip archive cannot be opened.", idx);
+
+    writable_memory_block block = allocate_memory(entry.size);
+
+    ssize_t num_bytes_read = zip_entry_noallocread(reader.get(), block.data(), block.size());
+
+    zip_entry_close(reader.get());
+
+    if (num_bytes_read < 0 || static_cast<std::size_t>(num_bytes_read) != entry.size)
+        throw_<byte_stream_error>("The entry {} of the zip archive cannot be decompressed.", idx);
+
+    release_reader(std::move(reader));
+
+    return block;
+}
+
+zip_file_data_source::zip_reader
+zip_file_data_source::acquire_reader()
+{
+    // A zip reader has a single current entry; therefore, each concurrent call
+    // needs its own reader. We open them lazily and reuse them afterwards.
+    {
+        std::unique_lock<std::mutex> reader_lock{reader_mutex_};
+
+        if (!idle_readers_.empty()) {
+            zip_reader reader = std::move(idle_readers_.back());
+
+            idle_readers_.pop_back();
+
+            return reader;
+        }
+    }
+
+    zip_reader reader{zip_open(pathname_.c_str(), ZIP_DEFAULT_COMPRESSION_LEVEL, 'r')};
+    if (reader == nullptr)
+        throw_<byte_stream_error>("The zip archive cannot be opened.");
+
+    return reader;
+}
+
+void
+zip_file_data_source::release_reader(zip_reader &&reader)
+{
+    std::unique_lock<std::mutex> reader_lock{reader_mutex_};
+
+    idle_readers_.push_back(std::move(reader));
 }
 
 void
@@ -96,4 +468,12 @@ zip_file_data_source::throw_read_failure()
         "The data pipeline cannot read from '{}'. See nested exception for details.", pathname_);
 }
 
+inline void
+zip_file_data_source::throw_entry_read_failure(std::size_t idx)
+{
+    // A corrupt entry does not affect the other entries of the archive.
+    throw_data_pipeline_error_with_nested(std::nullopt, /*recoverable=*/true,
+        "The data pipeline cannot read the entry {} of '{}'. See nested exception for details.", idx, pathname_);
+}
+
 }  // namespace fairseq2n::detail
@@ -7,22 +7,53 @@
 #pragma once
 
 #include <cstddef>
+#include <deque>
+#include <future>
 #include <memory>
+#include <mutex>
+#include <optional>
 #include <string>
 #include <utility>
+#include <vector>
 
 #include <zip.h>
 
 #include "fairseq2n/memory.h"
 #include "fairseq2n/span.h"
 #include "fairseq2n/data/data_source.h"
+#include "fairseq2n/data/detail/thread_pool.h"
 
 namespace fairseq2n::detail {
 
 class zip_file_data_source final : public data_source {
+    struct zip_entry {
+        std::size_t local_header_offset;
+        std::size_t compressed_size;
+        std::size_t size;
+        bool stored;
+    };
+
+    struct zip_deleter {
+        void
+        operator()(zip_t *reader) const noexcept
+        {
+            zip_close(reader);
+        }
+    };
+
+    using zip_reader = std::unique_ptr<zip_t, zip_deleter>;
+
 public:
     explicit
-    zip_file_data_source(std::string &&pathname);
+    zip_file_data_source(std::string &&pathname, std::size_t num_parallel_calls = 1);
+
+    zip_file_data_source(const zip_file_data_source &) = delete;
+    zip_file_data_source &operator=(const zip_file_data_source &) = delete;
+
+    zip_file_data_source(zip_file_data_source &&) = delete;
+    zip_file_data_source &operator=(zip_file_data_source &&) = delete;
+
+   ~zip_file_data_source() override;
 
     std::optional<data>
     next() override;
@@ -36,9 +67,33 @@ public:
     void
     reload_position(tape &t) override;
 
+    std::size_t
+    skip(std::size_t num_examples) override;
+
 private:
+    void
+    load_central_directory();
+
+    void
+    fill_read_ahead();
+
+    void
+    clear_read_ahead() noexcept;
+
+    memory_block
+    read_entry(std::size_t idx);
+
+    memory_block
+    read_stored_entry(const zip_entry &entry);
+
     memory_block
-    next_line();
+    read_compressed_entry(std::size_t idx, const zip_entry &entry);
+
+    zip_reader
+    acquire_reader();
+
+    void
+    release_reader(zip_reader &&reader);
 
     [[noreturn]] void
     handle_error();
@@ -46,11 +101,19 @@ private:
     [[noreturn]] void
     throw_read_failure();
 
+    [[noreturn]] void
+    throw_entry_read_failure(std::size_t idx);
+
 private:
     std::string pathname_;
-    zip_t* zip_reader_;
-    std::size_t num_entries_;
+    std::size_t num_parallel_calls_;
+    memory_block archive_{};
+    std::vector<zip_entry> entries_{};
     std::size_t num_files_read_ = 0;
+    std::deque<std::future<memory_block>> read_ahead_{};
+    std::mutex reader_mutex_{};
+    std::vector<zip_reader> idle_readers_{};
+    std::unique_ptr<thread_pool> pool_{};
 };
 
 }  // namespace fairseq2n::detail
@@ -25,6 +25,7 @@ from typing_extensions import Self
 from fairseq2 import _DOC_MODE
 from fairseq2.data.typing import PathLike, StringLike
 from fairseq2.memory import MemoryBlock
+from fairseq2.typing import Device
 
 if TYPE_CHECKING or _DOC_MODE:
 
@@ -165,6 +166,67 @@ if TYPE_CHECKING or _DOC_MODE:
         ) -> Self:
             """Combine examples of similar shape into batches."""
 
+        def cache(
+            self,
+            key_selector: str,
+            capacity_bytes: int,
+            spill_dir: Optional[PathLike] = None,
+        ) -> Self:
+            """Memoize the outputs of the preceding :meth:`map` call.
+
+            The function of the preceding ``map`` call is only invoked for
+            examples whose key has not been seen before; otherwise, the cached
+            output is returned. Since the cache is kept across :meth:`reset`
+            calls, subsequent epochs skip the function entirely if the cache is
+            large enough to hold all outputs.
+
+            Note that the cached outputs are shared; the tensors returned by the
+            pipeline must not be modified in-place. The function should also be
+            deterministic, as its output is computed only once per key.
+
+            :param key_selector:
+                The column of the input of the ``map`` call to use as the cache
+                key. The selected element(s) must be of type ``str`` or ``int``.
+                See :ref:`reference/data:column syntax` for more details.
+            :param capacity_bytes:
+                The maximum total size, in bytes, of the outputs held in memory.
+                The least-recently-used outputs are evicted first.
+            :param spill_dir:
+                If not ``None``, evicted outputs are written to an anonymous
+                file under this directory instead of being dropped. Outputs
+                holding Python objects or non-CPU tensors are never spilled.
+            """
+
+        def dynamic_bucket(
+            self,
+            max_num_tokens: int,
+            max_num_examples: Optional[int] = None,
+            sort_pool_size: int = 1,
+            selector: Optional[str] = None,
+            drop_remainder: bool = False,
+        ) -> Self:
+            """Combine examples into batches whose padded size stays within a
+            token budget.
+
+            Examples are read, ``sort_pool_size`` at a time, into a pool that is
+            sorted by length. Batches are then taken from the shortest examples
+            of the pool such that the number of examples times the length of
+            the longest example does not exceed ``max_num_tokens``.
+
+            :param max_num_tokens:
+                The maximum number of tokens, including padding, in a batch.
+            :param max_num_examples:
+                The maximum number of examples in a batch.
+            :param sort_pool_size:
+                The number of examples to read into the pool before sorting it.
+                A larger pool reduces padding at the cost of memory.
+            :param selector:
+                The column to determine the length of the examples. If ``None``,
+                the examples themselves are used.
+            :param drop_remainder:
+                If ``True``, drops the last batch if it is not full.
+            """
+
         def collate(
             self,
             pad_idx: Optional[int] = None,
@@ -190,6 +252,10 @@ if TYPE_CHECKING or _DOC_MODE:
             fn: Union[Callable[[Any], Any], Sequence[Callable[[Any], Any]]],
             selector: Optional[str] = None,
             num_parallel_calls: int = 1,
+            streaming: bool = False,
+            preserve_order: bool = True,
+            executor: str = "thread",
+            num_workers: Optional[int] = None,
         ) -> Self:
             """Apply ``fn`` to each example.
 
@@ -216,6 +282,28 @@ if TYPE_CHECKING or _DOC_MODE:
                 See :ref:`reference/data:column syntax` for more details.
             :param num_parallel_calls:
                 The number of examples to process in parallel.
+            :param streaming:
+                If ``True``, keeps up to ``num_parallel_calls`` examples in
+                flight on a persistent pool of worker threads and yields each
+                result as soon as it is ready, instead of processing examples
+                in lock-step batches of ``num_parallel_calls``. A single slow
+                example therefore does not stall the others. If a call that
+                has not been read yet has failed, :meth:`state_dict` raises its
+                error instead of recording the example as skipped.
+            :param preserve_order:
+                If ``False``, yields examples in the order they complete rather
+                than in the order they were read. Can only be ``False`` when
+                ``streaming`` is ``True``.
+            :param executor:
+                If 'thread', calls ``fn`` on the threads of the data pipeline.
+                If 'process', calls ``fn`` in a pool of ``num_workers`` worker
+                processes, which avoids contention on the GIL for pure-Python
+                functions. In this case ``fn`` must be picklable, the op always
+                runs in streaming mode, and tensors and memory blocks are sent
+                to and from the workers through shared memory.
+            :param num_workers:
+                The number of worker processes if ``executor`` is 'process'. If
+                ``None``, defaults to ``num_parallel_calls``.
             """
 
         def prefetch(self, num_examples: int) -> Self:
@@ -261,6 +349,24 @@ if TYPE_CHECKING or _DOC_MODE:
         def take(self, num_examples: int) -> Self:
             """Return at most ``num_examples`` examples."""
 
+        def to_device(self, device: Device, num_buffers: int = 2) -> Self:
+            """Move the tensors of examples to ``device`` in a background thread.
+
+            Unlike calling ``.to(device)`` on each example in :meth:`map`, the
+            transfer of the next examples overlaps with the processing of the
+            current one. On CUDA, CPU tensors are pinned and copied on a side
+            stream; the examples are returned only after their transfer is
+            complete.
+
+            This operator is typically used right after :meth:`collate` so that
+            each batch is copied with a single transfer per tensor.
+
+            :param device:
+                The device to move the tensors to.
+            :param num_buffers:
+                The number of examples to transfer ahead of time.
+            """
+
         def yield_from(self, fn: Callable[[Any], DataPipeline]) -> Self:
             """
             Map every example to a data pipeline and yield the examples returned
@@ -297,8 +403,44 @@ if TYPE_CHECKING or _DOC_MODE:
             The sequence to read.
         """
 
-    def read_zipped_records(pathname: PathLike) -> DataPipelineBuilder:
-        """Read each file in a zip archive"""
+    def read_indexed_shard(
+        pathname: PathLike, shuffle: bool = False
+    ) -> DataPipelineBuilder:
+        """Read the examples of an indexed shard written by
+        :class:`IndexedShardWriter`.
+
+        The shard is memory mapped and each example is returned as a dictionary
+        of tensors that refer directly to the mapped memory. The shard is
+        mapped copy-on-write; modifying a tensor in-place copies the affected
+        pages and never changes the file. Since
+        the shard has an index, skipping examples and restoring the state of
+        the pipeline do not require reading the preceding examples.
+
+        :param pathname:
+            The path to the shard.
+        :param shuffle:
+            If ``True``, reads the examples in a random order that changes with
+            each epoch.
+        """
+        ...
+
+    def read_zipped_records(
+        pathname: PathLike, num_parallel_calls: int = 1
+    ) -> DataPipelineBuilder:
+        """Read each file in a zip archive.
+
+        The entries are located through the central directory of the archive;
+        therefore, restoring the state of the pipeline does not require reading
+        the preceding entries. Stored (i.e. uncompressed) entries are returned
+        as slices of the memory mapped archive without copying. An entry that
+        cannot be read raises a recoverable error; the pipeline continues with
+        the next entry.
+
+        :param pathname:
+            The path to the zip archive.
+        :param num_parallel_calls:
+            The number of entries to decompress ahead of time in parallel.
+        """
         ...
 
     class CollateOptionsOverride:
@@ -413,6 +555,29 @@ if TYPE_CHECKING or _DOC_MODE:
             """
             ...
 
+    class IndexedShardWriter:
+        """Writes examples to an indexed shard that can be read with
+        :func:`read_indexed_shard`.
+
+        Each example must be a dictionary of CPU tensors. The columns, data
+        types, and all dimensions but the first one are inferred from the first
+        example; subsequent examples must match them.
+
+        :param pathname:
+            The path to the shard. An existing file is overwritten.
+        """
+
+        def __init__(self, pathname: PathLike) -> None:
+            ...
+
+        def write(self, example: Mapping[str, Tensor]) -> None:
+            """Write ``example`` to the shard."""
+            ...
+
+        def close(self) -> None:
+            """Write the index of the shard and close it."""
+            ...
+
     class ByteStreamError(RuntimeError):
         """Raised when a dataset file can't be read."""
 
@@ -433,11 +598,17 @@ else:
         DataPipelineError as DataPipelineError,
     )
     from fairseq2n.bindings.data.data_pipeline import FileMapper as FileMapper
+    from fairseq2n.bindings.data.data_pipeline import (
+        IndexedShardWriter as IndexedShardWriter,
+    )
     from fairseq2n.bindings.data.data_pipeline import RecordError as RecordError
     from fairseq2n.bindings.data.data_pipeline import (
         get_last_failed_example as get_last_failed_example,
     )
     from fairseq2n.bindings.data.data_pipeline import list_files as list_files
+    from fairseq2n.bindings.data.data_pipeline import (
+        read_indexed_shard as read_indexed_shard,
+    )
     from fairseq2n.bindings.data.data_pipeline import read_sequence as read_sequence
     from fairseq2n.bindings.data.data_pipeline import (
         read_zipped_records as read_zipped_records,
@@ -452,9 +623,11 @@ else:
             DataPipelineBuilder,
             DataPipelineError,
             FileMapper,
+            IndexedShardWriter,
             RecordError,
             get_last_failed_example,
             list_files,
+            read_indexed_shard,
             read_sequence,
             read_zipped_records,
         ]
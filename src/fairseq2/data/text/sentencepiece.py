@@ -9,6 +9,7 @@ from typing import TYPE_CHECKING, List, Optional, Sequence, final
 from torch import Tensor
 
 from fairseq2 import _DOC_MODE
+from fairseq2.data.data_pipeline import SequenceData
 from fairseq2.data.text.text_tokenizer import TextTokenDecoder, TextTokenEncoder
 from fairseq2.data.typing import PathLike, StringLike
 from fairseq2.data.vocabulary_info import VocabularyInfo
@@ -71,6 +72,32 @@ if TYPE_CHECKING or _DOC_MODE:
         def __call__(self, sentence: StringLike) -> Tensor:
             ...
 
+        def encode_batch(
+            self,
+            sentences: Sequence[StringLike],
+            pad_idx: int,
+            pad_to_multiple: int = 1,
+        ) -> SequenceData:
+            """Encode ``sentences`` into a single padded batch.
+
+            The sentences are encoded in parallel and their token indices are
+            written directly into the batch tensor. This is considerably faster
+            than encoding each sentence and collating the results.
+
+            :param sentences:
+                The sentences to encode.
+            :param pad_idx:
+                The index of the PAD symbol.
+            :param pad_to_multiple:
+                The sequence dimension is rounded up to the nearest multiple of
+                the specified value.
+
+            :returns:
+                The encoded sentences in the same format as the output of
+                :class:`~fairseq2.data.Collater`.
+            """
+            ...
+
         @property
         @finaloverride
         def prefix_indices(self) -> Optional[Tensor]:
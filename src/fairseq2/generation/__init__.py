@@ -5,11 +5,20 @@
 # LICENSE file in the root directory of this source tree.
 
 from fairseq2.generation.beam_search import BeamSearch as BeamSearch
+from fairseq2.generation.beam_search import SamplingSearch as SamplingSearch
 from fairseq2.generation.beam_search import StandardBeamSearch as StandardBeamSearch
+from fairseq2.generation.engine import (
+    Seq2SeqGenerationEngine as Seq2SeqGenerationEngine,
+)
 from fairseq2.generation.logits_processor import (
     BannedSequenceLogitsProcessor as BannedSequenceLogitsProcessor,
 )
 from fairseq2.generation.logits_processor import LogitsProcessor as LogitsProcessor
+from fairseq2.generation.sampler import Sampler as Sampler
+from fairseq2.generation.sampler import StandardSampler as StandardSampler
+from fairseq2.generation.sequence_generator import (
+    DecoderOnlyGenerator as DecoderOnlyGenerator,
+)
 from fairseq2.generation.sequence_generator import Hypothesis as Hypothesis
 from fairseq2.generation.sequence_generator import Seq2SeqGenerator as Seq2SeqGenerator
 from fairseq2.generation.sequence_generator import (
@@ -18,6 +27,12 @@ from fairseq2.generation.sequence_generator import (
 from fairseq2.generation.sequence_generator import (
     SequenceGeneratorOutput as SequenceGeneratorOutput,
 )
+from fairseq2.generation.speculative import (
+    SpeculativeDecoderOnlyGenerator as SpeculativeDecoderOnlyGenerator,
+)
+from fairseq2.generation.speculative import (
+    SpeculativeSeq2SeqGenerator as SpeculativeSeq2SeqGenerator,
+)
 from fairseq2.generation.text import SequenceToTextGenerator as SequenceToTextGenerator
 from fairseq2.generation.text import SequenceToTextOutput as SequenceToTextOutput
 from fairseq2.generation.text import TextTranslator as TextTranslator
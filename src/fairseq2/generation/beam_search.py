@@ -5,11 +5,12 @@
 # LICENSE file in the root directory of this source tree.
 
 from abc import ABC, abstractmethod
-from typing import Tuple, final
+from typing import Optional, Tuple, final
 
 import torch
 from torch import Tensor
 
+from fairseq2.generation.sampler import Sampler, StandardSampler, _derive_seeds
 from fairseq2.typing import finaloverride
 
 
@@ -23,7 +24,13 @@ class BeamSearch(ABC):
 
     @abstractmethod
     def step(
-        self, step_nr: int, is_start_step: bool, lprobs: Tensor, scores: Tensor
+        self,
+        step_nr: int,
+        is_start_step: bool,
+        lprobs: Tensor,
+        scores: Tensor,
+        *,
+        seeds: Optional[Tensor] = None,
     ) -> Tuple[Tensor, Tensor, Tensor]:
         """Take a single search step.
 
@@ -43,6 +50,13 @@ class BeamSearch(ABC):
             :math:`(N,B,S)`, where :math:`N` is the batch size, :math:`B` is the
             number of beams, and :math:`S` is the length of the generated
             sequence.
+        :param seeds:
+            The seed of each search for this step. A search algorithm that
+            draws random numbers uses it so that the candidates of a search do
+            not depend on the rest of the batch. The caller is expected to
+            derive a different seed for each step (e.g. from a per-request seed
+            and the step number). *Shape:* :math:`(N)`, where :math:`N` is the
+            batch size.
 
         :returns:
             - The top 2 x beam size scores. *Shape:* :math:`(N,2xB)`, where
@@ -61,7 +75,13 @@ class StandardBeamSearch(BeamSearch):
 
     @finaloverride
     def step(
-        self, step_nr: int, is_start_step: bool, lprobs: Tensor, scores: Tensor
+        self,
+        step_nr: int,
+        is_start_step: bool,
+        lprobs: Tensor,
+        scores: Tensor,
+        *,
+        seeds: Optional[Tensor] = None,
     ) -> Tuple[Tensor, Tensor, Tensor]:
         batch_size, beam_size, vocab_size = lprobs.size()
 
@@ -87,3 +107,92 @@ class StandardBeamSearch(BeamSearch):
 
         # Return scores, beam-relative indices, and beam indices.
         return top_scores, top_indices % vocab_size, top_indices // vocab_size
+
+
+@final
+class SamplingSearch(BeamSearch):
+    """Represents a search algorithm that samples the next step of each beam
+    from its probability distribution instead of taking the most likely
+    candidates."""
+
+    sampler: Sampler
+
+    def __init__(self, sampler: Optional[Sampler] = None) -> None:
+        """
+        :param sampler:
+            The sampler to draw candidates with. If ``None``, draws from the
+            unmodified distribution using :class:`StandardSampler`.
+        """
+        self.sampler = sampler or StandardSampler()
+
+    @finaloverride
+    def step(
+        self,
+        step_nr: int,
+        is_start_step: bool,
+        lprobs: Tensor,
+        scores: Tensor,
+        *,
+        seeds: Optional[Tensor] = None,
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        batch_size, beam_size, vocab_size = lprobs.size()
+
+        if is_start_step:
+            # At the initial step, all hypotheses are equally likely, so we draw
+            # all candidates from the first beam.
+            lprobs = lprobs[:, ::beam_size, :]
+
+            num_samples = 2 * beam_size
+        else:
+            # Otherwise, we draw two candidates per beam. The sequence generator
+            # continues each beam with its first candidate unless it is an EOS.
+            num_samples = 2
+
+        if seeds is None:
+            row_seeds = None
+        else:
+            row_offsets = torch.arange(lprobs.size(1), device=seeds.device)
+
+            # Give each beam of a search its own stream.
+            # (N) -> (N x B)
+            row_seeds = _derive_seeds(seeds.unsqueeze(1), row_offsets).view(-1)
+
+        # (N, B, V) -> (N x B, num_samples)
+        indices = self.sampler(
+            lprobs.reshape(-1, vocab_size), num_samples, seeds=row_seeds
+        )
+
+        if is_start_step:
+            # (N, 1, V) -> (N, 2 x B)
+            top_scores = torch.gather(lprobs.squeeze(1), dim=1, index=indices)
+
+            # The first step always indicates the beginning of the sequence and
+            # has no score.
+            if step_nr > 0:
+                top_scores += scores[:, ::beam_size, step_nr]
+
+            beam_indices = torch.zeros_like(indices)
+        else:
+            # (N x B, 2) -> (N, 2 x B) ordered as [sample 1 of each beam, sample
+            # 2 of each beam].
+            indices = indices.view(batch_size, beam_size, 2).transpose(1, 2)
+
+            indices = indices.reshape(batch_size, -1)
+
+            # (N, B) -> (N, 2 x B)
+            beam_indices = torch.arange(beam_size, device=lprobs.device).repeat(2)
+
+            beam_indices = beam_indices.expand(batch_size, -1)
+
+            # Make scores cumulative for each hypothesis.
+            # (N, B, V) + (N, B, 1) -> (N, B, V)
+            lprobs = lprobs + scores[:, :, step_nr].unsqueeze(-1)
+
+            # (N, B, V) -> (N, B x V)
+            lprobs = lprobs.view(batch_size, -1)
+
+            top_scores = torch.gather(
+                lprobs, dim=1, index=beam_indices * vocab_size + indices
+            )
+
+        return top_scores, indices, beam_indices
@@ -0,0 +1,483 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+import torch
+from torch import Tensor
+from torch.nn.functional import log_softmax
+
+from fairseq2.data import VocabularyInfo
+from fairseq2.generation.beam_search import BeamSearch, StandardBeamSearch
+from fairseq2.generation.sequence_generator import (
+    Hypothesis,
+    SequenceGeneratorOptions,
+    _BeamSearchBatch,
+    _Search,
+)
+from fairseq2.models.encoder_decoder import EncoderDecoderModel
+from fairseq2.nn.ops import repeat_interleave
+from fairseq2.nn.padding import PaddingMask, pad_seqs
+from fairseq2.nn.utils.module import infer_device
+
+
+class Seq2SeqGenerationEngine:
+    """Generates sequences with continuous (a.k.a. in-flight) batching.
+
+    Unlike :class:`Seq2SeqGenerator`, which runs a static batch to completion,
+    the engine admits pending requests into the running batch at every step and
+    evicts requests as soon as they are finished. The sequences in the running
+    batch are therefore at different steps; see
+    :attr:`IncrementalStateBag.seq_steps`.
+
+    The engine can be driven either synchronously via :meth:`submit`,
+    :meth:`step`, and :meth:`poll`, or from an :mod:`asyncio` serving loop via
+    :meth:`generate`. It is not thread-safe.
+
+    .. note::
+        The model must use attention states that support
+        :meth:`~fairseq2.nn.incremental_state.IncrementalState.extend` (e.g.
+        the default full and static attention states).
+    """
+
+    model: EncoderDecoderModel
+    opts: SequenceGeneratorOptions
+    max_num_requests: int
+    beam_size: int
+    unk_idx: Optional[int]
+    eos_idx: int
+    pad_idx: int
+    prefix_seq: Tensor
+    search: BeamSearch
+
+    _next_request_id: int
+    _pending_requests: Deque["_Request"]
+    _batch: Optional[_BeamSearchBatch]
+    _finished_requests: List[Tuple[int, List[Hypothesis]]]
+    _futures: Dict[int, "asyncio.Future[List[Hypothesis]]"]
+    _runner: Optional["asyncio.Task[None]"]
+
+    def __init__(
+        self,
+        model: EncoderDecoderModel,
+        vocab_info: VocabularyInfo,
+        prefix_seq: Optional[Union[int, Tensor]],
+        opts: Optional[SequenceGeneratorOptions] = None,
+        *,
+        max_num_requests: int = 32,
+    ) -> None:
+        """
+        :param model:
+            The encoder-decoder model to use.
+        :param vocab_info:
+            The vocabulary information to use.
+        :param prefix_seq:
+            The prefix sequence, typically one or more control symbols
+            indicating the beginning of a sequence. *Shape:* :math:`()` or
+            :math:`(S)`, where :math:`S` is the sequence length. If ``None``,
+            the EOS symbol will be used as prefix.
+        :param opts:
+            The generation options. ``logits_processor`` and
+            ``compaction_interval`` are not supported.
+        :param max_num_requests:
+            The maximum number of requests to decode concurrently. Pending
+            requests are admitted as soon as running ones finish.
+        """
+        model.eval()
+
+        self.model = model
+
+        self.opts = opts or SequenceGeneratorOptions()
+
+        if self.opts.logits_processor is not None:
+            raise ValueError(
+                "`opts.logits_processor` is not supported by `Seq2SeqGenerationEngine`."
+            )
+
+        if self.opts.compaction_interval is not None:
+            raise ValueError(
+                "`opts.compaction_interval` is not supported by `Seq2SeqGenerationEngine`."
+            )
+
+        if max_num_requests <= 0:
+            raise ValueError(
+                f"`max_num_requests` must be greater than 0, but is {max_num_requests} instead."
+            )
+
+        self.max_num_requests = max_num_requests
+
+        # Set beam size. -1 since we never select PAD.
+        self.beam_size = min(self.opts.beam_size, vocab_info.size - 1)
+
+        if vocab_info.eos_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `eos_idx` set for sequence generation."
+            )
+
+        if vocab_info.pad_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `pad_idx` set for sequence generation."
+            )
+
+        # Set vocab info.
+        self.unk_idx = vocab_info.unk_idx
+        self.eos_idx = vocab_info.eos_idx
+        self.pad_idx = vocab_info.pad_idx
+
+        device = infer_device(model)
+
+        # Set prefix sequence.
+        if prefix_seq is None:
+            # If `None`, we follow fairseq's convention, and use EOS as the
+            # prefix.
+            prefix_seq = self.eos_idx
+
+        if isinstance(prefix_seq, Tensor):
+            if prefix_seq.dim() >= 2:
+                raise ValueError(
+                    f"`prefix_seq` must be a scalar or a 1-dimensional tensor, but is {prefix_seq.dim()}-dimensional instead."
+                )
+
+            self.prefix_seq = prefix_seq.to(device).view(-1)
+        else:
+            self.prefix_seq = torch.tensor([prefix_seq], device=device)
+
+        # Set beam search.
+        self.search = self.opts.search or StandardBeamSearch()
+
+        self._next_request_id = 0
+
+        self._pending_requests = deque()
+
+        # The running batch; shared by all admitted requests.
+        self._batch = None
+
+        self._finished_requests = []
+
+        self._futures = {}
+
+        self._runner = None
+
+    def submit(self, source_seq: Tensor) -> int:
+        """Submit a source sequence for generation.
+
+        :param source_seq:
+            The source sequence. *Shape:* :math:`(S,*)`, where :math:`S` is the
+            sequence length and :math:`*` is any number of sequence-specific
+            dimensions including none.
+
+        :returns:
+            The id of the request to match against the output of :meth:`poll`.
+        """
+        max_seq_len = self._determine_max_seq_len(source_seq.size(0))
+
+        request_id = self._next_request_id
+
+        self._next_request_id += 1
+
+        self._pending_requests.append(_Request(request_id, source_seq, max_seq_len))
+
+        return request_id
+
+    def poll(self) -> List[Tuple[int, List[Hypothesis]]]:
+        """Return the requests that have finished since the last call.
+
+        Requests submitted via :meth:`generate` are not returned.
+
+        :returns:
+            The id of each finished request along with its hypotheses ordered
+            by score.
+        """
+        finished_requests, self._finished_requests = self._finished_requests, []
+
+        return finished_requests
+
+    @property
+    def is_idle(self) -> bool:
+        """``True`` if the engine has no pending or running requests."""
+        return not self._pending_requests and self._batch is None
+
+    async def generate(self, source_seq: Tensor) -> List[Hypothesis]:
+        """Submit ``source_seq`` and wait for its hypotheses.
+
+        The engine is stepped in a background task of the running event loop
+        for as long as there is work to do. Since a step runs synchronously,
+        it blocks the event loop for its duration. If the call is cancelled,
+        its request is removed from the engine. If a step fails, all requests
+        are dropped, and the pending calls raise the error.
+
+        :param source_seq:
+            The source sequence. *Shape:* :math:`(S,*)`, where :math:`S` is the
+            sequence length and :math:`*` is any number of sequence-specific
+            dimensions including none.
+
+        :returns:
+            The hypotheses ordered by score.
+        """
+        loop = asyncio.get_running_loop()
+
+        request_id = self.submit(source_seq)
+
+        future: "asyncio.Future[List[Hypothesis]]" = loop.create_future()
+
+        def cancel_request(f: "asyncio.Future[List[Hypothesis]]") -> None:
+            if f.cancelled():
+                self._cancel_request(request_id)
+
+        future.add_done_callback(cancel_request)
+
+        self._futures[request_id] = future
+
+        if self._runner is None or self._runner.done():
+            self._runner = loop.create_task(self._run())
+
+        return await future
+
+    async def _run(self) -> None:
+        try:
+            while not self.is_idle:
+                self.step()
+
+                # Give other coroutines the chance to submit requests.
+                await asyncio.sleep(0)
+        except Exception as ex:
+            # Nobody awaits this task, so instead of raising the error, we pass
+            # it to the waiting requests.
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ex)
+
+            self._futures.clear()
+
+            # The running batch is in an undefined state.
+            self._pending_requests.clear()
+
+            self._batch = None
+
+    @torch.inference_mode()
+    def step(self) -> None:
+        """Run a single decoding step.
+
+        Admits as many pending requests as there are free slots, advances all
+        running requests by one step, and evicts the ones that are finished.
+        """
+        lprobs_list = []
+
+        # Advance the running requests.
+        if self._batch is not None:
+            lprobs_list.append(self._batch.decode())
+
+            num_active_requests = len(self._batch.searches)
+        else:
+            num_active_requests = 0
+
+        # Admit new requests into the free slots.
+        num_free_slots = self.max_num_requests - num_active_requests
+
+        if num_free_slots > 0 and self._pending_requests:
+            new_requests: List[_Request] = []
+
+            while self._pending_requests and len(new_requests) < num_free_slots:
+                new_requests.append(self._pending_requests.popleft())
+
+            new_batch, lprobs = self._admit_requests(new_requests)
+
+            # The new requests start their search in this step along with the
+            # next step of the running ones.
+            if self._batch is None:
+                self._batch = new_batch
+            else:
+                self._batch.extend(new_batch)
+
+            lprobs_list.append(lprobs)
+
+        if self._batch is None:
+            return
+
+        # (R x B, V)
+        lprobs = torch.cat(lprobs_list)
+
+        finished_requests = self._batch.advance(lprobs)
+
+        if not self._batch.searches:
+            self._batch = None
+
+        for request_id, hypotheses in finished_requests:
+            self._finish_request(request_id, hypotheses)
+
+    def _admit_requests(
+        self, requests: List["_Request"]
+    ) -> Tuple[_BeamSearchBatch, Tensor]:
+        beam_size = self.beam_size
+
+        num_requests = len(requests)
+
+        device = self.prefix_seq.device
+
+        source_seqs, source_padding_mask = pad_seqs(
+            [r.source_seq.to(device) for r in requests], self.pad_idx
+        )
+
+        encoder_output, encoder_padding_mask = self.model.encode(
+            source_seqs, source_padding_mask
+        )
+
+        prefix_seq_len = self.prefix_seq.size(0)
+
+        # Fan out the encoder output to `beam_size`.
+        # (N_new) -> (N_new x B)
+        fan_out_indices = repeat_interleave(
+            torch.arange(num_requests, device=device), dim=0, repeat=beam_size
+        )
+
+        if encoder_padding_mask is None:
+            batch_encoder_padding_mask = None
+        else:
+            seq_lens = encoder_padding_mask.seq_lens.index_select(0, fan_out_indices)
+
+            batch_encoder_padding_mask = PaddingMask(
+                seq_lens, batch_seq_len=encoder_output.size(1)
+            )
+
+        # The first step of the prefix is always 0, so it is not scored.
+        searches = [
+            _Search(
+                r.request_id,
+                pad_len=0,
+                prompt_len=prefix_seq_len,
+                max_seq_len=r.max_seq_len,
+                num_unscored_steps=1,
+            )
+            for r in requests
+        ]
+
+        batch = _BeamSearchBatch(
+            self.model,
+            self.search,
+            self.opts,
+            beam_size,
+            self.eos_idx,
+            self.pad_idx,
+            self.unk_idx,
+            searches,
+            buffer_len=max(r.max_seq_len for r in requests),
+            start_step=prefix_seq_len - 1,
+            device=device,
+            max_num_steps=self.opts.hard_max_seq_len,
+            encoder_output=encoder_output.index_select(0, fan_out_indices),
+            encoder_padding_mask=batch_encoder_padding_mask,
+        )
+
+        state_bag = batch.state_bag
+
+        # Bootstrap the new requests with the prefix sequence in their own bag.
+        # Unlike `Seq2SeqGenerator`, we feed the last step of the prefix as well
+        # since it gives us the scores of the first step.
+        # (S_pfx) -> (N_new, S_pfx)
+        decoder_input = self.prefix_seq.expand(num_requests, -1)
+
+        decoder_output, decoder_padding_mask = self.model.decode(
+            decoder_input,
+            None,
+            encoder_output,
+            encoder_padding_mask,
+            state_bag=state_bag,
+        )
+
+        state_bag.increment_step(prefix_seq_len)
+
+        # New requests join the running batch through `extend()`.
+        if not state_bag.supports_extend():
+            raise ValueError(
+                "The incremental states of `model` must support `extend()` for continuous batching (e.g. the default full and static attention states)."
+            )
+
+        model_output = self.model.project(decoder_output, decoder_padding_mask)
+
+        # (N_new, S_pfx, V)
+        lprobs = log_softmax(model_output.logits, dim=-1, dtype=torch.float32)
+
+        # Fan out everything to `beam_size`; once for the whole prefix instead
+        # of running the bootstrap on `beam_size` identical copies.
+        state_bag.reorder(fan_out_indices)
+
+        state_bag.seq_steps = torch.full(
+            (num_requests * beam_size,), prefix_seq_len, device=device
+        )
+
+        # (N_new, S_pfx, V) -> (N_new x B, S_pfx, V)
+        lprobs = lprobs.index_select(0, fan_out_indices)
+
+        batch.seqs[:, :prefix_seq_len] = self.prefix_seq
+
+        if prefix_seq_len > 1:
+            # (S_pfx) -> (N_new x B, S_pfx - 1, 1)
+            indices = self.prefix_seq[1:].view(1, -1, 1).expand(lprobs.size(0), -1, -1)
+
+            # Fetch scores of the prefix steps.
+            # (N_new x B, S_pfx - 1, 1)
+            prefix_scores = torch.gather(lprobs[:, :-1], dim=-1, index=indices)
+
+            # (N_new x B, S_pfx - 1, 1) -> (N_new x B, S_pfx - 1)
+            prefix_scores.squeeze_(-1).cumsum_(dim=-1)
+
+            # First step (e.g. EOS)'s score is always 0.
+            batch.scores[:, 1:prefix_seq_len] = prefix_scores
+
+        # (N_new x B, S_pfx, V) -> (N_new x B, V)
+        return batch, lprobs[:, -1]
+
+    def _finish_request(self, request_id: int, hypotheses: List[Hypothesis]) -> None:
+        future = self._futures.pop(request_id, None)
+        if future is None:
+            self._finished_requests.append((request_id, hypotheses))
+        elif not future.done():
+            future.set_result(hypotheses)
+
+    def _cancel_request(self, request_id: int) -> None:
+        self._futures.pop(request_id, None)
+
+        for request in self._pending_requests:
+            if request.request_id == request_id:
+                self._pending_requests.remove(request)
+
+                return
+
+        if self._batch is not None and self._batch.remove(request_id):
+            if not self._batch.searches:
+                self._batch = None
+
+    def _determine_max_seq_len(self, source_seq_len: int) -> int:
+        opts = self.opts
+
+        if opts.soft_max_seq_len is None:
+            max_seq_len = opts.hard_max_seq_len
+        else:
+            at, bt = opts.soft_max_seq_len
+
+            max_seq_len = min(opts.hard_max_seq_len, int(at * source_seq_len + bt))
+
+        if opts.min_seq_len > max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than or equal to `min_seq_len` ({opts.min_seq_len}), but is {max_seq_len} instead. Adjust your soft and hard maximum sequence length limits."
+            )
+
+        if (prefix_seq_len := self.prefix_seq.size(0)) >= max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than `prefix_seq_len` ({prefix_seq_len}), but is {max_seq_len} instead."
+            )
+
+        return max_seq_len
+
+
+@dataclass
+class _Request:
+    request_id: int
+    source_seq: Tensor
+    max_seq_len: int
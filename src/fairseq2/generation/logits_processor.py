@@ -6,7 +6,8 @@
 
 
 from abc import ABC, abstractmethod
-from typing import List, Optional, Sequence, Tuple
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import torch
 from torch import Tensor
@@ -38,16 +39,18 @@ class LogitsProcessor(ABC):
 
 
 class BannedSequenceLogitsProcessor(LogitsProcessor):
-    """Processor used to penalize scores of multiple banned sequences of words."""
-
-    banned_tokens: Tensor
-    """Vector of shape (nb_banned_sequences, 1) containing last token of each sequence to ban."""
-
-    banned_prefix: Tensor
-    """Matrix of shape (nb_banned_sequences, max_banned_tokens_len - 1) padded with 0s on the left."""
-
-    banned_prefix_mask: Tensor
-    """mask of 0s and 1s based on each banned token sequence and max prefix len."""
+    """Processor used to penalize scores of multiple banned sequences of words.
+
+    The banned sequences are compiled once into a trie of their reversed
+    prefixes. At each step, the last steps of each beam are walked down the
+    trie, starting with the most recent one, so that the node reached after
+    ``i + 1`` steps tells whether the last ``i + 1`` steps form a banned prefix.
+    The walk advances all beams by one step at a time, and the tokens that would
+    complete a banned sequence are masked with a single scatter. The cost of a
+    step depends on the length of the longest banned sequence, but only
+    logarithmically on the number of banned sequences, and the processor never
+    synchronizes with the host.
+    """
 
     max_prefix_len: int
     """length of biggest banned sequence - 1."""
@@ -58,6 +61,13 @@ class BannedSequenceLogitsProcessor(LogitsProcessor):
     device: Device
     """device used for all inner tensors."""
 
+    _banned_tokens: Tensor
+    _token_radix: int
+    _edge_keys: Tensor
+    _edge_children: Tensor
+    _node_token_rows: Tensor
+    _next_tokens: Tensor
+
     def __init__(self, banned_seqs: List[Tensor], pad_idx: int, device: Device) -> None:
         """
         :param banned_seqs:
@@ -73,63 +83,163 @@ class BannedSequenceLogitsProcessor(LogitsProcessor):
             raise ValueError(
                 "`banned_seqs` should contain only one dimensional tensors."
             )
+        if any([len(t) == 0 for t in banned_seqs]):
+            raise ValueError("`banned_seqs` should not contain empty sequences.")
 
         self.pad_idx = pad_idx
         self.device = device
 
         self.max_prefix_len = max([len(t) - 1 for t in banned_seqs])
-        self.banned_prefix = self._create_pad_tensor(
-            size=(len(banned_seqs), self.max_prefix_len)
+
+        # Group the last tokens of the banned sequences by their prefix.
+        next_tokens: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+
+        for seq in banned_seqs:
+            *prefix, token = seq.tolist()
+
+            next_tokens[tuple(prefix)].append(token)
+
+        # Single-token sequences are banned at every step.
+        self._banned_tokens = torch.tensor(
+            next_tokens.pop((), []), device=device, dtype=torch.int64
+        )
+
+        # An edge of the trie is keyed by `parent * radix + token`, which is
+        # exact; unlike a hash, two different edges can never share a key. The
+        # root is node 0.
+        self._token_radix = max(max(p) for p in next_tokens) + 1 if next_tokens else 1
+
+        edges: Dict[Tuple[int, int], int] = {}
+
+        # The row of `next_tokens` holding the tokens banned after each node, or
+        # -1 if the node does not end a banned prefix.
+        node_token_rows = [-1]
+
+        for row, banned_prefix in enumerate(next_tokens):
+            node = 0
+
+            for token in reversed(banned_prefix):
+                child = edges.get((node, token))
+                if child is None:
+                    child = edges[(node, token)] = len(node_token_rows)
+
+                    node_token_rows.append(-1)
+
+                node = child
+
+            node_token_rows[node] = row
+
+        # Sort the edges by key for `torch.searchsorted()`.
+        edge_keys = torch.tensor(
+            [parent * self._token_radix + token for parent, token in edges],
+            device=device,
+            dtype=torch.int64,
+        )
+
+        edge_children = torch.tensor(
+            list(edges.values()), device=device, dtype=torch.int64
         )
-        self.banned_tokens = torch.empty(
-            size=(len(banned_seqs), 1), dtype=torch.int64, device=self.device
+
+        self._edge_keys, order = torch.sort(edge_keys)
+
+        self._edge_children = edge_children[order]
+
+        self._node_token_rows = torch.tensor(
+            node_token_rows, device=device, dtype=torch.int64
         )
-        for i, seq in enumerate(banned_seqs):
-            if (len(seq)) > 1:
-                self.banned_prefix[i, -len(seq) + 1 :] = seq[:-1]
-            self.banned_tokens[i] = seq[-1]
 
-        self.banned_prefix_mask = torch.where(
-            self.banned_prefix == self.pad_idx, 0, 1
-        ).to(device=self.device)
+        max_num_next_tokens = max((len(t) for t in next_tokens.values()), default=1)
+
+        # Pad the token lists by repeating their first token; scattering the same
+        # token twice is harmless.
+        # (P, F)
+        self._next_tokens = torch.tensor(
+            [t + t[:1] * (max_num_next_tokens - len(t)) for t in next_tokens.values()],
+            device=device,
+            dtype=torch.int64,
+        ).view(len(next_tokens), max_num_next_tokens)
 
     def __call__(self, seqs: Tensor, lprobs: Tensor) -> None:
-        """Apply score penalty of banend tokens inplace"""
-        seqs = self._pad_left_short_sequence(seqs)
-
-        if self.max_prefix_len == 0:
-            lprobs[:, :, self.banned_tokens] = -torch.inf
-        else:
-            prefix_diff = (
-                seqs[:, :, -self.max_prefix_len :].unsqueeze(2)
-                * self.banned_prefix_mask
-                - self.banned_prefix
-            )
-            batch_idx, beam_idx, match_idx = (prefix_diff.sum(dim=-1) == 0).nonzero(
-                as_tuple=True
+        """Apply score penalty of banned tokens inplace"""
+        if self._banned_tokens.numel() > 0:
+            lprobs[:, :, self._banned_tokens] = -torch.inf
+
+        num_edges = self._edge_keys.size(0)
+
+        # We can only match prefixes that are not longer than the sequences.
+        max_prefix_len = min(self.max_prefix_len, seqs.size(2))
+
+        if num_edges == 0 or max_prefix_len == 0:
+            return
+
+        radix = self._token_radix
+
+        # The last steps of each beam, starting with the most recent one.
+        # (N, B, S) -> (N, B, L)
+        reversed_steps = seqs[:, :, -max_prefix_len:].flip(-1)
+
+        # Tokens that do not occur in any banned prefix cannot extend a match.
+        valid_step_mask = (reversed_steps >= 0) & (reversed_steps < radix)
+
+        # (N, B)
+        node = torch.zeros(seqs.shape[:2], device=seqs.device, dtype=torch.int64)
+
+        nodes = []
+
+        # Walk down the trie; the node reached after `i + 1` steps matches the
+        # last `i + 1` steps of the beam exactly. A beam that leaves the trie
+        # stays at -1.
+        for i in range(max_prefix_len):
+            # (N, B)
+            keys = torch.where(
+                valid_step_mask[:, :, i] & (node >= 0),
+                node * radix + reversed_steps[:, :, i],
+                -1,
             )
-            if len(batch_idx) > 0:
-                lprobs[batch_idx, beam_idx, self.banned_tokens[match_idx]] = -torch.inf
-
-    def _pad_left_short_sequence(self, tokens: Tensor) -> Tensor:
-        batch_size, beam_size, seq_len = tokens.shape
-        if seq_len < self.max_prefix_len:
-            tmp = self._create_pad_tensor(
-                size=(batch_size, beam_size, self.max_prefix_len)
+
+            # (N, B)
+            edge_indices = torch.searchsorted(self._edge_keys, keys)
+
+            edge_indices.clamp_(max=num_edges - 1)
+
+            node = torch.where(
+                self._edge_keys[edge_indices] == keys,
+                self._edge_children[edge_indices],
+                -1,
             )
-            tmp[:, :, -seq_len:] = tokens
-            tokens = tmp
 
-        return tokens
+            nodes.append(node)
 
-    def _create_pad_tensor(self, size: Tuple[int, ...]) -> Tensor:
-        return torch.full(
-            size=size,
-            fill_value=self.pad_idx,
-            dtype=torch.int64,
-            device=self.device,
+        # The root never ends a banned prefix, so beams that left the trie can
+        # be pointed to it.
+        # (N, B) -> (N, B, L)
+        token_rows = self._node_token_rows[torch.stack(nodes, dim=-1).clamp(min=0)]
+
+        # (N, B, L)
+        match_mask = token_rows >= 0
+
+        vocab_size = lprobs.size(-1)
+
+        # Point the tokens of unmatched prefixes to an extra, discarded entry.
+        # (N, B, L) -> (N, B, L, F)
+        next_tokens = torch.where(
+            match_mask.unsqueeze(-1),
+            self._next_tokens[token_rows.clamp(min=0)],
+            vocab_size,
+        )
+
+        # (N, B, V + 1)
+        banned_mask = torch.zeros(
+            lprobs.shape[:-1] + (vocab_size + 1,),
+            device=lprobs.device,
+            dtype=torch.bool,
         )
 
+        # (N, B, L, F) -> (N, B, L x F)
+        banned_mask.scatter_(-1, next_tokens.flatten(2), True)
+
+        lprobs.masked_fill_(banned_mask[:, :, :vocab_size], -torch.inf)
+
     # This is not the best place but the whole file needs a refactoring
     # We need target decoder to create this tensor
     @staticmethod
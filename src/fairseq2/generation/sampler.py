@@ -0,0 +1,264 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple, Union, final
+
+import torch
+from torch import Generator, Tensor
+
+from fairseq2.typing import finaloverride
+
+
+class Sampler(ABC):
+    """Represents a sampling algorithm that draws the next step of sequences
+    from their probability distributions."""
+
+    generator: Optional[Generator] = None
+    """The random number generator to use when no per-sequence seeds are
+    specified. If ``None``, the default generator of PyTorch is used. Callers
+    that draw additional random numbers for the sampled steps (e.g. speculative
+    decoding) use it as well."""
+
+    def __call__(
+        self, lprobs: Tensor, num_samples: int, *, seeds: Optional[Tensor] = None
+    ) -> Tensor:
+        """
+        :param lprobs:
+            The next-step log probability of each vocabulary entry. *Shape:*
+            :math:`(N,V)`, where :math:`N` is the batch size and :math:`V` is
+            the size of the vocabulary.
+        :param num_samples:
+            The number of samples to draw, with replacement, for each sequence.
+        :param seeds:
+            The seed of the random number stream of each sequence. If not
+            ``None``, the samples of a sequence depend only on its seed and
+            probability distribution, but not on the rest of the batch. The
+            caller is expected to derive a different seed for each step (e.g.
+            from a per-request seed and the step number). *Shape:* :math:`(N)`,
+            where :math:`N` is the batch size.
+
+        :returns:
+            The indices of the sampled vocabulary entries. *Shape:*
+            :math:`(N,S)`, where :math:`N` is the batch size and :math:`S` is
+            the number of samples.
+        """
+        return self.sample(self.probs(lprobs), num_samples, seeds=seeds)
+
+    @abstractmethod
+    def probs(self, lprobs: Tensor) -> Tensor:
+        """Return the distributions that the sampler draws from.
+
+        :param lprobs:
+            The next-step log probability of each vocabulary entry. *Shape:*
+            :math:`(N,V)`, where :math:`N` is the batch size and :math:`V` is
+            the size of the vocabulary.
+
+        :returns:
+            The probability of each vocabulary entry, after any modification
+            (e.g. temperature scaling) applied by the sampler. *Shape:* Same as
+            ``lprobs``.
+        """
+
+    @abstractmethod
+    def sample(
+        self, probs: Tensor, num_samples: int, *, seeds: Optional[Tensor] = None
+    ) -> Tensor:
+        """Draw samples from ``probs`` as is.
+
+        :param probs:
+            The probability of each vocabulary entry. Does not have to be
+            normalized. *Shape:* :math:`(N,V)`, where :math:`N` is the batch
+            size and :math:`V` is the size of the vocabulary.
+        :param num_samples:
+            The number of samples to draw, with replacement, for each sequence.
+        :param seeds:
+            See :meth:`__call__`.
+
+        :returns:
+            The indices of the sampled vocabulary entries. *Shape:*
+            :math:`(N,S)`, where :math:`N` is the batch size and :math:`S` is
+            the number of samples.
+        """
+
+
+@final
+class StandardSampler(Sampler):
+    """Samples from probability distributions after applying temperature
+    scaling and optional top-k, top-p (nucleus), and min-p filtering.
+
+    All operations are batched; the filters are applied in the order of
+    temperature, top-k, top-p, and min-p.
+    """
+
+    temperature: float
+    top_k: Optional[int]
+    top_p: Optional[float]
+    min_p: Optional[float]
+    generator: Optional[Generator]
+
+    def __init__(
+        self,
+        *,
+        temperature: float = 1.0,
+        top_k: Optional[int] = None,
+        top_p: Optional[float] = None,
+        min_p: Optional[float] = None,
+        generator: Optional[Generator] = None,
+    ) -> None:
+        """
+        :param temperature:
+            The temperature to divide log probabilities by before sampling.
+            Values less than 1.0 sharpen, values greater than 1.0 flatten the
+            distribution.
+        :param top_k:
+            If not ``None``, samples only from the ``top_k`` most likely
+            entries.
+        :param top_p:
+            If not ``None``, samples only from the smallest set of most likely
+            entries whose cumulative probability exceeds ``top_p``.
+        :param min_p:
+            If not ``None``, samples only from the entries whose probability is
+            at least ``min_p`` times the probability of the most likely entry.
+        :param generator:
+            The random number generator to use when no per-sequence seeds are
+            specified. If ``None``, the default generator of PyTorch is used.
+        """
+        if temperature <= 0.0:
+            raise ValueError(
+                f"`temperature` must be greater than 0.0, but is {temperature} instead."
+            )
+
+        if top_k is not None and top_k <= 0:
+            raise ValueError(f"`top_k` must be greater than 0, but is {top_k} instead.")
+
+        if top_p is not None and not 0.0 < top_p <= 1.0:
+            raise ValueError(
+                f"`top_p` must be greater than 0.0 and less than or equal to 1.0, but is {top_p} instead."
+            )
+
+        if min_p is not None and not 0.0 <= min_p <= 1.0:
+            raise ValueError(
+                f"`min_p` must be greater than or equal to 0.0 and less than or equal to 1.0, but is {min_p} instead."
+            )
+
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.min_p = min_p
+        self.generator = generator
+
+    @finaloverride
+    def probs(self, lprobs: Tensor) -> Tensor:
+        # (N, V)
+        probs = torch.softmax(lprobs.float() / self.temperature, dim=-1)
+
+        if self.top_k is not None and self.top_k < probs.size(-1):
+            # (N, V) -> (N, 1)
+            kth_probs = torch.topk(probs, self.top_k, dim=-1).values[:, -1:]
+
+            probs = probs.masked_fill(probs < kth_probs, 0.0)
+
+        if self.top_p is not None and self.top_p < 1.0:
+            sorted_probs, sorted_indices = torch.sort(probs, dim=-1, descending=True)
+
+            cum_probs = torch.cumsum(sorted_probs, dim=-1)
+
+            # Drop the entries that come after the cumulative probability has
+            # already exceeded `top_p`. This always keeps the top entry.
+            sorted_probs.masked_fill_(cum_probs - sorted_probs > self.top_p, 0.0)
+
+            probs = torch.zeros_like(probs).scatter_(-1, sorted_indices, sorted_probs)
+
+        if self.min_p is not None and self.min_p > 0.0:
+            # (N, V) -> (N, 1)
+            max_probs = probs.amax(dim=-1, keepdim=True)
+
+            probs = probs.masked_fill(probs < self.min_p * max_probs, 0.0)
+
+        # Renormalize what is left after filtering.
+        return probs / probs.sum(dim=-1, keepdim=True)
+
+    @finaloverride
+    def sample(
+        self, probs: Tensor, num_samples: int, *, seeds: Optional[Tensor] = None
+    ) -> Tensor:
+        batch_size, vocab_size = probs.shape
+
+        # Sample via the "exponential race" (i.e. the Gumbel-max trick); the
+        # index of the smallest `E / p`, where `E ~ Exp(1)`, follows the
+        # categorical distribution `p`. Unlike `torch.multinomial`, this lets us
+        # use our own random numbers for each sequence.
+        noise_shape = (batch_size, num_samples, vocab_size)
+
+        if seeds is None:
+            noise = probs.new_empty(noise_shape, dtype=torch.float32)
+
+            noise.exponential_(generator=self.generator)
+
+            # `exponential_()` can return 0 on rare occasions; avoid `0 / 0`.
+            noise.clamp_(min=torch.finfo(torch.float32).tiny)
+        else:
+            noise = -torch.log1p(-_seeded_uniform(seeds, noise_shape))
+
+        # (N, V) -> (N, 1, V)
+        probs = probs.unsqueeze(1)
+
+        # (N, S, V) -> (N, S)
+        return torch.argmax(probs / noise, dim=-1)
+
+    def __repr__(self) -> str:
+        return f"StandardSampler(temperature={self.temperature}, top_k={self.top_k}, top_p={self.top_p}, min_p={self.min_p})"
+
+
+def _seeded_uniform(seeds: Tensor, shape: Tuple[int, ...]) -> Tensor:
+    """Return uniform random numbers in (0, 1]. Each row along the first
+    dimension is drawn from a counter-based stream keyed by its seed."""
+    # (N) -> (N, 1)
+    keys = seeds.to(torch.int64).view(-1, 1)
+
+    counters = torch.arange(
+        int(torch.Size(shape[1:]).numel()), device=seeds.device, dtype=torch.int64
+    )
+
+    # Hash the seeds first so that consecutive seeds do not produce overlapping
+    # counter ranges.
+    x = _splitmix64(keys) + counters
+
+    x = _splitmix64(x)
+
+    # Use the top 24 bits to build a float32 in (0, 1].
+    u = (_shift_right(x, 40) + 1).to(torch.float32) * (2.0**-24)
+
+    return u.view(shape)
+
+
+def _derive_seeds(seeds: Tensor, offsets: Union[int, Tensor]) -> Tensor:
+    """Return a new seed for each pair of ``seeds`` and ``offsets`` (e.g. a step
+    number or a beam index). The result has the broadcast shape of both."""
+    return _splitmix64(_splitmix64(seeds.to(torch.int64)) + offsets)
+
+
+# The constants of SplitMix64 as signed 64-bit integers.
+_GOLDEN_GAMMA = -7046029254386353131  # 0x9E3779B97F4A7C15
+_MIX_MULT1 = -4658895280553007687  # 0xBF58476D1CE4E5B9
+_MIX_MULT2 = -7723592293110705685  # 0x94D049BB133111EB
+
+
+def _splitmix64(x: Tensor) -> Tensor:
+    # Integer arithmetic on int64 tensors wraps around on overflow, which is
+    # what the unsigned algorithm expects.
+    x = x + _GOLDEN_GAMMA
+
+    x = (x ^ _shift_right(x, 30)) * _MIX_MULT1
+    x = (x ^ _shift_right(x, 27)) * _MIX_MULT2
+
+    return x ^ _shift_right(x, 31)
+
+
+def _shift_right(x: Tensor, n: int) -> Tensor:
+    # Logical (i.e. unsigned) right shift for int64 tensors.
+    return (x >> n) & ((1 << (64 - n)) - 1)
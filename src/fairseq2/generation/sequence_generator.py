@@ -5,20 +5,33 @@
 # LICENSE file in the root directory of this source tree.
 
 import math
-from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union, final
 
 import torch
 from torch import Tensor
-from torch.nn.functional import log_softmax
+from torch.nn import Module
+from torch.nn.functional import log_softmax, pad
 
 from fairseq2.data import VocabularyInfo
 from fairseq2.generation.beam_search import BeamSearch, StandardBeamSearch
 from fairseq2.generation.logits_processor import LogitsProcessor
+from fairseq2.generation.sampler import _derive_seeds
+from fairseq2.models.decoder import SequenceDecoder
 from fairseq2.models.encoder_decoder import Seq2SeqDecoder
+from fairseq2.models.transformer import TransformerModel
 from fairseq2.nn.incremental_state import IncrementalStateBag
 from fairseq2.nn.ops import repeat_interleave
 from fairseq2.nn.padding import PaddingMask, pad_seqs
+from fairseq2.nn.transformer import (
+    LocalAttentionStateFactory,
+    NaiveSDPA,
+    StandardMultiheadAttention,
+    StandardTransformerDecoder,
+    StandardTransformerDecoderLayer,
+    TiledSDPA,
+    TorchSDPA,
+)
 from fairseq2.typing import Device
 
 
@@ -58,6 +71,13 @@ class SequenceGeneratorOptions:
     logits_processor: Optional[LogitsProcessor] = None
     """Logits processor called before applying beam search step."""
 
+    compaction_interval: Optional[int] = None
+    """If not ``None``, :class:`Seq2SeqGenerator` does not synchronize with the
+    host at each step. Other generators reject it. Finished hypotheses are recorded in preallocated device
+    buffers, and finished searches are removed from the batch only every
+    ``compaction_interval`` steps. The hypotheses are gathered once at the end
+    of the generation."""
+
 
 class Seq2SeqGenerator:
     """Represents a sequence-to-sequence generator."""
@@ -140,317 +160,100 @@ class Seq2SeqGenerator:
 
         self.logits_processor = self.opts.logits_processor
 
+        compaction_interval = self.opts.compaction_interval
+
+        if compaction_interval is not None and compaction_interval <= 0:
+            raise ValueError(
+                f"`opts.compaction_interval` must be greater than 0, but is {compaction_interval} instead."
+            )
+
     @torch.inference_mode()
     def __call__(
         self,
         encoder_output: Tensor,
         encoder_padding_mask: Optional[PaddingMask],
         source_seq_len: Optional[int] = None,
+        *,
+        seeds: Optional[Tensor] = None,
     ) -> "SequenceGeneratorOutput":
         opts = self.opts
 
         num_searches = encoder_output.size(0)
 
-        beam_size = opts.beam_size
+        _check_seeds(seeds, num_searches)
 
         max_seq_len = self._determine_max_seq_len(source_seq_len)
 
         device = encoder_output.device
 
-        encoder_output, encoder_padding_mask = self._fan_out_encoder_output(
-            encoder_output, encoder_padding_mask
-        )
-
-        # Each element contains the id of the search corresponding to a single
-        # source sequence and its hypotheses.
-        active_searches: List[Tuple[int, List[Hypothesis]]] = [
-            (search_idx, []) for search_idx in range(num_searches)
-        ]
-
-        # Once a source sequence has `beam_size` hypotheses, its search is moved
-        # from `active_searches` to `finished_searches`.
-        finished_searches: List[List[Hypothesis]] = [[] for i in range(num_searches)]
+        # If the decoder supports it, the beams of each search share a single
+        # copy of the encoder output and of its projected keys and values.
+        share_encoder_output = _supports_shared_encoder_output(self.decoder)
 
-        num_remaining_searches = num_searches
+        if not share_encoder_output:
+            encoder_output, encoder_padding_mask = self._fan_out_encoder_output(
+                encoder_output, encoder_padding_mask
+            )
 
-        # Initialize buffers.
-        # (N x B, S)
-        seqs = torch.zeros(
-            (num_searches * beam_size, max_seq_len), device=device, dtype=torch.int64
-        )
+        # Each search corresponds to a single source sequence. The first step
+        # of the prefix is always 0, so it is not scored.
+        searches = [
+            _Search(
+                search_id,
+                pad_len=0,
+                prompt_len=self.prefix_seq_len,
+                max_seq_len=max_seq_len,
+                num_unscored_steps=1,
+            )
+            for search_id in range(num_searches)
+        ]
 
-        # (N x B, S)
-        scores = torch.zeros(
-            (num_searches * beam_size, max_seq_len), device=device, dtype=torch.float32
-        )
+        # In sync-free mode, finished hypotheses are recorded on the device
+        # instead of in `searches`.
+        if opts.compaction_interval is None:
+            hypothesis_buffer = None
+        else:
+            hypothesis_buffer = _HypothesisBuffer(
+                num_searches, self.beam_size, max_seq_len, device
+            )
 
-        # A list that indicates beams that should be ignored in the next step.
-        ignored_beam_mask = torch.full(
-            (num_searches, beam_size), False, device=device, dtype=torch.bool
+        batch = _BeamSearchBatch(
+            self.decoder,
+            self.search,
+            opts,
+            self.beam_size,
+            self.eos_idx,
+            self.pad_idx,
+            self.unk_idx,
+            searches,
+            buffer_len=max_seq_len,
+            start_step=self.prefix_seq_len - 1,
+            device=device,
+            encoder_output=encoder_output,
+            encoder_padding_mask=encoder_padding_mask,
+            share_encoder_output=share_encoder_output,
+            seeds=seeds,
+            hypothesis_buffer=hypothesis_buffer,
         )
 
-        # An offset array for converting between batch-wide and search-local
-        # beam indices.
-        # (B)
-        search_offsets = torch.arange(num_searches, device=device) * beam_size
-
-        # (B) -> (B, 1)
-        search_offsets.unsqueeze_(-1)
-
-        cand_offsets = torch.arange(2 * beam_size, device=device)
-
-        state_bag = IncrementalStateBag(max_seq_len)
-
         # At this point, the state is fully initialized, kick off the search.
         self._bootstrap_seqs_and_scores(
-            seqs, scores, encoder_output, encoder_padding_mask, state_bag
+            batch.seqs,
+            batch.scores,
+            encoder_output,
+            encoder_padding_mask,
+            batch.state_bag,
         )
 
-        start_step = self.prefix_seq_len - 1
-
-        # Holds the indices of beams (a beam can occur more than once) that we
-        # should continue with in the next step.
-        beam_indices: Optional[Tensor] = None
-
-        # Holds the indices of searches that we should continue with in the next
-        # step. If not `None`, it means we finalized one or more searches in the
-        # last step.
-        search_indices: Optional[Tensor] = None
-
-        for step_nr in range(start_step, max_seq_len - 1):
-            if beam_indices is not None:
-                # If not `None`, it means in the last step we finalized one or
-                # more searches. We should ensure that we adjust `beam_indices`
-                # before reordering `decoder`'s incremental state.
-                if search_indices is not None:
-                    num_searches = search_indices.numel()
-
-                    # (N)
-                    delta = search_indices - torch.arange(num_searches, device=device)
-
-                    # (N) -> (N, 1)
-                    delta.unsqueeze_(-1)
-
-                    # Adjust indices to take into account removed searches.
-                    beam_indices.view(num_searches, beam_size).add_(delta * beam_size)
-
-                state_bag.reorder(beam_indices)
-
-            decoder_output, decoder_padding_mask = self.decoder.decode(
-                seqs[:, step_nr : step_nr + 1],
-                None,  # We never generate PAD.
-                encoder_output,
-                encoder_padding_mask,
-                state_bag=state_bag,
-            )
-
-            state_bag.increment_step()
-
-            model_output = self.decoder.project(decoder_output, decoder_padding_mask)
-
-            # lprobs:          (1, V)
-            # model_output: (N, 1, V)
-            lprobs = log_softmax(model_output.logits, dim=-1, dtype=torch.float32)
-
-            # Do not allow EOS before reaching the minimum sequence length.
-            if step_nr < self.opts.min_seq_len:
-                lprobs[:, :, self.eos_idx] = -torch.inf
-
-            # fmt: off
-            # If we have reached the maximum length, force the last step to be
-            # EOS.
-            if step_nr == max_seq_len - 2:
-                lprobs[:, :, : self.eos_idx]       = -torch.inf
-                lprobs[:, :,   self.eos_idx + 1 :] = -torch.inf
-            # fmt: on
-
-            # Never allow PAD.
-            lprobs[:, :, self.pad_idx] = -torch.inf
-
-            # Apply UNK penalty.
-            if self.unk_idx is not None:
-                lprobs[:, :, self.unk_idx] -= self.opts.unk_penalty
-
-            # update scores in place using logits_processor
-            if self.logits_processor is not None:
-                self.logits_processor(
-                    seqs.view(num_searches, beam_size, -1)[:, :, : step_nr + 1],
-                    lprobs.view(num_searches, beam_size, -1),
-                )
-
-            # Determine candidates for the next step.
-            # (N, 2 x B)
-            cand_scores, cand_indices, cand_beam_indices = self.search.step(
-                step_nr,
-                step_nr == start_step,
-                lprobs.view(num_searches, beam_size, -1),
-                scores.view(num_searches, beam_size, -1)[:, :, : step_nr + 1],
-            )
-
-            # Convert search-local beam indices to batch-wide beam indices.
-            # (N, 2 x B) + (N) -> (N, 2 x B)
-            global_cand_beam_indices = cand_beam_indices + search_offsets
-
-            # Finalize beams that reached the minimum length and that end with
-            # an EOS.
-            # (N, 2 x B)
-            eos_mask = (cand_indices == self.eos_idx) & (cand_scores != -math.inf)
-
-            # Do not attempt to finalize beams that should be ignored.
-            eos_mask[:, :beam_size][ignored_beam_mask] = False
-
-            # Only consider EOS when it's among the top `beam_size` indices. Now
-            # we know what beam(s) to finalize.
-            # (N, B)
-            eos_beam_indices = torch.masked_select(
-                global_cand_beam_indices[:, :beam_size], mask=eos_mask[:, :beam_size]
-            )
-
-            if eos_beam_indices.numel() > 0:
-                # Select the scores of the finalized beams.
-                # (N, B)
-                eos_scores = torch.masked_select(
-                    cand_scores[:, :beam_size], mask=eos_mask[:, :beam_size]
-                )
-
-                newly_finished_searches = self._finalize_hypothesis(
-                    step_nr,
-                    eos_beam_indices,
-                    eos_scores,
-                    seqs,
-                    scores,
-                    active_searches,
-                    finished_searches,
-                )
-
-                num_remaining_searches -= len(newly_finished_searches)
-
-                if num_remaining_searches == 0:
-                    break
-            else:
-                newly_finished_searches = None
-
-            # Remove finished searches (ones for which `beam_size` finalized
-            # beams have been generated) from the batch.
-            if newly_finished_searches:
-                new_num_searches = num_searches - len(newly_finished_searches)
-
-                # Construct `search_indices` which holds indices of searches
-                # to keep for the next step.
-                search_mask = torch.full((num_searches,), True, device=device)
-
-                search_mask[newly_finished_searches] = False
-
-                search_indices = torch.arange(num_searches, device=device)
-
-                search_indices = search_indices.masked_select(search_mask)
-
-                # fmt: off
-                # Filter out removed batches from state variables.
-                # (N, B) -> (N - F, B)
-                ignored_beam_mask = ignored_beam_mask[search_indices]
-
-                # (N, 2 x B) -> (N - F, 2 x B)
-                cand_scores       = cand_scores      [search_indices]
-                cand_indices      = cand_indices     [search_indices]
-                cand_beam_indices = cand_beam_indices[search_indices]
-
-                # (N) -> (N - F)
-                search_offsets.resize_(new_num_searches, 1)
-
-                # (N - F, 2 x B) + (N - F) -> (N - F, 2 x B)
-                global_cand_beam_indices = cand_beam_indices + search_offsets
-
-                # (N, 2 x B) -> (N - F, 2 x B)
-                eos_mask = eos_mask[search_indices]
-
-                # (N x B, S) -> (N, B, S)
-                seqs   = seqs  .view(num_searches, -1)
-                scores = scores.view(num_searches, -1)
-
-                # (N, B, S + 1) -> ((N - F) x B, S)
-                seqs   = seqs  [search_indices].view(new_num_searches * beam_size, -1)
-                scores = scores[search_indices].view(new_num_searches * beam_size, -1)
-
-                # (N x B, S_enc, M) -> (N, B, S_enc, M)
-                encoder_output = encoder_output.unflatten(0, (num_searches, -1))
-
-                # (N, B, S_enc, M) -> ((N - F) x B, S_enc, M)
-                encoder_output = encoder_output[search_indices].flatten(0, 1)
-
-                if encoder_padding_mask is not None:
-                    # (N x B)
-                    seq_lens = encoder_padding_mask.seq_lens
-
-                    # (N x B) -> (N, B)
-                    seq_lens = seq_lens.unflatten(0, (num_searches, -1))
-
-                    # (N, B) -> ((N - F) x B)
-                    seq_lens = seq_lens[search_indices].flatten(0, 1)
-
-                    encoder_padding_mask = PaddingMask(
-                        seq_lens, batch_seq_len=encoder_output.size(1)
-                    )
-                # fmt: on
-
-                num_searches = new_num_searches
-            else:
-                search_indices = None
-
-            eos_mask[:, :beam_size][ignored_beam_mask] = True
-
-            # Set `beam_weights` so that values greater than or equal to 2 x
-            # `beam_size` indicate finished beams (i.e. end with EOS) and values
-            # less than 2 x `beam_size` indicate active beams.
-            # (N, 2 x B)
-            beam_weights = cand_offsets + (eos_mask * (2 * beam_size))
-
-            # Get the top `beam_size` active beams, which are the beams with the
-            # smallest weights in `active_beam_weights`.
-            # (N, B)
-            active_beam_weights, active_beams = torch.topk(
-                beam_weights, k=beam_size, dim=1, largest=False
-            )
-
-            # Update to ignore finalized beams in the next step.
-            # (N, B)
-            ignored_beam_mask = active_beam_weights >= 2 * beam_size
-
-            # We should always have at least one active beam in each search.
-            assert (~ignored_beam_mask).any(dim=1).all()
-
-            # Denotes which beams are continued for each new hypothesis (a beam
-            # can be selected more than once).
-            # (N, B)
-            beam_indices = torch.gather(
-                global_cand_beam_indices, dim=1, index=active_beams
-            )
-
-            # (N, B) -> (N x B)
-            beam_indices = beam_indices.view(-1)
-
-            # fmt: off
-            # Reorder beams in the `seq` and `score` buffers. The same beam can
-            # be selected more than once.
-            if step_nr > start_step:
-                seqs  [:, : step_nr + 1] = torch.index_select(
-                    seqs  [:, : step_nr + 1], dim=0, index=beam_indices
-                )
-                scores[:, : step_nr + 1] = torch.index_select(
-                    scores[:, : step_nr + 1], dim=0, index=beam_indices
-                )
-
-            # (N x B, S) -> (N, B, S)
-            seqs_view   = seqs  .view(num_searches, beam_size, -1)
-            scores_view = scores.view(num_searches, beam_size, -1)
+        finished_searches: List[List[Hypothesis]] = [[] for _ in range(num_searches)]
 
-            seqs_view  [:, :, step_nr + 1] = torch.gather(cand_indices, dim=1, index=active_beams)
-            scores_view[:, :, step_nr + 1] = torch.gather(cand_scores,  dim=1, index=active_beams)
-            # fmt: on
+        while batch.searches:
+            for search_id, hypotheses in batch.step():
+                finished_searches[search_id] = hypotheses
 
-        # Ensure that hypotheses are sorted by their scores before returning.
-        for batch in finished_searches:
-            batch.sort(key=lambda b: b.score, reverse=True)  # type: ignore[arg-type, return-value]
+        if hypothesis_buffer is not None:
+            # The gathered hypotheses are already sorted by their scores.
+            finished_searches = hypothesis_buffer.gather()
 
         return SequenceGeneratorOutput(
             results=finished_searches, device=device, pad_idx=self.pad_idx
@@ -514,12 +317,11 @@ class Seq2SeqGenerator:
 
         assert isinstance(self.prefix_seq, Tensor)
 
-        # We have to bootstrap the model with the already fanned-out encoder
-        # output to correctly initialize its incremental state. This causes some
-        # redundancy as we have to expand `decoder_input` to match the shape of
-        # `encoder_output`.
+        # We have to bootstrap the model with all beams to correctly initialize
+        # its incremental state. Note that `encoder_output` might not be fanned
+        # out if its keys and values are shared by the beams of each search.
         # (S_pfx) -> (N x B, S_pfx - 1)
-        decoder_input = self.prefix_seq[:-1].expand(encoder_output.size(0), -1)
+        decoder_input = self.prefix_seq[:-1].expand(seqs.size(0), -1)
 
         # Bootstrap the model state with prefix sequence.
         decoder_output, decoder_padding_mask = self.decoder.decode(
@@ -554,136 +356,1460 @@ class Seq2SeqGenerator:
         # First step (e.g. EOS)'s score is always 0.
         scores[:, 1 : self.prefix_seq_len] = prefix_scores
 
-    def _finalize_hypothesis(
-        self,
-        step_nr: int,
-        eos_beam_indices: Tensor,
-        eos_scores: Tensor,
-        seqs: Tensor,
-        scores: Tensor,
-        active_searches: List[Tuple[int, List["Hypothesis"]]],
-        finished_searches: List[List["Hypothesis"]],
-    ) -> List[int]:
-        # fmt: off
-        finalized_seqs   = seqs  .index_select(dim=0, index=eos_beam_indices)
-        finalized_scores = scores.index_select(dim=0, index=eos_beam_indices)
 
-        finalized_seqs   = finalized_seqs  [:, : step_nr + 2]
-        finalized_scores = finalized_scores[:, : step_nr + 2]
+class DecoderOnlyGenerator:
+    """Represents a sequence generator for decoder-only models such as LLaMA
+    and Mistral.
 
-        # Finalize beams.
-        finalized_seqs  [:, -1] = self.eos_idx
-        finalized_scores[:, -1] = eos_scores
-        # fmt: on
+    The prompts are fed to the model in a single forward pass to prefill its
+    incremental state, after which each sequence continues from the end of its
+    own prompt (see :attr:`IncrementalStateBag.seq_steps`). If the model uses
+    attention states that cannot track the length of each sequence (e.g. the
+    circular buffer of sliding window attention), prompts of different lengths
+    are generated in separate batches, one per prompt length.
+    """
 
-        # Convert from cumulative to per-step scores.
-        finalized_scores[:, 1:] = finalized_scores[:, 1:] - finalized_scores[:, :-1]
+    decoder: SequenceDecoder
+    opts: SequenceGeneratorOptions
+    beam_size: int
+    unk_idx: Optional[int]
+    eos_idx: int
+    pad_idx: int
+    search: BeamSearch
+    logits_processor: Optional[LogitsProcessor]
 
-        # Skip first EOS since it is always 0 and skews normalization.
-        if self.opts.normalize_scores:
-            eos_scores /= (step_nr + 1) ** self.opts.len_penalty
+    def __init__(
+        self,
+        decoder: SequenceDecoder,
+        vocab_info: VocabularyInfo,
+        opts: Optional[SequenceGeneratorOptions] = None,
+    ) -> None:
+        """
+        :param decoder:
+            The decoder to use.
+        :param vocab_info:
+            The vocabulary information to use.
+        :param opts:
+            The generation options. Use :class:`SamplingSearch` as ``search``
+            for sampling, and a ``beam_size`` of 1 for greedy decoding.
+            ``compaction_interval`` is not supported.
+        """
+        self.decoder = decoder
 
-        # Holds the ids of finished searches.
-        newly_finished: List[int] = []
+        self.opts = opts or SequenceGeneratorOptions()
 
-        active_search_indices = (eos_beam_indices // self.beam_size).tolist()
+        if self.opts.compaction_interval is not None:
+            raise ValueError(
+                "`opts.compaction_interval` is not supported by `DecoderOnlyGenerator`."
+            )
 
-        for beam_idx, search_idx in enumerate(active_search_indices):
-            search_id, hypotheses = active_searches[search_idx]
+        # Set beam size. -1 since we never select PAD.
+        self.beam_size = min(self.opts.beam_size, vocab_info.size - 1)
 
-            # We might have more than one beam finalized in one step that would
-            # potentially exceed `beam_size` hypotheses.
-            if len(hypotheses) == self.beam_size:
-                continue
+        if vocab_info.eos_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `eos_idx` set for sequence generation."
+            )
 
-            hypotheses.append(
-                Hypothesis(
-                    seq=finalized_seqs[beam_idx],
-                    score=eos_scores[beam_idx],
-                    step_scores=finalized_scores[beam_idx],
-                )
+        if vocab_info.pad_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `pad_idx` set for sequence generation."
             )
 
-            if len(hypotheses) == self.beam_size:
-                # We have `beam_size` hypotheses for this particular search, so
-                # we finish it now.
-                newly_finished.append(search_idx)
+        # Set vocab info.
+        self.unk_idx = vocab_info.unk_idx
+        self.eos_idx = vocab_info.eos_idx
+        self.pad_idx = vocab_info.pad_idx
 
-                finished_searches[search_id] = hypotheses
+        # Set beam search.
+        self.search = self.opts.search or StandardBeamSearch()
 
-        newly_finished.sort()
+        self.logits_processor = self.opts.logits_processor
 
-        # Remove finished searches from the active list.
-        for idx in reversed(newly_finished):
-            del active_searches[idx]
+    @torch.inference_mode()
+    def __call__(
+        self,
+        prompt_seqs: Tensor,
+        prompt_padding_mask: Optional[PaddingMask],
+        *,
+        left_padded: bool = False,
+        seeds: Optional[Tensor] = None,
+    ) -> "SequenceGeneratorOutput":
+        """
+        :param prompt_seqs:
+            The prompts to continue. *Shape:* :math:`(N,S)`, where :math:`N` is
+            the batch size and :math:`S` is the sequence length.
+        :param prompt_padding_mask:
+            The padding mask of ``prompt_seqs``. *Shape:* :math:`(N,S)`, where
+            :math:`N` is the batch size and :math:`S` is the sequence length.
+        :param left_padded:
+            If ``True``, the prompts in ``prompt_seqs`` are padded on the left
+            instead of the right.
+        :param seeds:
+            The seed of each prompt. If not ``None``, a search algorithm that
+            draws random numbers (e.g. :class:`SamplingSearch`) draws the
+            candidates of a prompt from its own stream, so they do not depend
+            on the other prompts in the batch. *Shape:* :math:`(N)`, where
+            :math:`N` is the batch size.
 
-        return newly_finished
+        :returns:
+            The generated hypotheses. Each hypothesis starts with its prompt.
+        """
+        num_searches, prompt_batch_seq_len = prompt_seqs.shape
 
+        _check_seeds(seeds, num_searches)
 
-@dataclass
-class SequenceGeneratorOutput:
-    """Holds the output of a sequence generator."""
+        device = prompt_seqs.device
 
-    results: List[List["Hypothesis"]]
-    """The list of hypothesis generated per search, ordered by score."""
+        # (N)
+        if prompt_padding_mask is None:
+            prompt_lens = torch.full(
+                (num_searches,), prompt_batch_seq_len, device=device, dtype=torch.int64
+            )
+        else:
+            prompt_lens = prompt_padding_mask.seq_lens
 
-    device: Device
-    """The device on which generated sequences reside."""
+            if left_padded:
+                prompt_seqs = _left_align_prompts(prompt_seqs, prompt_lens)
 
-    pad_idx: int
-    """The index of the PAD symbol."""
+        # We need the prompt lengths on the host to size the buffers and to
+        # finalize hypotheses. This is the only synchronization point before the
+        # main loop.
+        host_prompt_lens: List[int] = prompt_lens.tolist()
 
-    def collate(
-        self, *, hypo_idx: int = 0, skip_batch: bool = False
-    ) -> Tuple[Tensor, Optional[PaddingMask]]:
-        """Collate the generated sequences at index ``hypo_idx`` in each search
-        result into a single tensor.
+        if not host_prompt_lens:
+            return SequenceGeneratorOutput(
+                results=[], device=device, pad_idx=self.pad_idx
+            )
 
-        :param hypo_idx:
-            The index of hypothesis to extract from each search result.
-        :param skip_batch:
-            If ``True``, if a search result has no hypothesis at index `hypo_idx`,
-            it will be skipped instead of raising an error.
+        min_prompt_len = min(host_prompt_lens)
+        max_prompt_len = max(host_prompt_lens)
 
-        :returns:
-          - The collated sequences. *Shape:* :math:`(N,S)`, where :math:`N` is
-            the number of search results and :math:`S` is the sequence length.
-          - An array where each element represents the length of the sequence at
-            the same index in the first returned value. *Shape:* :math:`(N)`,
-            where :math:`N` is the number of search results.
-        """
-        if not self.results and not skip_batch:
-            raise ValueError("The output must contain at least one search result.")
+        if min_prompt_len == 0:
+            raise ValueError("`prompt_seqs` must not contain empty prompts.")
 
-        seqs = []
+        if min_prompt_len < max_prompt_len and not _supports_seq_steps(self.decoder):
+            return self._generate_by_prompt_len(prompt_seqs, host_prompt_lens, seeds)
 
-        for search_idx, result in enumerate(self.results):
-            if hypo_idx >= len(result):
-                if not skip_batch:
-                    raise ValueError(
-                        f"Each search result must have at least {hypo_idx + 1} hypotheses, but search {search_idx} has only {len(result)}."
-                    )
+        max_seq_len = self._determine_max_seq_len(max_prompt_len)
 
-                continue
+        # The prompts are right-aligned in the `seqs` and `scores` buffers so
+        # that all sequences are at the same step of the main loop. A sequence
+        # is offset by the length of its left padding.
+        # (N)
+        pad_lens = max_prompt_len - prompt_lens
 
-            seqs.append(result[hypo_idx].seq)
+        max_pad_len = max_prompt_len - min_prompt_len
 
-        if not seqs:
-            # Return a zero-dimensional (not scalar!) tensor.
-            return torch.empty((0,), device=self.device, dtype=torch.int64), None
+        # Each search corresponds to a single prompt. Prompt steps have no
+        # score, so we normalize by the number of generated steps only.
+        searches = [
+            _Search(
+                search_id,
+                pad_len=max_prompt_len - prompt_len,
+                prompt_len=prompt_len,
+                max_seq_len=max_seq_len,
+                num_unscored_steps=prompt_len,
+            )
+            for search_id, prompt_len in enumerate(host_prompt_lens)
+        ]
 
-        return pad_seqs(seqs, self.pad_idx)
+        start_step = max_prompt_len - 1
+
+        # Each sequence can reach `max_seq_len`, regardless of its offset.
+        batch = _BeamSearchBatch(
+            self.decoder,
+            self.search,
+            self.opts,
+            self.beam_size,
+            self.eos_idx,
+            self.pad_idx,
+            self.unk_idx,
+            searches,
+            buffer_len=max_seq_len + max_pad_len,
+            start_step=start_step,
+            device=device,
+            max_num_steps=max_seq_len,
+            seeds=seeds,
+        )
+
+        # (N, S_prm)
+        aligned_prompt_seqs = _right_align_prompts(
+            prompt_seqs[:, :max_prompt_len], prompt_lens
+        )
 
+        # (S_prm) -> (N, S_prm)
+        pad_mask = torch.arange(max_prompt_len, device=device) < pad_lens.unsqueeze(1)
 
-@dataclass
-class Hypothesis:
-    """Represents a hypothesis produced by a sequence generator."""
+        aligned_prompt_seqs = aligned_prompt_seqs.masked_fill(pad_mask, self.pad_idx)
 
-    seq: Tensor
-    """The generated sequence."""
+        # (N, S_prm) -> (N x B, S_prm)
+        batch.seqs[:, :max_prompt_len] = repeat_interleave(
+            aligned_prompt_seqs, dim=0, repeat=self.beam_size
+        )
 
-    score: Tensor
-    """The score of the hypothesis."""
+        if start_step > 0:
+            self._prefill(
+                prompt_seqs[:, :start_step],
+                prompt_lens if max_pad_len > 0 else None,
+                batch.state_bag,
+            )
 
-    step_scores: Tensor
-    """The score of each individual sequence step."""
+        finished_searches: List[List[Hypothesis]] = [[] for _ in range(num_searches)]
+
+        while batch.searches:
+            for search_id, hypotheses in batch.step():
+                finished_searches[search_id] = hypotheses
+
+        return SequenceGeneratorOutput(
+            results=finished_searches, device=device, pad_idx=self.pad_idx
+        )
+
+    def _generate_by_prompt_len(
+        self,
+        prompt_seqs: Tensor,
+        host_prompt_lens: List[int],
+        seeds: Optional[Tensor],
+    ) -> "SequenceGeneratorOutput":
+        # Group the prompts by length; each group starts at the same step and
+        # does not require tracking the length of each sequence.
+        groups: Dict[int, List[int]] = {}
+
+        for search_idx, prompt_len in enumerate(host_prompt_lens):
+            groups.setdefault(prompt_len, []).append(search_idx)
+
+        results: List[List[Hypothesis]] = [[] for _ in host_prompt_lens]
+
+        for prompt_len, search_indices in groups.items():
+            index = torch.tensor(search_indices, device=prompt_seqs.device)
+
+            if seeds is None:
+                group_seeds = None
+            else:
+                group_seeds = seeds[index]
+
+            output = self(prompt_seqs[index, :prompt_len], None, seeds=group_seeds)
+
+            for search_idx, hypotheses in zip(search_indices, output.results):
+                results[search_idx] = hypotheses
+
+        return SequenceGeneratorOutput(
+            results=results, device=prompt_seqs.device, pad_idx=self.pad_idx
+        )
+
+    def _determine_max_seq_len(self, max_prompt_len: int) -> int:
+        opts = self.opts
+
+        if opts.soft_max_seq_len is None:
+            max_seq_len = opts.hard_max_seq_len
+        else:
+            at, bt = opts.soft_max_seq_len
+
+            max_seq_len = min(opts.hard_max_seq_len, int(at * max_prompt_len + bt))
+
+        if opts.min_seq_len > max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than or equal to `min_seq_len` ({opts.min_seq_len}), but is {max_seq_len} instead. Adjust your soft and hard maximum sequence length limits."
+            )
+
+        if max_prompt_len >= max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than the length of the longest prompt ({max_prompt_len}), but is {max_seq_len} instead."
+            )
+
+        return max_seq_len
+
+    def _prefill(
+        self,
+        prompt_seqs: Tensor,
+        prompt_lens: Optional[Tensor],
+        state_bag: IncrementalStateBag,
+    ) -> None:
+        num_prompts, prefill_len = prompt_seqs.shape
+
+        # Feed all prompts but their last step in a single forward pass. We do
+        # not need the output; we only need the incremental state of the model.
+        # Since the prompts are right-padded, the causal attention keeps the
+        # padded steps from affecting the actual ones.
+        self.decoder.decode(prompt_seqs, None, state_bag=state_bag)
+
+        state_bag.increment_step(prefill_len)
+
+        # If the prompts have different lengths, discard the padded steps; from
+        # now on, each sequence continues from the end of its own prompt.
+        if prompt_lens is not None:
+            state_bag.truncate(prompt_lens - 1)
+
+        # Prefilling once per prompt instead of once per beam saves us from
+        # `beam_size` redundant forward passes; fan out the state afterwards.
+        if self.beam_size > 1:
+            # (N) -> (N x B)
+            fan_out_indices = repeat_interleave(
+                torch.arange(num_prompts, device=prompt_seqs.device),
+                dim=0,
+                repeat=self.beam_size,
+            )
+
+            state_bag.reorder(fan_out_indices)
+
+
+@dataclass
+class SequenceGeneratorOutput:
+    """Holds the output of a sequence generator."""
+
+    results: List[List["Hypothesis"]]
+    """The list of hypothesis generated per search, ordered by score."""
+
+    device: Device
+    """The device on which generated sequences reside."""
+
+    pad_idx: int
+    """The index of the PAD symbol."""
+
+    def collate(
+        self, *, hypo_idx: int = 0, skip_batch: bool = False
+    ) -> Tuple[Tensor, Optional[PaddingMask]]:
+        """Collate the generated sequences at index ``hypo_idx`` in each search
+        result into a single tensor.
+
+        :param hypo_idx:
+            The index of hypothesis to extract from each search result.
+        :param skip_batch:
+            If ``True``, if a search result has no hypothesis at index `hypo_idx`,
+            it will be skipped instead of raising an error.
+
+        :returns:
+          - The collated sequences. *Shape:* :math:`(N,S)`, where :math:`N` is
+            the number of search results and :math:`S` is the sequence length.
+          - An array where each element represents the length of the sequence at
+            the same index in the first returned value. *Shape:* :math:`(N)`,
+            where :math:`N` is the number of search results.
+        """
+        if not self.results and not skip_batch:
+            raise ValueError("The output must contain at least one search result.")
+
+        seqs = []
+
+        for search_idx, result in enumerate(self.results):
+            if hypo_idx >= len(result):
+                if not skip_batch:
+                    raise ValueError(
+                        f"Each search result must have at least {hypo_idx + 1} hypotheses, but search {search_idx} has only {len(result)}."
+                    )
+
+                continue
+
+            seqs.append(result[hypo_idx].seq)
+
+        if not seqs:
+            # Return a zero-dimensional (not scalar!) tensor.
+            return torch.empty((0,), device=self.device, dtype=torch.int64), None
+
+        return pad_seqs(seqs, self.pad_idx)
+
+
+@dataclass
+class Hypothesis:
+    """Represents a hypothesis produced by a sequence generator."""
+
+    seq: Tensor
+    """The generated sequence."""
+
+    score: Tensor
+    """The score of the hypothesis."""
+
+    step_scores: Tensor
+    """The score of each individual sequence step."""
+
+
+@final
+class _HypothesisBuffer:
+    """Records the finished hypotheses of :class:`Seq2SeqGenerator` in device
+    buffers, so that finalizing beams does not synchronize with the host."""
+
+    beam_size: int
+    seqs: Tensor
+    cum_scores: Tensor
+    scores: Tensor
+    seq_lens: Tensor
+    num_hypotheses: Tensor
+
+    def __init__(
+        self, num_searches: int, beam_size: int, max_seq_len: int, device: Device
+    ) -> None:
+        self.beam_size = beam_size
+
+        # Each search has an extra slot that takes the writes of the beams that
+        # are not finalized; it is never read.
+        shape = (num_searches, beam_size + 1)
+
+        # fmt: off
+        # (N, B + 1, S)
+        self.seqs       = torch.zeros(shape + (max_seq_len,), device=device, dtype=torch.int64)
+        self.cum_scores = torch.zeros(shape + (max_seq_len,), device=device, dtype=torch.float32)
+
+        # (N, B + 1)
+        self.scores   = torch.zeros(shape, device=device, dtype=torch.float32)
+        self.seq_lens = torch.zeros(shape, device=device, dtype=torch.int64)
+        # fmt: on
+
+        # (N)
+        self.num_hypotheses = torch.zeros(
+            (num_searches,), device=device, dtype=torch.int64
+        )
+
+    def record(
+        self,
+        step_nr: int,
+        search_ids: Tensor,
+        eos_beam_indices: Tensor,
+        eos_scores: Tensor,
+        eos_mask: Tensor,
+        seqs: Tensor,
+        scores: Tensor,
+        eos_idx: int,
+        len_normalizer: Union[float, Tensor],
+    ) -> None:
+        """Record the beams in ``eos_mask`` as hypotheses of their searches.
+
+        All arguments but ``seqs`` and ``scores`` have the shape :math:`(N,B)`,
+        except ``search_ids`` which holds the id of each search in the batch,
+        and ``len_normalizer`` which is either a scalar or of shape
+        :math:`(N,1)`.
+        """
+        beam_size = self.beam_size
+
+        seq_len = step_nr + 2
+
+        # (N) -> (N, 1)
+        num_hypotheses = self.num_hypotheses[search_ids].unsqueeze(1)
+
+        # Assign slots in the same order as `Seq2SeqGenerator` would append the
+        # hypotheses. Beams that are not finalized, or that would exceed
+        # `beam_size` hypotheses, are written to the extra slot.
+        # (N, B)
+        slots = num_hypotheses + torch.cumsum(eos_mask, dim=1) - 1
+
+        slots = torch.where(eos_mask & (slots < beam_size), slots, beam_size)
+
+        # (N) -> (N, 1)
+        search_index = search_ids.unsqueeze(1)
+
+        # fmt: off
+        # (N x B, S) -> (N, B, S')
+        finalized_seqs   = seqs  [eos_beam_indices, :seq_len]
+        finalized_scores = scores[eos_beam_indices, :seq_len]
+
+        finalized_seqs  [:, :, -1] = eos_idx
+        finalized_scores[:, :, -1] = eos_scores
+
+        self.seqs      [search_index, slots, :seq_len] = finalized_seqs
+        self.cum_scores[search_index, slots, :seq_len] = finalized_scores
+
+        self.scores  [search_index, slots] = eos_scores / len_normalizer
+        self.seq_lens[search_index, slots] = seq_len
+        # fmt: on
+
+        # (N, 1) + (N) -> (N)
+        num_hypotheses = num_hypotheses.squeeze(1) + eos_mask.sum(dim=1)
+
+        self.num_hypotheses[search_ids] = num_hypotheses.clamp(max=beam_size)
+
+    def finished(self, search_ids: Tensor) -> List[int]:
+        """Return the indices of the searches in the batch that have
+        ``beam_size`` hypotheses."""
+        finished_mask = self.num_hypotheses[search_ids] == self.beam_size
+
+        return finished_mask.nonzero().squeeze(1).tolist()  # type: ignore[no-any-return]
+
+    def gather(self) -> List[List["Hypothesis"]]:
+        """Return the recorded hypotheses of each search, sorted by score."""
+        # Convert from cumulative to per-step scores.
+        step_scores = self.cum_scores.clone()
+
+        step_scores[:, :, 1:] -= self.cum_scores[:, :, :-1]
+
+        host_num_hypotheses = self.num_hypotheses.tolist()
+
+        host_seq_lens = self.seq_lens.tolist()
+        host_scores = self.scores.tolist()
+
+        results: List[List[Hypothesis]] = []
+
+        for search_idx, num_hypotheses in enumerate(host_num_hypotheses):
+            # Like `Seq2SeqGenerator`, return no hypothesis for searches that
+            # have not finished.
+            if num_hypotheses < self.beam_size:
+                results.append([])
+
+                continue
+
+            seq_lens = host_seq_lens[search_idx]
+
+            scores = host_scores[search_idx]
+
+            hypotheses = []
+
+            # `sorted()` is stable, as is the sort in `Seq2SeqGenerator`.
+            for i in sorted(range(num_hypotheses), key=lambda i: -scores[i]):
+                hypotheses.append(
+                    Hypothesis(
+                        seq=self.seqs[search_idx, i, : seq_lens[i]],
+                        score=self.scores[search_idx, i],
+                        step_scores=step_scores[search_idx, i, : seq_lens[i]],
+                    )
+                )
+
+            results.append(hypotheses)
+
+        return results
+
+
+@dataclass
+class _Search:
+    """Holds the host-side state of a search in a :class:`_BeamSearchBatch`."""
+
+    search_id: int
+    """The id of the search (e.g. the index of its source sequence)."""
+
+    pad_len: int
+    """The offset of the search in the buffers of the batch. The searches are
+    right-aligned in the buffers, so that they are all at the same step."""
+
+    prompt_len: int
+    """The number of steps (e.g. the prefix or the prompt) that are given
+    before the first generated step."""
+
+    max_seq_len: int
+    """The maximum length of the generated sequences (including prompt)."""
+
+    num_unscored_steps: int
+    """The number of leading steps to exclude from score normalization."""
+
+    hypotheses: List[Hypothesis] = field(default_factory=list)
+    """The finished hypotheses."""
+
+
+@final
+class _BeamSearchBatch:
+    """Runs the beam search loop shared by :class:`Seq2SeqGenerator`,
+    :class:`DecoderOnlyGenerator`, and :class:`Seq2SeqGenerationEngine`.
+
+    The owner of the batch bootstraps (or prefills) :attr:`state_bag` and the
+    prompt steps of :attr:`seqs` and :attr:`scores`, and then calls :meth:`step`
+    until no search is left. A search whose prompt is shorter than the others
+    starts later; the length limits and the start of each search are tracked
+    individually. This also lets :class:`Seq2SeqGenerationEngine` merge new
+    searches into a running batch via :meth:`extend`.
+    """
+
+    decoder: Union[SequenceDecoder, Seq2SeqDecoder]
+    search: BeamSearch
+    opts: SequenceGeneratorOptions
+    beam_size: int
+    eos_idx: int
+    pad_idx: int
+    unk_idx: Optional[int]
+    searches: List[_Search]
+    step_nr: int
+    seqs: Tensor
+    scores: Tensor
+    state_bag: IncrementalStateBag
+    encoder_output: Optional[Tensor]
+    encoder_padding_mask: Optional[PaddingMask]
+    share_encoder_output: bool
+    seeds: Optional[Tensor]
+    hypothesis_buffer: Optional[_HypothesisBuffer]
+    ignored_beam_mask: Tensor
+    _pad_lens: Tensor
+    _max_seq_lens: Tensor
+    _search_ids: Optional[Tensor]
+    _search_offsets: Tensor
+    _cand_offsets: Tensor
+    _num_steps: int
+
+    def __init__(
+        self,
+        decoder: Union[SequenceDecoder, Seq2SeqDecoder],
+        search: BeamSearch,
+        opts: SequenceGeneratorOptions,
+        beam_size: int,
+        eos_idx: int,
+        pad_idx: int,
+        unk_idx: Optional[int],
+        searches: List[_Search],
+        *,
+        buffer_len: int,
+        start_step: int,
+        device: Device,
+        max_num_steps: Optional[int] = None,
+        encoder_output: Optional[Tensor] = None,
+        encoder_padding_mask: Optional[PaddingMask] = None,
+        share_encoder_output: bool = False,
+        seeds: Optional[Tensor] = None,
+        hypothesis_buffer: Optional[_HypothesisBuffer] = None,
+    ) -> None:
+        """
+        :param searches:
+            The searches in the batch.
+        :param buffer_len:
+            The length of the :attr:`seqs` and :attr:`scores` buffers.
+        :param start_step:
+            The step at which the batch starts, i.e. the last prompt step of the
+            longest prompt.
+        :param max_num_steps:
+            The maximum number of steps of :attr:`state_bag`. If ``None``,
+            ``buffer_len`` is used.
+        :param encoder_output:
+            The encoder output if ``decoder`` is a :class:`Seq2SeqDecoder`. If
+            ``share_encoder_output`` is ``True``, holds one sequence per search;
+            otherwise, one per beam.
+        """
+        self.decoder = decoder
+        self.search = search
+        self.opts = opts
+        self.beam_size = beam_size
+        self.eos_idx = eos_idx
+        self.pad_idx = pad_idx
+        self.unk_idx = unk_idx
+
+        self.searches = searches
+
+        self.step_nr = start_step
+
+        num_searches = len(searches)
+
+        # Initialize buffers.
+        # (N x B, S)
+        self.seqs = torch.zeros(
+            (num_searches * beam_size, buffer_len), device=device, dtype=torch.int64
+        )
+
+        # (N x B, S)
+        self.scores = torch.zeros(
+            (num_searches * beam_size, buffer_len), device=device, dtype=torch.float32
+        )
+
+        self.state_bag = IncrementalStateBag(max_num_steps or buffer_len)
+
+        self.encoder_output = encoder_output
+        self.encoder_padding_mask = encoder_padding_mask
+
+        self.share_encoder_output = share_encoder_output
+
+        self.seeds = seeds
+
+        self.hypothesis_buffer = hypothesis_buffer
+
+        # A list that indicates beams that should be ignored in the next step.
+        self.ignored_beam_mask = torch.full(
+            (num_searches, beam_size), False, device=device, dtype=torch.bool
+        )
+
+        # fmt: off
+        # (N)
+        self._pad_lens     = torch.tensor([s.pad_len     for s in searches], device=device)
+        self._max_seq_lens = torch.tensor([s.max_seq_len for s in searches], device=device)
+        # fmt: on
+
+        # The ids of the searches in the batch, used to record hypotheses in
+        # sync-free mode.
+        if hypothesis_buffer is None:
+            self._search_ids = None
+        else:
+            self._search_ids = torch.tensor(
+                [s.search_id for s in searches], device=device
+            )
+
+        # An offset array for converting between batch-wide and search-local
+        # beam indices.
+        # (N, 1)
+        self._search_offsets = self._make_search_offsets(num_searches)
+
+        self._cand_offsets = torch.arange(2 * beam_size, device=device)
+
+        self._num_steps = 0
+
+    def step(self) -> List[Tuple[int, List[Hypothesis]]]:
+        """Run a single step of the beam search loop.
+
+        :returns:
+            See :meth:`advance`.
+        """
+        return self.advance(self.decode())
+
+    def decode(self) -> Tensor:
+        """Decode the current step of each beam.
+
+        :returns:
+            The log probabilities of the next step. *Shape:* :math:`(NxB,V)`,
+            where :math:`N` is the number of searches, :math:`B` is the beam
+            size, and :math:`V` is the size of the vocabulary.
+        """
+        step_nr = self.step_nr
+
+        # (N x B, S) -> (N x B, 1)
+        seqs = self.seqs[:, step_nr : step_nr + 1]
+
+        if isinstance(self.decoder, Seq2SeqDecoder):
+            assert self.encoder_output is not None
+
+            decoder_output, decoder_padding_mask = self.decoder.decode(
+                seqs,
+                None,  # We never generate PAD.
+                self.encoder_output,
+                self.encoder_padding_mask,
+                state_bag=self.state_bag,
+            )
+        else:
+            decoder_output, decoder_padding_mask = self.decoder.decode(
+                seqs,
+                None,  # We never generate PAD.
+                state_bag=self.state_bag,
+            )
+
+        self.state_bag.increment_step()
+
+        model_output = self.decoder.project(decoder_output, decoder_padding_mask)
+
+        # (N x B, 1, V)
+        lprobs = log_softmax(model_output.logits, dim=-1, dtype=torch.float32)
+
+        # (N x B, 1, V) -> (N x B, V)
+        return lprobs.squeeze(1)
+
+    def advance(self, lprobs: Tensor) -> List[Tuple[int, List[Hypothesis]]]:
+        """Select the next step of each beam and remove the finished searches.
+
+        :param lprobs:
+            The log probabilities of the current step as returned by
+            :meth:`decode`. *Shape:* :math:`(NxB,V)`, where :math:`N` is the
+            number of searches, :math:`B` is the beam size, and :math:`V` is
+            the size of the vocabulary.
+
+        :returns:
+            The id of each search removed from the batch along with its
+            hypotheses ordered by score. A search that reaches its maximum
+            length with fewer than ``beam_size`` hypotheses, or whose
+            hypotheses are recorded in :attr:`hypothesis_buffer`, has none.
+        """
+        opts = self.opts
+
+        beam_size = self.beam_size
+
+        num_searches = len(self.searches)
+
+        step_nr = self.step_nr
+
+        # (N x B, V) -> (N, B, V)
+        lprobs = lprobs.view(num_searches, beam_size, -1)
+
+        self._apply_length_masks(lprobs)
+
+        # Never allow PAD.
+        lprobs[:, :, self.pad_idx] = -torch.inf
+
+        # Apply UNK penalty.
+        if self.unk_idx is not None:
+            lprobs[:, :, self.unk_idx] -= opts.unk_penalty
+
+        # (N x B, S) -> (N, B, S)
+        seqs = self.seqs.view(num_searches, beam_size, -1)
+        scores = self.scores.view(num_searches, beam_size, -1)
+
+        # update scores in place using logits_processor
+        if opts.logits_processor is not None:
+            opts.logits_processor(seqs[:, :, : step_nr + 1], lprobs)
+
+        # Derive the seeds from the step of each sequence instead of the step
+        # of the batch, which depends on the longest prompt.
+        if self.seeds is None:
+            step_seeds = None
+        else:
+            step_seeds = _derive_seeds(self.seeds, step_nr - self._pad_lens)
+
+        # A search starts once it has consumed its prompt.
+        start_search_indices = [
+            i
+            for i, s in enumerate(self.searches)
+            if step_nr - s.pad_len == s.prompt_len - 1
+        ]
+
+        # Determine candidates for the next step.
+        # (N, 2 x B)
+        cand_scores, cand_indices, cand_beam_indices = _search_step(
+            self.search,
+            step_nr,
+            start_search_indices,
+            lprobs,
+            scores[:, :, : step_nr + 1],
+            seeds=step_seeds,
+        )
+
+        # Convert search-local beam indices to batch-wide beam indices.
+        # (N, 2 x B) + (N) -> (N, 2 x B)
+        global_cand_beam_indices = cand_beam_indices + self._search_offsets
+
+        # Finalize beams that reached the minimum length and that end with an
+        # EOS.
+        # (N, 2 x B)
+        eos_mask = (cand_indices == self.eos_idx) & (cand_scores != -math.inf)
+
+        # Do not attempt to finalize beams that should be ignored.
+        eos_mask[:, :beam_size][self.ignored_beam_mask] = False
+
+        self._num_steps += 1
+
+        if self.hypothesis_buffer is not None:
+            assert self._search_ids is not None
+
+            self.hypothesis_buffer.record(
+                step_nr,
+                self._search_ids,
+                global_cand_beam_indices[:, :beam_size],
+                cand_scores[:, :beam_size],
+                eos_mask[:, :beam_size],
+                self.seqs,
+                self.scores,
+                self.eos_idx,
+                self._len_normalizer(),
+            )
+
+            assert opts.compaction_interval is not None
+
+            # This is the only point where we synchronize with the host.
+            if self._num_steps % opts.compaction_interval == 0:
+                newly_finished_searches = self.hypothesis_buffer.finished(
+                    self._search_ids
+                )
+            else:
+                newly_finished_searches = []
+        else:
+            # Only consider EOS when it's among the top `beam_size` indices.
+            # Now we know what beam(s) to finalize.
+            # (N, B)
+            eos_beam_indices = torch.masked_select(
+                global_cand_beam_indices[:, :beam_size], mask=eos_mask[:, :beam_size]
+            )
+
+            if eos_beam_indices.numel() > 0:
+                # Select the scores of the finalized beams.
+                # (N, B)
+                eos_scores = torch.masked_select(
+                    cand_scores[:, :beam_size], mask=eos_mask[:, :beam_size]
+                )
+
+                newly_finished_searches = self._finalize_hypotheses(
+                    eos_beam_indices, eos_scores
+                )
+            else:
+                newly_finished_searches = []
+
+        # A search that has reached its maximum length cannot continue, even if
+        # it has fewer than `beam_size` hypotheses.
+        expired_searches = [
+            i
+            for i, s in enumerate(self.searches)
+            if step_nr - s.pad_len == s.max_seq_len - 2
+        ]
+
+        removed_searches = sorted(set(newly_finished_searches).union(expired_searches))
+
+        output = []
+
+        for i in removed_searches:
+            search = self.searches[i]
+
+            if len(search.hypotheses) == beam_size:
+                hypotheses = search.hypotheses
+
+                # Ensure that hypotheses are sorted by their scores.
+                hypotheses.sort(key=lambda h: h.score, reverse=True)  # type: ignore[arg-type, return-value]
+            else:
+                hypotheses = []
+
+            output.append((search.search_id, hypotheses))
+
+        if len(removed_searches) == num_searches:
+            self.searches = []
+
+            return output
+
+        # Remove finished searches (ones for which `beam_size` finalized beams
+        # have been generated) from the batch.
+        if removed_searches:
+            removed_set = set(removed_searches)
+
+            kept_searches = [i for i in range(num_searches) if i not in removed_set]
+
+            # (N - F)
+            search_indices = torch.tensor(kept_searches, device=lprobs.device)
+
+            # fmt: off
+            # (N, 2 x B) -> (N - F, 2 x B)
+            cand_scores              = cand_scores             [search_indices]
+            cand_indices             = cand_indices            [search_indices]
+            global_cand_beam_indices = global_cand_beam_indices[search_indices]
+
+            eos_mask = eos_mask[search_indices]
+            # fmt: on
+
+            self._select_searches(kept_searches, search_indices)
+
+        eos_mask[:, :beam_size][self.ignored_beam_mask] = True
+
+        # Set `beam_weights` so that values greater than or equal to 2 x
+        # `beam_size` indicate finished beams (i.e. end with EOS) and values
+        # less than 2 x `beam_size` indicate active beams.
+        # (N, 2 x B)
+        beam_weights = self._cand_offsets + (eos_mask * (2 * beam_size))
+
+        # Get the top `beam_size` active beams, which are the beams with the
+        # smallest weights in `active_beam_weights`.
+        # (N, B)
+        active_beam_weights, active_beams = torch.topk(
+            beam_weights, k=beam_size, dim=1, largest=False
+        )
+
+        # Update to ignore finalized beams in the next step.
+        # (N, B)
+        self.ignored_beam_mask = active_beam_weights >= 2 * beam_size
+
+        # We should always have at least one active beam in each search.
+        # Checking it requires a synchronization, so we skip it in sync-free
+        # mode.
+        if self.hypothesis_buffer is None:
+            assert (~self.ignored_beam_mask).any(dim=1).all()
+
+        # Denotes which beams are continued for each new hypothesis (a beam can
+        # be selected more than once). Note that the indices refer to the beams
+        # of the batch before removing the finished searches.
+        # (N, B)
+        beam_indices = torch.gather(global_cand_beam_indices, dim=1, index=active_beams)
+
+        # (N, B) -> (N x B)
+        beam_indices = beam_indices.view(-1)
+
+        self.state_bag.reorder(beam_indices)
+
+        num_beams = beam_indices.numel()
+
+        # fmt: off
+        # Reorder beams in the `seq` and `score` buffers. The same beam can be
+        # selected more than once. The beams of the finished searches are
+        # dropped by keeping the first `num_beams` rows only.
+        self.seqs  [:num_beams, : step_nr + 1] = torch.index_select(
+            self.seqs  [:, : step_nr + 1], dim=0, index=beam_indices
+        )
+        self.scores[:num_beams, : step_nr + 1] = torch.index_select(
+            self.scores[:, : step_nr + 1], dim=0, index=beam_indices
+        )
+
+        self.seqs   = self.seqs  [:num_beams]
+        self.scores = self.scores[:num_beams]
+
+        # (N x B, S) -> (N, B, S)
+        seqs   = self.seqs  .view(-1, beam_size, self.seqs  .size(1))
+        scores = self.scores.view(-1, beam_size, self.scores.size(1))
+
+        seqs  [:, :, step_nr + 1] = torch.gather(cand_indices, dim=1, index=active_beams)
+        scores[:, :, step_nr + 1] = torch.gather(cand_scores,  dim=1, index=active_beams)
+        # fmt: on
+
+        self.step_nr += 1
+
+        return output
+
+    def extend(self, other: "_BeamSearchBatch") -> None:
+        """Append the searches of ``other`` to the batch.
+
+        Both batches must be at the same point of the loop (i.e. both either
+        decoded or not decoded their current step), and their incremental states
+        must support :meth:`IncrementalStateBag.extend`.
+        """
+        if self.hypothesis_buffer is not None or other.hypothesis_buffer is not None:
+            raise ValueError("A batch in sync-free mode cannot be extended.")
+
+        if (self.seeds is None) != (other.seeds is None):
+            raise ValueError(
+                "`other` must have seeds if and only if the batch has seeds."
+            )
+
+        # Right-align both batches at the later step, and drop the leading steps
+        # that no search uses anymore.
+        step_nr = max(self.step_nr, other.step_nr)
+
+        shift = step_nr - self.step_nr
+        other_shift = step_nr - other.step_nr
+
+        trim = min(
+            min(s.pad_len + shift for s in self.searches),
+            min(s.pad_len + other_shift for s in other.searches),
+        )
+
+        shift, other_shift = shift - trim, other_shift - trim
+
+        for search in self.searches:
+            search.pad_len += shift
+
+        for search in other.searches:
+            search.pad_len += other_shift
+
+        self.searches.extend(other.searches)
+
+        buffer_len = max(s.pad_len + s.max_seq_len for s in self.searches)
+
+        # fmt: off
+        self.seqs = torch.cat([
+            _shift_steps(self.seqs,  shift,       buffer_len),
+            _shift_steps(other.seqs, other_shift, buffer_len),
+        ])
+        self.scores = torch.cat([
+            _shift_steps(self.scores,  shift,       buffer_len),
+            _shift_steps(other.scores, other_shift, buffer_len),
+        ])
+
+        self._pad_lens = torch.cat([
+            self._pad_lens  + shift,
+            other._pad_lens + other_shift,
+        ])
+
+        self._max_seq_lens = torch.cat([self._max_seq_lens, other._max_seq_lens])
+        # fmt: on
+
+        self.step_nr = step_nr - trim
+
+        self.state_bag.extend(other.state_bag)
+
+        if self.encoder_output is not None:
+            assert other.encoder_output is not None
+
+            self.encoder_output, self.encoder_padding_mask = _cat_encoder_outputs(
+                self.encoder_output,
+                self.encoder_padding_mask,
+                other.encoder_output,
+                other.encoder_padding_mask,
+            )
+
+        if self.seeds is not None:
+            assert other.seeds is not None
+
+            self.seeds = torch.cat([self.seeds, other.seeds])
+
+        self.ignored_beam_mask = torch.cat(
+            [self.ignored_beam_mask, other.ignored_beam_mask]
+        )
+
+        self._search_offsets = self._make_search_offsets(len(self.searches))
+
+    def remove(self, search_id: int) -> bool:
+        """Remove the search with ``search_id`` from the batch without
+        finishing it.
+
+        :returns:
+            ``True`` if the batch held the search.
+        """
+        num_searches = len(self.searches)
+
+        kept_searches = [
+            i for i, s in enumerate(self.searches) if s.search_id != search_id
+        ]
+
+        if len(kept_searches) == num_searches:
+            return False
+
+        device = self.seqs.device
+
+        # (N - 1)
+        search_indices = torch.tensor(kept_searches, device=device, dtype=torch.int64)
+
+        # (N - 1) -> ((N - 1) x B)
+        beam_indices = self._search_offsets.view(-1)[search_indices].unsqueeze(-1)
+
+        beam_indices = beam_indices + torch.arange(self.beam_size, device=device)
+
+        beam_indices = beam_indices.view(-1)
+
+        self.state_bag.reorder(beam_indices)
+
+        # fmt: off
+        self.seqs   = self.seqs  .index_select(dim=0, index=beam_indices)
+        self.scores = self.scores.index_select(dim=0, index=beam_indices)
+        # fmt: on
+
+        self._select_searches(kept_searches, search_indices)
+
+        return True
+
+    def _apply_length_masks(self, lprobs: Tensor) -> None:
+        step_nr = self.step_nr
+
+        min_seq_len = self.opts.min_seq_len
+
+        # Do not allow EOS before reaching the minimum sequence length.
+        min_len_mask = [step_nr - s.pad_len < min_seq_len for s in self.searches]
+
+        if all(min_len_mask):
+            lprobs[:, :, self.eos_idx] = -torch.inf
+        elif any(min_len_mask):
+            # (N) -> (N, 1)
+            mask = (step_nr - self._pad_lens < min_seq_len).unsqueeze(1)
+
+            lprobs[:, :, self.eos_idx].masked_fill_(mask, -torch.inf)
+
+        # If a sequence has reached its maximum length, force its last step to
+        # be EOS.
+        max_len_mask = [step_nr - s.pad_len == s.max_seq_len - 2 for s in self.searches]
+
+        if all(max_len_mask):
+            # fmt: off
+            lprobs[:, :, : self.eos_idx]       = -torch.inf
+            lprobs[:, :,   self.eos_idx + 1 :] = -torch.inf
+            # fmt: on
+        elif any(max_len_mask):
+            # (N) -> (N, 1, 1)
+            mask = step_nr - self._pad_lens == self._max_seq_lens - 2
+
+            mask = mask.view(-1, 1, 1)
+
+            eos_lprobs = lprobs[:, :, self.eos_idx].clone()
+
+            lprobs.masked_fill_(mask, -torch.inf)
+
+            lprobs[:, :, self.eos_idx] = eos_lprobs
+
+    def _len_normalizer(self) -> Union[float, Tensor]:
+        if not self.opts.normalize_scores:
+            return 1.0
+
+        len_penalty = self.opts.len_penalty
+
+        # The length of the sequences when they end with an EOS in this step,
+        # excluding the steps that have no score.
+        seq_lens = [
+            self.step_nr + 2 - s.pad_len - s.num_unscored_steps for s in self.searches
+        ]
+
+        # Since the searches are right-aligned, the length is typically the same
+        # for all of them.
+        if min(seq_lens) == max(seq_lens):
+            return float(seq_lens[0] ** len_penalty)
+
+        normalizers = [float(seq_len**len_penalty) for seq_len in seq_lens]
+
+        # (N) -> (N, 1)
+        return torch.tensor(normalizers, device=self.seqs.device).unsqueeze(1)
+
+    def _finalize_hypotheses(
+        self, eos_beam_indices: Tensor, eos_scores: Tensor
+    ) -> List[int]:
+        beam_size = self.beam_size
+
+        step_nr = self.step_nr
+
+        # fmt: off
+        finalized_seqs   = self.seqs  .index_select(dim=0, index=eos_beam_indices)
+        finalized_scores = self.scores.index_select(dim=0, index=eos_beam_indices)
+
+        finalized_seqs   = finalized_seqs  [:, : step_nr + 2]
+        finalized_scores = finalized_scores[:, : step_nr + 2]
+
+        # Finalize beams.
+        finalized_seqs  [:, -1] = self.eos_idx
+        finalized_scores[:, -1] = eos_scores
+        # fmt: on
+
+        # Convert from cumulative to per-step scores.
+        finalized_scores[:, 1:] = finalized_scores[:, 1:] - finalized_scores[:, :-1]
+
+        len_normalizer = self._len_normalizer()
+
+        if isinstance(len_normalizer, Tensor):
+            # (N, 1) -> (F)
+            len_normalizer = len_normalizer.view(-1)[eos_beam_indices // beam_size]
+
+        eos_scores /= len_normalizer
+
+        # Holds the indices of finished searches.
+        newly_finished: List[int] = []
+
+        search_indices = (eos_beam_indices // beam_size).tolist()
+
+        for beam_idx, search_idx in enumerate(search_indices):
+            search = self.searches[search_idx]
+
+            hypotheses = search.hypotheses
+
+            # We might have more than one beam finalized in one step that would
+            # potentially exceed `beam_size` hypotheses.
+            if len(hypotheses) == beam_size:
+                continue
+
+            # Strip the left padding of the prompt.
+            pad_len = search.pad_len
+
+            hypotheses.append(
+                Hypothesis(
+                    seq=finalized_seqs[beam_idx, pad_len:],
+                    score=eos_scores[beam_idx],
+                    step_scores=finalized_scores[beam_idx, pad_len:],
+                )
+            )
+
+            if len(hypotheses) == beam_size:
+                # We have `beam_size` hypotheses for this particular search, so
+                # we finish it now.
+                newly_finished.append(search_idx)
+
+        return newly_finished
+
+    def _select_searches(
+        self, kept_searches: List[int], search_indices: Tensor
+    ) -> None:
+        num_searches = len(self.searches)
+
+        new_num_searches = len(kept_searches)
+
+        self.searches = [self.searches[i] for i in kept_searches]
+
+        # fmt: off
+        # Filter out removed searches from state variables.
+        # (N, B) -> (N - F, B)
+        self.ignored_beam_mask = self.ignored_beam_mask[search_indices]
+
+        # (N) -> (N - F)
+        self._pad_lens     = self._pad_lens    [search_indices]
+        self._max_seq_lens = self._max_seq_lens[search_indices]
+
+        # (N, 1) -> (N - F, 1)
+        self._search_offsets = self._search_offsets[:new_num_searches]
+
+        if self._search_ids is not None:
+            # (N) -> (N - F)
+            self._search_ids = self._search_ids[search_indices]
+
+        if self.seeds is not None:
+            # (N) -> (N - F)
+            self.seeds = self.seeds[search_indices]
+
+        if self.encoder_output is not None:
+            if self.share_encoder_output:
+                # (N, S_enc, M) -> (N - F, S_enc, M)
+                encoder_output = self.encoder_output[search_indices]
+            else:
+                # (N x B, S_enc, M) -> (N, B, S_enc, M)
+                encoder_output = self.encoder_output.unflatten(0, (num_searches, -1))
+
+                # (N, B, S_enc, M) -> ((N - F) x B, S_enc, M)
+                encoder_output = encoder_output[search_indices].flatten(0, 1)
+
+            if self.encoder_padding_mask is not None:
+                # (N) or (N x B)
+                seq_lens = self.encoder_padding_mask.seq_lens
+
+                # (N) or (N x B) -> (N, 1) or (N, B)
+                seq_lens = seq_lens.unflatten(0, (num_searches, -1))
+
+                # (N, 1) or (N, B) -> (N - F) or ((N - F) x B)
+                seq_lens = seq_lens[search_indices].flatten(0, 1)
+
+                self.encoder_padding_mask = PaddingMask(
+                    seq_lens, batch_seq_len=encoder_output.size(1)
+                )
+
+            self.encoder_output = encoder_output
+        # fmt: on
+
+    def _make_search_offsets(self, num_searches: int) -> Tensor:
+        device = self.seqs.device
+
+        # (N)
+        search_offsets = torch.arange(num_searches, device=device) * self.beam_size
+
+        # (N) -> (N, 1)
+        return search_offsets.unsqueeze(-1)
+
+
+def _left_align_prompts(prompt_seqs: Tensor, prompt_lens: Tensor) -> Tensor:
+    batch_seq_len = prompt_seqs.size(1)
+
+    # Rotate each left-padded prompt so that its padding moves to the end.
+    # (N, S)
+    indices = torch.arange(batch_seq_len, device=prompt_seqs.device)
+
+    indices = (indices + (batch_seq_len - prompt_lens).unsqueeze(-1)) % batch_seq_len
+
+    return torch.gather(prompt_seqs, dim=1, index=indices)
+
+
+def _right_align_prompts(prompt_seqs: Tensor, prompt_lens: Tensor) -> Tensor:
+    batch_seq_len = prompt_seqs.size(1)
+
+    # Rotate each right-padded prompt so that its padding moves to the start.
+    # (N, S)
+    indices = torch.arange(batch_seq_len, device=prompt_seqs.device)
+
+    indices = (indices + prompt_lens.unsqueeze(-1)) % batch_seq_len
+
+    return torch.gather(prompt_seqs, dim=1, index=indices)
+
+
+def _supports_seq_steps(decoder: Union[SequenceDecoder, Seq2SeqDecoder]) -> bool:
+    if not isinstance(decoder, Module):
+        return True
+
+    # Sliding window attention states are circular buffers and cannot hold
+    # sequences of different lengths.
+    for m in decoder.modules():
+        if isinstance(m, StandardMultiheadAttention):
+            if isinstance(m.state_factory, LocalAttentionStateFactory):
+                return False
+
+    return True
+
+
+def _check_seeds(seeds: Optional[Tensor], num_searches: int) -> None:
+    if seeds is not None and seeds.shape != (num_searches,):
+        raise ValueError(
+            f"`seeds` must be of shape ({num_searches},), but is of shape {tuple(seeds.shape)} instead."
+        )
+
+
+def _supports_shared_encoder_output(decoder: Seq2SeqDecoder) -> bool:
+    # Sharing relies on `StandardMultiheadAttention` broadcasting each key
+    # sequence over the beams of its search, so we only enable it for decoders
+    # whose encoder output is consumed by nothing else.
+    if not isinstance(decoder, TransformerModel):
+        return False
+
+    if not isinstance(decoder.decoder, StandardTransformerDecoder):
+        return False
+
+    for layer in decoder.decoder.layers:
+        if not isinstance(layer, StandardTransformerDecoderLayer):
+            return False
+
+        attn = layer.encoder_decoder_attn
+
+        if not isinstance(attn, StandardMultiheadAttention):
+            return False
+
+        # A custom state factory expects one key sequence per beam, and
+        # relative position SDPAs depend on the position of each query.
+        if attn.state_factory is not None:
+            return False
+
+        if not isinstance(attn.sdpa, (TorchSDPA, NaiveSDPA, TiledSDPA)):
+            return False
+
+    return True
+
+
+def _search_step(
+    search: BeamSearch,
+    step_nr: int,
+    start_search_indices: List[int],
+    lprobs: Tensor,
+    scores: Tensor,
+    *,
+    seeds: Optional[Tensor] = None,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    num_searches = lprobs.size(0)
+
+    num_start_searches = len(start_search_indices)
+
+    if num_start_searches == 0 or num_start_searches == num_searches:
+        return search.step(step_nr, num_start_searches > 0, lprobs, scores, seeds=seeds)
+
+    # Only some of the searches start at this step (e.g. prompts have different
+    # lengths). Run the search separately for both groups.
+    start_search_set = set(start_search_indices)
+
+    other_search_indices = [i for i in range(num_searches) if i not in start_search_set]
+
+    device = lprobs.device
+
+    start_index = torch.tensor(start_search_indices, device=device)
+    other_index = torch.tensor(other_search_indices, device=device)
+
+    if seeds is None:
+        start_seeds, other_seeds = None, None
+    else:
+        start_seeds, other_seeds = seeds[start_index], seeds[other_index]
+
+    # fmt: off
+    start_output = search.step(
+        step_nr, True,  lprobs[start_index], scores[start_index], seeds=start_seeds
+    )
+    other_output = search.step(
+        step_nr, False, lprobs[other_index], scores[other_index], seeds=other_seeds
+    )
+    # fmt: on
+
+    output = []
+
+    for start_t, other_t in zip(start_output, other_output):
+        t = start_t.new_empty((num_searches,) + start_t.shape[1:])
+
+        t[start_index] = start_t
+        t[other_index] = other_t
+
+        output.append(t)
+
+    return output[0], output[1], output[2]
+
+
+def _shift_steps(seqs: Tensor, offset: int, seq_len: int) -> Tensor:
+    # Move the step `i` of each sequence to `i + offset`, and pad or truncate
+    # the sequences to `seq_len`.
+    if offset < 0:
+        seqs = seqs[:, -offset:]
+    else:
+        seqs = pad(seqs, (offset, 0))
+
+    seqs = seqs[:, :seq_len]
+
+    return pad(seqs, (0, seq_len - seqs.size(1)))
+
+
+def _cat_encoder_outputs(
+    encoder_output: Tensor,
+    encoder_padding_mask: Optional[PaddingMask],
+    other_encoder_output: Tensor,
+    other_encoder_padding_mask: Optional[PaddingMask],
+) -> Tuple[Tensor, Optional[PaddingMask]]:
+    seq_len = encoder_output.size(1)
+
+    other_seq_len = other_encoder_output.size(1)
+
+    if encoder_padding_mask is None and other_encoder_padding_mask is None:
+        if seq_len == other_seq_len:
+            return torch.cat([encoder_output, other_encoder_output]), None
+
+    def get_seq_lens(output: Tensor, padding_mask: Optional[PaddingMask]) -> Tensor:
+        if padding_mask is None:
+            return torch.full((output.size(0),), output.size(1), device=output.device)
+
+        return padding_mask.seq_lens
+
+    seq_lens = torch.cat(
+        [
+            get_seq_lens(encoder_output, encoder_padding_mask),
+            get_seq_lens(other_encoder_output, other_encoder_padding_mask),
+        ]
+    )
+
+    max_seq_len = max(seq_len, other_seq_len)
+
+    # The attention states pad the encoder keys in the same way, so the encoder
+    # padding mask stays consistent with them.
+    # (N, S_enc, M) -> (N, S_max, M)
+    encoder_output = pad(encoder_output, (0, 0, 0, max_seq_len - seq_len))
+
+    other_encoder_output = pad(
+        other_encoder_output, (0, 0, 0, max_seq_len - other_seq_len)
+    )
+
+    encoder_output = torch.cat([encoder_output, other_encoder_output])
+
+    return encoder_output, PaddingMask(seq_lens, batch_seq_len=max_seq_len)
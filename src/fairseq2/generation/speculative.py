@@ -0,0 +1,910 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Callable, List, Optional, Tuple, Union
+
+import torch
+from torch import Tensor
+from torch.nn.functional import log_softmax, pad
+
+from fairseq2.data import VocabularyInfo
+from fairseq2.generation.beam_search import SamplingSearch, StandardBeamSearch
+from fairseq2.generation.sampler import Sampler
+from fairseq2.generation.sequence_generator import (
+    Hypothesis,
+    SequenceGeneratorOptions,
+    SequenceGeneratorOutput,
+    _left_align_prompts,
+    _supports_seq_steps,
+)
+from fairseq2.models.decoder import SequenceDecoder
+from fairseq2.models.encoder_decoder import Seq2SeqDecoder
+from fairseq2.nn.incremental_state import IncrementalStateBag
+from fairseq2.nn.padding import PaddingMask
+
+
+class _SpeculativeGenerator:
+    """Holds the decoding loop shared by the speculative generators.
+
+    In each round, the draft decoder proposes up to ``num_draft_steps`` steps
+    one by one, and the decoder scores all of them in a single forward pass.
+    Each sequence keeps its longest accepted prefix of the draft followed by a
+    step chosen by the decoder, so a round always makes progress. Sequences
+    advance independently of each other; the incremental states of both
+    decoders are truncated to the accepted steps of each sequence (see
+    :attr:`IncrementalStateBag.seq_steps`).
+    """
+
+    opts: SequenceGeneratorOptions
+    num_draft_steps: int
+    unk_idx: Optional[int]
+    eos_idx: int
+    pad_idx: int
+    sampler: Optional[Sampler]
+
+    def __init__(
+        self,
+        vocab_info: VocabularyInfo,
+        opts: Optional[SequenceGeneratorOptions],
+        num_draft_steps: int,
+    ) -> None:
+        self.opts = opts or SequenceGeneratorOptions(beam_size=1)
+
+        if self.opts.beam_size != 1:
+            raise ValueError(
+                f"`opts.beam_size` must be 1 for speculative decoding, but is {self.opts.beam_size} instead."
+            )
+
+        search = self.opts.search
+
+        if search is None or isinstance(search, StandardBeamSearch):
+            self.sampler = None
+        elif isinstance(search, SamplingSearch):
+            self.sampler = search.sampler
+        else:
+            raise ValueError(
+                f"`opts.search` must be `None` or of type {StandardBeamSearch} or {SamplingSearch} for speculative decoding, but is of type {type(search)} instead."
+            )
+
+        if self.opts.logits_processor is not None:
+            raise ValueError(
+                "`opts.logits_processor` must be `None` for speculative decoding."
+            )
+
+        if self.opts.compaction_interval is not None:
+            raise ValueError(
+                "`opts.compaction_interval` must be `None` for speculative decoding."
+            )
+
+        if num_draft_steps <= 0:
+            raise ValueError(
+                f"`num_draft_steps` must be greater than 0, but is {num_draft_steps} instead."
+            )
+
+        self.num_draft_steps = num_draft_steps
+
+        if vocab_info.eos_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `eos_idx` set for sequence generation."
+            )
+
+        if vocab_info.pad_idx is None:
+            raise ValueError(
+                "`vocab_info` must have `pad_idx` set for sequence generation."
+            )
+
+        # Set vocab info.
+        self.unk_idx = vocab_info.unk_idx
+        self.eos_idx = vocab_info.eos_idx
+        self.pad_idx = vocab_info.pad_idx
+
+    @staticmethod
+    def _check_decoders(
+        decoder: Union[SequenceDecoder, Seq2SeqDecoder],
+        draft_decoder: Union[SequenceDecoder, Seq2SeqDecoder],
+    ) -> None:
+        # Since sequences advance independently, both decoders must be able to
+        # hold sequences at different steps.
+        if not (_supports_seq_steps(decoder) and _supports_seq_steps(draft_decoder)):
+            raise ValueError(
+                "`decoder` and `draft_decoder` must not use sliding window attention for speculative decoding."
+            )
+
+    def _generate(
+        self,
+        seqs: Tensor,
+        scores: Tensor,
+        seq_lens: Tensor,
+        host_seq_lens: List[int],
+        num_unscored_steps: List[int],
+        decode: Callable[[Tensor, IncrementalStateBag], Tensor],
+        draft_decode: Callable[[Tensor, IncrementalStateBag], Tensor],
+        select: Callable[[Tensor], None],
+        state_bag: IncrementalStateBag,
+        draft_state_bag: IncrementalStateBag,
+    ) -> List[List[Hypothesis]]:
+        # `seqs` and `scores` hold the first `seq_lens` steps of each sequence.
+        # The incremental states of both decoders hold all but the last of
+        # these steps.
+        num_seqs, max_seq_len = seqs.shape
+
+        device = seqs.device
+
+        results: List[List[Hypothesis]] = [[] for _ in range(num_seqs)]
+
+        # The ids of the sequences still in the batch.
+        active_ids = list(range(num_seqs))
+
+        # The number of steps by which the draft decoder lags behind the end of
+        # the sequences. It is the same for all sequences.
+        draft_lag = 1
+
+        first_round = True
+
+        while True:
+            # Do not draft beyond the last step, which is always an EOS.
+            num_draft_steps = min(
+                self.num_draft_steps, max_seq_len - 1 - max(host_seq_lens)
+            )
+
+            # The positions of the steps generated in this round.
+            # (N, S_drf + 1)
+            positions = seq_lens.unsqueeze(1) + torch.arange(
+                num_draft_steps + 1, device=device
+            )
+
+            # The probabilities that the draft steps were sampled from.
+            draft_probs = []
+
+            # (N, S_lag)
+            draft_input = seqs.gather(
+                1, positions[:, :1] - torch.arange(draft_lag, 0, -1, device=device)
+            )
+
+            for i in range(num_draft_steps):
+                # (N, S_inp, V)
+                logits = draft_decode(draft_input, draft_state_bag)
+
+                draft_state_bag.increment_step(draft_input.size(1))
+
+                # (N, S_inp, V) -> (N, 1, V)
+                lprobs = log_softmax(logits[:, -1:], dim=-1, dtype=torch.float32)
+
+                self._prepare_lprobs(lprobs, positions[:, i : i + 1], max_seq_len)
+
+                # (N, 1, V) -> (N, V)
+                lprobs = lprobs.squeeze(1)
+
+                if self.sampler is None:
+                    # (N, V) -> (N, 1)
+                    draft_input = lprobs.argmax(dim=-1, keepdim=True)
+                else:
+                    # (N, V)
+                    probs = self.sampler.probs(lprobs)
+
+                    # (N, V) -> (N, 1)
+                    draft_input = self.sampler.sample(probs, 1)
+
+                    draft_probs.append(probs)
+
+                seqs.scatter_(1, positions[:, i : i + 1], draft_input)
+
+            # Verify the draft steps in a single forward pass.
+            # (N, S_drf + 1, V)
+            logits = decode(seqs.gather(1, positions - 1), state_bag)
+
+            state_bag.increment_step(num_draft_steps + 1)
+
+            # The states are only known once both decoders have run.
+            if first_round:
+                if not (
+                    state_bag.supports_truncate()
+                    and draft_state_bag.supports_truncate()
+                ):
+                    raise ValueError(
+                        "The incremental states of `decoder` and `draft_decoder` must support `truncate()` for speculative decoding (e.g. the default full and static attention states)."
+                    )
+
+                first_round = False
+
+            lprobs = log_softmax(logits, dim=-1, dtype=torch.float32)
+
+            self._prepare_lprobs(lprobs, positions, max_seq_len)
+
+            # (N, S_drf)
+            draft_steps = seqs.gather(1, positions[:, :-1])
+
+            if self.sampler is None:
+                # (N, S_drf + 1, V) -> (N, S_drf + 1)
+                target_steps = lprobs.argmax(dim=-1)
+
+                # (N, S_drf)
+                accept_mask = draft_steps == target_steps[:, :-1]
+            else:
+                target_steps, accept_mask = self._verify_samples(
+                    lprobs, draft_steps, draft_probs
+                )
+
+            # (N, S_drf) -> (N)
+            num_accepted = accept_mask.long().cumprod(dim=1).sum(dim=1)
+
+            # (S_drf + 1)
+            offsets = torch.arange(num_draft_steps + 1, device=device)
+
+            # Take the accepted draft steps followed by the step chosen by the
+            # decoder.
+            # (N, S_drf + 1)
+            next_steps = torch.where(
+                offsets < num_accepted.unsqueeze(1),
+                pad(draft_steps, (0, 1)),
+                target_steps,
+            )
+
+            # (N, S_drf + 1, V) -> (N, S_drf + 1)
+            next_scores = lprobs.gather(-1, next_steps.unsqueeze(-1)).squeeze(-1)
+
+            # Write all steps; the ones beyond the accepted steps of a sequence
+            # get overwritten in the next rounds.
+            seqs.scatter_(1, positions, next_steps)
+
+            scores.scatter_(1, positions, next_scores)
+
+            # (N, S_drf + 1)
+            eos_mask = next_steps == self.eos_idx
+
+            eos_mask &= offsets <= num_accepted.unsqueeze(1)
+
+            # The offset of the first EOS of each sequence, if any.
+            # (N)
+            eos_offsets = torch.where(eos_mask, offsets, num_draft_steps + 1)
+
+            eos_offsets = eos_offsets.amin(dim=1)
+
+            host_num_accepted, host_eos_offsets = torch.stack(
+                [num_accepted, eos_offsets]
+            ).tolist()
+
+            # Each sequence advances by its own number of accepted steps plus
+            # the step chosen by the decoder.
+            seq_lens = seq_lens + num_accepted + 1
+
+            finished_indices = []
+
+            for idx, eos_offset in enumerate(host_eos_offsets):
+                if eos_offset > num_draft_steps:
+                    host_seq_lens[idx] += host_num_accepted[idx] + 1
+
+                    continue
+
+                finished_indices.append(idx)
+
+                search_id = active_ids[idx]
+
+                hypothesis_len = host_seq_lens[idx] + eos_offset + 1
+
+                step_scores = scores[idx, :hypothesis_len]
+
+                score = step_scores.sum()
+
+                if self.opts.normalize_scores:
+                    gen_len = hypothesis_len - num_unscored_steps[search_id]
+
+                    score /= gen_len**self.opts.len_penalty
+
+                results[search_id].append(
+                    Hypothesis(
+                        seq=seqs[idx, :hypothesis_len],
+                        score=score,
+                        step_scores=step_scores,
+                    )
+                )
+
+            if finished_indices:
+                if len(finished_indices) == len(active_ids):
+                    break
+
+                finished_set = set(finished_indices)
+
+                unfinished_indices = [
+                    i for i in range(len(active_ids)) if i not in finished_set
+                ]
+
+                active_ids = [active_ids[i] for i in unfinished_indices]
+
+                host_seq_lens = [host_seq_lens[i] for i in unfinished_indices]
+
+                host_num_accepted = [host_num_accepted[i] for i in unfinished_indices]
+
+                # (N) -> (N - F)
+                index = torch.tensor(unfinished_indices, device=device)
+
+                # fmt: off
+                seqs     = seqs    .index_select(0, index)
+                scores   = scores  .index_select(0, index)
+                seq_lens = seq_lens.index_select(0, index)
+                # fmt: on
+
+                state_bag.reorder(index)
+
+                draft_state_bag.reorder(index)
+
+                select(index)
+
+            # Roll back the decoder of each sequence to its last accepted step.
+            # The step itself is fed in the next round.
+            state_bag.truncate(seq_lens - 1)
+
+            # The draft decoder has seen all but the last of its draft steps. A
+            # sequence whose draft got fully accepted has to catch up on two
+            # steps; roll back the others so that all lag behind equally.
+            if num_draft_steps > 0:
+                draft_lag = max(host_num_accepted) + 2 - num_draft_steps
+
+                draft_lag = max(draft_lag, 1)
+            else:
+                draft_lag += 1
+
+            draft_state_bag.truncate(seq_lens - draft_lag)
+
+        return results
+
+    def _verify_samples(
+        self, lprobs: Tensor, draft_steps: Tensor, draft_probs: List[Tensor]
+    ) -> Tuple[Tensor, Tensor]:
+        assert self.sampler is not None
+
+        batch_size, seq_len, vocab_size = lprobs.shape
+
+        # (N, S_drf + 1, V) -> (N x (S_drf + 1), V)
+        probs = self.sampler.probs(lprobs.flatten(0, 1))
+
+        # (N x (S_drf + 1), V) -> (N, S_drf + 1, V)
+        probs = probs.view(batch_size, seq_len, vocab_size)
+
+        if not draft_probs:
+            # (N, 1, V) -> (N, 1)
+            target_steps = self.sampler.sample(probs.squeeze(1), 1)
+
+            return target_steps, draft_steps.new_empty(
+                (batch_size, 0), dtype=torch.bool
+            )
+
+        # (N, S_drf, V)
+        q = torch.stack(draft_probs, dim=1)
+
+        # (N, S_drf, V)
+        p = probs[:, :-1]
+
+        # (N, S_drf) -> (N, S_drf, 1)
+        index = draft_steps.unsqueeze(-1)
+
+        # (N, S_drf)
+        p_draft = p.gather(-1, index).squeeze(-1)
+        q_draft = q.gather(-1, index).squeeze(-1)
+
+        # Draw the acceptance noise from the same generator as the samples, so
+        # that seeding the sampler makes the whole generation reproducible.
+        noise = torch.rand(
+            p_draft.shape,
+            generator=self.sampler.generator,
+            device=p_draft.device,
+            dtype=p_draft.dtype,
+        )
+
+        # Accept each draft step with a probability of `min(1, p / q)`.
+        accept_mask = noise * q_draft < p_draft
+
+        # On rejection, the decoder resamples the step from the residual
+        # distribution `max(0, p - q)`. After the last draft step, it samples
+        # from `p` as usual.
+        # (N, S_drf + 1, V)
+        residual_probs = torch.cat([(p - q).clamp_(min=0.0), probs[:, -1:]], dim=1)
+
+        # (N, S_drf + 1, V) -> (N x (S_drf + 1), V)
+        residual_probs = residual_probs.flatten(0, 1)
+
+        # (N x (S_drf + 1), V) -> (N, S_drf + 1)
+        target_steps = self.sampler.sample(residual_probs, 1).view(batch_size, -1)
+
+        return target_steps, accept_mask
+
+    def _prepare_lprobs(
+        self, lprobs: Tensor, positions: Tensor, max_seq_len: int
+    ) -> None:
+        # `lprobs[:, i]` is the distribution of the step at `positions[:, i]`.
+        # (N, S) -> (N, S, 1)
+        positions = positions.unsqueeze(-1)
+
+        # Do not allow EOS before reaching the minimum sequence length.
+        lprobs[:, :, self.eos_idx : self.eos_idx + 1].masked_fill_(
+            positions <= self.opts.min_seq_len, -torch.inf
+        )
+
+        # If we have reached the maximum length, force the step to be EOS.
+        # (V)
+        non_eos_mask = torch.ones(
+            lprobs.size(-1), device=lprobs.device, dtype=torch.bool
+        )
+
+        non_eos_mask[self.eos_idx] = False
+
+        lprobs.masked_fill_((positions == max_seq_len - 1) & non_eos_mask, -torch.inf)
+
+        # Never allow PAD.
+        lprobs[:, :, self.pad_idx] = -torch.inf
+
+        # Apply UNK penalty.
+        if self.unk_idx is not None:
+            lprobs[:, :, self.unk_idx] -= self.opts.unk_penalty
+
+
+class SpeculativeSeq2SeqGenerator(_SpeculativeGenerator):
+    """Represents a sequence-to-sequence generator that uses speculative
+    decoding as described in :cite:t:`https://doi.org/10.48550/arxiv.2211.17192`.
+
+    A smaller draft decoder proposes the next steps, and the decoder verifies
+    them in a single forward pass; the decoder therefore runs once for several
+    steps as long as the draft decoder predicts it well. With greedy search,
+    the generated sequences are the same as the ones of :class:`Seq2SeqGenerator`
+    with a beam size of 1. With :class:`SamplingSearch`, they follow the
+    distribution of the decoder.
+
+    .. note::
+        Both decoders must use attention states that support
+        :meth:`~fairseq2.nn.incremental_state.IncrementalState.truncate` and
+        multi-step appends of sequences at different steps (e.g. the default
+        full and static attention states).
+    """
+
+    decoder: Seq2SeqDecoder
+    draft_decoder: Seq2SeqDecoder
+    prefix_seq: Union[int, Tensor]
+    prefix_seq_len: int
+
+    def __init__(
+        self,
+        decoder: Seq2SeqDecoder,
+        draft_decoder: Seq2SeqDecoder,
+        vocab_info: VocabularyInfo,
+        prefix_seq: Optional[Union[int, Tensor]],
+        opts: Optional[SequenceGeneratorOptions] = None,
+        *,
+        num_draft_steps: int = 4,
+    ) -> None:
+        """
+        :param decoder:
+            The decoder to use.
+        :param draft_decoder:
+            The decoder to draft the next steps with. Must share the vocabulary
+            of ``decoder``.
+        :param vocab_info:
+            The vocabulary information to use.
+        :param prefix_seq:
+            The prefix sequence, typically one or more control symbols
+            indicating the beginning of a sequence. *Shape:* :math:`()` or
+            :math:`(S)`, where :math:`S` is the sequence length. If ``None``,
+            the EOS symbol will be used as prefix.
+        :param opts:
+            The generation options. ``beam_size`` must be 1, and ``search``
+            must be ``None`` for greedy decoding or a :class:`SamplingSearch`.
+        :param num_draft_steps:
+            The maximum number of steps to draft in each round.
+        """
+        super().__init__(vocab_info, opts, num_draft_steps)
+
+        self._check_decoders(decoder, draft_decoder)
+
+        self.decoder = decoder
+        self.draft_decoder = draft_decoder
+
+        # Set prefix sequence.
+        if prefix_seq is None:
+            # If `None`, we follow fairseq's convention, and use EOS as the
+            # prefix.
+            self.prefix_seq, self.prefix_seq_len = self.eos_idx, 1
+        else:
+            self.prefix_seq = prefix_seq
+
+            if isinstance(prefix_seq, Tensor):
+                num_dim = prefix_seq.dim()
+
+                if num_dim >= 2:
+                    raise ValueError(
+                        f"`prefix_seq` must be a scalar or a 1-dimensional tensor, but is {num_dim}-dimensional instead."
+                    )
+
+                self.prefix_seq_len = 1 if num_dim == 0 else prefix_seq.size(0)
+            else:
+                self.prefix_seq_len = 1
+
+    @torch.inference_mode()
+    def __call__(
+        self,
+        encoder_output: Tensor,
+        encoder_padding_mask: Optional[PaddingMask],
+        draft_encoder_output: Tensor,
+        draft_encoder_padding_mask: Optional[PaddingMask],
+        source_seq_len: Optional[int] = None,
+    ) -> SequenceGeneratorOutput:
+        """
+        :param encoder_output:
+            The encoder output of the model of :attr:`decoder`. *Shape:*
+            :math:`(N,S_{enc},M)`, where :math:`N` is the batch size,
+            :math:`S_{enc}` is the encoder output sequence length, and :math:`M`
+            is the dimensionality of the model.
+        :param encoder_padding_mask:
+            The padding mask of ``encoder_output``. *Shape:* :math:`(N,S_{enc})`,
+            where :math:`N` is the batch size and :math:`S_{enc}` is the encoder
+            output sequence length.
+        :param draft_encoder_output:
+            The encoder output of the model of :attr:`draft_decoder`. *Shape:*
+            :math:`(N,S_{enc},M_{drf})`, where :math:`N` is the batch size,
+            :math:`S_{enc}` is the encoder output sequence length, and
+            :math:`M_{drf}` is the dimensionality of the draft model.
+        :param draft_encoder_padding_mask:
+            The padding mask of ``draft_encoder_output``. *Shape:*
+            :math:`(N,S_{enc})`, where :math:`N` is the batch size and
+            :math:`S_{enc}` is the encoder output sequence length.
+        :param source_seq_len:
+            The source sequence length, used to determine the maximum length of
+            the generated sequences.
+        """
+        num_searches = encoder_output.size(0)
+
+        max_seq_len = self._determine_max_seq_len(source_seq_len)
+
+        device = encoder_output.device
+
+        # (N, S)
+        seqs = torch.zeros(
+            (num_searches, max_seq_len), device=device, dtype=torch.int64
+        )
+
+        # Unlike `Seq2SeqGenerator`, holds per-step, not cumulative, scores.
+        # (N, S)
+        scores = torch.zeros(
+            (num_searches, max_seq_len), device=device, dtype=torch.float32
+        )
+
+        seqs[:, : self.prefix_seq_len] = self.prefix_seq
+
+        def decode(seqs: Tensor, state_bag: IncrementalStateBag) -> Tensor:
+            decoder_output, decoder_padding_mask = self.decoder.decode(
+                seqs,
+                None,  # We never generate PAD.
+                encoder_output,
+                encoder_padding_mask,
+                state_bag=state_bag,
+            )
+
+            model_output = self.decoder.project(decoder_output, decoder_padding_mask)
+
+            return model_output.logits
+
+        def draft_decode(seqs: Tensor, state_bag: IncrementalStateBag) -> Tensor:
+            decoder_output, decoder_padding_mask = self.draft_decoder.decode(
+                seqs,
+                None,  # We never generate PAD.
+                draft_encoder_output,
+                draft_encoder_padding_mask,
+                state_bag=state_bag,
+            )
+
+            model_output = self.draft_decoder.project(
+                decoder_output, decoder_padding_mask
+            )
+
+            return model_output.logits
+
+        def select(index: Tensor) -> None:
+            nonlocal encoder_output, encoder_padding_mask
+            nonlocal draft_encoder_output, draft_encoder_padding_mask
+
+            encoder_output = encoder_output.index_select(0, index)
+
+            encoder_padding_mask = _select_padding_mask(encoder_padding_mask, index)
+
+            draft_encoder_output = draft_encoder_output.index_select(0, index)
+
+            draft_encoder_padding_mask = _select_padding_mask(
+                draft_encoder_padding_mask, index
+            )
+
+        state_bag = IncrementalStateBag(max_seq_len)
+
+        draft_state_bag = IncrementalStateBag(max_seq_len)
+
+        if self.prefix_seq_len > 1:
+            self._bootstrap(
+                seqs, scores, decode, draft_decode, state_bag, draft_state_bag
+            )
+
+        # (N)
+        seq_lens = torch.full(
+            (num_searches,), self.prefix_seq_len, device=device, dtype=torch.int64
+        )
+
+        # The first step (e.g. EOS) has no score; skip it in normalization.
+        num_unscored_steps = [1] * num_searches
+
+        results = self._generate(
+            seqs,
+            scores,
+            seq_lens,
+            [self.prefix_seq_len] * num_searches,
+            num_unscored_steps,
+            decode,
+            draft_decode,
+            select,
+            state_bag,
+            draft_state_bag,
+        )
+
+        return SequenceGeneratorOutput(
+            results=results, device=device, pad_idx=self.pad_idx
+        )
+
+    def _determine_max_seq_len(self, source_seq_len: Optional[int]) -> int:
+        opts = self.opts
+
+        if source_seq_len is None or opts.soft_max_seq_len is None:
+            max_seq_len = opts.hard_max_seq_len
+        else:
+            at, bt = opts.soft_max_seq_len
+
+            max_seq_len = min(opts.hard_max_seq_len, int(at * source_seq_len + bt))
+
+        if opts.min_seq_len > max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than or equal to `min_seq_len` ({opts.min_seq_len}), but is {max_seq_len} instead. Adjust your soft and hard maximum sequence length limits."
+            )
+
+        if self.prefix_seq_len >= max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than `prefix_seq_len` ({self.prefix_seq_len}), but is {max_seq_len} instead."
+            )
+
+        return max_seq_len
+
+    def _bootstrap(
+        self,
+        seqs: Tensor,
+        scores: Tensor,
+        decode: Callable[[Tensor, IncrementalStateBag], Tensor],
+        draft_decode: Callable[[Tensor, IncrementalStateBag], Tensor],
+        state_bag: IncrementalStateBag,
+        draft_state_bag: IncrementalStateBag,
+    ) -> None:
+        prefix_len = self.prefix_seq_len
+
+        # (N, S_pfx - 1)
+        decoder_input = seqs[:, : prefix_len - 1]
+
+        # Bootstrap the state of both decoders with the prefix sequence.
+        logits = decode(decoder_input, state_bag)
+
+        state_bag.increment_step(prefix_len - 1)
+
+        draft_decode(decoder_input, draft_state_bag)
+
+        draft_state_bag.increment_step(prefix_len - 1)
+
+        # (N, S_pfx - 1, V)
+        lprobs = log_softmax(logits, dim=-1, dtype=torch.float32)
+
+        # (N, S_pfx - 1) -> (N, S_pfx - 1, 1)
+        indices = seqs[:, 1:prefix_len].unsqueeze(-1)
+
+        # The first step (e.g. EOS)'s score is always 0.
+        scores[:, 1:prefix_len] = torch.gather(lprobs, dim=-1, index=indices).squeeze(
+            -1
+        )
+
+
+class SpeculativeDecoderOnlyGenerator(_SpeculativeGenerator):
+    """Represents a sequence generator for decoder-only models that uses
+    speculative decoding as described in
+    :cite:t:`https://doi.org/10.48550/arxiv.2211.17192`.
+
+    See :class:`SpeculativeSeq2SeqGenerator` for more information. With greedy
+    search, the generated sequences are the same as the ones of
+    :class:`DecoderOnlyGenerator` with a beam size of 1.
+    """
+
+    decoder: SequenceDecoder
+    draft_decoder: SequenceDecoder
+
+    def __init__(
+        self,
+        decoder: SequenceDecoder,
+        draft_decoder: SequenceDecoder,
+        vocab_info: VocabularyInfo,
+        opts: Optional[SequenceGeneratorOptions] = None,
+        *,
+        num_draft_steps: int = 4,
+    ) -> None:
+        """
+        :param decoder:
+            The decoder to use.
+        :param draft_decoder:
+            The decoder to draft the next steps with. Must share the vocabulary
+            of ``decoder``.
+        :param vocab_info:
+            The vocabulary information to use.
+        :param opts:
+            The generation options. ``beam_size`` must be 1, and ``search``
+            must be ``None`` for greedy decoding or a :class:`SamplingSearch`.
+        :param num_draft_steps:
+            The maximum number of steps to draft in each round.
+        """
+        super().__init__(vocab_info, opts, num_draft_steps)
+
+        self._check_decoders(decoder, draft_decoder)
+
+        self.decoder = decoder
+        self.draft_decoder = draft_decoder
+
+    @torch.inference_mode()
+    def __call__(
+        self,
+        prompt_seqs: Tensor,
+        prompt_padding_mask: Optional[PaddingMask],
+        *,
+        left_padded: bool = False,
+    ) -> SequenceGeneratorOutput:
+        """
+        :param prompt_seqs:
+            The prompts to continue. *Shape:* :math:`(N,S)`, where :math:`N` is
+            the batch size and :math:`S` is the sequence length.
+        :param prompt_padding_mask:
+            The padding mask of ``prompt_seqs``. *Shape:* :math:`(N,S)`, where
+            :math:`N` is the batch size and :math:`S` is the sequence length.
+        :param left_padded:
+            If ``True``, the prompts in ``prompt_seqs`` are padded on the left
+            instead of the right.
+
+        :returns:
+            The generated hypotheses. Each hypothesis starts with its prompt.
+        """
+        num_searches, prompt_batch_seq_len = prompt_seqs.shape
+
+        device = prompt_seqs.device
+
+        # (N)
+        if prompt_padding_mask is None:
+            prompt_lens = torch.full(
+                (num_searches,), prompt_batch_seq_len, device=device, dtype=torch.int64
+            )
+        else:
+            prompt_lens = prompt_padding_mask.seq_lens
+
+            if left_padded:
+                prompt_seqs = _left_align_prompts(prompt_seqs, prompt_lens)
+
+        host_prompt_lens: List[int] = prompt_lens.tolist()
+
+        if not host_prompt_lens:
+            return SequenceGeneratorOutput(
+                results=[], device=device, pad_idx=self.pad_idx
+            )
+
+        min_prompt_len = min(host_prompt_lens)
+        max_prompt_len = max(host_prompt_lens)
+
+        if min_prompt_len == 0:
+            raise ValueError("`prompt_seqs` must not contain empty prompts.")
+
+        max_seq_len = self._determine_max_seq_len(max_prompt_len)
+
+        # (N, S)
+        seqs = torch.zeros(
+            (num_searches, max_seq_len), device=device, dtype=torch.int64
+        )
+
+        # (N, S)
+        scores = torch.zeros(
+            (num_searches, max_seq_len), device=device, dtype=torch.float32
+        )
+
+        seqs[:, :max_prompt_len] = prompt_seqs[:, :max_prompt_len]
+
+        def decode(seqs: Tensor, state_bag: IncrementalStateBag) -> Tensor:
+            decoder_output, decoder_padding_mask = self.decoder.decode(
+                seqs, None, state_bag=state_bag  # We never generate PAD.
+            )
+
+            model_output = self.decoder.project(decoder_output, decoder_padding_mask)
+
+            return model_output.logits
+
+        def draft_decode(seqs: Tensor, state_bag: IncrementalStateBag) -> Tensor:
+            decoder_output, decoder_padding_mask = self.draft_decoder.decode(
+                seqs, None, state_bag=state_bag  # We never generate PAD.
+            )
+
+            model_output = self.draft_decoder.project(
+                decoder_output, decoder_padding_mask
+            )
+
+            return model_output.logits
+
+        def select(index: Tensor) -> None:
+            pass
+
+        state_bag = IncrementalStateBag(max_seq_len)
+
+        draft_state_bag = IncrementalStateBag(max_seq_len)
+
+        # Prefill both decoders with all prompts but their last step in a single
+        # forward pass. Since the prompts are right-padded, the causal attention
+        # keeps the padded steps from affecting the actual ones.
+        if (prefill_len := max_prompt_len - 1) > 0:
+            decode(seqs[:, :prefill_len], state_bag)
+
+            state_bag.increment_step(prefill_len)
+
+            draft_decode(seqs[:, :prefill_len], draft_state_bag)
+
+            draft_state_bag.increment_step(prefill_len)
+
+            # Discard the padded steps; from now on, each sequence continues
+            # from the end of its own prompt.
+            if min_prompt_len < max_prompt_len:
+                state_bag.truncate(prompt_lens - 1)
+
+                draft_state_bag.truncate(prompt_lens - 1)
+
+        # Prompt steps have no score, so we normalize by the number of generated
+        # steps only.
+        results = self._generate(
+            seqs,
+            scores,
+            prompt_lens,
+            list(host_prompt_lens),
+            host_prompt_lens,
+            decode,
+            draft_decode,
+            select,
+            state_bag,
+            draft_state_bag,
+        )
+
+        return SequenceGeneratorOutput(
+            results=results, device=device, pad_idx=self.pad_idx
+        )
+
+    def _determine_max_seq_len(self, max_prompt_len: int) -> int:
+        opts = self.opts
+
+        if opts.soft_max_seq_len is None:
+            max_seq_len = opts.hard_max_seq_len
+        else:
+            at, bt = opts.soft_max_seq_len
+
+            max_seq_len = min(opts.hard_max_seq_len, int(at * max_prompt_len + bt))
+
+        if opts.min_seq_len > max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than or equal to `min_seq_len` ({opts.min_seq_len}), but is {max_seq_len} instead. Adjust your soft and hard maximum sequence length limits."
+            )
+
+        if max_prompt_len >= max_seq_len:
+            raise ValueError(
+                f"The effective maximum sequence length must be greater than the length of the longest prompt ({max_prompt_len}), but is {max_seq_len} instead."
+            )
+
+        return max_seq_len
+
+
+def _select_padding_mask(
+    padding_mask: Optional[PaddingMask], index: Tensor
+) -> Optional[PaddingMask]:
+    if padding_mask is None:
+        return None
+
+    seq_lens = padding_mask.seq_lens.index_select(0, index)
+
+    return PaddingMask(seq_lens, batch_seq_len=padding_mask.batch_seq_len)
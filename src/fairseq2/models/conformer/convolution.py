@@ -11,7 +11,7 @@ from torch.nn import GLU, BatchNorm1d, Conv1d, Module, SiLU
 from torch.nn.functional import pad
 
 from fairseq2.nn.normalization import LayerNorm, StandardLayerNorm
-from fairseq2.nn.padding import PaddingMask, apply_padding_mask
+from fairseq2.nn.padding import PackedPaddingMask, PaddingMask, apply_padding_mask
 from fairseq2.typing import DataType, Device
 
 
@@ -125,6 +125,11 @@ class ConformerConvolution(Module):
         :returns:
             The processed sequences. *Shape:* Same as ``seqs``.
         """
+        if isinstance(padding_mask, PackedPaddingMask):
+            raise ValueError(
+                "`padding_mask` must not be a `PackedPaddingMask` since `ConformerConvolution` does not support packed batches."
+            )
+
         # Ensure that we do not leak padded positions in depthwise convolution.
         seqs = apply_padding_mask(seqs, padding_mask)
 
@@ -69,6 +69,10 @@ class LLaMAConfig:
     norm_eps: float
     """The epsilon used by Layer Normalization modules."""
 
+    fuse_qkv: bool = False
+    """If ``True``, packs the query, key, and value projections of attention
+    layers into a single projection."""
+
 
 llama_archs = ArchitectureRegistry[LLaMAConfig]("llama")
 
@@ -310,6 +314,7 @@ class LLaMABuilder:
             self.config.model_dim,
             num_heads,
             num_key_value_heads=num_key_value_heads,
+            fuse_qkv=self.config.fuse_qkv,
             sdpa=sdpa,
             pos_encoder=self.pos_encoder,
             bias=False,
@@ -18,7 +18,10 @@ from fairseq2.assets import (
 from fairseq2.models.llama.builder import LLaMAConfig, create_llama_model, llama_archs
 from fairseq2.models.llama.tokenizer import LLaMATokenizer
 from fairseq2.models.transformer import TransformerDecoderModel
-from fairseq2.models.utils.checkpoint_loader import convert_model_state_dict
+from fairseq2.models.utils.checkpoint_loader import (
+    convert_model_state_dict,
+    fuse_qkv_projections,
+)
 from fairseq2.models.utils.model_loader import ModelConfigLoader, ModelLoader
 
 
@@ -37,6 +40,9 @@ class LLaMALoader(ModelLoader[TransformerDecoderModel, LLaMAConfig]):
 
         checkpoint = convert_model_state_dict(checkpoint, key_map)
 
+        if config.fuse_qkv:
+            checkpoint = fuse_qkv_projections(checkpoint)
+
         return {"model": checkpoint}
 
     @staticmethod
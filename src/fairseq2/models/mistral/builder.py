@@ -67,6 +67,10 @@ class MistralConfig:
     dropout_p: float
     """The dropout probability in Transformer layers."""
 
+    fuse_qkv: bool = False
+    """If ``True``, packs the query, key, and value projections of attention
+    layers into a single projection."""
+
 
 mistral_archs = ArchitectureRegistry[MistralConfig]("mistral")
 
@@ -217,6 +221,7 @@ class MistralBuilder:
             self.config.model_dim,
             num_heads,
             num_key_value_heads=num_key_value_heads,
+            fuse_qkv=self.config.fuse_qkv,
             sdpa=sdpa,
             pos_encoder=self.pos_encoder,
             bias=False,
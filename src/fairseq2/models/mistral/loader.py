@@ -22,7 +22,10 @@ from fairseq2.models.mistral.builder import (
 )
 from fairseq2.models.mistral.tokenizer import MistralTokenizer
 from fairseq2.models.transformer import TransformerDecoderModel
-from fairseq2.models.utils.checkpoint_loader import convert_model_state_dict
+from fairseq2.models.utils.checkpoint_loader import (
+    convert_model_state_dict,
+    fuse_qkv_projections,
+)
 from fairseq2.models.utils.model_loader import ModelConfigLoader, ModelLoader
 
 
@@ -38,6 +41,9 @@ class MistralLoader(ModelLoader[TransformerDecoderModel, MistralConfig]):
 
         checkpoint = convert_model_state_dict(checkpoint, key_map)
 
+        if config.fuse_qkv:
+            checkpoint = fuse_qkv_projections(checkpoint)
+
         return {"model": checkpoint}
 
     @staticmethod
@@ -70,6 +70,10 @@ class NllbConfig:
     dropout_p: float
     """The dropout probability in Transformer layers."""
 
+    fuse_qkv: bool = False
+    """If ``True``, packs the query, key, and value projections of attention
+    layers into a single projection."""
+
     def update_vocabulary(self, info: VocabularyInfo) -> None:
         """Update vocabulary configuration from ``info``."""
         self.vocabulary_size, self.pad_idx = info.size, info.pad_idx
@@ -274,6 +278,7 @@ class NllbBuilder:
         return StandardMultiheadAttention(
             self.config.model_dim,
             num_heads,
+            fuse_qkv=self.config.fuse_qkv,
             sdpa=sdpa,
             device=self.device,
             dtype=self.dtype,
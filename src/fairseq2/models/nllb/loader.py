@@ -18,7 +18,10 @@ from fairseq2.assets import (
 from fairseq2.models.nllb.builder import NllbConfig, create_nllb_model, nllb_archs
 from fairseq2.models.nllb.tokenizer import NllbTokenizer
 from fairseq2.models.transformer import TransformerModel
-from fairseq2.models.utils.checkpoint_loader import upgrade_fairseq_checkpoint
+from fairseq2.models.utils.checkpoint_loader import (
+    fuse_qkv_projections,
+    upgrade_fairseq_checkpoint,
+)
 from fairseq2.models.utils.model_loader import ModelConfigLoader, ModelLoader
 from fairseq2.typing import finaloverride
 
@@ -33,9 +36,21 @@ class NllbLoader(ModelLoader[TransformerModel, NllbConfig]):
     ) -> Mapping[str, Any]:
         state_dict = checkpoint["model"]
 
-        # Check if we have a fairseq2 checkpoint.
-        if "decoder_frontend.embed_weight" in state_dict:
-            return checkpoint
+        # Check if we have a fairseq checkpoint.
+        if "decoder_frontend.embed_weight" not in state_dict:
+            checkpoint = self._upgrade_fairseq_checkpoint(checkpoint)
+
+        if config.fuse_qkv:
+            state_dict = fuse_qkv_projections(checkpoint["model"])
+
+            checkpoint = {**checkpoint, "model": state_dict}
+
+        return checkpoint
+
+    def _upgrade_fairseq_checkpoint(
+        self, checkpoint: Mapping[str, Any]
+    ) -> Mapping[str, Any]:
+        state_dict = checkpoint["model"]
 
         key_map = self._fairseq_key_map()
 
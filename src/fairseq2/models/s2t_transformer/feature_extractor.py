@@ -10,7 +10,7 @@ from torch import Tensor
 from torch.nn import GLU, Conv1d, Sequential
 
 from fairseq2.models.feature_extractor import SequenceFeatureExtractor
-from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.padding import PackedPaddingMask, PaddingMask
 from fairseq2.typing import DataType, Device, finaloverride
 
 
@@ -94,6 +94,11 @@ class Conv1dFbankSubsampler(SequenceFeatureExtractor):
             :math:`N` is the batch size, :math:`S` is the number of frames, and
             :math:`C` is the number of channels.
         """
+        if isinstance(padding_mask, PackedPaddingMask):
+            raise ValueError(
+                "`padding_mask` must not be a `PackedPaddingMask` since `Conv1dFbankSubsampler` does not support packed batches."
+            )
+
         # Apply the convolution along the temporal dimension (i.e. along the
         # sequence).
         # (N, S, C) -> (N, C, S)
@@ -119,6 +119,45 @@ def convert_model_state_dict(
     return new_state_dict
 
 
+def fuse_qkv_projections(state_dict: Mapping[str, Any]) -> Dict[str, Any]:
+    """Pack the query, key, and value projections of multi-head attention
+    layers into the ``qkv_proj`` layout of modules constructed with
+    ``fuse_qkv=True``.
+
+    :param state_dict:
+        The state dictionary with separate ``q_proj``, ``k_proj``, and
+        ``v_proj`` entries.
+
+    :returns:
+        A converted state dictionary. Entries that are already packed or that
+        do not belong to a complete set of projections are left as is.
+    """
+    new_state_dict = {}
+
+    for key, value in state_dict.items():
+        if (match := re.match(r"^(.*\.)?([qkv])_proj\.(weight|bias)$", key)) is None:
+            new_state_dict[key] = value
+
+            continue
+
+        prefix, proj, name = match.group(1) or "", match.group(2), match.group(3)
+
+        keys = [f"{prefix}{p}_proj.{name}" for p in "qkv"]
+
+        if not all(k in state_dict for k in keys):
+            new_state_dict[key] = value
+
+            continue
+
+        # Pack the projections at the position of the query projection.
+        if proj == "q":
+            params = [state_dict[k] for k in keys]
+
+            new_state_dict[f"{prefix}qkv_proj.{name}"] = torch.cat(params, dim=0)
+
+    return new_state_dict
+
+
 def upgrade_fairseq_checkpoint(
     checkpoint: Mapping[str, Any], key_map: Mapping[str, str]
 ) -> Dict[str, Any]:
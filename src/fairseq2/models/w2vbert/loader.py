@@ -9,7 +9,10 @@ from typing import Any, Dict, Mapping, final
 import torch
 
 from fairseq2.assets import asset_store, download_manager
-from fairseq2.models.utils.checkpoint_loader import upgrade_fairseq_checkpoint
+from fairseq2.models.utils.checkpoint_loader import (
+    fuse_qkv_projections,
+    upgrade_fairseq_checkpoint,
+)
 from fairseq2.models.utils.model_loader import ModelConfigLoader, ModelLoader
 from fairseq2.models.w2vbert.builder import (
     W2VBertConfig,
@@ -30,9 +33,21 @@ class W2VBertLoader(ModelLoader[W2VBertModel, W2VBertConfig]):
     ) -> Mapping[str, Any]:
         state_dict = checkpoint["model"]
 
-        # Check if we have a fairseq2 checkpoint.
-        if "w2v2_model.final_target_proj.weight" in state_dict:
-            return checkpoint
+        # Check if we have a fairseq checkpoint.
+        if "w2v2_model.final_target_proj.weight" not in state_dict:
+            checkpoint = self._upgrade_fairseq_checkpoint(checkpoint)
+
+        if config.w2v2_config.encoder_config.fuse_qkv:
+            state_dict = fuse_qkv_projections(checkpoint["model"])
+
+            checkpoint = {**checkpoint, "model": state_dict}
+
+        return checkpoint
+
+    def _upgrade_fairseq_checkpoint(
+        self, checkpoint: Mapping[str, Any]
+    ) -> Mapping[str, Any]:
+        state_dict = checkpoint["model"]
 
         state_dict["w2v2_model.quantizer.num_updates"] = torch.zeros((), device="cpu")
 
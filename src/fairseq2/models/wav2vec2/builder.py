@@ -139,6 +139,10 @@ class Wav2Vec2EncoderConfig:
     depthwise_conv_kernel_size: int
     """The kernel size of depthwise convolutions in Conformer blocks."""
 
+    fuse_qkv: bool = False
+    """If ``True``, packs the query, key, and value projections of attention
+    layers into a single projection."""
+
 
 def _encoder_base() -> Wav2Vec2EncoderConfig:
     layer_descs = [(512, 10, 5)] + [(512, 3, 2)] * 4 + [(512, 2, 2)] * 2
@@ -340,6 +344,7 @@ class Wav2Vec2EncoderBuilder:
         return StandardMultiheadAttention(
             self.config.model_dim,
             self.config.num_encoder_attn_heads,
+            fuse_qkv=self.config.fuse_qkv,
             pos_encoder=pos_encoder,
             sdpa=sdpa,
             device=self.device,
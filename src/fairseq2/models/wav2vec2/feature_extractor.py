@@ -14,7 +14,7 @@ from torch.nn.functional import group_norm, layer_norm
 
 from fairseq2.models.feature_extractor import SequenceFeatureExtractor
 from fairseq2.nn.normalization import LayerNorm
-from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.padding import PackedPaddingMask, PaddingMask
 from fairseq2.nn.utils.grad import scale_grad
 from fairseq2.typing import DataType, Device, finaloverride, override
 
@@ -128,6 +128,11 @@ class Wav2Vec2FeatureExtractor(SequenceFeatureExtractor):
             The input waveforms. *Shape:* :math:`(N,S)`, where :math:`N` is the
             batch size and :math:`(S)` is the sequence length.
         """
+        if isinstance(padding_mask, PackedPaddingMask):
+            raise ValueError(
+                "`padding_mask` must not be a `PackedPaddingMask` since `Wav2Vec2FeatureExtractor` does not support packed batches."
+            )
+
         # (N, S) -> (N, C, S)
         seqs = seqs.unsqueeze(1)
 
@@ -280,6 +285,11 @@ class Wav2Vec2FbankFeatureExtractor(SequenceFeatureExtractor):
             :math:`N` is the batch size, :math:`S` is the number of frames, and
             :math:`C` is the number of channels.
         """
+        if isinstance(padding_mask, PackedPaddingMask):
+            raise ValueError(
+                "`padding_mask` must not be a `PackedPaddingMask` since `Wav2Vec2FbankFeatureExtractor` does not support packed batches."
+            )
+
         batch_size, num_frames, num_channels = seqs.shape
 
         if padding_mask is None:
@@ -9,7 +9,10 @@ from typing import Any, Dict, Mapping, final
 import torch
 
 from fairseq2.assets import asset_store, download_manager
-from fairseq2.models.utils.checkpoint_loader import upgrade_fairseq_checkpoint
+from fairseq2.models.utils.checkpoint_loader import (
+    fuse_qkv_projections,
+    upgrade_fairseq_checkpoint,
+)
 from fairseq2.models.utils.model_loader import ModelConfigLoader, ModelLoader
 from fairseq2.models.wav2vec2.builder import (
     Wav2Vec2Config,
@@ -31,9 +34,21 @@ class Wav2Vec2Loader(ModelLoader[Wav2Vec2Model, Wav2Vec2Config]):
     ) -> Mapping[str, Any]:
         state_dict = checkpoint["model"]
 
-        # Check if we have a fairseq2 checkpoint.
-        if "final_target_proj.weight" in state_dict:
-            return checkpoint
+        # Check if we have a fairseq checkpoint.
+        if "final_target_proj.weight" not in state_dict:
+            checkpoint = self._upgrade_fairseq_checkpoint(checkpoint, config)
+
+        if config.encoder_config.fuse_qkv:
+            state_dict = fuse_qkv_projections(checkpoint["model"])
+
+            checkpoint = {**checkpoint, "model": state_dict}
+
+        return checkpoint
+
+    def _upgrade_fairseq_checkpoint(
+        self, checkpoint: Mapping[str, Any], config: Wav2Vec2Config
+    ) -> Mapping[str, Any]:
+        state_dict = checkpoint["model"]
 
         if config.encoder_config.norm_order == TransformerNormOrder.POST:
             # fmt: off
@@ -5,8 +5,9 @@
 # LICENSE file in the root directory of this source tree.
 
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Type, TypeVar
+from typing import Dict, Optional, Type, TypeVar, Union
 
+import torch
 from torch import Tensor
 from torch.nn import Module
 
@@ -34,6 +35,38 @@ class IncrementalState(ABC):
             :math:`(N)`, where :math:`N` is the batch size.
         """
 
+    def extend(self, other: "IncrementalState") -> None:
+        """Append the batch of ``other`` to the batch of this state.
+
+        This will be called when new sequences join a batch that is already
+        being decoded, such as in continuous batching. The sequences in
+        ``other`` might be at a different step than the ones in this state.
+
+        The default implementation raises :class:`ValueError`; states that
+        support it must override it.
+
+        :param other:
+            The state to append. Must be of the same type as this state.
+        """
+        raise ValueError(f"`extend()` on `{type(self).__name__}` is not supported.")
+
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        """Discard the steps past the first ``num_steps`` steps.
+
+        This will be called when the last steps of a batch are rejected after
+        having been decoded, such as in speculative decoding, or when sequences
+        of different lengths are decoded in a single padded batch.
+
+        The default implementation raises :class:`ValueError`; states that
+        support it must override it.
+
+        :param num_steps:
+            The number of steps to keep. If a tensor, the number of steps to
+            keep for each sequence in the batch. *Shape:* :math:`(N)`, where
+            :math:`N` is the batch size.
+        """
+        raise ValueError(f"`truncate()` on `{type(self).__name__}` is not supported.")
+
 
 T = TypeVar("T", bound=IncrementalState)
 
@@ -42,7 +75,17 @@ class IncrementalStateBag:
     """Holds the module states during incremental decoding."""
 
     step: int
+    """The current step. If the sequences in the batch are at different steps,
+    the largest of them."""
+
     max_num_steps: int
+    """The expected maximum number of steps to take."""
+
+    seq_steps: Optional[Tensor]
+    """The current step of each sequence in the batch. Only set when sequences
+    can be at different steps (see :meth:`extend`); otherwise, ``None`` and all
+    sequences are at :attr:`step`. *Shape:* :math:`(N)`, where :math:`N` is the
+    batch size."""
 
     _module_states: Dict[Module, IncrementalState]
 
@@ -54,6 +97,8 @@ class IncrementalStateBag:
         self.step = 0
         self.max_num_steps = max_num_steps
 
+        self.seq_steps = None
+
         self._module_states = {}
 
     def increment_step(self, delta: int = 1) -> None:
@@ -74,6 +119,9 @@ class IncrementalStateBag:
 
         self.step = step
 
+        if self.seq_steps is not None:
+            self.seq_steps = self.seq_steps + delta
+
     def get_state(self, m: Module, kls: Type[T]) -> Optional[T]:
         """Get the incremental state of ``m``, or ``None`` if ``m`` is not
         present in the bag.
@@ -111,3 +159,92 @@ class IncrementalStateBag:
         """
         for state in self._module_states.values():
             state.reorder(new_order)
+
+        if self.seq_steps is not None:
+            self.seq_steps = self.seq_steps.index_select(0, new_order)
+
+            # The sequence that was furthest ahead might have been dropped.
+            self.step = int(self.seq_steps.max()) if len(new_order) > 0 else 0
+
+    def truncate(self, step: Union[int, Tensor]) -> None:
+        """Roll back all incremental states in the bag to ``step``.
+
+        See :meth:`IncrementalState.truncate` for more information.
+
+        :param step:
+            The step to roll back to. Must be less than or equal to the current
+            step. If a tensor, the step to roll back to for each sequence in the
+            batch, after which :attr:`seq_steps` is set. *Shape:* :math:`(N)`,
+            where :math:`N` is the batch size.
+        """
+        if isinstance(step, Tensor):
+            if self.seq_steps is not None:
+                step = torch.minimum(self.seq_steps, step)
+
+            min_step, max_step = int(step.min()), int(step.max())
+        else:
+            min_step, max_step = step, step
+
+        if min_step < 0 or max_step > self.step:
+            raise ValueError(
+                f"`step` must be greater than or equal to 0 and less than or equal to the current step ({self.step}), but is {step} instead."
+            )
+
+        for state in self._module_states.values():
+            state.truncate(step)
+
+        self.step = max_step
+
+        if isinstance(step, Tensor):
+            self.seq_steps = step
+        elif self.seq_steps is not None:
+            self.seq_steps = self.seq_steps.clamp(max=step)
+
+    def supports_truncate(self) -> bool:
+        """Return ``True`` if all incremental states in the bag support
+        :meth:`IncrementalState.truncate`."""
+        return all(
+            type(state).truncate is not IncrementalState.truncate
+            for state in self._module_states.values()
+        )
+
+    def supports_extend(self) -> bool:
+        """Return ``True`` if all incremental states in the bag support
+        :meth:`IncrementalState.extend`."""
+        return all(
+            type(state).extend is not IncrementalState.extend
+            for state in self._module_states.values()
+        )
+
+    def extend(self, other: "IncrementalStateBag") -> None:
+        """Append the batch of ``other`` to the batch of this bag.
+
+        Since the sequences of the two bags might be at different steps, both
+        bags must have :attr:`seq_steps` set. See :meth:`IncrementalState.extend`
+        for more information.
+
+        :param other:
+            The bag to append. Must hold the states of the same modules as this
+            bag.
+        """
+        if self._module_states.keys() != other._module_states.keys():
+            raise ValueError(
+                "`other` must hold the states of the same modules as the bag."
+            )
+
+        if other.step >= self.max_num_steps:
+            raise ValueError(
+                f"The step of `other` must be less than the maximum number of steps ({self.max_num_steps}), but is {other.step} instead."
+            )
+
+        if self.seq_steps is None or other.seq_steps is None:
+            raise ValueError(
+                "`seq_steps` of both the bag and `other` must be set to extend the bag."
+            )
+
+        for m, state in self._module_states.items():
+            state.extend(other._module_states[m])
+
+        self.seq_steps = torch.cat([self.seq_steps, other.seq_steps])
+
+        self.step = max(self.step, other.step)
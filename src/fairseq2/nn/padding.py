@@ -4,12 +4,13 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-from typing import Any, Optional, Sequence, Tuple, cast
+from typing import Any, List, Optional, Sequence, Tuple, cast, final
 
 import torch
 from torch import Tensor
 
 from fairseq2.data import Collater, SequenceData
+from fairseq2.typing import Device
 
 
 class PaddingMask:
@@ -51,6 +52,99 @@ class PaddingMask:
         return PaddingMask(self.seq_lens - size, self.batch_seq_len - size)
 
 
+@final
+class PackedPaddingMask(PaddingMask):
+    """Represents the padding mask of a packed batch.
+
+    The sequences of a packed batch are concatenated along the time dimension
+    into a single sequence with no padding. *Shape:* :math:`(1,T)`, where
+    :math:`T` is the total length of the sequences. Modules that are not aware
+    of packing see it as a padding mask without padding; attention and position
+    encoders use it to keep each sequence separate.
+    """
+
+    packed_seq_lens: List[int]
+    """The length of each packed sequence."""
+
+    packed_seq_offsets: List[int]
+    """The offset of each packed sequence, followed by the total length."""
+
+    _seq_ids: Optional[Tensor]
+    _positions: Optional[Tensor]
+
+    def __init__(
+        self, packed_seq_lens: Sequence[int], *, device: Optional[Device] = None
+    ) -> None:
+        """
+        :param packed_seq_lens:
+            The length of each packed sequence. Kept on the host so that the
+            packed layout can be queried without synchronizing with the device.
+        """
+        if len(packed_seq_lens) == 0:
+            raise ValueError("`packed_seq_lens` must contain at least one element.")
+
+        if min(packed_seq_lens) <= 0:
+            raise ValueError(
+                f"The lengths in `packed_seq_lens` must be greater than 0, but are {list(packed_seq_lens)} instead."
+            )
+
+        self.packed_seq_lens = list(packed_seq_lens)
+
+        self.packed_seq_offsets = [0]
+
+        for seq_len in self.packed_seq_lens:
+            self.packed_seq_offsets.append(self.packed_seq_offsets[-1] + seq_len)
+
+        total_len = self.packed_seq_offsets[-1]
+
+        super().__init__(torch.tensor([total_len], device=device), total_len)
+
+        self._seq_ids = None
+        self._positions = None
+
+    @property
+    def max_packed_seq_len(self) -> int:
+        """The length of the longest packed sequence."""
+        return max(self.packed_seq_lens)
+
+    def seq_ids(self) -> Tensor:
+        """Return the index of the packed sequence of each step.
+
+        :returns:
+            *Shape:* :math:`(T)`, where :math:`T` is the total length.
+        """
+        if self._seq_ids is None:
+            seq_lens = torch.tensor(self.packed_seq_lens, device=self.seq_lens.device)
+
+            self._seq_ids = torch.repeat_interleave(
+                torch.arange(len(self.packed_seq_lens), device=seq_lens.device),
+                seq_lens,
+                output_size=self.batch_seq_len,
+            )
+
+        return self._seq_ids
+
+    def positions(self) -> Tensor:
+        """Return the position of each step within its packed sequence.
+
+        :returns:
+            *Shape:* :math:`(T)`, where :math:`T` is the total length.
+        """
+        if self._positions is None:
+            offsets = torch.tensor(
+                self.packed_seq_offsets[:-1], device=self.seq_lens.device
+            )
+
+            steps = torch.arange(self.batch_seq_len, device=self.seq_lens.device)
+
+            self._positions = steps - offsets[self.seq_ids()]
+
+        return self._positions
+
+    def trim(self, size: int) -> "PaddingMask":
+        raise ValueError("A `PackedPaddingMask` cannot be trimmed.")
+
+
 def to_padding_mask(seq_lens: Tensor, batch_seq_len: int) -> Tensor:
     """Convert a sequence length array to a boolean padding mask tensor.
 
@@ -147,3 +241,44 @@ def pad_seqs(
     seq_data = cast(SequenceData, collater(seqs))
 
     return get_seqs_and_padding_mask(seq_data)
+
+
+def pack_seqs(seqs: Sequence[Tensor]) -> Tuple[Tensor, PackedPaddingMask]:
+    """Concatenate ``seqs`` into a packed batch with no padding.
+
+    :param seqs:
+        The list of variable length sequences. All elements in ``seqs`` are
+        expected to have the same shape except the first dimension.
+
+    :returns:
+        - The packed batch. *Shape:* :math:`(1,T,*)`, where :math:`T` is the
+          total length of the sequences and :math:`*` is any number of
+          sequence-specific dimensions including none.
+        - The padding mask of the packed batch.
+    """
+    if not seqs:
+        raise ValueError("`seqs` must contain at least one element.")
+
+    packed_seqs = torch.cat(list(seqs)).unsqueeze(0)
+
+    padding_mask = PackedPaddingMask(
+        [s.size(0) for s in seqs], device=packed_seqs.device
+    )
+
+    return packed_seqs, padding_mask
+
+
+def unpack_seqs(seqs: Tensor, padding_mask: PackedPaddingMask) -> List[Tensor]:
+    """Split the packed batch ``seqs`` back into its sequences.
+
+    :param seqs:
+        The packed batch. *Shape:* :math:`(1,T,*)`, where :math:`T` is the total
+        length of the sequences and :math:`*` is any number of
+        sequence-specific dimensions including none.
+    :param padding_mask:
+        The padding mask of ``seqs``.
+
+    :returns:
+        The sequences as views of ``seqs``.
+    """
+    return list(seqs.squeeze(0).split(padding_mask.packed_seq_lens))
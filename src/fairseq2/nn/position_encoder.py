@@ -6,7 +6,7 @@
 
 import math
 from abc import ABC, abstractmethod
-from typing import Optional, final
+from typing import Dict, Literal, Optional, Tuple, Union, final
 
 import torch
 import torch.nn as nn
@@ -16,7 +16,7 @@ from torch.nn.functional import embedding
 from torch.nn.parameter import Parameter
 
 from fairseq2.nn.incremental_state import IncrementalStateBag
-from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.padding import PackedPaddingMask, PaddingMask
 from fairseq2.typing import DataType, Device, finaloverride
 
 
@@ -26,6 +26,11 @@ class PositionEncoder(Module, ABC):
     encoding_dim: int
     max_seq_len: Optional[int]
 
+    supports_packing: bool = False
+    """If ``True``, the encoder encodes each sequence of a packed batch (see
+    :class:`PackedPaddingMask`) from its own first position; otherwise, packed
+    batches are rejected."""
+
     def __init__(self, encoding_dim: int, max_seq_len: Optional[int]) -> None:
         """
         :param encoding_dim:
@@ -62,7 +67,24 @@ class PositionEncoder(Module, ABC):
             The input sequences with positional information encoded. *Shape:*
             Same as ``seqs``.
         """
-        if self.max_seq_len is not None:
+        if isinstance(padding_mask, PackedPaddingMask):
+            if not self.supports_packing:
+                raise ValueError(
+                    f"`padding_mask` must not be a `PackedPaddingMask` since `{type(self).__name__}` does not support packed batches."
+                )
+
+            if not self.training and state_bag is not None:
+                raise ValueError(
+                    "`padding_mask` must not be a `PackedPaddingMask` during incremental decoding."
+                )
+
+            # Each packed sequence is encoded from its own first position.
+            if self.max_seq_len is not None:
+                if (seq_len := padding_mask.max_packed_seq_len) > self.max_seq_len:
+                    raise ValueError(
+                        f"The input sequence length must be less than or equal to the maximum sequence length ({self.max_seq_len}), but is {seq_len} instead."
+                    )
+        elif self.max_seq_len is not None:
             if self.training or state_bag is None:
                 start_step = 0
             else:
@@ -135,6 +157,9 @@ class SinusoidalPositionEncoder(PositionEncoder):
     See `here <https://github.com/tensorflow/tensor2tensor/pull/177>`_ for more
     information.
 
+    The encodings are precomputed for ``max_seq_len`` steps and extended on
+    demand for longer sequences.
+
     Usage:
 
     >>> import torch
@@ -153,6 +178,8 @@ class SinusoidalPositionEncoder(PositionEncoder):
 
     freqs: Tensor
 
+    supports_packing = True
+
     def __init__(
         self,
         encoding_dim: int,
@@ -161,7 +188,14 @@ class SinusoidalPositionEncoder(PositionEncoder):
         _legacy_pad_idx: Optional[int] = None,
         device: Optional[Device] = None,
     ) -> None:
-        super().__init__(encoding_dim, max_seq_len)
+        """
+        :param encoding_dim:
+            The dimensionality of positional encodings.
+        :param max_seq_len:
+            The number of steps for which to precompute the encodings. Longer
+            sequences extend the encodings on demand.
+        """
+        super().__init__(encoding_dim, max_seq_len=None)
 
         if encoding_dim % 2 != 0:
             raise ValueError(
@@ -198,11 +232,11 @@ class SinusoidalPositionEncoder(PositionEncoder):
 
         start_step = self._sin_offset
 
-        assert self.max_seq_len is not None
+        num_steps = self.freqs.size(0)
 
         # (S)
         steps = torch.arange(
-            start_step, start_step + self.max_seq_len, device=device, dtype=dtype
+            start_step, start_step + num_steps, device=device, dtype=dtype
         )
 
         # (E)
@@ -234,7 +268,19 @@ class SinusoidalPositionEncoder(PositionEncoder):
         else:
             start_step = state_bag.step
 
-        fp32_seqs = seqs.float() + self.freqs[start_step : start_step + seq_len]
+        _maybe_extend_freqs(self, seqs, padding_mask, state_bag)
+
+        if isinstance(padding_mask, PackedPaddingMask):
+            # (T, E)
+            freqs = self.freqs[padding_mask.positions()]
+        elif (seq_steps := _get_seq_steps(self, state_bag)) is not None:
+            # (N, *, S, E)
+            freqs = self.freqs[_get_seq_step_indices(seqs, seq_steps)]
+        else:
+            # (S, E)
+            freqs = self.freqs[start_step : start_step + seq_len]
+
+        fp32_seqs = seqs.float() + freqs
 
         return fp32_seqs.type_as(seqs)
 
@@ -261,6 +307,8 @@ class LearnedPositionEncoder(PositionEncoder):
 
     weight: Parameter
 
+    supports_packing = True
+
     def __init__(
         self,
         encoding_dim: int,
@@ -296,9 +344,17 @@ class LearnedPositionEncoder(PositionEncoder):
         else:
             start_step = state_bag.step
 
-        steps = torch.arange(
-            start_step, start_step + seq_len, device=seqs.device, dtype=torch.int64
-        )
+        if isinstance(padding_mask, PackedPaddingMask):
+            # (T)
+            steps = padding_mask.positions()
+        elif (seq_steps := _get_seq_steps(self, state_bag)) is not None:
+            # (N, *, S)
+            steps = _get_seq_step_indices(seqs, seq_steps)
+        else:
+            # (S)
+            steps = torch.arange(
+                start_step, start_step + seq_len, device=seqs.device, dtype=torch.int64
+            )
 
         return seqs + embedding(steps, self.weight)
 
@@ -306,30 +362,79 @@ class LearnedPositionEncoder(PositionEncoder):
 @final
 class RotaryEncoder(PositionEncoder):
     """Encodes sequences with relative positional information as described in
-    :cite:t:`https://doi.org/10.48550/arxiv.2104.09864`."""
+    :cite:t:`https://doi.org/10.48550/arxiv.2104.09864`.
+
+    The rotations are applied with real-valued cosine and sine tables in the
+    data type of the input. The tables are precomputed for ``max_seq_len``
+    steps, extended on demand for longer sequences, and cached per device and
+    data type.
+    """
 
     freqs: Tensor
+    scale_factor: float
+    scaling: Literal["linear", "ntk"]
+
+    _cached_freqs: Dict[Tuple[Device, DataType], Tensor]
+    _cached_freqs_source: Optional[Tensor]
+
+    supports_packing = True
 
     def __init__(
         self,
         encoding_dim: int,
         max_seq_len: int,
         *,
+        scale_factor: float = 1.0,
+        scaling: Literal["linear", "ntk"] = "linear",
         device: Optional[Device] = None,
     ) -> None:
-        super().__init__(encoding_dim, max_seq_len)
+        """
+        :param encoding_dim:
+            The dimensionality of positional encodings.
+        :param max_seq_len:
+            The number of steps for which to precompute the rotations. Longer
+            sequences extend the rotations on demand.
+        :param scale_factor:
+            The factor by which to stretch the context the model was trained
+            with. Values greater than 1.0 trade off the resolution of positions
+            for longer sequences.
+        :param scaling:
+            If 'linear', divides the positions by ``scale_factor`` (i.e.
+            position interpolation); if 'ntk', increases the base of the
+            rotation frequencies instead (i.e. NTK-aware scaling), which
+            preserves the resolution of the high-frequency dimensions.
+        """
+        super().__init__(encoding_dim, max_seq_len=None)
 
         if encoding_dim % 2 != 0:
             raise ValueError(
                 f"`encoding_dim` must be even, but is {encoding_dim} instead."
             )
 
+        if scale_factor < 1.0:
+            raise ValueError(
+                f"`scale_factor` must be greater than or equal to 1.0, but is {scale_factor} instead."
+            )
+
+        if scaling not in ("linear", "ntk"):
+            raise ValueError(
+                f"`scaling` must be 'linear' or 'ntk', but is '{scaling}' instead."
+            )
+
+        self.scale_factor = scale_factor
+        self.scaling = scaling
+
+        # The cosines and sines of the rotation angles.
         freqs = torch.empty(
-            (max_seq_len, encoding_dim // 2), device=device, dtype=torch.complex64
+            (max_seq_len, encoding_dim // 2, 2), device=device, dtype=torch.float32
         )
 
         self.register_buffer("freqs", freqs, persistent=False)
 
+        self._cached_freqs = {}
+
+        self._cached_freqs_source = None
+
         self.reset_parameters()
 
     def reset_parameters(self) -> None:
@@ -338,30 +443,35 @@ class RotaryEncoder(PositionEncoder):
 
     def reset_non_persistent_buffers(self) -> None:
         """Reset the non-persistent buffers of the module."""
-        device = self.freqs.device
+        self._cached_freqs.clear()
 
-        assert self.max_seq_len is not None
-
-        # As of PyTorch 2.0, `torch.polar` does not support meta device, but we
-        # do not want to lose benefit of lazy initialization.
-        if device.type == "meta":
-            return
+        device, dtype = self.freqs.device, self.freqs.dtype
 
         # (S)
-        steps = torch.arange(self.max_seq_len, device=device, dtype=torch.float32)
+        steps = torch.arange(self.freqs.size(0), device=device, dtype=torch.float32)
 
         # (E / 2)
         indices = torch.arange(
             0, self.encoding_dim, step=2, device=device, dtype=torch.float32
         )
 
-        freqs = 1.0 / (10000.0 ** (indices / self.encoding_dim))
+        theta = 10000.0
+
+        if self.scale_factor != 1.0:
+            if self.scaling == "linear":
+                steps = steps / self.scale_factor
+            elif self.encoding_dim > 2:
+                theta *= self.scale_factor ** (
+                    self.encoding_dim / (self.encoding_dim - 2)
+                )
+
+        freqs = 1.0 / (theta ** (indices / self.encoding_dim))
 
         # (S) x (E / 2) -> (S, E / 2)
-        freqs = torch.outer(steps, freqs)
+        angles = torch.outer(steps, freqs)
 
-        # (S, E / 2)
-        torch.polar(torch.ones_like(freqs), freqs, out=self.freqs)
+        # (S, E / 2) -> (S, E / 2, 2)
+        self.freqs.copy_(torch.stack((angles.cos(), angles.sin()), dim=-1).to(dtype))
 
     @finaloverride
     def _do_forward(
@@ -378,14 +488,111 @@ class RotaryEncoder(PositionEncoder):
         else:
             start_step = state_bag.step
 
+        _maybe_extend_freqs(self, seqs, padding_mask, state_bag)
+
+        # (S_max, E / 2, 2)
+        all_freqs = self._get_cached_freqs(seqs.device, seqs.dtype)
+
+        if isinstance(padding_mask, PackedPaddingMask):
+            # (T, E / 2, 2)
+            freqs = all_freqs[padding_mask.positions()]
+        elif (seq_steps := _get_seq_steps(self, state_bag)) is not None:
+            # (N, *, S, E / 2, 2)
+            freqs = all_freqs[_get_seq_step_indices(seqs, seq_steps)]
+        else:
+            # (S, E / 2, 2)
+            freqs = all_freqs[start_step : start_step + seq_len]
+
+        cos, sin = freqs.unbind(-1)
+
         # (*, S, E) -> (*, S, E / 2, 2)
         seqs = seqs.unflatten(-1, (-1, 2))
 
-        complex_seqs = torch.view_as_complex(seqs.float())
+        x1, x2 = seqs.unbind(-1)
 
-        complex_seqs = complex_seqs * self.freqs[start_step : start_step + seq_len]
+        seqs = torch.stack((x1 * cos - x2 * sin, x1 * sin + x2 * cos), dim=-1)
 
         # (*, S, E / 2, 2) -> (*, S, E)
-        fp32_seqs = torch.view_as_real(complex_seqs).flatten(-2)
+        return seqs.flatten(-2)
 
-        return fp32_seqs.type_as(seqs)
+    def _get_cached_freqs(self, device: Device, dtype: DataType) -> Tensor:
+        # Drop the cached tables if the buffer was replaced (e.g. extended or
+        # moved to another device).
+        if self._cached_freqs_source is not self.freqs:
+            self._cached_freqs.clear()
+
+            self._cached_freqs_source = self.freqs
+
+        key = (device, dtype)
+
+        freqs = self._cached_freqs.get(key)
+        if freqs is None:
+            # See the note in `_maybe_extend_freqs()`.
+            with torch.inference_mode(False):
+                freqs = self.freqs.to(device, dtype)
+
+            self._cached_freqs[key] = freqs
+
+        return freqs
+
+    def extra_repr(self) -> str:
+        """:meta private:"""
+        s = super().extra_repr()
+
+        if self.scale_factor != 1.0:
+            s = f"{s}, scale_factor={self.scale_factor}, scaling={self.scaling}"
+
+        return s
+
+
+def _maybe_extend_freqs(
+    m: Union[SinusoidalPositionEncoder, RotaryEncoder],
+    seqs: Tensor,
+    padding_mask: Optional[PaddingMask],
+    state_bag: Optional[IncrementalStateBag],
+) -> None:
+    if isinstance(padding_mask, PackedPaddingMask):
+        num_steps = padding_mask.max_packed_seq_len
+    else:
+        num_steps = seqs.size(-2)
+
+        if not m.training and state_bag is not None:
+            num_steps += state_bag.step
+
+            # Cover all steps that the state bag can reach at once, instead of
+            # extending at every step of a long generation.
+            num_steps = max(num_steps, state_bag.max_num_steps)
+
+    if num_steps <= (max_num_steps := m.freqs.size(0)):
+        return
+
+    # Grow geometrically to amortize the cost of recomputing the table.
+    num_steps = max(num_steps, 2 * max_num_steps)
+
+    # The table might be extended within `torch.inference_mode()`; it must
+    # stay usable in regular (e.g. training) mode afterwards.
+    with torch.inference_mode(False):
+        m.freqs = m.freqs.new_empty((num_steps,) + m.freqs.shape[1:])
+
+        m.reset_non_persistent_buffers()
+
+
+def _get_seq_steps(
+    m: PositionEncoder, state_bag: Optional[IncrementalStateBag]
+) -> Optional[Tensor]:
+    if m.training or state_bag is None:
+        return None
+
+    return state_bag.seq_steps
+
+
+def _get_seq_step_indices(seqs: Tensor, seq_steps: Tensor) -> Tensor:
+    # The sequences in the batch are at different steps, so each gets its own
+    # range of positions.
+    # (N, 1) + (S) -> (N, S)
+    indices = seq_steps.unsqueeze(-1) + torch.arange(
+        seqs.size(-2), device=seqs.device, dtype=torch.int64
+    )
+
+    # (N, S) -> (N, *, S)
+    return indices.view(indices.size(0), *([1] * (seqs.dim() - 3)), -1)
@@ -7,6 +7,7 @@
 from fairseq2.nn.transformer.attention import SDPA as SDPA
 from fairseq2.nn.transformer.attention import NaiveSDPA as NaiveSDPA
 from fairseq2.nn.transformer.attention import SDPAFactory as SDPAFactory
+from fairseq2.nn.transformer.attention import TiledSDPA as TiledSDPA
 from fairseq2.nn.transformer.attention import TorchSDPA as TorchSDPA
 from fairseq2.nn.transformer.attention import create_default_sdpa as create_default_sdpa
 from fairseq2.nn.transformer.attention import sdpa as sdpa
@@ -26,6 +27,9 @@ from fairseq2.nn.transformer.attention_mask import (
 from fairseq2.nn.transformer.attention_mask import (
     CustomAttentionMask as CustomAttentionMask,
 )
+from fairseq2.nn.transformer.attention_mask import (
+    PackedAttentionMask as PackedAttentionMask,
+)
 from fairseq2.nn.transformer.decoder import (
     DecoderLayerOutputHook as DecoderLayerOutputHook,
 )
@@ -68,6 +72,9 @@ from fairseq2.nn.transformer.multihead_attention import (
 from fairseq2.nn.transformer.multihead_attention import (
     AttentionWeightHook as AttentionWeightHook,
 )
+from fairseq2.nn.transformer.multihead_attention import (
+    BeamSharedStaticAttentionState as BeamSharedStaticAttentionState,
+)
 from fairseq2.nn.transformer.multihead_attention import (
     FullAttentionState as FullAttentionState,
 )
@@ -80,6 +87,15 @@ from fairseq2.nn.transformer.multihead_attention import (
 from fairseq2.nn.transformer.multihead_attention import (
     MultiheadAttention as MultiheadAttention,
 )
+from fairseq2.nn.transformer.multihead_attention import (
+    PagedAttentionBlockPool as PagedAttentionBlockPool,
+)
+from fairseq2.nn.transformer.multihead_attention import (
+    PagedAttentionState as PagedAttentionState,
+)
+from fairseq2.nn.transformer.multihead_attention import (
+    PagedAttentionStateFactory as PagedAttentionStateFactory,
+)
 from fairseq2.nn.transformer.multihead_attention import (
     StandardMultiheadAttention as StandardMultiheadAttention,
 )
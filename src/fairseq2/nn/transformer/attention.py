@@ -6,6 +6,7 @@
 
 import logging
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 from contextlib import contextmanager
 from typing import Generator, Optional, Protocol, Tuple, final
 
@@ -15,10 +16,16 @@ from torch import Tensor
 from torch.nn import Module
 from torch.nn.functional import dropout, softmax
 
+from fairseq2.nn.ops import repeat_interleave
 from fairseq2.nn.padding import PaddingMask
-from fairseq2.nn.transformer.attention_mask import AttentionMask, CausalAttentionMask
+from fairseq2.nn.transformer.attention_mask import (
+    AttentionMask,
+    CausalAttentionMask,
+    CustomAttentionMask,
+    PackedAttentionMask,
+)
 from fairseq2.typing import finaloverride
-from fairseq2.utils.version import is_pt2_or_greater
+from fairseq2.utils.version import is_pt2_or_greater, is_pt22_or_greater
 
 logger = logging.getLogger(__name__)
 
@@ -54,23 +61,30 @@ class SDPA(Module, ABC):
             is the batch size, :math:`H` is the number of heads, :math:`S` is
             the sequence length, and :math:`K` is the key size.
         :param keys:
-            The keys. *Shape:* :math:`(N,H,S_{kv},K)`, where :math:`N` is the
-            batch size, :math:`H` is the number of heads, :math:`S_{kv}` is the
-            key/value sequence length, and :math:`K` is the key size.
+            The keys. *Shape:* :math:`(N,H_{kv},S_{kv},K)`, where :math:`N` is
+            the batch size, :math:`H_{kv}` is the number of key/value heads,
+            :math:`S_{kv}` is the key/value sequence length, and :math:`K` is
+            the key size. With Grouped Query Attention, :math:`H` is a multiple
+            of :math:`H_{kv}` and each key/value head is shared by a group of
+            consecutive query heads.
         :param key_padding_mask:
             The padding mask indicating which key positions to ignore for the
             purpose of attention. *Shape:* :math:`(N,S_{kv})`, where :math:`N`
             is the batch size and :math:`S_{kv}` is the key/value sequence
             length.
         :param values:
-            The values. *Shape:* :math:`(N,H,S_{kv},V)`, where :math:`N` is the
-            batch size, :math:`H` is the number of heads, :math:`S_{kv}` is the
-            key/value sequence length, and :math:`V` is the value size.
+            The values. *Shape:* :math:`(N,H_{kv},S_{kv},V)`, where :math:`N`
+            is the batch size, :math:`H_{kv}` is the number of key/value heads,
+            :math:`S_{kv}` is the key/value sequence length, and :math:`V` is
+            the value size.
         :param attn_mask:
             The mask that will be added to attention weights before computing
             the attention. *Shape:* :math:`([H],S,S_{kv})`, where :math:`H` is
             the number of heads, :math:`S` is the sequence length, and
-            :math:`S_{kv}` is the key/value sequence length.
+            :math:`S_{kv}` is the key/value sequence length. If the mask differs
+            between the sequences of the batch (e.g. when they are decoded at
+            different steps), :math:`(N,H,S,S_{kv})`, where :math:`N` is the
+            batch size and :math:`H` can be 1.
         :param needs_weights:
             If ``True``, returns the attention weights.
 
@@ -148,26 +162,59 @@ class TorchSDPA(SDPA):
         else:
             dropout_p = self.attn_dropout_p
 
+        # PyTorch SDPA expects the same number of query and key/value heads.
+        num_query_groups = seqs.size(1) // keys.size(1)
+
+        # Unless the attention mask depends on the query position, we fold the
+        # query heads that share a key/value head into the sequence dimension,
+        # so that we can attend without repeating the (typically large) cached
+        # keys and values.
+        fold_query_groups = num_query_groups > 1 and (
+            attn_mask is None or seqs.size(2) == 1
+        )
+
+        if fold_query_groups:
+            # (N, H, S, K) -> (N, H_kv, G x S, K)
+            seqs = seqs.unflatten(1, (-1, num_query_groups)).flatten(2, 3)
+
+            if attn_mask is not None:
+                # ([H], 1, S_kv)
+                m = attn_mask.materialize()
+
+                if m.dim() == 3:
+                    # (H, 1, S_kv) -> (H_kv, G, S_kv)
+                    m = m.unflatten(0, (-1, num_query_groups)).flatten(1, 2)
+                elif m.dim() == 4 and m.size(1) > 1:
+                    # (N, H, 1, S_kv) -> (N, H_kv, G, S_kv)
+                    m = m.unflatten(1, (-1, num_query_groups)).flatten(2, 3)
+
+                attn_mask = CustomAttentionMask(m)
+        elif num_query_groups > 1:
+            # (N, H_kv, S_kv, K) -> (N, H, S_kv, K)
+            keys = repeat_interleave(keys, dim=1, repeat=num_query_groups)
+            # (N, H_kv, S_kv, V) -> (N, H, S_kv, V)
+            values = repeat_interleave(values, dim=1, repeat=num_query_groups)
+
         is_causal = False
 
         if key_padding_mask is not None:
             mask = key_padding_mask.materialize()
 
+            # Keep the padding mask broadcastable; PyTorch SDPA does not need
+            # it to be expanded to the number of heads and steps.
             # (N, S_kv) -> (N, 1, 1, S_kv)
             mask = mask[:, None, None, :]
 
-            # (N, 1, 1, S_kv) -> (N, H, S, S_kv)
-            mask = mask.expand(-1, seqs.size(1), seqs.size(2), -1)
-
             if attn_mask is not None:
                 # ([H], S, S_kv)
                 m = attn_mask.materialize()
 
-                # (N, H, S, S_kv)
+                # (N, 1, 1, S_kv) + ([H], S, S_kv) -> (N, [H], S, S_kv)
                 mask = torch.where(mask, m, -torch.inf)
         elif isinstance(attn_mask, CausalAttentionMask):
-            # PyTorch SDPA supports only full causal attention.
-            if attn_mask.attn_window_len is None:
+            # PyTorch SDPA supports only full causal attention that starts at
+            # the first key.
+            if attn_mask.attn_window_len is None and attn_mask.start_step == 0:
                 mask = None
 
                 is_causal = True
@@ -189,6 +236,10 @@ class TorchSDPA(SDPA):
             is_causal=is_causal,
         )
 
+        if fold_query_groups:
+            # (N, H_kv, G x S, V) -> (N, H, S, V)
+            attn = attn.unflatten(2, (num_query_groups, -1)).flatten(1, 2)
+
         return attn, None
 
 
@@ -219,6 +270,333 @@ class NaiveSDPA(SDPA):
         )
 
 
+@final
+class TiledSDPA(SDPA):
+    """Computes scaled dot-product attention over blocks of queries and keys
+    with an online softmax, without materializing the attention weights.
+
+    Meant for CPU inference, where :class:`TorchSDPA` falls back to the naive
+    implementation. Key padding and causal masks are applied per block without
+    building dense masks; other attention masks are materialized once. If the
+    attention has no mask, or only a causal mask starting at the first key, and
+    PyTorch 2.2 or greater is available, the fused kernel of PyTorch is used
+    instead.
+    """
+
+    query_block_size: int
+    key_block_size: int
+
+    def __init__(
+        self,
+        *,
+        attn_dropout_p: float = 0.0,
+        query_block_size: int = 256,
+        key_block_size: int = 512,
+    ) -> None:
+        """
+        :param attn_dropout_p:
+            The dropout probability on attention weights.
+        :param query_block_size:
+            The number of query steps to attend at once.
+        :param key_block_size:
+            The number of key steps to attend at once. Together with
+            ``query_block_size`` bounds the size of the attention weights held
+            in memory.
+        """
+        super().__init__(attn_dropout_p=attn_dropout_p)
+
+        if query_block_size <= 0:
+            raise ValueError(
+                f"`query_block_size` must be greater than 0, but is {query_block_size} instead."
+            )
+
+        if key_block_size <= 0:
+            raise ValueError(
+                f"`key_block_size` must be greater than 0, but is {key_block_size} instead."
+            )
+
+        self.query_block_size = query_block_size
+        self.key_block_size = key_block_size
+
+        self._has_warned = False
+
+    @finaloverride
+    def forward(
+        self,
+        seqs: Tensor,
+        keys: Tensor,
+        key_padding_mask: Optional[PaddingMask],
+        values: Tensor,
+        *,
+        attn_mask: Optional[AttentionMask] = None,
+        needs_weights: bool = False,
+    ) -> Tuple[Tensor, Optional[Tensor]]:
+        if needs_weights:
+            if not self._has_warned:
+                logger.warning(
+                    "`TiledSDPA` has to fall back to the naive SDPA implementation because of `needs_weights` set to `True`."
+                )
+
+                self._has_warned = True
+
+            return _naive_scaled_dot_product_attention(
+                seqs,
+                keys,
+                key_padding_mask,
+                values,
+                attn_mask,
+                self.attn_dropout_p,
+                needs_weights,
+                self.training,
+            )
+
+        if not self.training:
+            dropout_p = 0.0
+        else:
+            dropout_p = self.attn_dropout_p
+
+        if key_padding_mask is None and is_pt22_or_greater():
+            if attn_mask is None:
+                return _fused_scaled_dot_product_attention(
+                    seqs, keys, values, dropout_p, is_causal=False
+                )
+
+            # The fused kernel supports only full causal attention that starts
+            # at the first key, and cannot fold query groups with a mask.
+            if (
+                isinstance(attn_mask, CausalAttentionMask)
+                and attn_mask.attn_window_len is None
+                and attn_mask.start_step == 0
+                and seqs.size(1) == keys.size(1)
+            ):
+                return _fused_scaled_dot_product_attention(
+                    seqs, keys, values, dropout_p, is_causal=True
+                )
+
+        attn = _tiled_scaled_dot_product_attention(
+            seqs,
+            keys,
+            key_padding_mask,
+            values,
+            attn_mask,
+            dropout_p,
+            self.query_block_size,
+            self.key_block_size,
+        )
+
+        return attn, None
+
+    def extra_repr(self) -> str:
+        """:meta private:"""
+        s = super().extra_repr()
+
+        return f"{s}, query_block_size={self.query_block_size}, key_block_size={self.key_block_size}"
+
+
+def _fused_scaled_dot_product_attention(
+    seqs: Tensor, keys: Tensor, values: Tensor, dropout_p: float, is_causal: bool
+) -> Tuple[Tensor, Optional[Tensor]]:
+    num_query_groups = seqs.size(1) // keys.size(1)
+
+    if num_query_groups > 1:
+        # Without a mask, we can fold the query heads that share a key/value
+        # head into the sequence dimension.
+        # (N, H, S, K) -> (N, H_kv, G x S, K)
+        seqs = seqs.unflatten(1, (-1, num_query_groups)).flatten(2, 3)
+
+    attn = F.scaled_dot_product_attention(  # type: ignore[attr-defined]
+        seqs, keys, values, dropout_p=dropout_p, is_causal=is_causal
+    )
+
+    if num_query_groups > 1:
+        # (N, H_kv, G x S, V) -> (N, H, S, V)
+        attn = attn.unflatten(2, (num_query_groups, -1)).flatten(1, 2)
+
+    return attn, None
+
+
+def _tiled_scaled_dot_product_attention(
+    seqs: Tensor,
+    keys: Tensor,
+    key_padding_mask: Optional[PaddingMask],
+    values: Tensor,
+    attn_mask: Optional[AttentionMask],
+    dropout_p: float,
+    query_block_size: int,
+    key_block_size: int,
+) -> Tensor:
+    batch_size, num_heads, seq_len, _ = seqs.shape
+
+    num_query_groups = num_heads // keys.size(1)
+
+    key_len = keys.size(2)
+
+    scale = seqs.size(-1) ** -0.5
+
+    # (N, H, S, K) -> (N, H_kv, G, S, K)
+    seqs = seqs.unflatten(1, (-1, num_query_groups))
+
+    packed_mask: Optional[PackedAttentionMask] = None
+
+    # The sequences of a packed batch attend only to themselves; we restrict
+    # each block of queries to the keys of its sequences, and apply the inner
+    # mask as usual.
+    if isinstance(attn_mask, PackedAttentionMask):
+        packed_mask, attn_mask = attn_mask, attn_mask.inner_mask
+
+        # (T), (T_kv)
+        q_seq_ids = packed_mask.padding_mask.seq_ids()
+        k_seq_ids = packed_mask.key_padding_mask.seq_ids()
+
+    causal_mask: Optional[CausalAttentionMask] = None
+
+    # ([N, H_kv, G], S, S_kv)
+    mask: Optional[Tensor] = None
+
+    if isinstance(attn_mask, CausalAttentionMask):
+        causal_mask = attn_mask
+    elif attn_mask is not None:
+        mask = _unflatten_mask_heads(attn_mask.materialize(), num_query_groups)
+
+    # (N, 1, 1, 1, 1)
+    if key_padding_mask is not None:
+        key_seq_lens = key_padding_mask.seq_lens[:, None, None, None, None]
+    else:
+        key_seq_lens = None
+
+    # (N, H_kv, G, S, V)
+    attn = seqs.new_empty(seqs.shape[:-1] + (values.size(-1),))
+
+    for q_begin in range(0, seq_len, query_block_size):
+        q_end = min(q_begin + query_block_size, seq_len)
+
+        # Skip the key blocks that are entirely masked by the causal mask.
+        k_begin, k_end = 0, key_len
+
+        if causal_mask is not None:
+            start_step = causal_mask.start_step
+
+            k_end = min(key_len, start_step + q_end)
+
+            if (attn_window_len := causal_mask.attn_window_len) is not None:
+                k_begin = max(0, start_step + q_begin - attn_window_len + 1)
+
+            # (S_q, 1)
+            q_pos = torch.arange(
+                start_step + q_begin, start_step + q_end, device=seqs.device
+            )
+
+            q_pos = q_pos.unsqueeze(-1)
+
+        if packed_mask is not None:
+            q_offsets = packed_mask.padding_mask.packed_seq_offsets
+            k_offsets = packed_mask.key_padding_mask.packed_seq_offsets
+
+            # The indices of the first and last sequence of the query block.
+            first_seq_idx = bisect_right(q_offsets, q_begin) - 1
+            last_seq_idx = bisect_right(q_offsets, q_end - 1) - 1
+
+            k_begin = max(k_begin, k_offsets[first_seq_idx])
+            k_end = min(k_end, k_offsets[last_seq_idx + 1])
+
+            # (S_q, 1)
+            q_block_seq_ids = q_seq_ids[q_begin:q_end].unsqueeze(-1)
+
+        # (N, H_kv, G, S, K) -> (N, H_kv, G x S_q, K)
+        q = seqs[:, :, :, q_begin:q_end].flatten(2, 3)
+
+        # (N, H_kv, G, S_q, 1)
+        stat_shape = seqs.shape[:3] + (q_end - q_begin, 1)
+
+        # The running maximum and sum of the attention weights of each step,
+        # and the running attention values scaled by the maximum.
+        max_weights = q.new_full(stat_shape, -torch.inf, dtype=torch.float32)
+        sum_weights = q.new_zeros(stat_shape, dtype=torch.float32)
+
+        # (N, H_kv, G, S_q, V)
+        acc = q.new_zeros(stat_shape[:-1] + (values.size(-1),), dtype=torch.float32)
+
+        for k_block_begin in range(k_begin, k_end, key_block_size):
+            k_block_end = min(k_block_begin + key_block_size, k_end)
+
+            # (N, H_kv, S_kv, K) -> (N, H_kv, K, S_k)
+            k = keys[:, :, k_block_begin:k_block_end].transpose(-1, -2)
+
+            # (N, H_kv, G x S_q, K) @ (N, H_kv, K, S_k) = (N, H_kv, G x S_q, S_k)
+            weights = torch.matmul(q, k)
+
+            # For numerical stability run in single precision.
+            weights = weights.float() * scale
+
+            # (N, H_kv, G x S_q, S_k) -> (N, H_kv, G, S_q, S_k)
+            weights = weights.unflatten(2, (num_query_groups, -1))
+
+            if mask is not None:
+                weights = weights + mask[..., q_begin:q_end, k_block_begin:k_block_end]
+
+            if packed_mask is not None:
+                # (S_q, 1), (S_k) -> (S_q, S_k)
+                m = q_block_seq_ids != k_seq_ids[k_block_begin:k_block_end]
+
+                weights = weights.masked_fill(m, -torch.inf)
+
+            if causal_mask is not None or key_seq_lens is not None:
+                # (S_k)
+                k_pos = torch.arange(k_block_begin, k_block_end, device=seqs.device)
+
+                if causal_mask is not None:
+                    # (S_q, 1), (S_k) -> (S_q, S_k)
+                    m = k_pos > q_pos
+
+                    if attn_window_len is not None:
+                        m |= k_pos <= q_pos - attn_window_len
+
+                    weights = weights.masked_fill(m, -torch.inf)
+
+                if key_seq_lens is not None:
+                    # (S_k), (N, 1, 1, 1, 1) -> (N, 1, 1, 1, S_k)
+                    m = k_pos >= key_seq_lens
+
+                    weights = weights.masked_fill(m, -torch.inf)
+
+            # (N, H_kv, G, S_q, 1)
+            new_max_weights = torch.maximum(
+                max_weights, weights.amax(dim=-1, keepdim=True)
+            )
+
+            # Steps that have not attended to any key yet have a maximum of
+            # -inf; shift them by 0 instead to avoid NaNs.
+            shift = new_max_weights.masked_fill(new_max_weights == -torch.inf, 0.0)
+
+            weights = torch.exp(weights - shift)
+
+            # Rescale the running sums to the new maximum.
+            correction = torch.exp(max_weights - shift)
+
+            sum_weights = sum_weights * correction + weights.sum(dim=-1, keepdim=True)
+
+            if dropout_p > 0.0:
+                weights = dropout(weights, dropout_p)
+
+            # (N, H_kv, G, S_q, S_k) -> (N, H_kv, G x S_q, S_k)
+            weights = weights.type_as(values).flatten(2, 3)
+
+            # (N, H_kv, G x S_q, S_k) @ (N, H_kv, S_k, V) = (N, H_kv, G x S_q, V)
+            v = torch.matmul(weights, values[:, :, k_block_begin:k_block_end])
+
+            # (N, H_kv, G x S_q, V) -> (N, H_kv, G, S_q, V)
+            v = v.unflatten(2, (num_query_groups, -1))
+
+            acc = acc * correction + v
+
+            max_weights = new_max_weights
+
+        attn[:, :, :, q_begin:q_end] = acc / sum_weights
+
+    # (N, H_kv, G, S, V) -> (N, H, S, V)
+    return attn.flatten(1, 2)
+
+
 def _naive_scaled_dot_product_attention(
     seqs: Tensor,
     keys: Tensor,
@@ -229,25 +607,35 @@ def _naive_scaled_dot_product_attention(
     needs_weights: bool,
     training: bool,
 ) -> Tuple[Tensor, Optional[Tensor]]:
-    # (N, H, S, K) @ (N, H, K, S_kv) = (N, H, S, S_kv)
+    num_query_groups = seqs.size(1) // keys.size(1)
+
+    # Fold the query heads that share a key/value head into the sequence
+    # dimension, so that we can attend without repeating the keys and values.
+    # (N, H, S, K) -> (N, H_kv, G x S, K)
+    seqs = seqs.unflatten(1, (-1, num_query_groups)).flatten(2, 3)
+
+    # (N, H_kv, G x S, K) @ (N, H_kv, K, S_kv) = (N, H_kv, G x S, S_kv)
     attn_weights = torch.matmul(seqs, keys.transpose(-1, -2))
 
     attn_weights = attn_weights * (seqs.size(-1) ** -0.5)
 
+    # (N, H_kv, G x S, S_kv) -> (N, H_kv, G, S, S_kv)
+    attn_weights = attn_weights.unflatten(2, (num_query_groups, -1))
+
     if attn_mask is not None:
-        # (S, S_kv)
-        m = attn_mask.materialize()
+        # ([N, H_kv, G], S, S_kv)
+        m = _unflatten_mask_heads(attn_mask.materialize(), num_query_groups)
 
-        # (N, H, S, S_kv) + (S, S_kv) -> (N, H, S, S_kv)
+        # (N, H_kv, G, S, S_kv) + ([N, H_kv, G], S, S_kv) -> (N, H_kv, G, S, S_kv)
         attn_weights = attn_weights + m
 
     if key_padding_mask is not None:
         # (N, S_kv)
         m = key_padding_mask.materialize()
 
-        m = m[:, None, None, :]
+        m = m[:, None, None, None, :]
 
-        # (N, H, S, S_kv) + (N, 1, 1, S_kv) -> (N. H, S, S_kv)
+        # (N, H_kv, G, S, S_kv) + (N, 1, 1, 1, S_kv) -> (N, H_kv, G, S, S_kv)
         attn_weights = torch.where(m, attn_weights, -torch.inf)
 
     # For numerical stability run in single precision.
@@ -258,10 +646,35 @@ def _naive_scaled_dot_product_attention(
     if training and dropout_p > 0.0:
         attn_weights = dropout(attn_weights, dropout_p)
 
-    # (N, H, S, S_kv) @ (N, H, S_kv, V) = (N, H, S, V)
-    attn = torch.matmul(attn_weights, values)
+    # (N, H_kv, G, S, S_kv) -> (N, H_kv, G x S, S_kv)
+    attn = attn_weights.flatten(2, 3)
+
+    # (N, H_kv, G x S, S_kv) @ (N, H_kv, S_kv, V) = (N, H_kv, G x S, V)
+    attn = torch.matmul(attn, values)
+
+    # (N, H_kv, G x S, V) -> (N, H, S, V)
+    attn = attn.unflatten(2, (num_query_groups, -1)).flatten(1, 2)
+
+    if not needs_weights:
+        return attn, None
+
+    # (N, H_kv, G, S, S_kv) -> (N, H, S, S_kv)
+    return attn, attn_weights.flatten(1, 2)
+
+
+def _unflatten_mask_heads(mask: Tensor, num_query_groups: int) -> Tensor:
+    if mask.dim() == 3:
+        # (H, S, S_kv) -> (H_kv, G, S, S_kv)
+        mask = mask.unflatten(0, (-1, num_query_groups))
+    elif mask.dim() == 4:
+        if mask.size(1) == 1:
+            # (N, 1, S, S_kv) -> (N, 1, 1, S, S_kv)
+            mask = mask.unsqueeze(2)
+        else:
+            # (N, H, S, S_kv) -> (N, H_kv, G, S, S_kv)
+            mask = mask.unflatten(1, (-1, num_query_groups))
 
-    return attn, attn_weights if needs_weights else None
+    return mask
 
 
 class SDPAFactory(Protocol):
@@ -5,12 +5,14 @@
 # LICENSE file in the root directory of this source tree.
 
 from abc import ABC, abstractmethod
-from typing import Optional, Protocol, final
+from typing import Dict, Hashable, Optional, Protocol, final
+from weakref import WeakKeyDictionary
 
 import torch
 from torch import Tensor
 
 from fairseq2.nn.incremental_state import IncrementalStateBag
+from fairseq2.nn.padding import PackedPaddingMask
 from fairseq2.typing import DataType, Device, finaloverride
 
 
@@ -110,6 +112,11 @@ class CausalAttentionMask(AttentionMask):
             [0.,     0., -inf, -inf],
             [-inf,   0.,   0., -inf],
             [-inf, -inf,   0.,   0.]])
+    >>>
+    >>> mask = CausalAttentionMask(seq_len=2, key_len=4, start_step=2)
+    >>> mask.materialize()
+    tensor([[0., 0., 0., -inf],
+            [0., 0., 0.,   0.]])
     """
 
     def __init__(
@@ -118,6 +125,7 @@ class CausalAttentionMask(AttentionMask):
         key_len: int,
         *,
         attn_window_len: Optional[int] = None,
+        start_step: int = 0,
         device: Optional[Device] = None,
         dtype: Optional[DataType] = None,
     ) -> None:
@@ -130,22 +138,149 @@ class CausalAttentionMask(AttentionMask):
             The attention window length as described in Section 3.1 of
             :cite:t:`https://doi.org/10.48550/arxiv.2004.05150`. If ``None``,
             constructs a full causal attention mask.
+        :param start_step:
+            The position of the first step of the sequence within the keys
+            (e.g. the number of past steps during incremental decoding).
         """
         super().__init__()
 
         self.seq_len = seq_len
         self.key_len = key_len
         self.attn_window_len = attn_window_len
+        self.start_step = start_step
 
         self.device, self.dtype = device, dtype
 
     @finaloverride
     def _do_materialize(self) -> Tensor:
         return _create_causal_attention_mask(
-            self.seq_len, self.key_len, self.attn_window_len, self.device, self.dtype
+            self.seq_len,
+            self.key_len,
+            self.attn_window_len,
+            self.start_step,
+            self.device,
+            self.dtype,
         )
 
 
+@final
+class PackedAttentionMask(AttentionMask):
+    """Represents an attention mask that restricts the steps of a packed batch
+    to attend only to the steps of their own sequence.
+
+    *Shape:* :math:`([H],T,T_{kv})`, where :math:`H` is the number of heads of
+    ``inner_mask`` (if any), :math:`T` is the total length of the packed
+    sequences, and :math:`T_{kv}` is the total length of the packed key/value
+    sequences.
+
+    The materialized mask is shared by all instances constructed with the same
+    padding masks and an equal causal (or no) inner mask, so that the attention
+    layers of a model build it only once per forward pass.
+    """
+
+    padding_mask: PackedPaddingMask
+    key_padding_mask: PackedPaddingMask
+    inner_mask: Optional[AttentionMask]
+
+    def __init__(
+        self,
+        padding_mask: PackedPaddingMask,
+        key_padding_mask: PackedPaddingMask,
+        inner_mask: Optional[AttentionMask] = None,
+        *,
+        dtype: Optional[DataType] = None,
+    ) -> None:
+        """
+        :param padding_mask:
+            The padding mask of the packed sequences.
+        :param key_padding_mask:
+            The padding mask of the packed key/value sequences.
+        :param inner_mask:
+            The mask to apply within each sequence (e.g. a causal mask). It is
+            defined over the packed steps; masks that depend only on relative
+            positions, such as causal and ALiBi masks, apply to each sequence
+            as if it was not packed.
+        """
+        super().__init__()
+
+        num_seqs = len(padding_mask.packed_seq_lens)
+
+        if (num_key_seqs := len(key_padding_mask.packed_seq_lens)) != num_seqs:
+            raise ValueError(
+                f"The number of packed key/value sequences must be equal to the number of packed sequences ({num_seqs}), but is {num_key_seqs} instead."
+            )
+
+        self.padding_mask = padding_mask
+        self.key_padding_mask = key_padding_mask
+        self.inner_mask = inner_mask
+
+        self.dtype = dtype
+
+    @finaloverride
+    def _do_materialize(self) -> Tensor:
+        # All attention layers of a forward pass see the same packed padding
+        # masks; build the mask once and share it instead of allocating a new
+        # (T, T_kv) tensor in each layer.
+        cache_key = self._get_cache_key()
+
+        if cache_key is not None:
+            cache = _packed_attention_masks.setdefault(
+                self.padding_mask, WeakKeyDictionary()
+            ).setdefault(self.key_padding_mask, {})
+
+            mask = cache.get(cache_key)
+            if mask is None:
+                mask = cache[cache_key] = self._create_mask()
+
+            return mask
+
+        return self._create_mask()
+
+    def _get_cache_key(self) -> Optional[Hashable]:
+        inner_mask = self.inner_mask
+
+        if inner_mask is None:
+            return (None, self.dtype)
+
+        # Other masks cannot be compared cheaply; they are not shared.
+        if isinstance(inner_mask, CausalAttentionMask):
+            return (
+                inner_mask.seq_len,
+                inner_mask.key_len,
+                inner_mask.attn_window_len,
+                inner_mask.start_step,
+                inner_mask.dtype,
+            )
+
+        return None
+
+    def _create_mask(self) -> Tensor:
+        # (T, 1) == (T_kv) -> (T, T_kv)
+        same_seq_mask = self.padding_mask.seq_ids().unsqueeze(1) == (
+            self.key_padding_mask.seq_ids()
+        )
+
+        if self.inner_mask is None:
+            dtype = self.dtype or torch.get_default_dtype()
+
+            mask = torch.zeros(
+                same_seq_mask.shape, device=same_seq_mask.device, dtype=dtype
+            )
+        else:
+            # ([H], T, T_kv)
+            mask = self.inner_mask.materialize()
+
+        return torch.where(same_seq_mask, mask, -torch.inf)
+
+
+# The materialized masks of packed batches, keyed by their padding masks. The
+# entries are dropped along with the padding masks at the end of the forward
+# pass.
+_packed_attention_masks: "WeakKeyDictionary[PackedPaddingMask, WeakKeyDictionary[PackedPaddingMask, Dict[Hashable, Tensor]]]" = (
+    WeakKeyDictionary()
+)
+
+
 class CausalAttentionMaskFactory:
     """Constructs instances of :class:`CausalAttentionMask`."""
 
@@ -165,7 +300,7 @@ class CausalAttentionMaskFactory:
         *,
         training: bool = True,
         state_bag: Optional[IncrementalStateBag] = None,
-    ) -> Optional[CausalAttentionMask]:
+    ) -> Optional[AttentionMask]:
         seq_len, key_len = seqs.size(1), keys.size(1)
 
         if seq_len > key_len:
@@ -178,10 +313,31 @@ class CausalAttentionMaskFactory:
             # or if we attend to past steps during incremental decoding.
             return None
 
+        if training or state_bag is None:
+            start_step = 0
+        else:
+            # If the sequences are at different steps, each of them starts at
+            # its own step within the keys.
+            if state_bag.seq_steps is not None:
+                mask = _create_seq_causal_attention_mask(
+                    seq_len,
+                    state_bag.step + key_len,
+                    self.attn_window_len,
+                    state_bag.seq_steps,
+                    seqs.dtype,
+                )
+
+                return CustomAttentionMask(mask)
+
+            start_step = state_bag.step
+
+        # During incremental decoding, the steps attend to the past steps held
+        # in the incremental state in addition to `keys`.
         return CausalAttentionMask(
             seq_len,
-            key_len,
+            start_step + key_len,
             attn_window_len=self.attn_window_len,
+            start_step=start_step,
             device=seqs.device,
             dtype=seqs.dtype,
         )
@@ -265,7 +421,7 @@ class ALiBiMask(AttentionMask):
         else:
             # (S, S_kv)
             causal_mask = _create_causal_attention_mask(
-                seq_len, self.key_len, None, self.device, self.dtype
+                seq_len, self.key_len, None, 0, self.device, self.dtype
             )
 
             # (H, S, S_kv) + (S, S_kv) -> (H, S, S_kv)
@@ -295,6 +451,11 @@ class ALiBiMaskFactory:
         if training or state_bag is None:
             start_step = 0
         else:
+            if state_bag.seq_steps is not None:
+                raise ValueError(
+                    "`ALiBiMaskFactory` does not support incremental decoding of sequences at different steps."
+                )
+
             start_step = state_bag.step
 
         seq_len = start_step + seqs.size(1)
@@ -328,6 +489,7 @@ def _create_causal_attention_mask(
     seq_len: int,
     key_len: int,
     attn_window_len: Optional[int],
+    start_step: int,
     device: Optional[Device],
     dtype: Optional[DataType],
 ) -> Tensor:
@@ -339,11 +501,41 @@ def _create_causal_attention_mask(
 
     mask = torch.ones((seq_len, key_len), device=device, dtype=dt)
 
-    mask.tril_(diagonal=0)
+    mask.tril_(diagonal=start_step)
 
     if attn_window_len is not None:
-        mask.triu_(diagonal=1 - attn_window_len)
+        mask.triu_(diagonal=start_step + 1 - attn_window_len)
 
     mask.log_()
 
     return mask.to(dtype)
+
+
+def _create_seq_causal_attention_mask(
+    seq_len: int,
+    key_len: int,
+    attn_window_len: Optional[int],
+    start_steps: Tensor,
+    dtype: Optional[DataType],
+) -> Tensor:
+    if dtype is None:
+        dtype = torch.get_default_dtype()
+
+    device = start_steps.device
+
+    # (N, 1, 1) + (S, 1) -> (N, S, 1)
+    q_pos = start_steps[:, None, None] + torch.arange(seq_len, device=device)[:, None]
+
+    # (S_kv)
+    k_pos = torch.arange(key_len, device=device)
+
+    # (N, S, S_kv)
+    m = k_pos > q_pos
+
+    if attn_window_len is not None:
+        m |= k_pos <= q_pos - attn_window_len
+
+    mask = torch.zeros(m.shape, device=device, dtype=dtype).masked_fill_(m, -torch.inf)
+
+    # (N, S, S_kv) -> (N, 1, S, S_kv)
+    return mask.unsqueeze(1)
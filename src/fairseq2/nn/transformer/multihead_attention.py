@@ -6,22 +6,36 @@
 
 from abc import ABC, abstractmethod
 from collections import OrderedDict
-from typing import Dict, MutableSequence, Optional, Protocol, Tuple, final
+from functools import partial
+from typing import (
+    Dict,
+    List,
+    MutableSequence,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+    final,
+)
 
 import torch
 import torch.nn as nn
 from torch import Tensor
 from torch.nn import Module
+from torch.nn.functional import linear, pad
 from torch.nn.parameter import Parameter
 from torch.utils.hooks import RemovableHandle
 
 from fairseq2.nn.incremental_state import IncrementalState, IncrementalStateBag
-from fairseq2.nn.ops import repeat_interleave
-from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.padding import PackedPaddingMask, PaddingMask
 from fairseq2.nn.position_encoder import PositionEncoder
 from fairseq2.nn.projection import Linear, Projection
 from fairseq2.nn.transformer.attention import SDPA, create_default_sdpa
-from fairseq2.nn.transformer.attention_mask import AttentionMask, AttentionMaskFactory
+from fairseq2.nn.transformer.attention_mask import (
+    AttentionMask,
+    AttentionMaskFactory,
+    PackedAttentionMask,
+)
 from fairseq2.typing import DataType, Device, finaloverride
 
 
@@ -70,7 +84,10 @@ class MultiheadAttention(Module, ABC):
         :param keys:
             The keys. *Shape:* :math:`(N,S_{kv},K)`, where :math:`N` is the
             batch size, :math:`S_{kv}` is the key/value sequence length, and
-            :math:`K` is the key size.
+            :math:`K` is the key size. The batch size can also be a divisor of
+            the batch size of ``seqs`` (e.g. the number of searches in beam
+            search), in which case each key sequence is shared by that many
+            consecutive sequences in ``seqs``.
         :param key_padding_mask:
             The padding mask indicating which key positions to ignore for the
             purpose of attention. *Shape:* :math:`(N,S_{kv})`, where :math:`N`
@@ -184,9 +201,10 @@ class StandardMultiheadAttention(MultiheadAttention):
     :cite:t:`https://doi.org/10.48550/arxiv.1706.03762`."""
 
     num_key_value_heads: int
-    q_proj: Projection
-    k_proj: Projection
-    v_proj: Projection
+    q_proj: Optional[Projection]
+    k_proj: Optional[Projection]
+    v_proj: Optional[Projection]
+    qkv_proj: Optional[Linear]
     attn_mask_factory: Optional[AttentionMaskFactory]
     pos_encoder: Optional[PositionEncoder]
     bias_k: Optional[Parameter]
@@ -206,6 +224,7 @@ class StandardMultiheadAttention(MultiheadAttention):
         q_proj: Optional[Projection] = None,
         k_proj: Optional[Projection] = None,
         v_proj: Optional[Projection] = None,
+        fuse_qkv: bool = False,
         attn_mask_factory: Optional[AttentionMaskFactory] = None,
         pos_encoder: Optional[PositionEncoder] = None,
         sdpa: Optional[SDPA] = None,
@@ -236,6 +255,12 @@ class StandardMultiheadAttention(MultiheadAttention):
         :param v_proj:
             The projection to apply to values before computing attention. If
             ``None``, a default projection will be used.
+        :param fuse_qkv:
+            If ``True``, the default query, key, and value projections are
+            packed into :attr:`qkv_proj` and self attention projects its input
+            with a single matrix multiplication. Use
+            :func:`~fairseq2.models.utils.checkpoint_loader.fuse_qkv_projections`
+            to load a state dictionary saved in the unfused layout.
         :param attn_mask_factory:
             The attention mask factory.
         :param pos_encoder:
@@ -277,7 +302,25 @@ class StandardMultiheadAttention(MultiheadAttention):
 
         num_query_groups = num_heads // self.num_key_value_heads
 
-        if q_proj is None and k_proj is None and v_proj is None:
+        kv_dim = head_dim * self.num_key_value_heads
+
+        if fuse_qkv:
+            if q_proj is not None or k_proj is not None or v_proj is not None:
+                raise ValueError(
+                    "`q_proj`, `k_proj`, and `v_proj` must be all `None` when `fuse_qkv` is `True`."
+                )
+
+            split_sizes = [model_dim, kv_dim, kv_dim]
+
+            self.qkv_proj = Linear(
+                model_dim,
+                sum(split_sizes),
+                bias,
+                init_fn=partial(init_fused_qkv_projection, split_sizes=split_sizes),
+                device=device,
+                dtype=dtype,
+            )
+        elif q_proj is None and k_proj is None and v_proj is None:
             q_proj = Linear(
                 model_dim,
                 model_dim,
@@ -288,7 +331,7 @@ class StandardMultiheadAttention(MultiheadAttention):
             )
             k_proj = Linear(
                 model_dim,
-                head_dim * self.num_key_value_heads,
+                kv_dim,
                 bias,
                 init_fn=init_qkv_projection,
                 device=device,
@@ -296,7 +339,7 @@ class StandardMultiheadAttention(MultiheadAttention):
             )
             v_proj = Linear(
                 model_dim,
-                head_dim * self.num_key_value_heads,
+                kv_dim,
                 bias,
                 init_fn=init_qkv_projection,
                 device=device,
@@ -328,9 +371,16 @@ class StandardMultiheadAttention(MultiheadAttention):
                     f"`output_dim` of `v_proj` must be a multiple of `num_key_value_heads` ({self.num_key_value_heads}), but is {v_proj.output_dim} instead."
                 )
 
-        self.q_proj = q_proj
-        self.k_proj = k_proj
-        self.v_proj = v_proj
+        if fuse_qkv:
+            self.register_module("q_proj", None)
+            self.register_module("k_proj", None)
+            self.register_module("v_proj", None)
+        else:
+            self.q_proj = q_proj
+            self.k_proj = k_proj
+            self.v_proj = v_proj
+
+            self.register_module("qkv_proj", None)
 
         self.attn_mask_factory = attn_mask_factory
 
@@ -356,7 +406,10 @@ class StandardMultiheadAttention(MultiheadAttention):
         else:
             self.register_parameter("head_scale_weight", None)
 
-        v_dim = v_proj.output_dim * num_query_groups
+        if v_proj is None:
+            v_dim = kv_dim * num_query_groups
+        else:
+            v_dim = v_proj.output_dim * num_query_groups
 
         if output_proj is None:
             self.output_proj = Linear(
@@ -401,13 +454,24 @@ class StandardMultiheadAttention(MultiheadAttention):
         attn_mask: Optional[AttentionMask] = None,
         state_bag: Optional[IncrementalStateBag] = None,
     ) -> Tensor:
-        # (N, S, M) -> (N, H, S, K_h)
-        q = self._project_q(seqs, padding_mask, state_bag)
+        # Self attention can project its input with a single matrix
+        # multiplication.
+        is_fused = self.qkv_proj is not None and seqs is keys and keys is values
+
+        if is_fused:
+            # q: (N, S, M) -> (N, H, S, K_h)
+            # k: (N, S, M) -> (N, H_kv, S, K_h)
+            # v: (N, S, M) -> (N, H_kv, S, V_h)
+            q, k, v = self._project_qkv(seqs, padding_mask, key_padding_mask, state_bag)
+        else:
+            # (N, S, M) -> (N, H, S, K_h)
+            q = self._project_q(seqs, padding_mask, state_bag)
 
         if self.training or state_bag is None:
-            # k: (N, S_kv, M) -> (N, H_kv, S_kv, K_h)
-            # v: (N, S_kv, M) -> (N, H_kv, S_kv, V_h)
-            k, v = self._project_kv(keys, key_padding_mask, values)
+            if not is_fused:
+                # k: (N, S_kv, M) -> (N, H_kv, S_kv, K_h)
+                # v: (N, S_kv, M) -> (N, H_kv, S_kv, V_h)
+                k, v = self._project_kv(keys, key_padding_mask, values)
         else:
             if seqs is keys:  # Self attention
                 if key_padding_mask is not None:
@@ -415,9 +479,10 @@ class StandardMultiheadAttention(MultiheadAttention):
                         "`key_padding_mask` must be `None` during incremental decoding."
                     )
 
-                # k: (N, S_step, M) -> (N, H_kv, S_step, K_h)
-                # v: (N, S_step, M) -> (N, H_kv, S_step, V_h)
-                k, v = self._project_kv(keys, key_padding_mask, values, state_bag)
+                if not is_fused:
+                    # k: (N, S_step, M) -> (N, H_kv, S_step, K_h)
+                    # v: (N, S_step, M) -> (N, H_kv, S_step, V_h)
+                    k, v = self._project_kv(keys, key_padding_mask, values, state_bag)
 
                 state = state_bag.get_state(self, AttentionState)
                 if state is None:
@@ -432,6 +497,20 @@ class StandardMultiheadAttention(MultiheadAttention):
                     # k: (N, H_kv, S_kv, K_h)
                     # v: (N, H_kv, S_kv, V_h)
                     k, v = state.get()
+
+                    # If the sequences are at different steps, mask the key
+                    # positions beyond the step of each sequence.
+                    if state_bag.seq_steps is not None:
+                        seq_len = seqs.size(1)
+
+                        key_len = state_bag.step + seq_len
+
+                        k = k[:, :, :key_len]
+                        v = v[:, :, :key_len]
+
+                        key_padding_mask = PaddingMask(
+                            state_bag.seq_steps + seq_len, batch_seq_len=key_len
+                        )
             else:
                 state = state_bag.get_state(self, AttentionState)
                 if state is None:
@@ -439,9 +518,14 @@ class StandardMultiheadAttention(MultiheadAttention):
                     # v: (N, S_kv, M) -> (N, H_kv, S_kv, V_h)
                     k, v = self._project_kv(keys, key_padding_mask, values)
 
-                    state_factory = self.state_factory or StaticAttentionState
+                    if k.size(0) == seqs.size(0):
+                        state_factory = self.state_factory or StaticAttentionState
 
-                    state = state_factory(k, v, max_seq_len=k.size(2))
+                        state = state_factory(k, v, max_seq_len=k.size(2))
+                    else:
+                        beam_size = seqs.size(0) // k.size(0)
+
+                        state = BeamSharedStaticAttentionState(k, v, beam_size)
 
                     state_bag.set_state(self, state)
                 else:
@@ -449,18 +533,42 @@ class StandardMultiheadAttention(MultiheadAttention):
                     # v: (N, H_kv, S_kv, V_h)
                     k, v = state.get()
 
-        # With Grouped Query Attention, each key/value head is repeated.
-        if (num_query_groups := self.num_heads // self.num_key_value_heads) > 1:
-            # (N, H_kv, S_kv, K_h) -> (N, H, S_kv, K_h)
-            k = repeat_interleave(k, dim=1, repeat=num_query_groups)
-            # (N, H_kv, S_kv, K_h) -> (N, H, S_kv, V_h)
-            v = repeat_interleave(v, dim=1, repeat=num_query_groups)
-
         if self.attn_mask_factory is not None:
             attn_mask = self.attn_mask_factory(
                 seqs, keys=keys, training=self.training, state_bag=state_bag
             )
 
+        # A packed batch has no padding, but its sequences must attend only to
+        # themselves.
+        if isinstance(key_padding_mask, PackedPaddingMask):
+            if not isinstance(padding_mask, PackedPaddingMask):
+                raise ValueError(
+                    "`padding_mask` must be a `PackedPaddingMask` when `key_padding_mask` is a `PackedPaddingMask`."
+                )
+
+            attn_mask = PackedAttentionMask(
+                padding_mask, key_padding_mask, attn_mask, dtype=q.dtype
+            )
+
+            key_padding_mask = None
+
+        # If each key sequence is shared by more than one query sequence (e.g.
+        # the beams of a search), attend with all of them at once instead of
+        # repeating the keys and values.
+        if (num_shared_seqs := q.size(0) // k.size(0)) > 1:
+            if q.size(0) % k.size(0) != 0:
+                raise ValueError(
+                    f"The batch size of `seqs` must be a multiple of the batch size of `keys` ({k.size(0)}), but is {q.size(0)} instead."
+                )
+
+            if attn_mask is not None:
+                raise ValueError(
+                    "`attn_mask` must be `None` when the keys are shared by more than one query sequence."
+                )
+
+            # (N x B, H, S, K_h) -> (N, H, B x S, K_h)
+            q = q.unflatten(0, (-1, num_shared_seqs)).transpose(1, 2).flatten(2, 3)
+
         needs_weights = len(self._attn_weight_hooks) > 0
 
         # attn:         (N, H, S, V_h)
@@ -474,6 +582,18 @@ class StandardMultiheadAttention(MultiheadAttention):
             needs_weights=needs_weights,
         )
 
+        if num_shared_seqs > 1:
+            # (N, H, B x S, V_h) -> (N x B, H, S, V_h)
+            attn = attn.unflatten(2, (num_shared_seqs, -1))
+
+            attn = attn.transpose(1, 2).flatten(0, 1)
+
+            if attn_weights is not None:
+                # (N, H, B x S, S_kv) -> (N x B, H, S, S_kv)
+                attn_weights = attn_weights.unflatten(2, (num_shared_seqs, -1))
+
+                attn_weights = attn_weights.transpose(1, 2).flatten(0, 1)
+
         if attn_weights is not None:
             self._run_attn_weight_hooks(attn, attn_weights)
 
@@ -498,7 +618,10 @@ class StandardMultiheadAttention(MultiheadAttention):
         state_bag: Optional[IncrementalStateBag] = None,
     ) -> Tensor:
         # (N, S, M) -> (N, S, K_proj)
-        q = self.q_proj(seqs)
+        if self.q_proj is not None:
+            q = self.q_proj(seqs)
+        else:
+            q = self._fused_proj(seqs, 0)
 
         # (N, S, K_proj) -> (N, H, S, K_h)
         q = q.unflatten(-1, (self.num_heads, -1)).transpose(1, 2)
@@ -515,10 +638,16 @@ class StandardMultiheadAttention(MultiheadAttention):
         values: Tensor,
         state_bag: Optional[IncrementalStateBag] = None,
     ) -> Tuple[Tensor, Tensor]:
-        # (N, S, K) -> (N, S, K_proj)
-        k = self.k_proj(keys)
-        # (N, S, V) -> (N, S, V_proj)
-        v = self.v_proj(values)
+        if self.k_proj is not None and self.v_proj is not None:
+            # (N, S, K) -> (N, S, K_proj)
+            k = self.k_proj(keys)
+            # (N, S, V) -> (N, S, V_proj)
+            v = self.v_proj(values)
+        else:
+            # (N, S, K) -> (N, S, K_proj)
+            k = self._fused_proj(keys, 1)
+            # (N, S, V) -> (N, S, V_proj)
+            v = self._fused_proj(values, 2)
 
         # (N, S, K_proj) -> (N, H, S, K_h)
         k = k.unflatten(-1, (self.num_key_value_heads, -1)).transpose(1, 2)
@@ -530,6 +659,64 @@ class StandardMultiheadAttention(MultiheadAttention):
 
         return k, v
 
+    def _project_qkv(
+        self,
+        seqs: Tensor,
+        padding_mask: Optional[PaddingMask],
+        key_padding_mask: Optional[PaddingMask],
+        state_bag: Optional[IncrementalStateBag] = None,
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        assert self.qkv_proj is not None
+
+        # (N, S, M) -> (N, S, K_proj + 2 x KV_proj)
+        qkv = self.qkv_proj(seqs)
+
+        # (N, S, K_proj + 2 x KV_proj) -> (N, H + 2 x H_kv, S, K_h)
+        qkv = qkv.unflatten(-1, (self.num_heads + 2 * self.num_key_value_heads, -1))
+
+        qkv = qkv.transpose(1, 2)
+
+        # (N, H + 2 x H_kv, S, K_h) -> (N, H, S, K_h), (N, H_kv, S, K_h) x 2
+        q, k, v = qkv.split(
+            [self.num_heads, self.num_key_value_heads, self.num_key_value_heads], dim=1
+        )
+
+        if self.pos_encoder is not None:
+            if padding_mask is key_padding_mask:
+                # Encode the queries and keys at once.
+                # (N, H + H_kv, S, K_h)
+                qk = self.pos_encoder(
+                    qkv[:, : -self.num_key_value_heads],
+                    padding_mask,
+                    state_bag=state_bag,
+                )
+
+                q, k = qk.split([self.num_heads, self.num_key_value_heads], dim=1)
+            else:
+                q = self.pos_encoder(q, padding_mask, state_bag=state_bag)
+                k = self.pos_encoder(k, key_padding_mask, state_bag=state_bag)
+
+        return q, k, v
+
+    def _fused_proj(self, x: Tensor, split_idx: int) -> Tensor:
+        """Apply one of the query, key, or value projections packed in
+        :attr:`qkv_proj` (e.g. for encoder-decoder attention)."""
+        assert self.qkv_proj is not None
+
+        split_sizes = _qkv_split_sizes(self)
+
+        start = sum(split_sizes[:split_idx])
+        end = start + split_sizes[split_idx]
+
+        weight = self.qkv_proj.weight[start:end]
+
+        if self.qkv_proj.bias is None:
+            bias = None
+        else:
+            bias = self.qkv_proj.bias[start:end]
+
+        return linear(x, weight, bias)
+
     def extra_repr(self) -> str:
         """:meta private:"""
         s = super().extra_repr()
@@ -537,6 +724,9 @@ class StandardMultiheadAttention(MultiheadAttention):
         if self.num_key_value_heads != self.num_heads:
             s = f"{s}, num_key_value_heads={self.num_key_value_heads}"
 
+        if self.qkv_proj is not None:
+            s = f"{s}, fuse_qkv=True"
+
         if self.state_factory is not None:
             state_factory = getattr(self.state_factory, "__name__", self.state_factory)
 
@@ -555,6 +745,27 @@ def init_qkv_projection(proj: Linear) -> None:
         nn.init.zeros_(proj.bias)
 
 
+def init_fused_qkv_projection(proj: Linear, split_sizes: List[int]) -> None:
+    """Initialize ``proj`` as packed multi-head attention input projections.
+
+    :param split_sizes:
+        The output dimensionalities of the query, key, and value projections
+        packed in ``proj``. Each of them is initialized as by
+        :func:`init_qkv_projection`.
+    """
+    for weight in proj.weight.split(split_sizes):
+        nn.init.xavier_uniform_(weight, gain=2**-0.5)
+
+    if proj.bias is not None:
+        nn.init.zeros_(proj.bias)
+
+
+def _qkv_split_sizes(m: StandardMultiheadAttention) -> List[int]:
+    kv_dim = (m.model_dim // m.num_heads) * m.num_key_value_heads
+
+    return [m.model_dim, kv_dim, kv_dim]
+
+
 def init_output_projection(proj: Linear) -> None:
     """Initialize ``proj`` as a multi-head attention output projection."""
     nn.init.xavier_uniform_(proj.weight)
@@ -572,15 +783,17 @@ class AttentionState(IncrementalState):
         """Update the state with ``k`` and ``v``.
 
         :param k:
-            The projected keys of the current step. *Shape:*
-            :math:`(N,H,1,K_{proj})`, where :math:`N` is the batch size,
-            :math:`H` is the number of heads, :math:`1` is the step length, and
-            :math:`K_{proj}` is the projected key size.
+            The projected keys of the current steps. *Shape:*
+            :math:`(N,H,S_{stp},K_{proj})`, where :math:`N` is the batch size,
+            :math:`H` is the number of heads, :math:`S_{stp}` is the step
+            length (typically 1), and :math:`K_{proj}` is the projected key
+            size.
         :param v:
-            The projected values of the current step. *Shape:*
-            :math:`(N,H,1,V_{proj})`, where :math:`N` is the batch size,
-            :math:`H` is the number of heads, :math:`1` is the step length, and
-            :math:`V_{proj}` is the projected value size.
+            The projected values of the current steps. *Shape:*
+            :math:`(N,H,S_{stp},V_{proj})`, where :math:`N` is the batch size,
+            :math:`H` is the number of heads, :math:`S_{stp}` is the step
+            length (typically 1), and :math:`V_{proj}` is the projected value
+            size.
         """
 
     @abstractmethod
@@ -613,7 +826,13 @@ class FullAttentionState(AttentionState):
     module during incremental decoding."""
 
     seq_len: int
-    """The current sequence length of :attr:`k` and :attr:`v`."""
+    """The current sequence length of :attr:`k` and :attr:`v`. If
+    :attr:`seq_lens` is set, an upper bound of the sequence lengths."""
+
+    seq_lens: Optional[Tensor]
+    """The current sequence length of each element in the batch if they differ
+    (see :meth:`extend`); otherwise, ``None``. *Shape:* :math:`(N)`, where
+    :math:`N` is the batch size."""
 
     k: Tensor
     """The projected keys accumulated from the past decoding steps. *Shape:*
@@ -638,14 +857,35 @@ class FullAttentionState(AttentionState):
 
         self.seq_len = seq_len
 
+        self.seq_lens = None
+
     @finaloverride
     def append(self, k: Tensor, v: Tensor) -> None:
-        pos = self.seq_len
+        step_len = k.size(2)
 
-        self.k[:, :, pos : pos + 1] = k
-        self.v[:, :, pos : pos + 1] = v
+        if self.seq_lens is None:
+            pos = self.seq_len
 
-        self.seq_len += 1
+            self.k[:, :, pos : pos + step_len] = k
+            self.v[:, :, pos : pos + step_len] = v
+
+            self.seq_len += step_len
+        else:
+            # Write the steps right after the last step of their own sequence.
+            # (N) -> (N, S_stp)
+            steps = self.seq_lens.unsqueeze(1) + torch.arange(step_len, device=k.device)
+
+            # (N, S_stp) -> (N, H, S_stp, K_proj)
+            k_indices = steps[:, None, :, None].expand_as(k)
+            # (N, S_stp) -> (N, H, S_stp, V_proj)
+            v_indices = steps[:, None, :, None].expand_as(v)
+
+            self.k.scatter_(2, k_indices, k)
+            self.v.scatter_(2, v_indices, v)
+
+            self.seq_lens = self.seq_lens + step_len
+
+            self.seq_len = min(self.seq_len + step_len, self.k.size(2))
 
     @finaloverride
     def get(self) -> Tuple[Tensor, Tensor]:
@@ -659,6 +899,56 @@ class FullAttentionState(AttentionState):
         self.k = self.k.index_select(0, new_order)
         self.v = self.v.index_select(0, new_order)
 
+        if self.seq_lens is not None:
+            self.seq_lens = self.seq_lens.index_select(0, new_order)
+
+    @finaloverride
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        # The discarded steps get overwritten by the next `append()` call.
+        if isinstance(num_steps, Tensor):
+            self.seq_lens = torch.minimum(self._prepare_extend(), num_steps)
+
+            # `seq_len` stays an upper bound; the discarded steps of shorter
+            # sequences are masked until they get overwritten.
+            return
+
+        self.seq_len = min(self.seq_len, num_steps)
+
+        if self.seq_lens is not None:
+            self.seq_lens = self.seq_lens.clamp(max=num_steps)
+
+    @finaloverride
+    def extend(self, other: IncrementalState) -> None:
+        if not isinstance(other, FullAttentionState):
+            raise ValueError(
+                f"`other` must be of type {FullAttentionState}, but is of type {type(other)} instead."
+            )
+
+        seq_lens = torch.cat([self._prepare_extend(), other._prepare_extend()])
+
+        self.k = _pad_and_cat(self.k, other.k)
+        self.v = _pad_and_cat(self.v, other.v)
+
+        self.seq_lens = seq_lens
+
+        self.seq_len = max(self.seq_len, other.seq_len)
+
+    def _prepare_extend(self) -> Tensor:
+        # Called before the sequences start to have different lengths, either
+        # by `extend()` or by `truncate()`.
+        if self.seq_lens is not None:
+            return self.seq_lens
+
+        # Once the sequences have different lengths, the positions past the end
+        # of a sequence get read (and masked) during attention. Make sure they
+        # do not contain any uninitialized NaNs.
+        self.k[:, :, self.seq_len :] = 0.0
+        self.v[:, :, self.seq_len :] = 0.0
+
+        return torch.full(
+            (self.k.size(0),), self.seq_len, device=self.k.device, dtype=torch.int64
+        )
+
 
 @final
 class LocalAttentionState(AttentionState):
@@ -667,10 +957,18 @@ class LocalAttentionState(AttentionState):
 
     The intended use of this class is with Sliding Window Attention as described
     in :cite:t:`https://doi.org/10.48550/arxiv.2004.05150`.
+
+    The keys and values are held in a circular buffer; each step overwrites the
+    oldest step in place. Once the window is full, :meth:`get` returns the steps
+    in buffer order rather than in chronological order. This is transparent to
+    the attention as long as the positional information is already encoded in
+    the keys (e.g. rotary encoding) and no position-dependent attention mask is
+    used, which is the case for single-step incremental decoding.
     """
 
     seq_len: int
-    """The current sequence length of :attr:`k` and :attr:`v`."""
+    """The number of steps appended to the state so far, including the ones that
+    are no longer in the window."""
 
     attn_window_len: int
     """The attention window length."""
@@ -680,14 +978,16 @@ class LocalAttentionState(AttentionState):
     decoding steps. *Shape:* :math:`(N,H,S_{wnd},K_{proj})`, where :math:`N` is
     the batch size, :math:`H` is the number of heads, :math:`S_{wnd}` is the
     attention window length (i.e. :attr:`attn_window_len`), and :math:`K_{proj}`
-    is the projected key size."""
+    is the projected key size. The step :math:`t` is stored at the position
+    ``t % attn_window_len``."""
 
     v: Tensor
     """The projected values accumulated from the past :attr:`attn_window_len`
     decoding steps. *Shape:* :math:`(N,H,S_{wnd},V_{proj})`, where :math:`N` is
     the batch size, :math:`H` is the number of heads, :math:`S_{wnd}` is the
     attention window length (i.e. :attr:`attn_window_len`), and :math:`V_{proj}`
-    is the projected value size."""
+    is the projected value size. The step :math:`t` is stored at the position
+    ``t % attn_window_len``."""
 
     def __init__(
         self, k: Tensor, v: Tensor, max_seq_len: int, attn_window_len: int
@@ -699,22 +999,28 @@ class LocalAttentionState(AttentionState):
         self.k = k.new_empty((batch_size, num_heads, self.attn_window_len, head_dim))
         self.v = v.new_empty((batch_size, num_heads, self.attn_window_len, head_dim))
 
-        pos = min(seq_len, self.attn_window_len)
+        if seq_len > self.attn_window_len:
+            # Keep the last `attn_window_len` steps, each at its position in the
+            # circular buffer.
+            shift = seq_len % self.attn_window_len
 
-        self.k[:, :, :pos] = k[:, :, -pos:]
-        self.v[:, :, :pos] = v[:, :, -pos:]
+            self.k[:, :, :] = torch.roll(k[:, :, -self.attn_window_len :], shift, 2)
+            self.v[:, :, :] = torch.roll(v[:, :, -self.attn_window_len :], shift, 2)
+        else:
+            self.k[:, :, :seq_len] = k
+            self.v[:, :, :seq_len] = v
 
         self.seq_len = seq_len
 
     @finaloverride
     def append(self, k: Tensor, v: Tensor) -> None:
-        if self.seq_len >= self.attn_window_len:
-            self.k = torch.roll(self.k, shifts=-1, dims=2)
-            self.v = torch.roll(self.v, shifts=-1, dims=2)
+        if k.size(2) != 1:
+            raise ValueError(
+                f"The step length of `k` must be 1 for `LocalAttentionState`, but is {k.size(2)} instead."
+            )
 
-            pos = self.attn_window_len - 1
-        else:
-            pos = self.seq_len
+        # Overwrite the oldest step.
+        pos = self.seq_len % self.attn_window_len
 
         self.k[:, :, pos : pos + 1] = k
         self.v[:, :, pos : pos + 1] = v
@@ -733,6 +1039,25 @@ class LocalAttentionState(AttentionState):
         self.k = self.k.index_select(0, new_order)
         self.v = self.v.index_select(0, new_order)
 
+    @finaloverride
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        if isinstance(num_steps, Tensor):
+            raise ValueError(
+                "`LocalAttentionState` can only be truncated to the same number of steps for all sequences."
+            )
+
+        if num_steps >= self.seq_len:
+            return
+
+        # Once the window is full, each step overwrites a step that we would
+        # need back after the truncation.
+        if self.seq_len > self.attn_window_len:
+            raise ValueError(
+                f"`LocalAttentionState` can only be truncated before its window is full, but its sequence length ({self.seq_len}) exceeds the attention window length ({self.attn_window_len})."
+            )
+
+        self.seq_len = num_steps
+
 
 class LocalAttentionStateFactory:
     """Constructs instances of :class:`LocalAttentionState`."""
@@ -751,6 +1076,553 @@ class LocalAttentionStateFactory:
         return f"LocalAttentionStateFactory(attn_window_len={self.attn_window_len})"
 
 
+class PagedAttentionBlockPool:
+    """Holds a pool of fixed-size key/value blocks shared by the
+    :class:`PagedAttentionState` instances of all layers and requests.
+
+    The block storage is allocated once, on first use, based on the shape of
+    the first projected keys and values. Blocks are reference counted so that
+    the same block can be shared by more than one sequence (e.g. beams with a
+    common prefix).
+
+    The reference counts are kept on the device of the storage so that block
+    tables can be remapped with tensor operations. The pool only synchronizes
+    with the device if an allocation might exceed its host-side lower bound of
+    free blocks.
+    """
+
+    num_blocks: int
+    block_size: int
+
+    _k: Optional[Tensor]
+    _v: Optional[Tensor]
+    _ref_counts: Optional[Tensor]
+    _min_num_free_blocks: int
+
+    def __init__(self, num_blocks: int, block_size: int = 16) -> None:
+        """
+        :param num_blocks:
+            The number of blocks in the pool.
+        :param block_size:
+            The number of steps held by each block.
+        """
+        if num_blocks <= 0:
+            raise ValueError(
+                f"`num_blocks` must be greater than 0, but is {num_blocks} instead."
+            )
+
+        if block_size <= 0:
+            raise ValueError(
+                f"`block_size` must be greater than 0, but is {block_size} instead."
+            )
+
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+
+        self._k = None
+        self._v = None
+
+        self._ref_counts = None
+
+        self._min_num_free_blocks = num_blocks
+
+    @property
+    def null_block(self) -> int:
+        """The index of the block used to pad block tables. It always holds
+        zeros and is never allocated."""
+        return self.num_blocks
+
+    @property
+    def num_free_blocks(self) -> int:
+        """The number of blocks that are not in use.
+
+        .. note::
+            Synchronizes with the device of the block storage.
+        """
+        if self._ref_counts is None:
+            return self.num_blocks
+
+        return int((self._ref_counts[: self.num_blocks] == 0).sum())
+
+    def storage(self, k: Tensor, v: Tensor) -> Tuple[Tensor, Tensor]:
+        """Return the key and value block storage.
+
+        :param k:
+            The projected keys to store in the pool. *Shape:*
+            :math:`(N,H,S,K_{proj})`, where :math:`N` is the batch size,
+            :math:`H` is the number of heads, :math:`S` is the sequence length,
+            and :math:`K_{proj}` is the projected key size.
+        :param v:
+            The projected values to store in the pool. *Shape:*
+            :math:`(N,H,S,V_{proj})`, where :math:`N` is the batch size,
+            :math:`H` is the number of heads, :math:`S` is the sequence length,
+            and :math:`V_{proj}` is the projected value size.
+
+        :returns:
+            - The key blocks. *Shape:* :math:`(B+1,H,S_{blk},K_{proj})`, where
+              :math:`B` is the number of blocks and :math:`S_{blk}` is the
+              block size. The last block is :attr:`null_block`.
+            - The value blocks. *Shape:* :math:`(B+1,H,S_{blk},V_{proj})`, where
+              :math:`B` is the number of blocks and :math:`S_{blk}` is the
+              block size. The last block is :attr:`null_block`.
+        """
+        num_heads, k_size, v_size = k.size(1), k.size(-1), v.size(-1)
+
+        if self._k is None or self._v is None:
+            num_blocks, block_size = self.num_blocks + 1, self.block_size
+
+            # Unused steps of a block get read (and masked) during attention, so
+            # they must not contain any uninitialized NaNs.
+            self._k = k.new_zeros((num_blocks, num_heads, block_size, k_size))
+            self._v = v.new_zeros((num_blocks, num_heads, block_size, v_size))
+
+            self._ref_counts = torch.zeros(
+                (num_blocks,), device=k.device, dtype=torch.int64
+            )
+        else:
+            expected_sizes = (self._k.size(1), self._k.size(-1), self._v.size(-1))
+
+            if (num_heads, k_size, v_size) != expected_sizes:
+                raise ValueError(
+                    f"The number of heads and the projected key and value sizes must match the ones of the block storage {expected_sizes}, but are {(num_heads, k_size, v_size)} instead."
+                )
+
+        return self._k, self._v
+
+    def allocate(self, mask: Tensor, max_num_blocks: int) -> Tensor:
+        """Allocate a block with a reference count of 1 for each ``True`` entry
+        of ``mask``.
+
+        :param mask:
+            The boolean mask of the entries to allocate a block for. *Shape:*
+            Any.
+        :param max_num_blocks:
+            An upper bound of the number of ``True`` entries in ``mask``. The
+            pool synchronizes with the device only if it cannot guarantee that
+            it has that many free blocks.
+
+        :returns:
+            The allocated blocks. :attr:`null_block` for the ``False`` entries
+            of ``mask``. *Shape:* Same as ``mask``.
+        """
+        ref_counts = self._get_ref_counts()
+
+        # (B)
+        is_free = ref_counts[: self.num_blocks] == 0
+
+        if max_num_blocks > self._min_num_free_blocks:
+            num_free_blocks = int(is_free.sum())
+
+            num_blocks = int(mask.sum())
+
+            if num_blocks > num_free_blocks:
+                raise RuntimeError(
+                    f"The block pool does not have enough free blocks ({num_free_blocks}) to allocate {num_blocks} blocks. Increase `num_blocks` or decrease the batch size."
+                )
+
+            self._min_num_free_blocks = num_free_blocks - num_blocks
+        else:
+            self._min_num_free_blocks -= max_num_blocks
+
+        # Hand out the free blocks in ascending order; the i-th allocated entry
+        # of `mask` gets the i-th free block.
+        # (*) -> (*)
+        ranks = mask.flatten().cumsum(0)
+
+        # (B)
+        free_ranks = is_free.cumsum(0)
+
+        blocks = torch.searchsorted(free_ranks, ranks).view(mask.shape)
+
+        blocks = torch.where(mask, blocks, self.null_block)
+
+        ref_counts[blocks] = 1
+
+        ref_counts[self.null_block] = 0
+
+        return blocks
+
+    def retain(self, blocks: Tensor) -> None:
+        """Increment the reference count of ``blocks``. Entries that are
+        :attr:`null_block` are ignored."""
+        self._update_ref_counts(blocks, 1)
+
+    def release(self, blocks: Tensor) -> None:
+        """Decrement the reference count of ``blocks``. Entries that are
+        :attr:`null_block` are ignored. Blocks that are no longer in use return
+        to the pool."""
+        self._update_ref_counts(blocks, -1)
+
+    def is_shared(self, blocks: Tensor) -> Tensor:
+        """Return a boolean tensor that is ``True`` for the entries of
+        ``blocks`` that are referenced more than once."""
+        # The reference count of the null block is always 0.
+        is_shared = self._get_ref_counts()[blocks] > 1
+
+        return is_shared
+
+    def _update_ref_counts(self, blocks: Tensor, value: int) -> None:
+        ref_counts = self._get_ref_counts()
+
+        blocks = blocks.flatten()
+
+        ref_counts.index_add_(0, blocks, torch.full_like(blocks, value))
+
+        ref_counts[self.null_block] = 0
+
+    def _get_ref_counts(self) -> Tensor:
+        if self._ref_counts is None:
+            raise RuntimeError(
+                "The block storage is not allocated yet. Call `storage()` first."
+            )
+
+        return self._ref_counts
+
+
+@final
+class PagedAttentionState(AttentionState):
+    """Holds the past projected keys and values of a :class:`MultiheadAttention`
+    module during incremental decoding in fixed-size blocks allocated from a
+    :class:`PagedAttentionBlockPool`.
+
+    Unlike :class:`FullAttentionState`, the memory held by each sequence grows
+    with its actual length instead of the maximum sequence length, and
+    :meth:`reorder` remaps the block table of each sequence instead of copying
+    the keys and values. Blocks shared by more than one sequence are copied on
+    write.
+
+    The block tables and sequence lengths are kept on the device, so neither
+    :meth:`append` nor :meth:`reorder` synchronizes with the host.
+    """
+
+    pool: PagedAttentionBlockPool
+    """The pool from which the blocks are allocated."""
+
+    seq_len: int
+    """An upper bound of the sequence lengths of the batch."""
+
+    _k_blocks: Tensor
+    _v_blocks: Tensor
+    _block_table: Tensor
+    _seq_lens: Tensor
+    _min_seq_len: int
+    _may_share_last_blocks: bool
+
+    def __init__(
+        self, k: Tensor, v: Tensor, max_seq_len: int, pool: PagedAttentionBlockPool
+    ) -> None:
+        batch_size, _, seq_len, _ = k.shape
+
+        self.pool = pool
+
+        block_size = pool.block_size
+
+        num_blocks = -(-seq_len // block_size)
+
+        max_num_blocks = -(-max_seq_len // block_size)
+
+        device = k.device
+
+        # (N, B_max)
+        self._block_table = torch.full(
+            (batch_size, max_num_blocks), pool.null_block, device=device
+        )
+
+        self._k_blocks, self._v_blocks = pool.storage(k, v)
+
+        # (N, B)
+        mask = torch.ones((batch_size, num_blocks), device=device, dtype=torch.bool)
+
+        blocks = pool.allocate(mask, max_num_blocks=batch_size * num_blocks)
+
+        self._block_table[:, :num_blocks] = blocks
+
+        self._seq_lens = torch.full((batch_size,), seq_len, device=device)
+
+        self.seq_len = seq_len
+
+        self._min_seq_len = seq_len
+
+        self._may_share_last_blocks = False
+
+        if num_blocks > 0:
+            # (N, B) -> (N x B)
+            blocks = blocks.flatten()
+
+            # (N, H, S, K_proj) -> (N x B, H, S_blk, K_proj)
+            self._k_blocks[blocks] = self._to_blocks(k, num_blocks)
+            # (N, H, S, V_proj) -> (N x B, H, S_blk, V_proj)
+            self._v_blocks[blocks] = self._to_blocks(v, num_blocks)
+
+    def _to_blocks(self, x: Tensor, num_blocks: int) -> Tensor:
+        block_size = self.pool.block_size
+
+        # (N, H, S, K) -> (N, H, B x S_blk, K)
+        x = pad(x, (0, 0, 0, num_blocks * block_size - x.size(2)))
+
+        # (N, H, B x S_blk, K) -> (N, H, B, S_blk, K)
+        x = x.unflatten(2, (num_blocks, block_size))
+
+        # (N, H, B, S_blk, K) -> (N x B, H, S_blk, K)
+        return x.transpose(1, 2).flatten(0, 1)
+
+    @finaloverride
+    def append(self, k: Tensor, v: Tensor) -> None:
+        block_size = self.pool.block_size
+
+        step_len = k.size(2)
+
+        # The block table columns of the last block of each sequence and of the
+        # blocks to be allocated lie between the ones of the shortest and of the
+        # longest sequence.
+        start_col = self._min_seq_len // block_size
+
+        end_col = min(
+            -(-(self.seq_len + step_len) // block_size), self._block_table.size(1)
+        )
+
+        # (N, B_win)
+        block_table = self._block_table[:, start_col:end_col]
+
+        if self._may_share_last_blocks:
+            self._copy_shared_last_blocks(block_table, start_col)
+
+            self._may_share_last_blocks = False
+
+        self._allocate_blocks(block_table, start_col, step_len)
+
+        # Write the steps right after the last step of their own sequence.
+        # (N) -> (N, S_stp)
+        steps = self._seq_lens[:, None] + torch.arange(step_len, device=k.device)
+
+        # (N, S_stp)
+        blocks = block_table.gather(1, steps // block_size - start_col)
+
+        offsets = steps % block_size
+
+        # (N, H, S_stp, K_proj) -> (N, S_stp, H, K_proj)
+        self._k_blocks[blocks, :, offsets] = k.transpose(1, 2)
+        # (N, H, S_stp, V_proj) -> (N, S_stp, H, V_proj)
+        self._v_blocks[blocks, :, offsets] = v.transpose(1, 2)
+
+        self._seq_lens = self._seq_lens + step_len
+
+        self.seq_len += step_len
+
+        self._min_seq_len += step_len
+
+    def _copy_shared_last_blocks(self, block_table: Tensor, start_col: int) -> None:
+        pool = self.pool
+
+        # (N)
+        last_cols = self._seq_lens // pool.block_size - start_col
+
+        # The last column of a sequence whose last block is full is not part of
+        # the window; such sequences never get copied.
+        # (N) -> (N, 1)
+        last_cols = last_cols.clamp(max=block_table.size(1) - 1).unsqueeze(1)
+
+        # (N, 1)
+        last_blocks = block_table.gather(1, last_cols)
+
+        # (N, 1)
+        cow_mask = pool.is_shared(last_blocks)
+
+        cow_mask &= (self._seq_lens % pool.block_size != 0).unsqueeze(1)
+
+        # (N, 1)
+        cow_blocks = pool.allocate(cow_mask, max_num_blocks=cow_mask.size(0))
+
+        # Sequences that are not copied copy the null block onto itself.
+        # (N, 1)
+        src_blocks = torch.where(cow_mask, last_blocks, pool.null_block)
+
+        # (N)
+        src_blocks, dst_blocks = src_blocks.squeeze(1), cow_blocks.squeeze(1)
+
+        self._k_blocks[dst_blocks] = self._k_blocks[src_blocks]
+        self._v_blocks[dst_blocks] = self._v_blocks[src_blocks]
+
+        # Since the source blocks are shared, releasing our references cannot
+        # return them to the pool.
+        pool.release(src_blocks)
+
+        block_table.scatter_(
+            1, last_cols, torch.where(cow_mask, cow_blocks, last_blocks)
+        )
+
+    def _allocate_blocks(
+        self, block_table: Tensor, start_col: int, step_len: int
+    ) -> None:
+        pool = self.pool
+
+        block_size = pool.block_size
+
+        batch_size, num_cols = block_table.shape
+
+        if self._min_seq_len == self.seq_len:
+            # All sequences have the same length; we know exactly how many
+            # blocks each of them needs.
+            num_blocks = -(-(self.seq_len + step_len) // block_size)
+
+            num_blocks -= -(-self.seq_len // block_size)
+
+            if num_blocks == 0:
+                return
+        else:
+            num_blocks = -(-step_len // block_size)
+
+        # (B_win)
+        cols = torch.arange(start_col, start_col + num_cols, device=block_table.device)
+
+        # (N)
+        end_cols = -(-(self._seq_lens + step_len) // block_size)
+
+        # (N, B_win)
+        mask = (block_table == pool.null_block) & (cols < end_cols.unsqueeze(1))
+
+        blocks = pool.allocate(mask, max_num_blocks=batch_size * num_blocks)
+
+        block_table.copy_(torch.where(mask, blocks, block_table))
+
+    @finaloverride
+    def get(self) -> Tuple[Tensor, Tensor]:
+        num_blocks = -(-self.seq_len // self.pool.block_size)
+
+        # (N, B)
+        block_table = self._block_table[:, :num_blocks]
+
+        # Gather the blocks of each sequence into a contiguous tensor that can
+        # be consumed by the attention function. Positions past the end of a
+        # sequence are expected to be masked by the caller.
+        # (N, B) -> (N, B, H, S_blk, K_proj)
+        k = self._k_blocks[block_table]
+        # (N, B) -> (N, B, H, S_blk, V_proj)
+        v = self._v_blocks[block_table]
+
+        # (N, B, H, S_blk, K_proj) -> (N, H, S, K_proj)
+        k = k.transpose(1, 2).flatten(2, 3)[:, :, : self.seq_len]
+        # (N, B, H, S_blk, V_proj) -> (N, H, S, V_proj)
+        v = v.transpose(1, 2).flatten(2, 3)[:, :, : self.seq_len]
+
+        return k, v
+
+    @finaloverride
+    def reorder(self, new_order: Tensor) -> None:
+        num_blocks = -(-self.seq_len // self.pool.block_size)
+
+        block_table = self._block_table.index_select(0, new_order)
+
+        # Retain before release so that the blocks kept by the new order never
+        # return to the pool.
+        self.pool.retain(block_table[:, :num_blocks])
+
+        self.pool.release(self._block_table[:, :num_blocks])
+
+        self._block_table = block_table
+
+        self._seq_lens = self._seq_lens.index_select(0, new_order)
+
+        self._may_share_last_blocks = True
+
+    @finaloverride
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        pool = self.pool
+
+        if isinstance(num_steps, Tensor):
+            seq_lens = torch.minimum(self._seq_lens, num_steps)
+
+            # `seq_len` stays an upper bound; the discarded steps of shorter
+            # sequences are masked until they get overwritten.
+            self._min_seq_len = 0
+        else:
+            seq_lens = self._seq_lens.clamp(max=num_steps)
+
+            self.seq_len = min(self.seq_len, num_steps)
+
+            self._min_seq_len = min(self._min_seq_len, num_steps)
+
+        num_blocks = self._block_table.size(1)
+
+        cols = torch.arange(num_blocks, device=seq_lens.device)
+
+        # A partially truncated last block is kept; if it is shared, it is
+        # copied on the next write.
+        # (N, B_max)
+        mask = cols >= -(-seq_lens // pool.block_size)[:, None]
+
+        pool.release(torch.where(mask, self._block_table, pool.null_block))
+
+        self._block_table = self._block_table.masked_fill(mask, pool.null_block)
+
+        self._seq_lens = seq_lens
+
+        # The new last block of a sequence might be part of a shared prefix.
+        self._may_share_last_blocks = True
+
+    @finaloverride
+    def extend(self, other: IncrementalState) -> None:
+        if not isinstance(other, PagedAttentionState):
+            raise ValueError(
+                f"`other` must be of type {PagedAttentionState}, but is of type {type(other)} instead."
+            )
+
+        if other.pool is not self.pool:
+            raise ValueError("`other` must allocate its blocks from the same pool.")
+
+        null_block = self.pool.null_block
+
+        num_blocks = max(self._block_table.size(1), other._block_table.size(1))
+
+        def pad_block_table(block_table: Tensor) -> Tensor:
+            return pad(
+                block_table, (0, num_blocks - block_table.size(1)), value=null_block
+            )
+
+        # Take over the block references of `other`.
+        self._block_table = torch.cat(
+            [pad_block_table(self._block_table), pad_block_table(other._block_table)]
+        )
+
+        self._seq_lens = torch.cat([self._seq_lens, other._seq_lens])
+
+        self.seq_len = max(self.seq_len, other.seq_len)
+
+        self._min_seq_len = min(self._min_seq_len, other._min_seq_len)
+
+        self._may_share_last_blocks |= other._may_share_last_blocks
+
+        other._block_table = other._block_table[:0]
+
+        other._seq_lens = other._seq_lens[:0]
+
+        other.seq_len = 0
+
+    def __del__(self) -> None:
+        # Return the blocks to the pool once the state is discarded.
+        self.pool.release(self._block_table)
+
+        self._block_table = self._block_table[:0]
+
+
+class PagedAttentionStateFactory:
+    """Constructs instances of :class:`PagedAttentionState`."""
+
+    def __init__(self, pool: PagedAttentionBlockPool) -> None:
+        """
+        :param pool:
+            The pool from which to allocate the blocks. It is typically shared
+            by all attention layers of a model.
+        """
+        self.pool = pool
+
+    def __call__(self, k: Tensor, v: Tensor, max_seq_len: int) -> PagedAttentionState:
+        return PagedAttentionState(k, v, max_seq_len, self.pool)
+
+    def __repr__(self) -> str:
+        return f"PagedAttentionStateFactory(num_blocks={self.pool.num_blocks}, block_size={self.pool.block_size})"
+
+
 @final
 class StaticAttentionState(AttentionState):
     """Holds the static projected keys and values (e.g. encoder-decoder) of a
@@ -775,3 +1647,98 @@ class StaticAttentionState(AttentionState):
     def reorder(self, new_order: Tensor) -> None:
         self.k = self.k.index_select(0, new_order)
         self.v = self.v.index_select(0, new_order)
+
+    @finaloverride
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        # The keys and values do not depend on the decoding steps.
+        pass
+
+    @finaloverride
+    def extend(self, other: IncrementalState) -> None:
+        if not isinstance(other, StaticAttentionState):
+            raise ValueError(
+                f"`other` must be of type {StaticAttentionState}, but is of type {type(other)} instead."
+            )
+
+        # The padded positions are expected to be masked by the caller via the
+        # key padding mask (e.g. the encoder padding mask).
+        self.k = _pad_and_cat(self.k, other.k)
+        self.v = _pad_and_cat(self.v, other.v)
+
+
+@final
+class BeamSharedStaticAttentionState(AttentionState):
+    """Holds the static projected keys and values (e.g. encoder-decoder) of a
+    :class:`MultiheadAttention` module during incremental decoding, shared by
+    the beams of each search.
+
+    The keys and values are stored once per search instead of once per beam.
+    :meth:`reorder` expects the beams of each search to stay consecutive and
+    within their search, as done by beam search, and reorders only the
+    searches.
+    """
+
+    k: Tensor
+    """The projected keys. *Shape:* :math:`(N,H,S_{kv},K_{proj})`, where
+    :math:`N` is the number of searches."""
+
+    v: Tensor
+    """The projected values. *Shape:* :math:`(N,H,S_{kv},V_{proj})`, where
+    :math:`N` is the number of searches."""
+
+    beam_size: int
+    """The number of beams sharing each search's keys and values."""
+
+    def __init__(self, k: Tensor, v: Tensor, beam_size: int) -> None:
+        self.k = k
+        self.v = v
+
+        self.beam_size = beam_size
+
+    @finaloverride
+    def append(self, k: Tensor, v: Tensor) -> None:
+        raise ValueError(
+            "`append()` on `BeamSharedStaticAttentionState` is not supported."
+        )
+
+    @finaloverride
+    def get(self) -> Tuple[Tensor, Tensor]:
+        return self.k, self.v
+
+    @finaloverride
+    def reorder(self, new_order: Tensor) -> None:
+        # (N x B) -> (N)
+        search_order = new_order.view(-1, self.beam_size)[:, 0] // self.beam_size
+
+        self.k = self.k.index_select(0, search_order)
+        self.v = self.v.index_select(0, search_order)
+
+    @finaloverride
+    def truncate(self, num_steps: Union[int, Tensor]) -> None:
+        # The keys and values do not depend on the decoding steps.
+        pass
+
+    @finaloverride
+    def extend(self, other: IncrementalState) -> None:
+        if not isinstance(other, BeamSharedStaticAttentionState):
+            raise ValueError(
+                f"`other` must be of type {BeamSharedStaticAttentionState}, but is of type {type(other)} instead."
+            )
+
+        if other.beam_size != self.beam_size:
+            raise ValueError(
+                f"`beam_size` of `other` must be {self.beam_size}, but is {other.beam_size} instead."
+            )
+
+        self.k = _pad_and_cat(self.k, other.k)
+        self.v = _pad_and_cat(self.v, other.v)
+
+
+def _pad_and_cat(a: Tensor, b: Tensor) -> Tensor:
+    seq_len = max(a.size(2), b.size(2))
+
+    # (N, H, S, K) -> (N, H, S_max, K)
+    a = pad(a, (0, 0, 0, seq_len - a.size(2)))
+    b = pad(b, (0, 0, 0, seq_len - b.size(2)))
+
+    return torch.cat([a, b])
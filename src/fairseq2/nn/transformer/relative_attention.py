@@ -13,6 +13,7 @@ from torch import Tensor
 from torch.nn import Module, Parameter
 from torch.nn.functional import dropout, pad, softmax
 
+from fairseq2.nn.ops import repeat_interleave
 from fairseq2.nn.padding import PaddingMask
 from fairseq2.nn.projection import Linear
 from fairseq2.nn.transformer.attention import SDPA
@@ -100,6 +101,13 @@ class RelativePositionSDPA(SDPA):
         attn_mask: Optional[AttentionMask] = None,
         needs_weights: bool = False,
     ) -> Tuple[Tensor, Optional[Tensor]]:
+        # With Grouped Query Attention, each key/value head is repeated.
+        if (num_query_groups := seqs.size(1) // keys.size(1)) > 1:
+            # (N, H_kv, S_kv, K_h) -> (N, H, S_kv, K_h)
+            keys = repeat_interleave(keys, dim=1, repeat=num_query_groups)
+            # (N, H_kv, S_kv, V_h) -> (N, H, S_kv, V_h)
+            values = repeat_interleave(values, dim=1, repeat=num_query_groups)
+
         q = seqs
         k = keys
 
@@ -12,6 +12,7 @@ from torch import Tensor
 from torch.nn.functional import dropout, softmax
 
 from fairseq2.nn.embedding import StandardEmbedding
+from fairseq2.nn.ops import repeat_interleave
 from fairseq2.nn.padding import PaddingMask
 from fairseq2.nn.transformer.attention import SDPA
 from fairseq2.nn.transformer.attention_mask import AttentionMask
@@ -102,6 +103,13 @@ class ShawRelativePositionSDPA(SDPA):
         attn_mask: Optional[AttentionMask] = None,
         needs_weights: bool = False,
     ) -> Tuple[Tensor, Optional[Tensor]]:
+        # With Grouped Query Attention, each key/value head is repeated.
+        if (num_query_groups := seqs.size(1) // keys.size(1)) > 1:
+            # (N, H_kv, S_kv, K_h) -> (N, H, S_kv, K_h)
+            keys = repeat_interleave(keys, dim=1, repeat=num_query_groups)
+            # (N, H_kv, S_kv, V_h) -> (N, H, S_kv, V_h)
+            values = repeat_interleave(values, dim=1, repeat=num_query_groups)
+
         q_len = seqs.size(2)
 
         # (N, H, S, K_h) @ (N, H, K_h, S_kv) = (N, H, S, S_kv)
@@ -24,3 +24,8 @@ TORCH_VERSION: Final[Version] = _get_torch_version()
 def is_pt2_or_greater() -> bool:
     """Return ``True`` if the version of PyTorch is 2.0 or greater."""
     return TORCH_VERSION.major >= 2
+
+
+def is_pt22_or_greater() -> bool:
+    """Return ``True`` if the version of PyTorch is 2.2 or greater."""
+    return TORCH_VERSION >= Version("2.2")
@@ -0,0 +1,129 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+import torch
+
+from fairseq2.data import read_sequence
+from tests.common import assert_equal
+
+
+class TestCacheOp:
+    @pytest.mark.parametrize("num_parallel_calls", [1, 3])
+    def test_op_works(self, num_parallel_calls: int) -> None:
+        keys: List[str] = []
+
+        def fn(d: Dict[str, Any]) -> Dict[str, Any]:
+            keys.append(d["id"])
+
+            return {"id": d["id"], "t": torch.full((2,), d["n"])}
+
+        seq = [{"id": f"k{i % 3}", "n": i % 3} for i in range(6)]
+
+        pipeline = (
+            read_sequence(seq)
+            .map(fn, num_parallel_calls=num_parallel_calls)
+            .cache("id", capacity_bytes=2**20)
+            .and_return()
+        )
+
+        for _ in range(3):
+            for i, d in enumerate(pipeline):
+                assert d["id"] == f"k{i % 3}"
+
+                assert_equal(d["t"], [i % 3, i % 3])
+
+            pipeline.reset()
+
+        assert sorted(keys) == ["k0", "k1", "k2"]
+
+    def test_op_works_when_capacity_is_exceeded(self) -> None:
+        num_calls = 0
+
+        def fn(d: Dict[str, Any]) -> torch.Tensor:
+            nonlocal num_calls
+
+            num_calls += 1
+
+            return torch.zeros((1024,), dtype=torch.int8)
+
+        seq = [{"id": i} for i in range(4)]
+
+        pipeline = (
+            read_sequence(seq).map(fn).cache("id", capacity_bytes=2048).and_return()
+        )
+
+        for _ in range(2):
+            assert len(list(pipeline)) == 4
+
+            pipeline.reset()
+
+        # Scanning four examples through a cache that fits one never hits.
+        assert num_calls == 8
+
+    def test_op_works_when_spill_dir_is_specified(self, tmp_path: Path) -> None:
+        num_calls = 0
+
+        def fn(d: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal num_calls
+
+            num_calls += 1
+
+            n = d["id"]
+
+            return {"t": torch.full((256,), n), "s": str(n), "l": [n, 1.5, True]}
+
+        seq = [{"id": i} for i in range(8)]
+
+        pipeline = (
+            read_sequence(seq)
+            .map(fn)
+            .cache("id", capacity_bytes=4096, spill_dir=tmp_path)
+            .and_return()
+        )
+
+        for _ in range(2):
+            for i, d in enumerate(pipeline):
+                assert_equal(d["t"], torch.full((256,), i))
+
+                assert d["s"] == str(i)
+
+                assert d["l"] == [i, 1.5, True]
+
+            pipeline.reset()
+
+        assert num_calls == 8
+
+    def test_op_raises_error_when_key_is_not_str_or_int(self) -> None:
+        pipeline = (
+            read_sequence([{"id": 1.5}])
+            .map(lambda d: d)
+            .cache("id", capacity_bytes=1024)
+            .and_return()
+        )
+
+        with pytest.raises(
+            RuntimeError,
+            match=r"^The cache key of the input data cannot be determined\.$",
+        ):
+            next(iter(pipeline))
+
+    def test_op_raises_error_when_it_does_not_follow_map(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`cache` must directly follow a `map` operation\.$",
+        ):
+            read_sequence([1, 2, 3]).map(lambda x: x).prefetch(2).cache("id", 1024)
+
+    def test_op_raises_error_when_capacity_bytes_is_zero(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`capacity_bytes` must be greater than zero\.$",
+        ):
+            read_sequence([1, 2, 3]).map(lambda x: x).cache("id", 0)
@@ -0,0 +1,126 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+
+from fairseq2.data import read_sequence
+from tests.common import assert_equal
+
+
+class TestDynamicBucketOp:
+    def test_op_works(self) -> None:
+        seq = [torch.ones(n) for n in [5, 1, 9, 3, 3, 7, 2, 8, 4, 6, 1, 2]]
+
+        pipeline = (
+            read_sequence(seq).dynamic_bucket(16, sort_pool_size=100).and_return()
+        )
+
+        for _ in range(2):
+            lens = [[len(t) for t in b] for b in pipeline]
+
+            assert lens == [[1, 1, 2, 2, 3], [3, 4, 5], [6, 7], [8], [9]]
+
+            pipeline.reset()
+
+    def test_op_works_when_max_num_examples_is_specified(self) -> None:
+        seq = [torch.ones(n) for n in [5, 1, 9, 3, 3, 7, 2, 8, 4, 6, 1, 2]]
+
+        pipeline = (
+            read_sequence(seq)
+            .dynamic_bucket(16, max_num_examples=2, sort_pool_size=100)
+            .and_return()
+        )
+
+        lens = [[len(t) for t in b] for b in pipeline]
+
+        assert lens == [[1, 1], [2, 2], [3, 3], [4, 5], [6, 7], [8], [9]]
+
+    @pytest.mark.parametrize("drop", [False, True])
+    def test_op_works_when_final_bucket_is_partial(self, drop: bool) -> None:
+        seq = [torch.ones(n) for n in [5, 1, 9, 3, 3, 7, 2, 8, 4, 6, 1, 2]]
+
+        pipeline = (
+            read_sequence(seq)
+            .dynamic_bucket(16, sort_pool_size=4, drop_remainder=drop)
+            .and_return()
+        )
+
+        lens = [[len(t) for t in b] for b in pipeline]
+
+        expected_lens = [[1, 3, 5], [2, 3], [7, 8], [1, 2, 4], [6]]
+
+        if not drop:
+            expected_lens.append([9])
+
+        assert lens == expected_lens
+
+    def test_op_works_when_selector_is_specified(self) -> None:
+        seq = [{"a": torch.ones(n), "b": n} for n in [3, 1, 2]]
+
+        pipeline = (
+            read_sequence(seq)
+            .dynamic_bucket(4, sort_pool_size=3, selector="a")
+            .and_return()
+        )
+
+        output = [[e["b"] for e in b] for b in pipeline]
+
+        assert output == [[1, 2], [3]]
+
+    def test_op_raises_error_when_example_is_longer_than_max_num_tokens(
+        self,
+    ) -> None:
+        seq = [torch.ones(n) for n in [3, 20, 4]]
+
+        pipeline = read_sequence(seq).dynamic_bucket(16).and_return()
+
+        with pytest.raises(
+            RuntimeError,
+            match=r"^The length of the input data must be less than or equal to the maximum number of tokens \(16\), but is 20 instead\.$",
+        ):
+            next(iter(pipeline))
+
+    def test_op_raises_error_when_max_num_tokens_is_zero(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`max_num_tokens` must be greater than zero\.$",
+        ):
+            read_sequence([1, 2, 3]).dynamic_bucket(0)
+
+    def test_op_saves_and_restores_its_state(self) -> None:
+        seq = [torch.ones(n) for n in [5, 1, 9, 3, 3, 7, 2, 8, 4, 6, 1, 2]]
+
+        pipeline = read_sequence(seq).dynamic_bucket(12, sort_pool_size=5).and_return()
+
+        d = None
+
+        it = iter(pipeline)
+
+        # Move to the second example.
+        for _ in range(2):
+            d = next(it)
+
+        assert [len(t) for t in d] == [5]  # type: ignore[union-attr]
+
+        state_dict = pipeline.state_dict()
+
+        # Read a few more examples before we roll back.
+        for _ in range(3):
+            d = next(it)
+
+        pipeline.load_state_dict(state_dict)
+
+        # Expected to read the remaining batches.
+        lens = [[len(t) for t in b] for b in pipeline]
+
+        assert lens == [[2, 4], [6], [7], [8], [1, 2], [9]]
+
+        pipeline.reset()
+
+        b = next(iter(pipeline))
+
+        assert_equal(b[0], torch.ones(1))
@@ -14,6 +14,10 @@ from fairseq2.data import DataPipelineError, read_sequence
 from fairseq2.data.text.converters import StrToIntConverter
 
 
+def square(d: int) -> int:
+    return d**2
+
+
 class TestMapOp:
     @pytest.mark.parametrize("num_parallel_calls", [0, 1, 4, 10, 20])
     def test_op_works(self, num_parallel_calls: int) -> None:
@@ -310,3 +314,205 @@ class TestMapOp:
 
         with pytest.raises(StopIteration):
             next(iter(pipeline))
+
+    @pytest.mark.parametrize("num_parallel_calls", [0, 1, 4, 10, 20])
+    def test_op_works_when_streaming(self, num_parallel_calls: int) -> None:
+        def fn(d: int) -> int:
+            return d**2
+
+        seq = list(range(1, 10))
+
+        pipeline = (
+            read_sequence(seq)
+            .map(fn, num_parallel_calls=num_parallel_calls, streaming=True)
+            .and_return()
+        )
+
+        for _ in range(2):
+            assert list(pipeline) == [i**2 for i in seq]
+
+            pipeline.reset()
+
+    @pytest.mark.parametrize("num_parallel_calls", [1, 4, 20])
+    def test_op_works_when_order_is_not_preserved(
+        self, num_parallel_calls: int
+    ) -> None:
+        def fn(d: int) -> int:
+            return d**2
+
+        seq = list(range(1, 10))
+
+        pipeline = (
+            read_sequence(seq)
+            .map(
+                fn,
+                num_parallel_calls=num_parallel_calls,
+                streaming=True,
+                preserve_order=False,
+            )
+            .and_return()
+        )
+
+        for _ in range(2):
+            assert sorted(pipeline) == [i**2 for i in seq]
+
+            pipeline.reset()
+
+    def test_op_raises_error_when_order_is_not_preserved_without_streaming(
+        self,
+    ) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`preserve_order` can only be `false` when `streaming` is `true`\.$",
+        ):
+            read_sequence([]).map(lambda x: x, preserve_order=False)
+
+    @pytest.mark.parametrize("num_parallel_calls", [0, 1, 4, 20])
+    def test_op_raises_nested_error_when_callable_fails_and_streaming(
+        self, num_parallel_calls: int
+    ) -> None:
+        def fn(d: int) -> int:
+            if d == 3:
+                raise ValueError("map error")
+
+            return d
+
+        pipeline = (
+            read_sequence([1, 2, 3, 4])
+            .map(fn, num_parallel_calls=num_parallel_calls, streaming=True)
+            .and_return()
+        )
+
+        with pytest.raises(DataPipelineError) as exc_info:
+            for d in pipeline:
+                pass
+
+        cause = exc_info.value.__cause__
+
+        assert isinstance(cause, ValueError)
+
+        assert str(cause) == "map error"
+
+    @pytest.mark.parametrize("num_parallel_calls", [0, 1, 4, 20])
+    def test_op_saves_and_restores_its_state_when_streaming(
+        self, num_parallel_calls: int
+    ) -> None:
+        def fn(d: int) -> int:
+            return d
+
+        seq = list(range(1, 10))
+
+        pipeline = (
+            read_sequence(seq)
+            .map(fn, num_parallel_calls=num_parallel_calls, streaming=True)
+            .and_return()
+        )
+
+        d = None
+
+        it = iter(pipeline)
+
+        # Move the the second example.
+        for _ in range(2):
+            d = next(it)
+
+        assert d == 2
+
+        state_dict = pipeline.state_dict()
+
+        # Read a few examples before we roll back.
+        for _ in range(4):
+            d = next(it)
+
+        assert d == 6
+
+        # Expected to roll back to the second example.
+        pipeline.load_state_dict(state_dict)
+
+        # Move to EOD.
+        for _ in range(7):
+            d = next(it)
+
+        assert d == 9
+
+        state_dict = pipeline.state_dict()
+
+        pipeline.reset()
+
+        # Expected to be EOD.
+        pipeline.load_state_dict(state_dict)
+
+        with pytest.raises(StopIteration):
+            next(iter(pipeline))
+
+    @pytest.mark.parametrize("num_parallel_calls", [4, 20])
+    def test_op_raises_error_when_state_has_failed_call_and_streaming(
+        self, num_parallel_calls: int
+    ) -> None:
+        def fn(d: int) -> int:
+            if d == 3:
+                raise ValueError("map error")
+
+            return d
+
+        pipeline = (
+            read_sequence([1, 2, 3, 4])
+            .map(fn, num_parallel_calls=num_parallel_calls, streaming=True)
+            .and_return()
+        )
+
+        it = iter(pipeline)
+
+        assert next(it) == 1
+
+        # The failed call of the third example is still in flight; it must not
+        # be recorded as a skipped example.
+        with pytest.raises(DataPipelineError) as exc_info:
+            pipeline.state_dict()
+
+        cause = exc_info.value.__cause__
+
+        assert isinstance(cause, ValueError)
+
+        assert str(cause) == "map error"
+
+        # The error is recoverable, so the pipeline must still be usable.
+        assert not pipeline.is_broken
+
+        assert next(it) == 2
+
+        with pytest.raises(DataPipelineError):
+            next(it)
+
+        state_dict = pipeline.state_dict()
+
+        assert next(it) == 4
+
+        pipeline.load_state_dict(state_dict)
+
+        assert next(it) == 4
+
+        with pytest.raises(StopIteration):
+            next(it)
+
+    @pytest.mark.parametrize("num_workers", [1, 2])
+    def test_op_works_when_executor_is_process(self, num_workers: int) -> None:
+        seq = list(range(1, 10))
+
+        pipeline = (
+            read_sequence(seq)
+            .map(square, executor="process", num_workers=num_workers)
+            .and_return()
+        )
+
+        for _ in range(2):
+            assert list(pipeline) == [i**2 for i in seq]
+
+            pipeline.reset()
+
+    def test_op_raises_error_when_executor_is_not_valid(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`executor` must be 'thread' or 'process', but is 'foo' instead\.$",
+        ):
+            read_sequence([]).map(lambda x: x, executor="foo")
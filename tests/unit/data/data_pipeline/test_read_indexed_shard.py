@@ -0,0 +1,230 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from pathlib import Path
+
+import pytest
+import torch
+
+from fairseq2.data import DataPipelineError, IndexedShardWriter, read_indexed_shard
+from tests.common import assert_equal
+
+
+class TestReadIndexedShardOp:
+    @staticmethod
+    def write_shard(path: Path, num_examples: int = 10) -> None:
+        writer = IndexedShardWriter(path)
+
+        for i in range(num_examples):
+            writer.write(
+                {
+                    "tokens": torch.arange(i, dtype=torch.int32),
+                    "fbank": torch.full((i + 1, 4), float(i)),
+                }
+            )
+
+        writer.close()
+
+    def test_op_works(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        for _ in range(2):
+            for i, example in enumerate(pipeline):
+                assert_equal(example["tokens"], torch.arange(i, dtype=torch.int32))
+
+                assert_equal(example["fbank"], torch.full((i + 1, 4), float(i)))
+
+            assert i == 9
+
+            pipeline.reset()
+
+    def test_op_works_when_shuffle_is_true(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        pipeline = read_indexed_shard(path, shuffle=True).and_return()
+
+        lens = [len(e["tokens"]) for e in pipeline]
+
+        assert sorted(lens) == list(range(10))
+
+    def test_op_skips_examples(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        pipeline = read_indexed_shard(path).skip(7).and_return()
+
+        lens = [len(e["tokens"]) for e in pipeline]
+
+        assert lens == [7, 8, 9]
+
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_op_saves_and_restores_its_state(
+        self, tmp_path: Path, shuffle: bool
+    ) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        pipeline = read_indexed_shard(path, shuffle=shuffle).and_return()
+
+        it = iter(pipeline)
+
+        for _ in range(3):
+            next(it)
+
+        state_dict = pipeline.state_dict()
+
+        expected_lens = [len(e["tokens"]) for e in pipeline]
+
+        pipeline.load_state_dict(state_dict)
+
+        lens = [len(e["tokens"]) for e in pipeline]
+
+        assert lens == expected_lens
+
+        assert len(lens) == 7
+
+    def test_op_raises_error_when_file_is_not_a_shard(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        path.write_bytes(b"foo" * 100)
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        with pytest.raises(
+            DataPipelineError,
+            match=rf"^The data pipeline cannot read from '{path}'\. See nested exception for details\.$",
+        ):
+            next(iter(pipeline))
+
+    def test_op_works_when_examples_are_modified_in_place(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        shard_bytes = path.read_bytes()
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        for example in pipeline:
+            example["fbank"].add_(1.0)
+
+        pipeline.reset()
+
+        # The modifications must stay private to the returned tensors.
+        for i, example in enumerate(pipeline):
+            assert_equal(example["fbank"], torch.full((i + 1, 4), float(i)))
+
+        assert path.read_bytes() == shard_bytes
+
+    def test_op_raises_error_when_data_type_is_corrupt(self, tmp_path: Path) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        data = bytearray(path.read_bytes())
+
+        index_offset = int.from_bytes(data[24:32], "little")
+
+        name_size = int.from_bytes(data[index_offset : index_offset + 4], "little")
+
+        # Overwrite the data type code of the first column.
+        data[index_offset + 4 + name_size] = 200
+
+        path.write_bytes(data)
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        with pytest.raises(DataPipelineError) as exc_info:
+            next(iter(pipeline))
+
+        cause = exc_info.value.__cause__
+
+        assert str(cause).endswith("has an unknown data type code 200.")
+
+    def test_op_raises_error_when_number_of_examples_overflows(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        self.write_shard(path)
+
+        data = bytearray(path.read_bytes())
+
+        # The size of the index entries cannot be represented in 64 bits.
+        data[16:24] = (2**62).to_bytes(8, "little")
+
+        path.write_bytes(data)
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        with pytest.raises(DataPipelineError) as exc_info:
+            next(iter(pipeline))
+
+        cause = exc_info.value.__cause__
+
+        assert str(cause) == (
+            "The indexed shard is corrupt; a size computed from its fields is too large."
+        )
+
+    def test_writer_raises_error_when_data_type_is_not_supported(
+        self, tmp_path: Path
+    ) -> None:
+        writer = IndexedShardWriter(tmp_path.joinpath("test.shard"))
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The column 'fbank' must be of a boolean, integral, or floating-point data type, but is of data type `ComplexFloat` instead\.$",
+        ):
+            writer.write({"fbank": torch.zeros((2, 4), dtype=torch.complex64)})
+
+    def test_writer_raises_error_when_columns_do_not_match(
+        self, tmp_path: Path
+    ) -> None:
+        writer = IndexedShardWriter(tmp_path.joinpath("test.shard"))
+
+        writer.write({"tokens": torch.arange(3)})
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The column 'tokens' must have the feature dimensions \(\) of the first example, but has the shape \(3, 2\) instead\.$",
+        ):
+            writer.write({"tokens": torch.zeros((3, 2), dtype=torch.int64)})
+
+    def test_writer_infers_columns_when_first_example_is_invalid(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path.joinpath("test.shard")
+
+        writer = IndexedShardWriter(path)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The column 'fbank' must have at least one dimension\.$",
+        ):
+            writer.write({"tokens": torch.arange(3), "fbank": torch.tensor(1.0)})
+
+        # The rejected example must not leave its columns behind.
+        writer.write({"tokens": torch.arange(2), "fbank": torch.ones((2, 4))})
+        writer.write({"tokens": torch.arange(4), "fbank": torch.ones((1, 4))})
+
+        writer.close()
+
+        pipeline = read_indexed_shard(path).and_return()
+
+        examples = list(pipeline)
+
+        assert len(examples) == 2
+
+        assert_equal(examples[0]["tokens"], torch.arange(2))
+        assert_equal(examples[1]["fbank"], torch.ones((1, 4)))
@@ -0,0 +1,170 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import zipfile
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from fairseq2.data import DataPipeline, DataPipelineError, read_zipped_records
+
+
+class TestReadZippedRecordsOp:
+    contents = [f"file {i} " + "abc" * (i * 7) for i in range(10)]
+
+    @pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+    @pytest.mark.parametrize("num_parallel_calls", [1, 4])
+    def test_op_works(
+        self, tmp_path: Path, compression: int, num_parallel_calls: int
+    ) -> None:
+        pathname = self.write_archive(tmp_path, compression)
+
+        pipeline = read_zipped_records(
+            pathname, num_parallel_calls=num_parallel_calls
+        ).and_return()
+
+        # The entries read ahead must be returned in archive order.
+        for _ in range(2):
+            assert self.read_all(pipeline) == self.contents
+
+            pipeline.reset()
+
+    def test_op_works_when_archive_has_comment(self, tmp_path: Path) -> None:
+        pathname = self.write_archive(tmp_path, zipfile.ZIP_STORED, comment=b"x" * 300)
+
+        pipeline = read_zipped_records(pathname).and_return()
+
+        assert self.read_all(pipeline) == self.contents
+
+    @pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+    def test_op_works_when_archive_is_zip64(
+        self, tmp_path: Path, compression: int, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Force the ZIP64 end of central directory record and extra fields.
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 16)
+        monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 4)
+
+        pathname = self.write_archive(tmp_path, compression)
+
+        with open(pathname, "rb") as fp:
+            assert b"PK\x06\x06" in fp.read()
+
+        pipeline = read_zipped_records(pathname, num_parallel_calls=4).and_return()
+
+        assert self.read_all(pipeline) == self.contents
+
+    def test_op_raises_error_when_file_is_not_zip_archive(self, tmp_path: Path) -> None:
+        pathname = tmp_path.joinpath("test.zip")
+
+        pathname.write_bytes(b"foo" * 100)
+
+        pipeline = read_zipped_records(pathname).and_return()
+
+        with pytest.raises(DataPipelineError) as exc_info:
+            next(iter(pipeline))
+
+        cause = exc_info.value.__cause__
+
+        assert str(cause).startswith("The file is not a zip archive")
+
+    @pytest.mark.parametrize("num_parallel_calls", [1, 4])
+    def test_op_raises_recoverable_error_when_entry_is_corrupt(
+        self, tmp_path: Path, num_parallel_calls: int
+    ) -> None:
+        pathname = self.write_archive(tmp_path, zipfile.ZIP_STORED)
+
+        with zipfile.ZipFile(pathname) as fp:
+            header_offset = fp.infolist()[2].header_offset
+
+        # Corrupt the local header signature of the third entry.
+        data = bytearray(pathname.read_bytes())
+
+        data[header_offset : header_offset + 4] = b"\x00" * 4
+
+        pathname.write_bytes(data)
+
+        pipeline = read_zipped_records(
+            pathname, num_parallel_calls=num_parallel_calls
+        ).and_return()
+
+        it = iter(pipeline)
+
+        assert self.read(it, 2) == self.contents[:2]
+
+        with pytest.raises(
+            DataPipelineError,
+            match=r"cannot read the entry 2 of ",
+        ):
+            next(it)
+
+        assert not pipeline.is_broken
+
+        # The failed entry must count as read; the entries read ahead must
+        # still line up with the position of the pipeline.
+        assert pipeline.state_dict()["position"] == [True, 3]
+
+        assert self.read(it, 7) == self.contents[3:]
+
+        with pytest.raises(StopIteration):
+            next(it)
+
+    @pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+    @pytest.mark.parametrize("num_parallel_calls", [1, 4])
+    def test_op_saves_and_restores_its_state(
+        self, tmp_path: Path, compression: int, num_parallel_calls: int
+    ) -> None:
+        pathname = self.write_archive(tmp_path, compression)
+
+        pipeline = read_zipped_records(
+            pathname, num_parallel_calls=num_parallel_calls
+        ).and_return()
+
+        it = iter(pipeline)
+
+        assert self.read(it, 3) == self.contents[:3]
+
+        state_dict = pipeline.state_dict()
+
+        # Read a few entries before we roll back.
+        assert self.read(it, 2) == self.contents[3:5]
+
+        pipeline.load_state_dict(state_dict)
+
+        assert self.read(it, 7) == self.contents[3:]
+
+        with pytest.raises(StopIteration):
+            next(it)
+
+        # A new pipeline must resume from the same entry.
+        pipeline = read_zipped_records(
+            pathname, num_parallel_calls=num_parallel_calls
+        ).and_return()
+
+        pipeline.load_state_dict(state_dict)
+
+        assert self.read_all(pipeline) == self.contents[3:]
+
+    def write_archive(
+        self, tmp_path: Path, compression: int, comment: bytes = b""
+    ) -> Path:
+        pathname = tmp_path.joinpath("test.zip")
+
+        with zipfile.ZipFile(pathname, "w", compression=compression) as fp:
+            for i, content in enumerate(self.contents):
+                fp.writestr(f"file{i}.txt", content)
+
+            fp.comment = comment
+
+        return pathname
+
+    @staticmethod
+    def read(it: Iterator[Any], num_entries: int) -> List[str]:
+        return [str(next(it)) for _ in range(num_entries)]
+
+    @staticmethod
+    def read_all(pipeline: DataPipeline) -> List[str]:
+        return [str(d) for d in pipeline]
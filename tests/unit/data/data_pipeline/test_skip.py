@@ -4,9 +4,19 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+import zipfile
+from itertools import islice
+from pathlib import Path
+
 import pytest
 
-from fairseq2.data import read_sequence
+from fairseq2.data import (
+    DataPipeline,
+    DataPipelineBuilder,
+    read_sequence,
+    read_zipped_records,
+)
+from fairseq2.data.text import read_text
 
 
 class TestSkipOp:
@@ -34,6 +44,85 @@ class TestSkipOp:
 
             pipeline.reset()
 
+    @pytest.mark.parametrize("source", ["sequence", "text", "zip"])
+    @pytest.mark.parametrize("count", [0, 1, 4, 9, 10, 15])
+    def test_op_works_with_data_source(
+        self, tmp_path: Path, source: str, count: int
+    ) -> None:
+        examples = list(build_source(tmp_path, source).and_return())
+
+        pipeline = build_source(tmp_path, source).skip(count).and_return()
+
+        # Skipping must be equivalent to reading and discarding the examples.
+        for _ in range(2):
+            assert list(pipeline) == examples[count:]
+
+            pipeline.reset()
+
+    @pytest.mark.parametrize("count", [0, 1, 7])
+    def test_op_works_with_count(self, count: int) -> None:
+        pipeline = DataPipeline.count(start=4).skip(count).and_return()
+
+        for _ in range(2):
+            assert list(islice(pipeline, 5)) == list(range(4 + count, 9 + count))
+
+            pipeline.reset()
+
+    @pytest.mark.parametrize("source", ["sequence", "text", "zip"])
+    @pytest.mark.parametrize("count1,count2", [(0, 3), (2, 3), (4, 8)])
+    def test_op_works_when_nested(
+        self, tmp_path: Path, source: str, count1: int, count2: int
+    ) -> None:
+        examples = list(build_source(tmp_path, source).and_return())
+
+        pipeline = build_source(tmp_path, source).skip(count1).skip(count2).and_return()
+
+        for _ in range(2):
+            assert list(pipeline) == examples[count1 + count2 :]
+
+            pipeline.reset()
+
+    @pytest.mark.parametrize("source", ["sequence", "text", "zip"])
+    @pytest.mark.parametrize("shard_idx", [0, 1, 2])
+    @pytest.mark.parametrize("count", [0, 1, 2, 3, 5])
+    def test_op_works_when_inner_pipeline_is_sharded(
+        self, tmp_path: Path, source: str, shard_idx: int, count: int
+    ) -> None:
+        examples = list(build_source(tmp_path, source).and_return())
+
+        # The trailing example does not form a complete span of 3 examples.
+        shard = examples[shard_idx:9:3]
+
+        pipeline = (
+            build_source(tmp_path, source).shard(shard_idx, 3).skip(count).and_return()
+        )
+
+        for _ in range(2):
+            assert list(pipeline) == shard[count:]
+
+            pipeline.reset()
+
+    @pytest.mark.parametrize("source", ["sequence", "text", "zip"])
+    @pytest.mark.parametrize("shard_idx", [0, 1, 2])
+    @pytest.mark.parametrize("count", [0, 1, 4])
+    def test_op_works_when_outer_pipeline_is_sharded(
+        self, tmp_path: Path, source: str, shard_idx: int, count: int
+    ) -> None:
+        examples = list(build_source(tmp_path, source).and_return())
+
+        remaining = examples[count:]
+
+        num_spans = len(remaining) // 3
+
+        pipeline = (
+            build_source(tmp_path, source).skip(count).shard(shard_idx, 3).and_return()
+        )
+
+        for _ in range(2):
+            assert list(pipeline) == remaining[shard_idx : num_spans * 3 : 3]
+
+            pipeline.reset()
+
     def test_op_saves_and_restores_its_state(self) -> None:
         pipeline = read_sequence([1, 2, 3, 4, 5, 6, 7, 8, 9]).skip(3).and_return()
 
@@ -73,3 +162,29 @@ class TestSkipOp:
 
         with pytest.raises(StopIteration):
             next(iter(pipeline))
+
+
+def build_source(tmp_path: Path, source: str) -> DataPipelineBuilder:
+    """Build a pipeline that reads 10 examples from ``source``."""
+    if source == "sequence":
+        return read_sequence([f"line {i}" for i in range(10)])
+
+    if source == "text":
+        pathname = tmp_path.joinpath("test.txt")
+
+        if not pathname.exists():
+            pathname.write_text("".join(f"line {i}\n" for i in range(10)))
+
+        return read_text(pathname, rtrim=True).map(str)
+
+    if source == "zip":
+        pathname = tmp_path.joinpath("test.zip")
+
+        if not pathname.exists():
+            with zipfile.ZipFile(pathname, "w") as fp:
+                for i in range(10):
+                    fp.writestr(f"file{i}.txt", f"line {i}")
+
+        return read_zipped_records(pathname, num_parallel_calls=4).map(str)
+
+    raise ValueError(f"`source` must be a known data source, but is {source} instead.")
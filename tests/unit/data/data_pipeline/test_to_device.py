@@ -0,0 +1,40 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+
+from fairseq2.data import read_sequence
+from tests.common import assert_equal, device
+
+
+class TestToDeviceOp:
+    @pytest.mark.parametrize("num_buffers", [1, 2, 4])
+    def test_op_works(self, num_buffers: int) -> None:
+        seq = [
+            {"a": torch.full((2,), i), "b": [torch.full((3,), i), i]} for i in range(10)
+        ]
+
+        pipeline = read_sequence(seq).to_device(device, num_buffers).and_return()
+
+        for _ in range(2):
+            for i, d in enumerate(pipeline):
+                assert d["a"].device == device
+                assert d["b"][0].device == device
+
+                assert_equal(d["a"], [i, i])
+                assert_equal(d["b"][0], [i, i, i])
+
+                assert d["b"][1] == i
+
+            pipeline.reset()
+
+    def test_op_raises_error_when_num_buffers_is_zero(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`num_buffers` must be greater than zero\.$",
+        ):
+            read_sequence([1, 2, 3]).to_device(device, num_buffers=0)
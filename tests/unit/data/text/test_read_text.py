@@ -0,0 +1,117 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from fairseq2.data import DataPipeline
+from fairseq2.data.text import read_text
+
+
+class TestReadText:
+    lines = [f"line {i}" + "x" * (i % 7) for i in range(100)]
+
+    # fmt: off
+    @pytest.mark.parametrize("memory_map,encoding",
+        [
+            (False, "utf-8"),   # file stream
+            (True,  "utf-8"),   # memory stream
+            (False, "utf-16"),  # re-encoded stream, cannot seek
+            (True,  "utf-16"),
+        ],
+    )
+    # fmt: on
+    def test_op_saves_and_restores_its_state(
+        self, tmp_path: Path, memory_map: bool, encoding: str
+    ) -> None:
+        pathname = self.write_file(tmp_path, encoding)
+
+        pipeline = self.build_pipeline(pathname, memory_map, encoding)
+
+        it = iter(pipeline)
+
+        assert self.read_lines(it, 30) == self.lines[:30]
+
+        state_dict = pipeline.state_dict()
+
+        # Read a few lines before we roll back.
+        assert self.read_lines(it, 10) == self.lines[30:40]
+
+        pipeline.load_state_dict(state_dict)
+
+        assert self.read_lines(it, 70) == self.lines[30:]
+
+        with pytest.raises(StopIteration):
+            next(it)
+
+        # A new pipeline must resume from the same line.
+        pipeline = self.build_pipeline(pathname, memory_map, encoding)
+
+        pipeline.load_state_dict(state_dict)
+
+        assert self.read_lines(iter(pipeline), 70) == self.lines[30:]
+
+    def test_op_records_byte_offset(self, tmp_path: Path) -> None:
+        pathname = self.write_file(tmp_path, "utf-8")
+
+        pipeline = self.build_pipeline(pathname, memory_map=False)
+
+        it = iter(pipeline)
+
+        self.read_lines(it, 30)
+
+        state_dict = pipeline.state_dict()
+
+        # The pipeline state holds the number of lines read along with the
+        # byte offset of the next line.
+        assert state_dict["position"][1] == [
+            30,
+            sum(len(line) + 1 for line in self.lines[:30]),
+        ]
+
+    @pytest.mark.parametrize("memory_map", [False, True])
+    def test_op_restores_its_state_when_state_has_old_format(
+        self, tmp_path: Path, memory_map: bool
+    ) -> None:
+        pathname = self.write_file(tmp_path, "utf-8")
+
+        pipeline = self.build_pipeline(pathname, memory_map)
+
+        # Earlier versions recorded only the number of lines read.
+        pipeline.load_state_dict({"position": [True, 30]})
+
+        it = iter(pipeline)
+
+        assert self.read_lines(it, 70) == self.lines[30:]
+
+        with pytest.raises(StopIteration):
+            next(it)
+
+    def write_file(self, tmp_path: Path, encoding: str) -> Path:
+        pathname = tmp_path.joinpath("test.txt")
+
+        pathname.write_text("\n".join(self.lines) + "\n", encoding=encoding)
+
+        return pathname
+
+    @staticmethod
+    def build_pipeline(
+        pathname: Path, memory_map: bool, encoding: str = "utf-8"
+    ) -> DataPipeline:
+        # Use a small block size so that lines span multiple chunks.
+        return read_text(
+            pathname,
+            encoding=encoding,
+            rtrim=True,
+            memory_map=memory_map,
+            block_size=64,
+        ).and_return()
+
+    @staticmethod
+    def read_lines(it: Iterator[Any], num_lines: int) -> List[str]:
+        return [str(next(it)) for _ in range(num_lines)]
@@ -172,6 +172,51 @@ class TestSentencePieceModel:
         # Assert decoder.
         assert sentences[0] == self.sentences[0]
 
+    @pytest.mark.parametrize("reverse", [False, True])
+    def test_encode_batch_works(self, reverse: bool) -> None:
+        model = self.build_model()
+
+        encoder = SentencePieceEncoder(model, device=device, reverse=reverse)
+
+        output = encoder.encode_batch(self.sentences, pad_idx=0)
+
+        seq0 = self.token_indices[0]
+        seq1 = self.token_indices[1]
+
+        if reverse:
+            seq0 = seq0[::-1]
+            seq1 = seq1[::-1]
+
+        assert output["is_ragged"]
+
+        assert_equal(output["seqs"], [seq0 + [0] * 4, seq1])
+
+        assert_equal(output["seq_lens"], [11, 15])
+
+    def test_encode_batch_works_when_pad_to_multiple_is_specified(self) -> None:
+        model = self.build_model()
+
+        encoder = SentencePieceEncoder(model, device=device)
+
+        output = encoder.encode_batch(self.sentences[1:], pad_idx=0, pad_to_multiple=8)
+
+        assert output["is_ragged"]
+
+        assert_equal(output["seqs"], [self.token_indices[1] + [0]])
+
+        assert_equal(output["seq_lens"], [15])
+
+    def test_encode_batch_works_when_input_is_empty(self) -> None:
+        model = self.build_model()
+
+        encoder = SentencePieceEncoder(model, device=device)
+
+        output = encoder.encode_batch([], pad_idx=0)
+
+        assert output["seqs"].shape == (0, 0)
+
+        assert not output["is_ragged"]
+
     @pytest.mark.parametrize("dtype", [torch.int16, torch.int32, torch.int64])
     def test_decode_works_when_input_is_batched(self, dtype: DataType) -> None:
         model = self.build_model()
@@ -0,0 +1,84 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import torch
+
+from fairseq2.data import VocabularyInfo
+from fairseq2.models.encoder_decoder import EncoderDecoderModel
+from fairseq2.models.llama import LLaMAConfig, create_llama_model
+from fairseq2.models.mistral import MistralConfig, create_mistral_model
+from fairseq2.models.nllb import NllbConfig, create_nllb_model
+from fairseq2.models.transformer import TransformerDecoderModel
+from tests.common import device
+
+# The vocabulary of the tiny models used by the generation tests.
+VOCAB_INFO = VocabularyInfo(size=32, unk_idx=0, bos_idx=1, eos_idx=2, pad_idx=3)
+
+
+def build_nllb_model(seed: int = 0) -> EncoderDecoderModel:
+    """Build a tiny NLLB model initialized with ``seed``."""
+    config = NllbConfig(
+        model_dim=32,
+        max_seq_len=64,
+        vocabulary_size=VOCAB_INFO.size,
+        pad_idx=VOCAB_INFO.pad_idx,
+        num_encoder_layers=2,
+        num_decoder_layers=2,
+        num_encoder_attn_heads=4,
+        num_decoder_attn_heads=4,
+        ffn_inner_dim=64,
+        dropout_p=0.0,
+    )
+
+    torch.manual_seed(seed)
+
+    model = create_nllb_model(config, device=device)
+
+    return model.eval()
+
+
+def build_llama_model(seed: int = 0) -> TransformerDecoderModel:
+    """Build a tiny LLaMA model initialized with ``seed``."""
+    config = LLaMAConfig(
+        model_dim=32,
+        max_seq_len=64,
+        vocabulary_size=VOCAB_INFO.size,
+        num_layers=2,
+        num_attn_heads=4,
+        num_key_value_heads=2,
+        ffn_inner_dim=64,
+        ffn_inner_dim_to_multiple=8,
+        dropout_p=0.0,
+        norm_eps=1e-5,
+    )
+
+    torch.manual_seed(seed)
+
+    model = create_llama_model(config, device=device)
+
+    return model.eval()
+
+
+def build_mistral_model(seed: int = 0) -> TransformerDecoderModel:
+    """Build a tiny Mistral model, with a sliding attention window, initialized
+    with ``seed``."""
+    config = MistralConfig(
+        model_dim=32,
+        max_seq_len=64,
+        vocabulary_size=VOCAB_INFO.size,
+        attn_window_len=16,
+        num_layers=2,
+        num_attn_heads=4,
+        num_key_value_heads=2,
+        ffn_inner_dim=64,
+        dropout_p=0.0,
+    )
+
+    torch.manual_seed(seed)
+
+    model = create_mistral_model(config, device=device)
+
+    return model.eval()
@@ -0,0 +1,323 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Any, Callable, List, Tuple
+
+import pytest
+import torch
+from torch import Tensor
+
+from fairseq2.generation import (
+    DecoderOnlyGenerator,
+    SamplingSearch,
+    SequenceGeneratorOptions,
+    StandardSampler,
+)
+from fairseq2.models.transformer import TransformerDecoderModel
+from fairseq2.nn.padding import PaddingMask
+from tests.common import assert_close, assert_equal, device
+from tests.unit.generation.common import (
+    VOCAB_INFO,
+    build_llama_model,
+    build_mistral_model,
+)
+
+
+class TestDecoderOnlyGenerator:
+    prompts = [[1, 7, 8, 9, 10], [1, 11], [1, 12, 13]]
+
+    def test_call_works_when_beam_size_is_one(self) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1, soft_max_seq_len=None, hard_max_seq_len=12
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        output = generator(seqs, padding_mask)
+
+        for prompt, hypotheses in zip(self.prompts, output.results):
+            assert len(hypotheses) == 1
+
+            expected_seq = self.greedy_decode(model, prompt, max_seq_len=12)
+
+            assert_equal(hypotheses[0].seq, expected_seq)
+
+        # Left-padded prompts must produce the same output.
+        seqs, padding_mask = self.build_batch(left_padded=True)
+
+        output_left = generator(seqs, padding_mask, left_padded=True)
+
+        for hypotheses, hypotheses_left in zip(output.results, output_left.results):
+            assert_equal(hypotheses_left[0].seq, hypotheses[0].seq)
+
+    def test_call_works_when_beam_size_is_greater_than_one(self) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=3, soft_max_seq_len=None, hard_max_seq_len=12
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        output = generator(seqs, padding_mask)
+
+        for prompt, hypotheses in zip(self.prompts, output.results):
+            assert len(hypotheses) == 3
+
+            scores = [float(h.score) for h in hypotheses]
+
+            assert scores == sorted(scores, reverse=True)
+
+            for hypothesis in hypotheses:
+                assert hypothesis.seq.tolist()[: len(prompt)] == prompt
+
+                assert hypothesis.seq[-1] == VOCAB_INFO.eos_idx
+
+    def test_call_works_when_search_is_sampling(self) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=4,
+            soft_max_seq_len=None,
+            hard_max_seq_len=12,
+            search=SamplingSearch(StandardSampler(temperature=0.8)),
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        torch.manual_seed(0)
+
+        output = generator(seqs, padding_mask)
+
+        for prompt, hypotheses in zip(self.prompts, output.results):
+            assert len(hypotheses) == 4
+
+            for hypothesis in hypotheses:
+                assert hypothesis.seq.tolist()[: len(prompt)] == prompt
+
+                assert hypothesis.seq[-1] == VOCAB_INFO.eos_idx
+
+                assert VOCAB_INFO.pad_idx not in hypothesis.seq.tolist()
+
+    @pytest.mark.parametrize("build_model", [build_llama_model, build_mistral_model])
+    def test_call_works_when_seeds_are_specified(
+        self, build_model: Callable[[int], TransformerDecoderModel]
+    ) -> None:
+        model = build_model(2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2,
+            soft_max_seq_len=None,
+            hard_max_seq_len=12,
+            search=SamplingSearch(StandardSampler(temperature=1.5)),
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        seeds = torch.tensor([5, 6, 7], device=device)
+
+        torch.manual_seed(0)
+
+        output = generator(seqs, padding_mask, seeds=seeds)
+
+        # The samples of a prompt must depend only on its seed, not on its
+        # neighbours in the batch or on the default generator of PyTorch.
+        for idx, (prompt, hypotheses) in enumerate(zip(self.prompts, output.results)):
+            torch.manual_seed(idx + 1)
+
+            expected_output = generator(
+                torch.tensor([prompt], device=device), None, seeds=seeds[idx : idx + 1]
+            )
+
+            self.assert_hypotheses_close(hypotheses, expected_output.results[0])
+
+    def test_call_raises_error_when_seeds_have_wrong_shape(self) -> None:
+        model = build_llama_model(seed=2)
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        seeds = torch.tensor([5, 6], device=device)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`seeds` must be of shape \(3,\), but is of shape \(2,\) instead\.$",
+        ):
+            generator(seqs, padding_mask, seeds=seeds)
+
+    def test_call_prefills_prompts_in_single_forward_pass(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_llama_model(seed=2)
+
+        decoder_input_shapes = []
+
+        decode = model.decode
+
+        def record_decode(seqs: Tensor, *args: Any, **kwargs: Any) -> Any:
+            decoder_input_shapes.append(tuple(seqs.shape))
+
+            return decode(seqs, *args, **kwargs)
+
+        monkeypatch.setattr(model, "decode", record_decode)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2, soft_max_seq_len=None, hard_max_seq_len=12
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        generator(seqs, padding_mask)
+
+        # All prompts but their last step must be fed at once; the remaining
+        # steps are fed one at a time, for all beams.
+        assert decoder_input_shapes[0] == (3, 4)
+
+        assert all(shape[1] == 1 for shape in decoder_input_shapes[1:])
+
+        assert decoder_input_shapes[1] == (6, 1)
+
+    @pytest.mark.parametrize("left_padded", [False, True])
+    def test_call_works_when_prompts_are_batched(self, left_padded: bool) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=3, soft_max_seq_len=None, hard_max_seq_len=12
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded)
+
+        output = generator(seqs, padding_mask, left_padded=left_padded)
+
+        # Each prompt must produce the same hypotheses as when it is generated
+        # on its own.
+        for prompt, hypotheses in zip(self.prompts, output.results):
+            expected_output = generator(torch.tensor([prompt], device=device), None)
+
+            self.assert_hypotheses_close(hypotheses, expected_output.results[0])
+
+    def test_call_works_when_model_has_sliding_window_attention(self) -> None:
+        model = build_mistral_model(seed=2)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2, soft_max_seq_len=None, hard_max_seq_len=12
+        )
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        output = generator(seqs, padding_mask)
+
+        # The prompts are generated in separate batches, one per length.
+        for prompt, hypotheses in zip(self.prompts, output.results):
+            expected_output = generator(torch.tensor([prompt], device=device), None)
+
+            self.assert_hypotheses_close(hypotheses, expected_output.results[0])
+
+    def test_call_raises_error_when_prompt_is_too_long(self) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(soft_max_seq_len=None, hard_max_seq_len=5)
+
+        generator = DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+        seqs, padding_mask = self.build_batch(left_padded=False)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The effective maximum sequence length must be greater than the length of the longest prompt \(5\), but is 5 instead\.$",
+        ):
+            generator(seqs, padding_mask)
+
+    def test_init_raises_error_when_compaction_interval_is_specified(self) -> None:
+        model = build_llama_model(seed=2)
+
+        opts = SequenceGeneratorOptions(compaction_interval=3)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`opts.compaction_interval` is not supported by `DecoderOnlyGenerator`\.$",
+        ):
+            DecoderOnlyGenerator(model, VOCAB_INFO, opts)
+
+    def build_batch(self, left_padded: bool) -> Tuple[Tensor, PaddingMask]:
+        pad_idx = 3
+
+        max_len = max(len(p) for p in self.prompts)
+
+        rows: List[List[int]] = []
+
+        for prompt in self.prompts:
+            pad = [pad_idx] * (max_len - len(prompt))
+
+            rows.append(pad + prompt if left_padded else prompt + pad)
+
+        seqs = torch.tensor(rows, device=device)
+
+        seq_lens = torch.tensor([len(p) for p in self.prompts], device=device)
+
+        return seqs, PaddingMask(seq_lens, batch_seq_len=max_len)
+
+    @staticmethod
+    def assert_hypotheses_close(hypotheses: Any, expected_hypotheses: Any) -> None:
+        assert len(hypotheses) == len(expected_hypotheses)
+
+        for hypothesis, expected_hypothesis in zip(hypotheses, expected_hypotheses):
+            assert_equal(hypothesis.seq, expected_hypothesis.seq)
+
+            assert_close(hypothesis.score, expected_hypothesis.score)
+
+            assert_close(hypothesis.step_scores, expected_hypothesis.step_scores)
+
+    @staticmethod
+    def greedy_decode(
+        model: TransformerDecoderModel, prompt: List[int], max_seq_len: int
+    ) -> List[int]:
+        seq = list(prompt)
+
+        while len(seq) < max_seq_len:
+            step_nr = len(seq) - 1
+
+            x = torch.tensor([seq], device=device)
+
+            decoder_output, decoder_padding_mask = model.decode(x, None)
+
+            logits = model.project(decoder_output, decoder_padding_mask).logits
+
+            logits = logits[0, -1].float()
+
+            logits[VOCAB_INFO.pad_idx] = -torch.inf
+
+            if step_nr < 1:
+                logits[VOCAB_INFO.eos_idx] = -torch.inf
+
+            if step_nr == max_seq_len - 2:
+                next_idx = VOCAB_INFO.eos_idx
+            else:
+                next_idx = int(logits.argmax())
+
+            seq.append(next_idx)  # type: ignore[arg-type]
+
+            if next_idx == VOCAB_INFO.eos_idx:
+                break
+
+        return seq
@@ -0,0 +1,254 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+import torch
+from torch import Tensor
+
+from fairseq2.generation import (
+    Hypothesis,
+    Seq2SeqGenerationEngine,
+    Seq2SeqGenerator,
+    SequenceGeneratorOptions,
+)
+from fairseq2.models.encoder_decoder import EncoderDecoderModel
+from fairseq2.nn.incremental_state import IncrementalStateBag
+from tests.common import assert_close, assert_equal, device
+from tests.unit.generation.common import VOCAB_INFO, build_nllb_model
+
+
+class TestSeq2SeqGenerationEngine:
+    sources = [[5, 6, 7, 2], [8, 9, 2], [10, 11, 12, 13, 14, 2], [15, 2], [16, 17, 2]]
+
+    @pytest.mark.parametrize("beam_size", [1, 2])
+    def test_step_works(self, beam_size: int) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(
+            beam_size=beam_size, soft_max_seq_len=(1, 5), hard_max_seq_len=16
+        )
+
+        prefix_seq = torch.tensor([2, 4], device=device)
+
+        engine = Seq2SeqGenerationEngine(
+            model, VOCAB_INFO, prefix_seq, opts, max_num_requests=2
+        )
+
+        # Submit the requests at different steps so that the running batch
+        # always holds sequences at different steps.
+        request_ids = []
+
+        outputs: Dict[int, List[Hypothesis]] = {}
+
+        for source in self.sources:
+            request_ids.append(engine.submit(self.to_tensor(source)))
+
+            engine.step()
+
+            outputs.update(engine.poll())
+
+        while not engine.is_idle:
+            engine.step()
+
+            outputs.update(engine.poll())
+
+        assert sorted(outputs.keys()) == request_ids
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, prefix_seq, opts)
+
+        for request_id, source in zip(request_ids, self.sources):
+            expected_hypotheses = self.generate(generator, model, source)
+
+            self.assert_hypotheses_equal(outputs[request_id], expected_hypotheses)
+
+    def test_generate_works(self) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2, soft_max_seq_len=(1, 5), hard_max_seq_len=16
+        )
+
+        engine = Seq2SeqGenerationEngine(
+            model, VOCAB_INFO, None, opts, max_num_requests=3
+        )
+
+        async def generate_all() -> List[List[Hypothesis]]:
+            futures = [engine.generate(self.to_tensor(s)) for s in self.sources]
+
+            return await asyncio.gather(*futures)
+
+        outputs = asyncio.run(generate_all())
+
+        assert engine.is_idle
+
+        # Requests served via `generate()` are not returned by `poll()`.
+        assert engine.poll() == []
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, None, opts)
+
+        for hypotheses, source in zip(outputs, self.sources):
+            expected_hypotheses = self.generate(generator, model, source)
+
+            self.assert_hypotheses_equal(hypotheses, expected_hypotheses)
+
+    def test_generate_removes_cancelled_request(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2, soft_max_seq_len=(1, 5), hard_max_seq_len=16
+        )
+
+        engine = Seq2SeqGenerationEngine(
+            model, VOCAB_INFO, None, opts, max_num_requests=3
+        )
+
+        batch_sizes: List[int] = []
+
+        decode = model.decode
+
+        def record_decode(seqs: Tensor, *args: Any, **kwargs: Any) -> Any:
+            batch_sizes.append(seqs.size(0))
+
+            return decode(seqs, *args, **kwargs)
+
+        monkeypatch.setattr(model, "decode", record_decode)
+
+        sources = self.sources[:3]
+
+        async def generate_all() -> List[List[Hypothesis]]:
+            tasks = [
+                asyncio.create_task(engine.generate(self.to_tensor(s))) for s in sources
+            ]
+
+            # Let the engine admit all requests and run a few steps.
+            while len(batch_sizes) < 3:
+                await asyncio.sleep(0)
+
+            assert batch_sizes[-1] == 6
+
+            tasks[0].cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await tasks[0]
+
+            batch_sizes.clear()
+
+            return await asyncio.gather(*tasks[1:])
+
+        outputs = asyncio.run(generate_all())
+
+        assert engine.is_idle
+
+        # The running batch shrinks by the beams of the cancelled request.
+        assert batch_sizes[0] == 4
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, None, opts)
+
+        for hypotheses, source in zip(outputs, sources[1:]):
+            expected_hypotheses = self.generate(generator, model, source)
+
+            self.assert_hypotheses_equal(hypotheses, expected_hypotheses)
+
+    def test_generate_raises_error_when_step_fails(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_nllb_model()
+
+        engine = Seq2SeqGenerationEngine(model, VOCAB_INFO, None)
+
+        def fail_step() -> None:
+            raise RuntimeError("foo")
+
+        monkeypatch.setattr(engine, "step", fail_step)
+
+        async def generate() -> None:
+            with pytest.raises(RuntimeError, match=r"^foo$"):
+                await engine.generate(self.to_tensor(self.sources[0]))
+
+            assert engine._runner is not None
+
+            # The error is passed to the caller instead of the background task.
+            await engine._runner
+
+        asyncio.run(generate())
+
+        assert engine.is_idle
+
+    def test_submit_raises_error_when_max_seq_len_is_too_small(self) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(soft_max_seq_len=(0, 2), min_seq_len=4)
+
+        engine = Seq2SeqGenerationEngine(model, VOCAB_INFO, None, opts)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The effective maximum sequence length must be greater than or equal to `min_seq_len` \(4\), but is 2 instead\. Adjust your soft and hard maximum sequence length limits\.$",
+        ):
+            engine.submit(self.to_tensor(self.sources[0]))
+
+    def test_init_raises_error_when_compaction_interval_is_specified(self) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(compaction_interval=3)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`opts.compaction_interval` is not supported by `Seq2SeqGenerationEngine`\.$",
+        ):
+            Seq2SeqGenerationEngine(model, VOCAB_INFO, None, opts)
+
+    def test_step_raises_error_when_states_do_not_support_extend(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_nllb_model()
+
+        monkeypatch.setattr(IncrementalStateBag, "supports_extend", lambda self: False)
+
+        engine = Seq2SeqGenerationEngine(model, VOCAB_INFO, None)
+
+        engine.submit(self.to_tensor(self.sources[0]))
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The incremental states of `model` must support `extend\(\)` for continuous batching",
+        ):
+            engine.step()
+
+    @staticmethod
+    def generate(
+        generator: Seq2SeqGenerator, model: EncoderDecoderModel, source: List[int]
+    ) -> List[Hypothesis]:
+        source_seqs = torch.tensor([source], device=device)
+
+        with torch.inference_mode():
+            encoder_output, encoder_padding_mask = model.encode(source_seqs, None)
+
+            output = generator(encoder_output, encoder_padding_mask, len(source))
+
+        return output.results[0]
+
+    @staticmethod
+    def assert_hypotheses_equal(
+        hypotheses: List[Hypothesis], expected_hypotheses: List[Hypothesis]
+    ) -> None:
+        assert len(hypotheses) == len(expected_hypotheses)
+
+        for hypothesis, expected_hypothesis in zip(hypotheses, expected_hypotheses):
+            assert_equal(hypothesis.seq, expected_hypothesis.seq)
+
+            assert_close(hypothesis.score, expected_hypothesis.score)
+
+            assert_close(hypothesis.step_scores, expected_hypothesis.step_scores)
+
+    @staticmethod
+    def to_tensor(source: List[int]) -> Tensor:
+        return torch.tensor(source, device=device)
@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+import pytest
+import torch
+
+from fairseq2.generation.logits_processor import BannedSequenceLogitsProcessor
+from tests.common import assert_equal, device
+
+
+class TestBannedSequenceLogitsProcessor:
+    banned_seqs = [[5], [6, 7], [6, 8], [9, 6, 7, 4], [7, 6, 7], [4, 4, 4]]
+
+    @pytest.mark.parametrize("seq_len", [1, 2, 3, 6])
+    def test_call_works(self, seq_len: int) -> None:
+        processor = BannedSequenceLogitsProcessor(
+            [torch.tensor(s, device=device) for s in self.banned_seqs],
+            pad_idx=0,
+            device=device,
+        )
+
+        torch.manual_seed(0)
+
+        seqs = torch.randint(4, 10, (4, 16, seq_len), device=device)
+
+        lprobs = torch.randn((4, 16, 12), device=device)
+
+        expected_lprobs = lprobs.clone()
+
+        processor(seqs, lprobs)
+
+        for i, beams in enumerate(seqs.tolist()):
+            for j, seq in enumerate(beams):
+                for token in self.banned_tokens(seq):
+                    expected_lprobs[i, j, token] = -torch.inf
+
+        assert_equal(lprobs, expected_lprobs)
+
+    def test_call_works_when_banned_seqs_are_many(self) -> None:
+        generator = torch.Generator().manual_seed(0)
+
+        # Draw from a small vocabulary so that many prefixes share their last
+        # steps.
+        banned_seqs = [
+            torch.randint(4, 20, (int(torch.randint(1, 6, ())),), generator=generator)
+            for _ in range(25_000)
+        ]
+
+        processor = BannedSequenceLogitsProcessor(
+            [s.to(device) for s in banned_seqs], pad_idx=0, device=device
+        )
+
+        seqs = torch.randint(4, 20, (4, 8, 7), generator=generator).to(device)
+
+        lprobs = torch.randn((4, 8, 24), generator=generator).to(device)
+
+        expected_lprobs = lprobs.clone()
+
+        processor(seqs, lprobs)
+
+        next_tokens: Dict[Tuple[int, ...], Set[int]] = defaultdict(set)
+
+        for banned_seq in banned_seqs:
+            *prefix, token = banned_seq.tolist()
+
+            next_tokens[tuple(prefix)].add(token)
+
+        for i, beams in enumerate(seqs.tolist()):
+            for j, seq in enumerate(beams):
+                for prefix_len in range(5):
+                    suffix = tuple(seq[len(seq) - prefix_len :])
+
+                    for token in next_tokens.get(suffix, set()):
+                        expected_lprobs[i, j, token] = -torch.inf
+
+        assert_equal(lprobs, expected_lprobs)
+
+    def banned_tokens(self, seq: List[int]) -> List[int]:
+        tokens = []
+
+        for banned_seq in self.banned_seqs:
+            *prefix, token = banned_seq
+
+            if len(prefix) == 0 or seq[-len(prefix) :] == prefix:
+                tokens.append(token)
+
+        return tokens
+
+    def test_init_raises_error_when_banned_seqs_is_empty(self) -> None:
+        with pytest.raises(
+            ValueError, match=r"^`banned_seqs` should contain at least one element\.$"
+        ):
+            BannedSequenceLogitsProcessor([], pad_idx=0, device=device)
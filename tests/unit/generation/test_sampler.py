@@ -0,0 +1,113 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Any, Dict, List
+
+import pytest
+import torch
+
+from fairseq2.generation import StandardSampler
+from tests.common import assert_equal, device
+
+
+class TestStandardSampler:
+    probs = [[0.1, 0.2, 0.3, 0.4], [0.5, 0.05, 0.05, 0.4]]
+
+    @pytest.mark.parametrize("kwargs", [{"top_k": 1}, {"top_p": 0.01}, {"min_p": 1.0}])
+    def test_call_works_when_filter_keeps_most_likely_entry(
+        self, kwargs: Dict[str, Any]
+    ) -> None:
+        sampler = StandardSampler(**kwargs)
+
+        lprobs = torch.tensor(self.probs, device=device).log()
+
+        indices = sampler(lprobs, num_samples=16)
+
+        assert_equal(indices, torch.tensor([[3], [0]], device=device).expand(-1, 16))
+
+    @pytest.mark.parametrize(
+        "kwargs,expected_probs",
+        [
+            ({}, [[0.1, 0.2, 0.3, 0.4], [0.5, 0.05, 0.05, 0.4]]),
+            ({"top_k": 2}, [[0.0, 0.0, 3 / 7, 4 / 7], [5 / 9, 0.0, 0.0, 4 / 9]]),
+            ({"top_p": 0.6}, [[0.0, 0.0, 3 / 7, 4 / 7], [5 / 9, 0.0, 0.0, 4 / 9]]),
+            ({"min_p": 0.6}, [[0.0, 0.0, 3 / 7, 4 / 7], [5 / 9, 0.0, 0.0, 4 / 9]]),
+        ],
+    )
+    @pytest.mark.parametrize("use_seeds", [False, True])
+    def test_call_works(
+        self,
+        kwargs: Dict[str, Any],
+        expected_probs: List[List[float]],
+        use_seeds: bool,
+    ) -> None:
+        sampler = StandardSampler(**kwargs)
+
+        lprobs = torch.tensor(self.probs, device=device).log()
+
+        num_samples = 20_000
+
+        if use_seeds:
+            seeds = torch.tensor([3, 4], device=device)
+        else:
+            seeds = None
+
+            torch.manual_seed(0)
+
+        indices = sampler(lprobs, num_samples, seeds=seeds)
+
+        freqs = torch.stack([torch.bincount(i, minlength=4) for i in indices])
+
+        expected_freqs = torch.tensor(expected_probs, device=device)
+
+        assert ((freqs / num_samples) - expected_freqs).abs().max() < 0.02
+
+    def test_call_works_when_seeds_are_specified(self) -> None:
+        sampler = StandardSampler(temperature=1.5)
+
+        lprobs = torch.randn((4, 64), device=device).log_softmax(dim=-1)
+
+        seeds = torch.tensor([0, 1, 2, 3], device=device)
+
+        indices1 = sampler(lprobs, num_samples=8, seeds=seeds)
+
+        # The samples of a sequence must not depend on its position in the
+        # batch or on the other sequences.
+        indices2 = sampler(lprobs[[2, 0]], num_samples=8, seeds=seeds[[2, 0]])
+
+        assert_equal(indices1[[2, 0]], indices2)
+
+        # Different seeds must produce different streams.
+        indices3 = sampler(lprobs, num_samples=8, seeds=seeds + 4)
+
+        assert not torch.equal(indices1, indices3)
+
+    def test_init_raises_error_when_temperature_is_invalid(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`temperature` must be greater than 0\.0, but is 0\.0 instead\.$",
+        ):
+            StandardSampler(temperature=0.0)
+
+    def test_init_raises_error_when_top_k_is_invalid(self) -> None:
+        with pytest.raises(
+            ValueError, match=r"^`top_k` must be greater than 0, but is 0 instead\.$"
+        ):
+            StandardSampler(top_k=0)
+
+    def test_init_raises_error_when_top_p_is_invalid(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`top_p` must be greater than 0\.0 and less than or equal to 1\.0, but is 1\.5 instead\.$",
+        ):
+            StandardSampler(top_p=1.5)
+
+    def test_init_raises_error_when_min_p_is_invalid(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`min_p` must be greater than or equal to 0\.0 and less than or equal to 1\.0, but is -0\.1 instead\.$",
+        ):
+            StandardSampler(min_p=-0.1)
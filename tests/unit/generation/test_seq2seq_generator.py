@@ -0,0 +1,206 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from dataclasses import replace
+from typing import Optional
+
+import pytest
+import torch
+
+from fairseq2.generation import (
+    SamplingSearch,
+    Seq2SeqGenerator,
+    SequenceGeneratorOptions,
+    SequenceGeneratorOutput,
+    StandardSampler,
+    sequence_generator,
+)
+from fairseq2.nn.padding import PaddingMask
+from tests.common import assert_close, assert_equal, device
+from tests.unit.generation.common import VOCAB_INFO, build_nllb_model
+
+
+class TestSeq2SeqGenerator:
+    @pytest.mark.parametrize("compaction_interval", [1, 3, 100])
+    @pytest.mark.parametrize("beam_size", [1, 3])
+    def test_call_works_when_compaction_interval_is_specified(
+        self, compaction_interval: int, beam_size: int
+    ) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(
+            beam_size=beam_size, soft_max_seq_len=(1, 5), hard_max_seq_len=16
+        )
+
+        prefix_seq = torch.tensor([2, 4], device=device)
+
+        source_seqs = torch.tensor(
+            [[5, 6, 7, 2], [8, 9, 2, 3], [10, 11, 12, 13], [14, 2, 3, 3]],
+            device=device,
+        )
+
+        source_padding_mask = PaddingMask(
+            torch.tensor([4, 3, 4, 2], device=device), batch_seq_len=4
+        )
+
+        with torch.inference_mode():
+            encoder_output, encoder_padding_mask = model.encode(
+                source_seqs, source_padding_mask
+            )
+
+        sync_free_opts = replace(opts, compaction_interval=compaction_interval)
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, prefix_seq, sync_free_opts)
+
+        output = generator(encoder_output, encoder_padding_mask, source_seq_len=4)
+
+        # Finished searches stay longer in the batch, but this must not change
+        # the generated hypotheses.
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, prefix_seq, opts)
+
+        expected_output = generator(
+            encoder_output, encoder_padding_mask, source_seq_len=4
+        )
+
+        self.assert_outputs_equal(output, expected_output)
+
+    @pytest.mark.parametrize("compaction_interval", [None, 3])
+    def test_call_works_when_encoder_output_is_not_shared(
+        self, compaction_interval: Optional[int], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_nllb_model()
+
+        assert sequence_generator._supports_shared_encoder_output(model)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=3,
+            soft_max_seq_len=(1, 5),
+            hard_max_seq_len=16,
+            compaction_interval=compaction_interval,
+        )
+
+        prefix_seq = torch.tensor([2, 4], device=device)
+
+        source_seqs = torch.tensor(
+            [[5, 6, 7, 2], [8, 9, 2, 3], [10, 11, 12, 13], [14, 2, 3, 3]],
+            device=device,
+        )
+
+        source_padding_mask = PaddingMask(
+            torch.tensor([4, 3, 4, 2], device=device), batch_seq_len=4
+        )
+
+        with torch.inference_mode():
+            encoder_output, encoder_padding_mask = model.encode(
+                source_seqs, source_padding_mask
+            )
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, prefix_seq, opts)
+
+        output = generator(encoder_output, encoder_padding_mask, source_seq_len=4)
+
+        # Fall back to fanning out the encoder output to every beam.
+        monkeypatch.setattr(
+            sequence_generator, "_supports_shared_encoder_output", lambda _: False
+        )
+
+        expected_output = generator(
+            encoder_output, encoder_padding_mask, source_seq_len=4
+        )
+
+        self.assert_outputs_equal(output, expected_output)
+
+    @pytest.mark.parametrize("compaction_interval", [None, 3])
+    def test_call_works_when_seeds_are_specified(
+        self, compaction_interval: Optional[int]
+    ) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(
+            beam_size=2,
+            soft_max_seq_len=(1, 5),
+            hard_max_seq_len=16,
+            search=SamplingSearch(StandardSampler(temperature=1.5)),
+            compaction_interval=compaction_interval,
+        )
+
+        source_seqs = torch.tensor(
+            [[5, 6, 7, 2], [8, 9, 2, 3], [10, 11, 12, 13], [14, 2, 3, 3]],
+            device=device,
+        )
+
+        source_padding_mask = PaddingMask(
+            torch.tensor([4, 3, 4, 2], device=device), batch_seq_len=4
+        )
+
+        with torch.inference_mode():
+            encoder_output, encoder_padding_mask = model.encode(
+                source_seqs, source_padding_mask
+            )
+
+        seeds = torch.tensor([5, 6, 7, 8], device=device)
+
+        generator = Seq2SeqGenerator(model, VOCAB_INFO, None, opts)
+
+        torch.manual_seed(0)
+
+        output = generator(
+            encoder_output, encoder_padding_mask, source_seq_len=4, seeds=seeds
+        )
+
+        # The samples of a source sequence must depend only on its seed, not on
+        # its position in the batch or on the default generator of PyTorch.
+        order = torch.tensor([2, 0, 3, 1], device=device)
+
+        assert encoder_padding_mask is not None
+
+        reordered_encoder_padding_mask = PaddingMask(
+            encoder_padding_mask.seq_lens[order], batch_seq_len=encoder_output.size(1)
+        )
+
+        torch.manual_seed(1)
+
+        reordered_output = generator(
+            encoder_output[order],
+            reordered_encoder_padding_mask,
+            source_seq_len=4,
+            seeds=seeds[order],
+        )
+
+        expected_output = replace(
+            output, results=[output.results[i] for i in order.tolist()]
+        )
+
+        self.assert_outputs_equal(reordered_output, expected_output)
+
+    def test_init_raises_error_when_compaction_interval_is_invalid(self) -> None:
+        model = build_nllb_model()
+
+        opts = SequenceGeneratorOptions(compaction_interval=0)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`opts.compaction_interval` must be greater than 0, but is 0 instead\.$",
+        ):
+            Seq2SeqGenerator(model, VOCAB_INFO, None, opts)
+
+    @staticmethod
+    def assert_outputs_equal(
+        output: SequenceGeneratorOutput, expected_output: SequenceGeneratorOutput
+    ) -> None:
+        assert len(output.results) == len(expected_output.results)
+
+        for hypotheses, expected_hypotheses in zip(
+            output.results, expected_output.results
+        ):
+            assert len(hypotheses) == len(expected_hypotheses)
+
+            for hypothesis, expected_hypothesis in zip(hypotheses, expected_hypotheses):
+                assert_equal(hypothesis.seq, expected_hypothesis.seq)
+
+                assert_close(hypothesis.score, expected_hypothesis.score)
+
+                assert_close(hypothesis.step_scores, expected_hypothesis.step_scores)
@@ -0,0 +1,314 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Any, List, Optional, Tuple
+
+import pytest
+import torch
+from torch import Tensor
+
+from fairseq2.generation import (
+    DecoderOnlyGenerator,
+    Hypothesis,
+    SamplingSearch,
+    Seq2SeqGenerator,
+    SequenceGeneratorOptions,
+    SpeculativeDecoderOnlyGenerator,
+    SpeculativeSeq2SeqGenerator,
+    StandardSampler,
+)
+from fairseq2.nn.incremental_state import IncrementalStateBag
+from fairseq2.nn.padding import PaddingMask
+from tests.common import assert_close, assert_equal, device
+from tests.unit.generation.common import VOCAB_INFO, build_llama_model, build_nllb_model
+
+
+class TestSpeculativeSeq2SeqGenerator:
+    @pytest.mark.parametrize("draft_seed", [0, 1])
+    @pytest.mark.parametrize("prefix_seq", [None, [2, 4]])
+    def test_call_works(self, draft_seed: int, prefix_seq: List[int]) -> None:
+        model = build_nllb_model(seed=0)
+
+        # With the same seed, the draft model is identical to the model, and
+        # all draft steps get accepted.
+        draft_model = build_nllb_model(seed=draft_seed)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1, soft_max_seq_len=(1, 6), hard_max_seq_len=16
+        )
+
+        prefix = None if prefix_seq is None else torch.tensor(prefix_seq, device=device)
+
+        source_seqs = torch.tensor(
+            [[5, 6, 7, 2], [8, 9, 2, 3], [10, 11, 12, 13]], device=device
+        )
+
+        source_padding_mask = PaddingMask(
+            torch.tensor([4, 3, 4], device=device), batch_seq_len=4
+        )
+
+        with torch.inference_mode():
+            encoder_output, encoder_padding_mask = model.encode(
+                source_seqs, source_padding_mask
+            )
+
+            draft_encoder_output, draft_encoder_padding_mask = draft_model.encode(
+                source_seqs, source_padding_mask
+            )
+
+        generator = SpeculativeSeq2SeqGenerator(
+            model, draft_model, VOCAB_INFO, prefix, opts, num_draft_steps=3
+        )
+
+        output = generator(
+            encoder_output,
+            encoder_padding_mask,
+            draft_encoder_output,
+            draft_encoder_padding_mask,
+            source_seq_len=4,
+        )
+
+        expected_output = Seq2SeqGenerator(model, VOCAB_INFO, prefix, opts)(
+            encoder_output, encoder_padding_mask, source_seq_len=4
+        )
+
+        assert len(output.results) == len(expected_output.results)
+
+        for hypotheses, expected_hypotheses in zip(
+            output.results, expected_output.results
+        ):
+            assert_hypotheses_equal(hypotheses, expected_hypotheses)
+
+    def test_init_raises_error_when_beam_size_is_not_1(self) -> None:
+        model = build_nllb_model(seed=0)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`opts.beam_size` must be 1 for speculative decoding, but is 5 instead\.$",
+        ):
+            SpeculativeSeq2SeqGenerator(
+                model, model, VOCAB_INFO, None, SequenceGeneratorOptions()
+            )
+
+
+class TestSpeculativeDecoderOnlyGenerator:
+    prompts = [[1, 5, 6, 7, 8], [1, 9], [1, 10, 11]]
+
+    @pytest.mark.parametrize("draft_seed", [2, 3])
+    def test_call_works(self, draft_seed: int) -> None:
+        model = build_llama_model(seed=2)
+
+        draft_model = build_llama_model(seed=draft_seed)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1, soft_max_seq_len=None, hard_max_seq_len=14
+        )
+
+        seqs, padding_mask = self.build_batch()
+
+        generator = SpeculativeDecoderOnlyGenerator(
+            model, draft_model, VOCAB_INFO, opts, num_draft_steps=4
+        )
+
+        output = generator(seqs, padding_mask)
+
+        expected_output = DecoderOnlyGenerator(model, VOCAB_INFO, opts)(
+            seqs, padding_mask
+        )
+
+        assert len(output.results) == len(expected_output.results)
+
+        for hypotheses, expected_hypotheses in zip(
+            output.results, expected_output.results
+        ):
+            assert_hypotheses_equal(hypotheses, expected_hypotheses)
+
+    def test_call_works_when_search_is_sampling(self) -> None:
+        model = build_llama_model(seed=2)
+
+        draft_model = build_llama_model(seed=3)
+
+        sampler = StandardSampler(temperature=2.0)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1,
+            soft_max_seq_len=None,
+            hard_max_seq_len=4,
+            search=SamplingSearch(sampler),
+        )
+
+        num_samples = 4000
+
+        prompt = torch.tensor([[1, 5]], device=device)
+
+        generator = SpeculativeDecoderOnlyGenerator(
+            model, draft_model, VOCAB_INFO, opts, num_draft_steps=1
+        )
+
+        torch.manual_seed(0)
+
+        output = generator(prompt.expand(num_samples, -1), None)
+
+        seqs, _ = output.collate()
+
+        # The generated step must follow the distribution of the
+        # model, not the one of the draft model.
+        with torch.inference_mode():
+            decoder_output, _ = model.decode(prompt, None)
+
+            logits = model.project(decoder_output, None).logits
+
+            lprobs = torch.log_softmax(logits[:, -1].float(), dim=-1)
+
+            lprobs[:, VOCAB_INFO.pad_idx] = -torch.inf
+
+            expected_probs = sampler.probs(lprobs).squeeze(0)
+
+        freqs = torch.bincount(seqs[:, 2], minlength=VOCAB_INFO.size) / num_samples
+
+        assert (freqs - expected_probs).abs().max() < 0.03
+
+    def test_call_advances_each_sequence_independently(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_llama_model(seed=2)
+
+        # A draft model that mostly, but not always, agrees with the model.
+        draft_model = build_llama_model(seed=2)
+
+        torch.manual_seed(0)
+
+        with torch.no_grad():
+            for param in draft_model.parameters():
+                param.add_(torch.randn_like(param) * 0.05)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1, soft_max_seq_len=None, hard_max_seq_len=64
+        )
+
+        generator = SpeculativeDecoderOnlyGenerator(
+            model, draft_model, VOCAB_INFO, opts, num_draft_steps=4
+        )
+
+        num_calls = 0
+
+        decode = model.decode
+
+        def count_decode(*args: Any, **kwargs: Any) -> Any:
+            nonlocal num_calls
+
+            num_calls += 1
+
+            return decode(*args, **kwargs)
+
+        monkeypatch.setattr(model, "decode", count_decode)
+
+        def generate(prompts: List[List[int]]) -> int:
+            nonlocal num_calls
+
+            num_calls = 0
+
+            seqs, padding_mask = self.build_batch(prompts)
+
+            generator(seqs, padding_mask)
+
+            return num_calls
+
+        max_num_calls = max(generate([prompt]) for prompt in self.prompts)
+
+        # If the batch advanced by its shortest accepted draft, it would need
+        # far more rounds than its slowest sequence. Only the last rounds of the
+        # sequence closest to the maximum length shorten the drafts of others.
+        assert generate(self.prompts) <= max_num_calls + 4
+
+    def test_call_works_when_sampler_has_generator(self) -> None:
+        model = build_llama_model(seed=2)
+
+        draft_model = build_llama_model(seed=3)
+
+        generator = torch.Generator(device)
+
+        opts = SequenceGeneratorOptions(
+            beam_size=1,
+            soft_max_seq_len=None,
+            hard_max_seq_len=14,
+            search=SamplingSearch(StandardSampler(generator=generator)),
+        )
+
+        seqs, padding_mask = self.build_batch()
+
+        speculative_generator = SpeculativeDecoderOnlyGenerator(
+            model, draft_model, VOCAB_INFO, opts, num_draft_steps=4
+        )
+
+        def generate() -> Tensor:
+            output = speculative_generator(seqs, padding_mask)
+
+            return output.collate()[0]
+
+        generator.manual_seed(0)
+
+        torch.manual_seed(1)
+
+        expected_seqs = generate()
+
+        generator.manual_seed(0)
+
+        # The acceptance of the draft steps must not depend on the default
+        # generator of PyTorch.
+        torch.manual_seed(2)
+
+        assert_equal(generate(), expected_seqs)
+
+    def test_call_raises_error_when_states_do_not_support_truncate(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        model = build_llama_model(seed=2)
+
+        monkeypatch.setattr(
+            IncrementalStateBag, "supports_truncate", lambda self: False
+        )
+
+        seqs, padding_mask = self.build_batch()
+
+        generator = SpeculativeDecoderOnlyGenerator(model, model, VOCAB_INFO)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^The incremental states of `decoder` and `draft_decoder` must support `truncate\(\)` for speculative decoding",
+        ):
+            generator(seqs, padding_mask)
+
+    def build_batch(
+        self, prompts: Optional[List[List[int]]] = None
+    ) -> Tuple[Tensor, PaddingMask]:
+        if prompts is None:
+            prompts = self.prompts
+
+        max_len = max(len(p) for p in prompts)
+
+        pad_idx = 3
+
+        rows = [p + [pad_idx] * (max_len - len(p)) for p in prompts]
+
+        seqs = torch.tensor(rows, device=device)
+
+        seq_lens = torch.tensor([len(p) for p in prompts], device=device)
+
+        return seqs, PaddingMask(seq_lens, batch_seq_len=max_len)
+
+
+def assert_hypotheses_equal(
+    hypotheses: List[Hypothesis], expected_hypotheses: List[Hypothesis]
+) -> None:
+    assert len(hypotheses) == len(expected_hypotheses)
+
+    for hypothesis, expected_hypothesis in zip(hypotheses, expected_hypotheses):
+        assert_equal(hypothesis.seq, expected_hypothesis.seq)
+
+        assert_close(hypothesis.score, expected_hypothesis.score)
+
+        assert_close(hypothesis.step_scores, expected_hypothesis.step_scores)
@@ -0,0 +1,178 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from functools import partial
+from typing import List, Optional
+
+import pytest
+import torch
+
+from fairseq2.models.conformer import ConformerConvolution
+from fairseq2.models.llama import LLaMAConfig, create_llama_model
+from fairseq2.models.nllb import NllbConfig, create_nllb_model
+from fairseq2.models.wav2vec2 import Wav2Vec2FeatureExtractor, Wav2Vec2PositionEncoder
+from fairseq2.nn.padding import PackedPaddingMask, pack_seqs, pad_seqs, unpack_seqs
+from fairseq2.nn.transformer import SDPAFactory, TiledSDPA, sdpa
+from tests.common import device
+
+SEQS = [[5, 6, 7, 8, 2], [9, 2], [10, 11, 12, 2], [13, 14, 15, 16, 17, 18, 2]]
+
+
+@pytest.mark.parametrize(
+    "sdpa_factory", [None, partial(TiledSDPA, query_block_size=2, key_block_size=3)]
+)
+def test_encoder_decoder_works_with_packed_batch(
+    sdpa_factory: Optional[SDPAFactory],
+) -> None:
+    config = NllbConfig(
+        model_dim=32,
+        max_seq_len=64,
+        vocabulary_size=32,
+        pad_idx=1,
+        num_encoder_layers=2,
+        num_decoder_layers=2,
+        num_encoder_attn_heads=4,
+        num_decoder_attn_heads=4,
+        ffn_inner_dim=64,
+        dropout_p=0.0,
+    )
+
+    torch.manual_seed(0)
+
+    with sdpa(sdpa_factory):
+        model = create_nllb_model(config, device=device).eval()
+
+    seqs = [torch.tensor(s, device=device) for s in SEQS]
+
+    # Use the reversed sequences as the target to pair sequences of different
+    # lengths.
+    target_seqs = seqs[::-1]
+
+    with torch.inference_mode():
+        # Padded reference.
+        padded_seqs, padding_mask = pad_seqs(seqs, pad_idx=1)
+
+        padded_target_seqs, target_padding_mask = pad_seqs(target_seqs, pad_idx=1)
+
+        encoder_output, encoder_padding_mask = model.encode(padded_seqs, padding_mask)
+
+        decoder_output, _ = model.decode(
+            padded_target_seqs,
+            target_padding_mask,
+            encoder_output,
+            encoder_padding_mask,
+        )
+
+        # Packed.
+        packed_seqs, packed_padding_mask = pack_seqs(seqs)
+
+        packed_target_seqs, packed_target_padding_mask = pack_seqs(target_seqs)
+
+        packed_encoder_output, packed_encoder_padding_mask = model.encode(
+            packed_seqs, packed_padding_mask
+        )
+
+        packed_decoder_output, _ = model.decode(
+            packed_target_seqs,
+            packed_target_padding_mask,
+            packed_encoder_output,
+            packed_encoder_padding_mask,
+        )
+
+    assert packed_encoder_padding_mask is packed_padding_mask
+
+    assert_unpacked_close(
+        unpack_seqs(packed_encoder_output, packed_padding_mask),
+        encoder_output,
+        [len(s) for s in seqs],
+    )
+
+    assert_unpacked_close(
+        unpack_seqs(packed_decoder_output, packed_target_padding_mask),
+        decoder_output,
+        [len(s) for s in target_seqs],
+    )
+
+
+@pytest.mark.parametrize(
+    "sdpa_factory", [None, partial(TiledSDPA, query_block_size=2, key_block_size=3)]
+)
+def test_decoder_works_with_packed_batch(sdpa_factory: Optional[SDPAFactory]) -> None:
+    config = LLaMAConfig(
+        model_dim=32,
+        max_seq_len=64,
+        vocabulary_size=32,
+        num_layers=2,
+        num_attn_heads=4,
+        num_key_value_heads=2,
+        ffn_inner_dim=64,
+        ffn_inner_dim_to_multiple=8,
+        dropout_p=0.0,
+        norm_eps=1e-5,
+    )
+
+    torch.manual_seed(0)
+
+    with sdpa(sdpa_factory):
+        model = create_llama_model(config, device=device).eval()
+
+    seqs = [torch.tensor(s, device=device) for s in SEQS]
+
+    with torch.inference_mode():
+        padded_seqs, padding_mask = pad_seqs(seqs, pad_idx=1)
+
+        decoder_output, _ = model.decode(padded_seqs, padding_mask)
+
+        packed_seqs, packed_padding_mask = pack_seqs(seqs)
+
+        packed_decoder_output, _ = model.decode(packed_seqs, packed_padding_mask)
+
+    assert_unpacked_close(
+        unpack_seqs(packed_decoder_output, packed_padding_mask),
+        decoder_output,
+        [len(s) for s in seqs],
+    )
+
+
+def test_modules_that_mix_sequences_raise_error_with_packed_batch() -> None:
+    padding_mask = PackedPaddingMask([2, 3], device=device)
+
+    seqs = torch.ones((1, 5, 8), device=device)
+
+    pos_encoder = Wav2Vec2PositionEncoder(8, kernel_size=3, num_groups=2, device=device)
+
+    with pytest.raises(
+        ValueError,
+        match=r"^`padding_mask` must not be a `PackedPaddingMask` since `Wav2Vec2PositionEncoder` does not support packed batches\.$",
+    ):
+        pos_encoder(seqs, padding_mask)
+
+    conv = ConformerConvolution(8, depthwise_kernel_size=3, device=device)
+
+    with pytest.raises(
+        ValueError,
+        match=r"^`padding_mask` must not be a `PackedPaddingMask` since `ConformerConvolution` does not support packed batches\.$",
+    ):
+        conv(seqs, padding_mask)
+
+    feature_extractor = Wav2Vec2FeatureExtractor([(8, 3, 1)], bias=False, device=device)
+
+    with pytest.raises(
+        ValueError,
+        match=r"^`padding_mask` must not be a `PackedPaddingMask` since `Wav2Vec2FeatureExtractor` does not support packed batches\.$",
+    ):
+        feature_extractor(torch.ones((1, 5), device=device), padding_mask)
+
+
+def assert_unpacked_close(
+    unpacked_seqs: List[torch.Tensor], padded_seqs: torch.Tensor, seq_lens: List[int]
+) -> None:
+    assert len(unpacked_seqs) == len(seq_lens)
+
+    for idx, (unpacked_seq, seq_len) in enumerate(zip(unpacked_seqs, seq_lens)):
+        assert unpacked_seq.size(0) == seq_len
+
+        assert (unpacked_seq - padded_seqs[idx, :seq_len]).abs().max() < 1e-5
@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from dataclasses import replace
+from typing import Dict
+
+import torch
+from torch import Tensor
+
+from fairseq2.models.llama import LLaMAConfig, create_llama_model, load_llama_model
+from fairseq2.models.nllb import NllbConfig, create_nllb_model
+from fairseq2.models.utils.checkpoint_loader import fuse_qkv_projections
+from fairseq2.nn.padding import pad_seqs
+from tests.common import assert_close, assert_equal, device
+
+
+class TestFuseQkvProjections:
+    def test_call_works(self) -> None:
+        config = NllbConfig(
+            model_dim=32,
+            max_seq_len=64,
+            vocabulary_size=32,
+            pad_idx=1,
+            num_encoder_layers=1,
+            num_decoder_layers=1,
+            num_encoder_attn_heads=4,
+            num_decoder_attn_heads=4,
+            ffn_inner_dim=64,
+            dropout_p=0.0,
+        )
+
+        model = create_nllb_model(config, device=device).eval()
+
+        fused_model = create_nllb_model(
+            replace(config, fuse_qkv=True), device=device
+        ).eval()
+
+        state_dict = fuse_qkv_projections(model.state_dict())
+
+        assert state_dict.keys() == fused_model.state_dict().keys()
+
+        # Already packed entries must be left as is.
+        assert fuse_qkv_projections(state_dict).keys() == state_dict.keys()
+
+        fused_model.load_state_dict(state_dict)
+
+        seqs, padding_mask = pad_seqs(
+            [torch.tensor(s, device=device) for s in [[5, 6, 7, 2], [8, 2]]],
+            pad_idx=1,
+        )
+
+        with torch.inference_mode():
+            output1, _ = model.decode(
+                seqs, padding_mask, *model.encode(seqs, padding_mask)
+            )
+
+            output2, _ = fused_model.decode(
+                seqs, padding_mask, *fused_model.encode(seqs, padding_mask)
+            )
+
+        assert_close(output1, output2)
+
+    def test_loader_converts_checkpoint_when_qkv_is_fused(self) -> None:
+        config = LLaMAConfig(
+            model_dim=32,
+            max_seq_len=64,
+            vocabulary_size=32,
+            num_layers=2,
+            num_attn_heads=4,
+            num_key_value_heads=2,
+            ffn_inner_dim=64,
+            ffn_inner_dim_to_multiple=8,
+            dropout_p=0.0,
+            norm_eps=1e-5,
+            fuse_qkv=True,
+        )
+
+        model = create_llama_model(config, device=device)
+
+        checkpoint: Dict[str, Tensor] = {}
+
+        # Use the layout of the reference LLaMA implementation.
+        for layer_idx, layer in enumerate(model.decoder.layers):
+            weight = layer.self_attn.qkv_proj.weight
+
+            for name, w in zip(["wq", "wk", "wv"], weight.split([32, 16, 16])):
+                checkpoint[f"layers.{layer_idx}.attention.{name}.weight"] = w
+
+        converted_checkpoint = load_llama_model._convert_checkpoint(checkpoint, config)
+
+        state_dict = converted_checkpoint["model"]
+
+        for layer_idx, layer in enumerate(model.decoder.layers):
+            key = f"decoder.layers.{layer_idx}.self_attn.qkv_proj.weight"
+
+            assert_equal(state_dict[key], layer.self_attn.qkv_proj.weight)
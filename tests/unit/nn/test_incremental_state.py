@@ -0,0 +1,67 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+from torch import Tensor
+from torch.nn import Module
+
+from fairseq2.nn.incremental_state import IncrementalState, IncrementalStateBag
+from fairseq2.nn.transformer import FullAttentionState
+from tests.common import device
+
+
+class MinimalState(IncrementalState):
+    """Implements only the abstract methods of :class:`IncrementalState`."""
+
+    def reorder(self, new_order: Tensor) -> None:
+        pass
+
+
+class TestIncrementalState:
+    def test_extend_raises_error_when_not_overridden(self) -> None:
+        state = MinimalState()
+
+        with pytest.raises(
+            ValueError, match=r"^`extend\(\)` on `MinimalState` is not supported\.$"
+        ):
+            state.extend(MinimalState())
+
+    def test_truncate_raises_error_when_not_overridden(self) -> None:
+        state = MinimalState()
+
+        with pytest.raises(
+            ValueError, match=r"^`truncate\(\)` on `MinimalState` is not supported\.$"
+        ):
+            state.truncate(1)
+
+
+class TestIncrementalStateBag:
+    def test_supports_extend_works(self) -> None:
+        bag = IncrementalStateBag(max_num_steps=4)
+
+        k = torch.zeros((2, 1, 1, 4), device=device)
+
+        bag.set_state(Module(), FullAttentionState(k, k, max_seq_len=4))
+
+        assert bag.supports_extend()
+
+        bag.set_state(Module(), MinimalState())
+
+        assert not bag.supports_extend()
+
+    def test_supports_truncate_works(self) -> None:
+        bag = IncrementalStateBag(max_num_steps=4)
+
+        k = torch.zeros((2, 1, 1, 4), device=device)
+
+        bag.set_state(Module(), FullAttentionState(k, k, max_seq_len=4))
+
+        assert bag.supports_truncate()
+
+        bag.set_state(Module(), MinimalState())
+
+        assert not bag.supports_truncate()
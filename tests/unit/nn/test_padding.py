@@ -6,7 +6,7 @@
 
 import torch
 
-from fairseq2.nn.padding import to_padding_mask
+from fairseq2.nn.padding import pack_seqs, to_padding_mask, unpack_seqs
 from tests.common import assert_equal, device
 
 
@@ -30,3 +30,35 @@ def test_to_padding_mask_works() -> None:
     assert mask is not None
 
     assert_equal(mask, expected_mask)
+
+
+def test_pack_seqs_works() -> None:
+    seqs = [
+        torch.tensor([1, 2, 3], device=device),
+        torch.tensor([4], device=device),
+        torch.tensor([5, 6], device=device),
+    ]
+
+    packed_seqs, padding_mask = pack_seqs(seqs)
+
+    assert_equal(packed_seqs, torch.tensor([[1, 2, 3, 4, 5, 6]], device=device))
+
+    assert padding_mask.packed_seq_offsets == [0, 3, 4, 6]
+
+    # A packed batch has no padding.
+    assert_equal(padding_mask.materialize(), torch.ones((1, 6), device=device).bool())
+
+    assert_equal(
+        padding_mask.seq_ids(), torch.tensor([0, 0, 0, 1, 2, 2], device=device)
+    )
+
+    assert_equal(
+        padding_mask.positions(), torch.tensor([0, 1, 2, 0, 0, 1], device=device)
+    )
+
+    unpacked_seqs = unpack_seqs(packed_seqs, padding_mask)
+
+    assert len(unpacked_seqs) == len(seqs)
+
+    for unpacked_seq, seq in zip(unpacked_seqs, seqs):
+        assert_equal(unpacked_seq, seq)
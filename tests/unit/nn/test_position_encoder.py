@@ -144,16 +144,16 @@ class TestSinusoidalPositionEncoder:
 
         assert_close(y - x, m.freqs[step : step + seq_len].expand_as(y))
 
-    def test_forward_raises_error_when_seq_len_is_out_of_range(self) -> None:
+    def test_forward_works_when_seq_len_is_greater_than_max_seq_len(self) -> None:
         m = SinusoidalPositionEncoder(encoding_dim=32, max_seq_len=3, device=device)
 
         x = torch.randn((1, 5, 32), device=device)
 
-        with pytest.raises(
-            ValueError,
-            match=r"^The input sequence length must be less than or equal to the maximum sequence length \(3\), but is 5 instead\.$",
-        ):
-            m(x, padding_mask=None)
+        y = m(x, padding_mask=None)
+
+        assert m.freqs.size(0) == 6
+
+        assert_close(y - x, self.expected_freqs()[:5].expand_as(y))
 
     def test_forward_works_when_state_bag_is_not_none_in_training(self) -> None:
         m = SinusoidalPositionEncoder(encoding_dim=32, max_seq_len=3, device=device)
@@ -306,16 +306,79 @@ class TestRotaryEncoder:
 
         assert_close(y1, y2[:, step:])
 
-    def test_forward_raises_error_when_seq_len_is_out_of_range(self) -> None:
+    def test_forward_matches_complex_rotation(self) -> None:
+        m = RotaryEncoder(encoding_dim=32, max_seq_len=10, device=device)
+
+        x = torch.randn((2, 4, 10, 32), device=device)
+
+        y = m(x, padding_mask=None)
+
+        assert_close(y, rotate(x, start_step=0))
+
+    def test_forward_works_when_seq_len_is_greater_than_max_seq_len(self) -> None:
         m = RotaryEncoder(encoding_dim=32, max_seq_len=3, device=device)
 
-        x = torch.randn((1, 5, 32), device=device)
+        m.eval()
 
-        with pytest.raises(
-            ValueError,
-            match=r"^The input sequence length must be less than or equal to the maximum sequence length \(3\), but is 5 instead\.$",
-        ):
-            m(x, padding_mask=None)
+        x = torch.randn((2, 5, 32), device=device)
+
+        y = m(x, padding_mask=None)
+
+        assert m.freqs.size(0) == 6
+
+        assert_close(y, rotate(x, start_step=0))
+
+        # In incremental decoding, the table must cover the state bag at once.
+        state_bag = IncrementalStateBag(max_num_steps=40)
+        state_bag.increment_step(delta=20)
+
+        y = m(x, padding_mask=None, state_bag=state_bag)
+
+        assert m.freqs.size(0) == 40
+
+        assert_close(y, rotate(x, start_step=20))
+
+    @pytest.mark.parametrize("dtype", [torch.float16, torch.bfloat16])
+    def test_forward_works_when_dtype_is_half(self, dtype: torch.dtype) -> None:
+        m = RotaryEncoder(encoding_dim=32, max_seq_len=10, device=device)
+
+        x = torch.randn((2, 10, 32), device=device)
+
+        y = m(x.to(dtype), padding_mask=None)
+
+        assert y.dtype == dtype
+
+        assert (y.float() - rotate(x, start_step=0)).abs().max() < 0.05
+
+    @pytest.mark.parametrize("scaling", ["linear", "ntk"])
+    def test_forward_works_when_scale_factor_is_specified(self, scaling: str) -> None:
+        m1 = RotaryEncoder(encoding_dim=32, max_seq_len=8, device=device)
+
+        m2 = RotaryEncoder(
+            encoding_dim=32,
+            max_seq_len=8,
+            scale_factor=4.0,
+            scaling=scaling,  # type: ignore[arg-type]
+            device=device,
+        )
+
+        x = torch.randn((1, 8, 32), device=device)
+
+        y1 = m1(x, padding_mask=None)
+        y2 = m2(x, padding_mask=None)
+
+        # The first position is never rotated.
+        assert_close(y1[:, 0], y2[:, 0])
+
+        if scaling == "linear":
+            # The rotation of step 4 with a scale factor of 4 must be identical
+            # to the rotation of step 1 without scaling.
+            y1 = m1(x[:, 3:5], padding_mask=None)
+
+            assert_close(y1[:, 1], y2[:, 4])
+        else:
+            # NTK scaling keeps the highest frequency as is.
+            assert_close(y1[:, :, :2], y2[:, :, :2])
 
     def test_forward_works_when_state_bag_is_not_none_in_training(self) -> None:
         m = RotaryEncoder(encoding_dim=32, max_seq_len=3, device=device)
@@ -328,3 +391,20 @@ class TestRotaryEncoder:
         y = m(x, padding_mask=None, state_bag=state_bag)
 
         assert y.shape == (5, 2, 32)
+
+
+def rotate(x: Tensor, start_step: int) -> Tensor:
+    """Rotate ``x`` by using complex numbers as the reference implementation."""
+    dim = x.size(-1)
+
+    steps = torch.arange(start_step, start_step + x.size(-2), device=x.device)
+
+    indices = torch.arange(0, dim, step=2, device=x.device)
+
+    freqs = torch.outer(steps.float(), 1.0 / (10000.0 ** (indices.float() / dim)))
+
+    freqs = torch.polar(torch.ones_like(freqs), freqs)
+
+    complex_x = torch.view_as_complex(x.float().unflatten(-1, (-1, 2)))
+
+    return torch.view_as_real(complex_x * freqs).flatten(-2)
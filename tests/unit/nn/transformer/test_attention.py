@@ -4,14 +4,23 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Type
 
 import pytest
 import torch
 from torch import Tensor
 
+from fairseq2.nn.ops import repeat_interleave
 from fairseq2.nn.padding import PaddingMask
-from fairseq2.nn.transformer import CustomAttentionMask, NaiveSDPA, TorchSDPA
+from fairseq2.nn.transformer import (
+    SDPA,
+    AttentionMask,
+    CausalAttentionMask,
+    CustomAttentionMask,
+    NaiveSDPA,
+    TiledSDPA,
+    TorchSDPA,
+)
 from fairseq2.utils.version import is_pt2_or_greater
 from tests.common import assert_close, device, tmp_rng_seed
 
@@ -56,6 +65,198 @@ class TestScaledDotProductAttention:
 
         assert_close(attn1, attn2)
 
+    @pytest.mark.skipif(
+        not is_pt2_or_greater(), reason="requires PyTorch 2.0.0 or greater"
+    )
+    # fmt: off
+    @pytest.mark.parametrize("seq_len,key_len,mask_kind",
+        [
+            (4, 4, None),
+            (4, 4, "causal"),
+            (2, 5, "causal"),
+            (1, 5, "causal"),
+            (4, 5, "custom"),
+            (1, 5, "custom"),
+            (4, 5, "head"),
+            (1, 5, "head"),
+            (4, 5, "seq"),
+            (1, 5, "seq"),
+        ],
+    )
+    # fmt: on
+    @pytest.mark.parametrize("num_key_heads", [4, 2])
+    @pytest.mark.parametrize("use_key_padding_mask", [False, True])
+    def test_torch_sdpa_works_when_fused(
+        self,
+        seq_len: int,
+        key_len: int,
+        mask_kind: Optional[str],
+        num_key_heads: int,
+        use_key_padding_mask: bool,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        torch_sdpa = TorchSDPA()
+        naive_sdpa = NaiveSDPA()
+
+        q = torch.randn((2, 4, seq_len, 8), device=device)
+        k = torch.randn((2, num_key_heads, key_len, 8), device=device)
+        v = torch.randn((2, num_key_heads, key_len, 6), device=device)
+
+        if use_key_padding_mask:
+            key_padding_mask = PaddingMask(
+                torch.tensor([key_len - 2, key_len], device=device), key_len
+            )
+        else:
+            key_padding_mask = None
+
+        attn_mask: Optional[AttentionMask]
+
+        if mask_kind == "causal":
+            # During incremental decoding, the steps come after the past keys.
+            attn_mask = CausalAttentionMask(
+                seq_len, key_len, start_step=key_len - seq_len, device=device
+            )
+        elif mask_kind == "custom":
+            attn_mask = CustomAttentionMask(
+                torch.randn((seq_len, key_len), device=device)
+            )
+        elif mask_kind == "head":
+            attn_mask = CustomAttentionMask(
+                torch.randn((4, seq_len, key_len), device=device)
+            )
+        elif mask_kind == "seq":
+            attn_mask = CustomAttentionMask(
+                torch.randn((2, 1, seq_len, key_len), device=device)
+            )
+        else:
+            attn_mask = None
+
+        attn2, _ = naive_sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        # `TorchSDPA` uses the fused kernel of PyTorch only on CUDA; pretend to
+        # be on CUDA to test it on any device.
+        monkeypatch.setattr(Tensor, "is_cuda", property(lambda self: True))
+
+        attn1, _ = torch_sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        monkeypatch.undo()
+
+        assert_close(attn1, attn2)
+
+    @pytest.mark.skipif(
+        not is_pt2_or_greater(), reason="requires PyTorch 2.0.0 or greater"
+    )
+    @pytest.mark.parametrize("sdpa_cls", [TorchSDPA, NaiveSDPA])
+    @pytest.mark.parametrize("target_seq_len", [1, 2])
+    @pytest.mark.parametrize("attn_mask_heads", [None, 0, 4])
+    def test_sdpa_works_when_keys_have_fewer_heads(
+        self, sdpa_cls: Type[SDPA], target_seq_len: int, attn_mask_heads: Optional[int]
+    ) -> None:
+        sdpa = sdpa_cls()
+
+        sdpa.eval()
+
+        q = torch.randn((2, 4, target_seq_len, 2), device=device)
+        k = torch.randn((2, 2, 3, 2), device=device)
+        v = torch.randn((2, 2, 3, 3), device=device)
+
+        key_padding_mask = PaddingMask(torch.tensor([2, 3], device=device), 3)
+
+        if attn_mask_heads is None:
+            attn_mask = None
+        elif attn_mask_heads == 0:
+            attn_mask = CustomAttentionMask(
+                torch.randn((target_seq_len, 3), device=device)
+            )
+        else:
+            attn_mask = CustomAttentionMask(
+                torch.randn((attn_mask_heads, target_seq_len, 3), device=device)
+            )
+
+        attn1, _ = sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        # Each key/value head is shared by two consecutive query heads.
+        k = repeat_interleave(k, dim=1, repeat=2)
+        v = repeat_interleave(v, dim=1, repeat=2)
+
+        attn2, _ = sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        assert_close(attn1, attn2)
+
+    # fmt: off
+    @pytest.mark.parametrize("seq_len,key_len,mask_kind,num_key_heads",
+        [
+            (7,  7,  None,     4),
+            (7,  7,  "causal", 4),
+            (7,  7,  "causal", 2),
+            (7,  7,  "window", 4),
+            (3,  9,  "causal", 2),
+            (1,  9,  None,     1),
+            (5,  9,  "custom", 2),
+            (5,  9,  "head",   4),
+        ],
+    )
+    # fmt: on
+    @pytest.mark.parametrize("use_key_padding_mask", [False, True])
+    def test_tiled_sdpa(
+        self,
+        seq_len: int,
+        key_len: int,
+        mask_kind: Optional[str],
+        num_key_heads: int,
+        use_key_padding_mask: bool,
+    ) -> None:
+        # Use small blocks so that the attention spans multiple blocks.
+        tiled_sdpa = TiledSDPA(query_block_size=2, key_block_size=3)
+        naive_sdpa = NaiveSDPA()
+
+        q = torch.randn((2, 4, seq_len, 8), device=device)
+        k = torch.randn((2, num_key_heads, key_len, 8), device=device)
+        v = torch.randn((2, num_key_heads, key_len, 6), device=device)
+
+        if use_key_padding_mask:
+            key_padding_mask = PaddingMask(
+                torch.tensor([key_len - 2, key_len], device=device), key_len
+            )
+        else:
+            key_padding_mask = None
+
+        attn_mask: Optional[AttentionMask]
+
+        # During incremental decoding, the steps come after the past keys.
+        start_step = key_len - seq_len
+
+        if mask_kind == "causal":
+            attn_mask = CausalAttentionMask(
+                seq_len, key_len, start_step=start_step, device=device
+            )
+        elif mask_kind == "window":
+            attn_mask = CausalAttentionMask(
+                seq_len, key_len, attn_window_len=3, device=device
+            )
+        elif mask_kind == "custom":
+            attn_mask = CustomAttentionMask(
+                torch.randn((seq_len, key_len), device=device)
+            )
+        elif mask_kind == "head":
+            attn_mask = CustomAttentionMask(
+                torch.randn((4, seq_len, key_len), device=device)
+            )
+        else:
+            attn_mask = None
+
+        attn1, _ = tiled_sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+        attn2, _ = naive_sdpa(q, k, key_padding_mask, v, attn_mask=attn_mask)
+
+        assert (attn1 - attn2).abs().max() < 1e-5
+
+    def test_tiled_sdpa_raises_error_when_block_size_is_invalid(self) -> None:
+        with pytest.raises(
+            ValueError,
+            match=r"^`key_block_size` must be greater than 0, but is 0 instead\.$",
+        ):
+            TiledSDPA(key_block_size=0)
+
     @staticmethod
     def _get_sdpa_args(
         use_key_padding_mask: bool, use_attn_mask: bool
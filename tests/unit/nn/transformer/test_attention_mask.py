@@ -7,7 +7,13 @@
 import torch
 
 from fairseq2.nn import IncrementalStateBag
-from fairseq2.nn.transformer import ALiBiMaskFactory, CausalAttentionMaskFactory
+from fairseq2.nn.padding import PackedPaddingMask
+from fairseq2.nn.transformer import (
+    ALiBiMaskFactory,
+    CausalAttentionMask,
+    CausalAttentionMaskFactory,
+    PackedAttentionMask,
+)
 from tests.common import assert_close, device
 
 
@@ -68,6 +74,91 @@ class TestCausalAttentionMaskFactory:
 
         assert_close(m, expected_mask)
 
+    def test_call_works_when_seqs_are_at_different_steps(self) -> None:
+        factory = CausalAttentionMaskFactory()
+
+        q = torch.ones((2, 2, 3), device=device)
+
+        state_bag = IncrementalStateBag(max_num_steps=8)
+
+        state_bag.increment_step(3)
+
+        state_bag.seq_steps = torch.tensor([3, 1], device=device)
+
+        mask = factory(seqs=q, keys=q, training=False, state_bag=state_bag)
+
+        assert mask is not None
+
+        m = mask.materialize()
+
+        assert m.shape == (2, 1, 2, 5)
+
+        inf = -torch.inf
+
+        expected_mask = torch.tensor(
+            [
+                [[0.0, 0.0, 0.0, 0.0, inf], [0.0, 0.0, 0.0, 0.0, 0.0]],
+                [[0.0, 0.0, inf, inf, inf], [0.0, 0.0, 0.0, inf, inf]],
+            ],
+            device=device,
+        )
+
+        assert_close(m.squeeze(1), expected_mask)
+
+
+class TestPackedAttentionMask:
+    def test_materialize_works(self) -> None:
+        padding_mask = PackedPaddingMask([2, 3], device=device)
+
+        causal_mask = CausalAttentionMask(5, 5, device=device)
+
+        mask = PackedAttentionMask(padding_mask, padding_mask, causal_mask)
+
+        m = mask.materialize()
+
+        inf = -torch.inf
+
+        expected_mask = torch.tensor(
+            [
+                [0.0, inf, inf, inf, inf],
+                [0.0, 0.0, inf, inf, inf],
+                [inf, inf, 0.0, inf, inf],
+                [inf, inf, 0.0, 0.0, inf],
+                [inf, inf, 0.0, 0.0, 0.0],
+            ],
+            device=device,
+        )
+
+        assert_close(m, expected_mask)
+
+    def test_materialize_shares_mask_between_layers(self) -> None:
+        padding_mask = PackedPaddingMask([2, 3], device=device)
+
+        def materialize(
+            causal: bool, key_padding_mask: PackedPaddingMask = padding_mask
+        ) -> torch.Tensor:
+            # Each attention layer constructs its own masks.
+            if causal:
+                causal_mask = CausalAttentionMask(5, 5, device=device)
+            else:
+                causal_mask = None
+
+            mask = PackedAttentionMask(
+                padding_mask, key_padding_mask, causal_mask, dtype=torch.float32
+            )
+
+            return mask.materialize()
+
+        assert materialize(True) is materialize(True)
+
+        assert materialize(False) is materialize(False)
+
+        assert materialize(True) is not materialize(False)
+
+        other_padding_mask = PackedPaddingMask([3, 2], device=device)
+
+        assert materialize(True, other_padding_mask) is not materialize(True)
+
 
 class TestALiBiAttentionMaskGenerator:
     def test_call_works(self) -> None:
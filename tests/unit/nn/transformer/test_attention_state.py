@@ -0,0 +1,310 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import gc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pytest
+import torch
+from torch.overrides import TorchFunctionMode
+
+from fairseq2.nn.transformer import (
+    FullAttentionState,
+    LocalAttentionStateFactory,
+    NaiveSDPA,
+    PagedAttentionBlockPool,
+    PagedAttentionStateFactory,
+)
+from tests.common import assert_close, assert_equal, device
+
+
+class TestPagedAttentionState:
+    def test_append_get_reorder_work(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=32, block_size=4)
+
+        factory = PagedAttentionStateFactory(pool)
+
+        k = torch.randn((2, 3, 5, 8), device=device)
+        v = torch.randn((2, 3, 5, 8), device=device)
+
+        paged_state = factory(k, v, max_seq_len=16)
+
+        full_state = FullAttentionState(k, v, max_seq_len=16)
+
+        # Fan out to 2 beams per sequence as done by sequence generators.
+        new_order = torch.tensor([0, 0, 1, 1], device=device)
+
+        paged_state.reorder(new_order)
+
+        full_state.reorder(new_order)
+
+        # Reordering must not allocate any blocks; all beams share the prefix.
+        assert pool.num_free_blocks == 32 - 4
+
+        for step_nr in range(7):
+            k = torch.randn((4, 3, 1, 8), device=device)
+            v = torch.randn((4, 3, 1, 8), device=device)
+
+            paged_state.append(k, v)
+
+            full_state.append(k, v)
+
+            paged_k, paged_v = paged_state.get()
+
+            full_k, full_v = full_state.get()
+
+            assert_close(paged_k, full_k)
+            assert_close(paged_v, full_v)
+
+            new_order = torch.tensor([1, 1, 3, 2], device=device)
+
+            paged_state.reorder(new_order)
+
+            full_state.reorder(new_order)
+
+        paged_k, paged_v = paged_state.get()
+
+        full_k, full_v = full_state.get()
+
+        assert_close(paged_k, full_k)
+        assert_close(paged_v, full_v)
+
+        del paged_state
+
+        gc.collect()
+
+        # All blocks must be returned to the pool.
+        assert pool.num_free_blocks == 32
+
+    def test_extend_works(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=16, block_size=2)
+
+        factory = PagedAttentionStateFactory(pool)
+
+        k1 = torch.randn((1, 2, 3, 4), device=device)
+        v1 = torch.randn((1, 2, 3, 4), device=device)
+
+        k2 = torch.randn((2, 2, 1, 4), device=device)
+        v2 = torch.randn((2, 2, 1, 4), device=device)
+
+        state = factory(k1, v1, max_seq_len=8)
+
+        state.extend(factory(k2, v2, max_seq_len=8))
+
+        k3 = torch.randn((3, 2, 1, 4), device=device)
+        v3 = torch.randn((3, 2, 1, 4), device=device)
+
+        state.append(k3, v3)
+
+        k, v = state.get()
+
+        assert k.shape == (3, 2, 4, 4)
+        assert v.shape == (3, 2, 4, 4)
+
+        assert_equal(k[0], torch.cat([k1[0], k3[0]], dim=1))
+        assert_equal(v[0], torch.cat([v1[0], v3[0]], dim=1))
+
+        assert_equal(k[1:, :, :2], torch.cat([k2, k3[1:]], dim=2))
+        assert_equal(v[1:, :, :2], torch.cat([v2, v3[1:]], dim=2))
+
+    def test_truncate_works(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=16, block_size=2)
+
+        factory = PagedAttentionStateFactory(pool)
+
+        k = torch.randn((2, 2, 3, 4), device=device)
+        v = torch.randn((2, 2, 3, 4), device=device)
+
+        paged_state = factory(k, v, max_seq_len=16)
+
+        full_state = FullAttentionState(k, v, max_seq_len=16)
+
+        paged_state.reorder(torch.tensor([0, 0, 1], device=device))
+
+        full_state.reorder(torch.tensor([0, 0, 1], device=device))
+
+        # Append multiple steps at once as done in speculative decoding.
+        k = torch.randn((3, 2, 4, 4), device=device)
+        v = torch.randn((3, 2, 4, 4), device=device)
+
+        paged_state.append(k, v)
+
+        full_state.append(k, v)
+
+        paged_state.truncate(4)
+
+        full_state.truncate(4)
+
+        # The blocks past the fourth step must be returned to the pool. The
+        # first block is still shared by the first two sequences.
+        assert pool.num_free_blocks == 16 - 5
+
+        k = torch.randn((3, 2, 1, 4), device=device)
+        v = torch.randn((3, 2, 1, 4), device=device)
+
+        paged_state.append(k, v)
+
+        full_state.append(k, v)
+
+        paged_k, paged_v = paged_state.get()
+
+        full_k, full_v = full_state.get()
+
+        assert_close(paged_k, full_k)
+        assert_close(paged_v, full_v)
+
+    def test_truncate_works_when_num_steps_differ(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=16, block_size=2)
+
+        factory = PagedAttentionStateFactory(pool)
+
+        k = torch.randn((3, 2, 5, 4), device=device)
+        v = torch.randn((3, 2, 5, 4), device=device)
+
+        paged_state = factory(k, v, max_seq_len=16)
+
+        full_state = FullAttentionState(k, v, max_seq_len=16)
+
+        # Discard the padded steps of a right-padded batch.
+        seq_lens = torch.tensor([2, 5, 1], device=device)
+
+        paged_state.truncate(seq_lens)
+
+        full_state.truncate(seq_lens)
+
+        # The blocks past the last step of each sequence must be returned to
+        # the pool.
+        assert pool.num_free_blocks == 16 - 5
+
+        k_step = torch.randn((3, 2, 1, 4), device=device)
+        v_step = torch.randn((3, 2, 1, 4), device=device)
+
+        paged_state.append(k_step, v_step)
+
+        full_state.append(k_step, v_step)
+
+        paged_k, paged_v = paged_state.get()
+
+        full_k, full_v = full_state.get()
+
+        assert paged_k.size(2) == full_k.size(2) == 6
+
+        # Each sequence must continue right after its own last step.
+        for i, seq_len in enumerate(seq_lens.tolist()):
+            expected_k = torch.cat([k[i, :, :seq_len], k_step[i]], dim=1)
+            expected_v = torch.cat([v[i, :, :seq_len], v_step[i]], dim=1)
+
+            assert_equal(paged_k[i, :, : seq_len + 1], expected_k)
+            assert_equal(paged_v[i, :, : seq_len + 1], expected_v)
+
+            assert_equal(full_k[i, :, : seq_len + 1], expected_k)
+            assert_equal(full_v[i, :, : seq_len + 1], expected_v)
+
+    def test_step_work_does_not_grow_with_seq_len(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=1024, block_size=4)
+
+        factory = PagedAttentionStateFactory(pool)
+
+        k = torch.randn((4, 2, 1, 8), device=device)
+        v = torch.randn((4, 2, 1, 8), device=device)
+
+        state = factory(k, v, max_seq_len=256)
+
+        new_order = torch.tensor([1, 1, 3, 2], device=device)
+
+        step_ops = []
+
+        for _ in range(128):
+            k = torch.randn((4, 2, 1, 8), device=device)
+            v = torch.randn((4, 2, 1, 8), device=device)
+
+            with OpRecorder() as recorder:
+                state.append(k, v)
+
+                state.get()
+
+                state.reorder(new_order)
+
+            step_ops.append(recorder.ops)
+
+        # The steps at the same position within a block must run the same ops
+        # regardless of the sequence length.
+        for step_nr in range(4):
+            assert step_ops[step_nr + 4] == step_ops[step_nr + 124]
+
+        # No step must synchronize with the host or upload host data.
+        host_ops = {"item", "tolist", "__bool__", "__int__", "__index__", "tensor"}
+
+        for ops in step_ops:
+            assert host_ops.isdisjoint(ops)
+
+    def test_init_raises_error_when_pool_is_exhausted(self) -> None:
+        pool = PagedAttentionBlockPool(num_blocks=2, block_size=4)
+
+        k = torch.randn((3, 2, 2, 4), device=device)
+
+        with pytest.raises(
+            RuntimeError,
+            match=r"^The block pool does not have enough free blocks \(2\) to allocate 3 blocks\. Increase `num_blocks` or decrease the batch size\.$",
+        ):
+            PagedAttentionStateFactory(pool)(k, k, max_seq_len=8)
+
+
+class OpRecorder(TorchFunctionMode):
+    """Records the names of the torch functions called in its context."""
+
+    ops: List[str]
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.ops = []
+
+    def __torch_function__(
+        self,
+        func: Callable[..., Any],
+        types: Sequence[type],
+        args: Sequence[Any] = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        self.ops.append(func.__name__)
+
+        return func(*args, **(kwargs or {}))
+
+
+class TestLocalAttentionState:
+    @pytest.mark.parametrize("prefix_len", [2, 7])
+    def test_append_get_work(self, prefix_len: int) -> None:
+        sdpa = NaiveSDPA()
+
+        k = torch.randn((2, 3, prefix_len, 4), device=device)
+        v = torch.randn((2, 3, prefix_len, 4), device=device)
+
+        state = LocalAttentionStateFactory(attn_window_len=4)(k, v, max_seq_len=16)
+
+        all_k, all_v = k, v
+
+        for _ in range(6):
+            k = torch.randn((2, 3, 1, 4), device=device)
+            v = torch.randn((2, 3, 1, 4), device=device)
+
+            state.append(k, v)
+
+            all_k = torch.cat([all_k, k], dim=2)
+            all_v = torch.cat([all_v, v], dim=2)
+
+            state_k, state_v = state.get()
+
+            assert state_k.size(2) == min(all_k.size(2), 4)
+
+            q = torch.randn((2, 3, 1, 4), device=device)
+
+            # The keys and values are in buffer order, but the attention must
+            # be the same as with the last window steps in chronological order.
+            attn1, _ = sdpa(q, state_k, None, state_v)
+            attn2, _ = sdpa(q, all_k[:, :, -4:], None, all_v[:, :, -4:])
+
+            assert_close(attn1, attn2)
@@ -0,0 +1,160 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+
+from fairseq2.models.utils.checkpoint_loader import fuse_qkv_projections
+from fairseq2.nn.incremental_state import IncrementalStateBag
+from fairseq2.nn.ops import repeat_interleave
+from fairseq2.nn.padding import PaddingMask
+from fairseq2.nn.position_encoder import RotaryEncoder
+from fairseq2.nn.transformer import StandardMultiheadAttention
+from tests.common import assert_close, device
+
+
+class TestStandardMultiheadAttention:
+    def test_forward_works_when_keys_are_shared(self) -> None:
+        mha = StandardMultiheadAttention(
+            model_dim=16, num_heads=4, num_key_value_heads=2, device=device
+        )
+
+        mha.eval()
+
+        num_searches, beam_size = 3, 2
+
+        keys = torch.randn((num_searches, 5, 16), device=device)
+
+        key_padding_mask = PaddingMask(
+            torch.tensor([5, 3, 4], device=device), batch_seq_len=5
+        )
+
+        # Repeat the keys for each beam as the reference.
+        repeated_keys = repeat_interleave(keys, dim=0, repeat=beam_size)
+
+        repeated_key_padding_mask = PaddingMask(
+            repeat_interleave(key_padding_mask.seq_lens, dim=0, repeat=beam_size),
+            batch_seq_len=5,
+        )
+
+        state_bag1 = IncrementalStateBag(max_num_steps=4)
+        state_bag2 = IncrementalStateBag(max_num_steps=4)
+
+        # The first reorder drops the second search, the second one reorders
+        # the beams within the remaining searches.
+        new_orders = [[1, 0, 5, 5], [1, 1, 2, 3]]
+
+        for step_nr in range(3):
+            seqs = torch.randn((num_searches * beam_size, 1, 16), device=device)
+
+            output1 = mha(
+                seqs, None, keys, key_padding_mask, keys, state_bag=state_bag1
+            )
+
+            output2 = mha(
+                seqs,
+                None,
+                repeated_keys,
+                repeated_key_padding_mask,
+                repeated_keys,
+                state_bag=state_bag2,
+            )
+
+            assert_close(output1, output2)
+
+            if step_nr == 2:
+                break
+
+            new_order = new_orders[step_nr]
+
+            state_bag1.reorder(torch.tensor(new_order, device=device))
+            state_bag2.reorder(torch.tensor(new_order, device=device))
+
+            search_order = [i // beam_size for i in new_order[::beam_size]]
+
+            num_searches = len(search_order)
+
+            keys = keys[search_order]
+
+            key_padding_mask = PaddingMask(
+                key_padding_mask.seq_lens[search_order], batch_seq_len=5
+            )
+
+            repeated_keys = repeated_keys[new_order]
+
+            repeated_key_padding_mask = PaddingMask(
+                repeated_key_padding_mask.seq_lens[new_order], batch_seq_len=5
+            )
+
+    @pytest.mark.parametrize("bias", [False, True])
+    def test_forward_works_when_qkv_is_fused(self, bias: bool) -> None:
+        def build_mha(fuse_qkv: bool) -> StandardMultiheadAttention:
+            pos_encoder = RotaryEncoder(4, max_seq_len=16, device=device)
+
+            return StandardMultiheadAttention(
+                model_dim=16,
+                num_heads=4,
+                num_key_value_heads=2,
+                fuse_qkv=fuse_qkv,
+                pos_encoder=pos_encoder,
+                bias=bias,
+                device=device,
+            ).eval()
+
+        mha = build_mha(fuse_qkv=False)
+
+        fused_mha = build_mha(fuse_qkv=True)
+
+        fused_mha.load_state_dict(fuse_qkv_projections(mha.state_dict()))
+
+        seqs = torch.randn((2, 5, 16), device=device)
+
+        padding_mask = PaddingMask(torch.tensor([5, 3], device=device), 5)
+
+        output1 = mha(seqs, padding_mask, seqs, padding_mask, seqs)
+        output2 = fused_mha(seqs, padding_mask, seqs, padding_mask, seqs)
+
+        assert_close(output1, output2)
+
+        # Encoder-decoder attention uses the packed projections separately.
+        keys = torch.randn((2, 3, 16), device=device)
+
+        output1 = mha(seqs, padding_mask, keys, None, keys)
+        output2 = fused_mha(seqs, padding_mask, keys, None, keys)
+
+        assert_close(output1, output2)
+
+        state_bag1 = IncrementalStateBag(max_num_steps=8)
+        state_bag2 = IncrementalStateBag(max_num_steps=8)
+
+        for step_nr in range(3):
+            seqs = torch.randn((2, 2 if step_nr == 0 else 1, 16), device=device)
+
+            output1 = mha(seqs, None, seqs, None, seqs, state_bag=state_bag1)
+            output2 = fused_mha(seqs, None, seqs, None, seqs, state_bag=state_bag2)
+
+            assert_close(output1, output2)
+
+            state_bag1.increment_step(seqs.size(1))
+            state_bag2.increment_step(seqs.size(1))
+
+    def test_init_raises_error_when_qkv_is_fused_and_projections_are_specified(
+        self,
+    ) -> None:
+        mha = StandardMultiheadAttention(model_dim=16, num_heads=4, device=device)
+
+        with pytest.raises(
+            ValueError,
+            match=r"^`q_proj`, `k_proj`, and `v_proj` must be all `None` when `fuse_qkv` is `True`\.$",
+        ):
+            StandardMultiheadAttention(
+                model_dim=16,
+                num_heads=4,
+                q_proj=mha.q_proj,
+                k_proj=mha.k_proj,
+                v_proj=mha.v_proj,
+                fuse_qkv=True,
+            )